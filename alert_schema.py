@@ -0,0 +1,252 @@
+"""
+Structural checks of Grafana alert provisioning files, on parsed objects.
+
+Covers what Grafana rejects at provisioning time, or silently mishandles:
+- rules: uid present, at most 40 characters of [a-zA-Z0-9_-]; title; data
+  stages with unique refIds; condition naming one of them; reduce, math and
+  threshold expressions only referring to existing refIds; Prometheus
+  queries that parse; `for` a valid duration; known noDataState and
+  execErrState; string labels and annotations
+- groups: name, interval (a duration, at least and a multiple of 10s),
+  folder provisioned in folders.yaml, rule titles unique
+- files: apiVersion 1 and the shape of folders, contact point and
+  notification policy files; a ConfigMap is checked through the files in
+  its data, a PrometheusRule is not a provisioning file and is skipped
+
+Every check returns a list of problems instead of raising, so a caller can
+report all of them. uids must also be unique across all files of a
+provisioning directory; duplicate_uids() checks that over the uids each file
+reported, which lets files be validated in separate processes.
+
+Usage:
+    folders = load_folders(Path('grafana-alerts/folders.yaml'))
+    problems = document_problems(yaml_io.load(f), folders)
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import promql
+import yaml_io
+
+MAX_UID_LENGTH = 40
+UID_RE = re.compile(r'[a-zA-Z0-9_-]+')
+DURATION_RE = re.compile(r'(\d+(ms|[smhdwy]))+|0')
+REF_RE = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)\}?')
+
+# Grafana evaluates rule groups on a 10s scheduler tick
+BASE_INTERVAL = 10
+
+NO_DATA_STATES = ('Alerting', 'NoData', 'OK', 'KeepLast')
+EXEC_ERR_STATES = ('Alerting', 'Error', 'OK', 'KeepLast')
+EXPRESSION_TYPES = ('math', 'reduce', 'resample', 'threshold', 'classic_conditions', 'sql')
+EXPRESSION_DATASOURCE = '__expr__'
+
+FOLDERS_FILE = 'folders.yaml'
+
+class SchemaError(ValueError):
+    """Generated provisioning data that Grafana would reject."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+def load_folders(path: Path) -> Set[str]:
+    """uids and titles of the folders a folders.yaml provisions."""
+    with open(path, encoding='utf-8') as f:
+        document = yaml_io.load(f) or {}
+    names = set()
+    for folder in document.get('folders') or []:
+        for key in ('uid', 'title'):
+            if folder.get(key):
+                names.add(str(folder[key]))
+    return names
+
+def duration_seconds(text: Any) -> Optional[float]:
+    text = str(text).strip()
+    if not DURATION_RE.fullmatch(text):
+        return None
+    return promql.parse_duration(text) if text != '0' else 0.0
+
+def stage_references(stage: Dict[str, Any]) -> List[str]:
+    """refIds an expression stage reads."""
+    model = stage.get('model') or {}
+    kind = model.get('type')
+    expression = str(model.get('expression') or '')
+    if kind == 'math':
+        return REF_RE.findall(expression)
+    if kind in ('reduce', 'resample', 'threshold'):
+        return [expression.lstrip('$')] if expression else []
+    if kind == 'classic_conditions':
+        return [((c.get('query') or {}).get('params') or [''])[0] for c in model.get('conditions') or []]
+    return []
+
+def rule_problems(rule: Dict[str, Any]) -> List[str]:
+    """Problems of one rule, each prefixed with its title (or uid)."""
+    if not isinstance(rule, dict):
+        return ["rule is not a mapping"]
+    problems = []
+    uid = rule.get('uid')
+    if not uid:
+        problems.append("missing uid")
+    elif len(str(uid)) > MAX_UID_LENGTH:
+        problems.append(f"uid {uid!r} is longer than {MAX_UID_LENGTH} characters")
+    elif not UID_RE.fullmatch(str(uid)):
+        problems.append(f"uid {uid!r} may only contain letters, digits, - and _")
+    if not rule.get('title'):
+        problems.append("missing title")
+
+    data = rule.get('data')
+    ref_ids: List[str] = []
+    if not isinstance(data, list) or not data:
+        problems.append("missing data stages")
+        data = []
+    for stage in data:
+        ref_id = stage.get('refId') if isinstance(stage, dict) else None
+        if not ref_id:
+            problems.append("data stage without refId")
+            continue
+        if ref_id in ref_ids:
+            problems.append(f"refId {ref_id} used twice")
+        ref_ids.append(ref_id)
+    for stage in data:
+        if not isinstance(stage, dict) or not stage.get('refId'):
+            continue
+        ref_id = stage['refId']
+        model = stage.get('model')
+        if not isinstance(model, dict):
+            problems.append(f"stage {ref_id} has no model")
+            continue
+        if not stage.get('datasourceUid'):
+            problems.append(f"stage {ref_id} has no datasourceUid")
+        elif stage['datasourceUid'] == EXPRESSION_DATASOURCE:
+            if model.get('type') not in EXPRESSION_TYPES:
+                problems.append(f"stage {ref_id} has unknown expression type {model.get('type')!r}")
+            for ref in stage_references(stage):
+                if ref not in ref_ids:
+                    problems.append(f"stage {ref_id} refers to missing refId {ref!r}")
+                elif ref == ref_id:
+                    problems.append(f"stage {ref_id} refers to itself")
+        else:
+            window = stage.get('relativeTimeRange') or {}
+            if (window.get('from') or 0) < (window.get('to') or 0):
+                problems.append(f"stage {ref_id} relativeTimeRange ends before it starts")
+            if 'expr' in model:
+                try:
+                    promql.parse(str(model['expr']))
+                except promql.PromQLSyntaxError as e:
+                    problems.append(f"stage {ref_id} query does not parse: {e}")
+    condition = rule.get('condition')
+    if not condition:
+        problems.append("missing condition")
+    elif condition not in ref_ids:
+        problems.append(f"condition {condition!r} is not one of the refIds {', '.join(ref_ids) or '(none)'}")
+
+    if 'for' in rule and duration_seconds(rule['for']) is None:
+        problems.append(f"for {rule['for']!r} is not a duration like 5m")
+    if rule.get('noDataState', 'NoData') not in NO_DATA_STATES:
+        problems.append(f"noDataState {rule['noDataState']!r} is not one of {', '.join(NO_DATA_STATES)}")
+    if rule.get('execErrState', 'Error') not in EXEC_ERR_STATES:
+        problems.append(f"execErrState {rule['execErrState']!r} is not one of {', '.join(EXEC_ERR_STATES)}")
+    for field in ('labels', 'annotations'):
+        values = rule.get(field) or {}
+        if not isinstance(values, dict):
+            problems.append(f"{field} is not a mapping")
+            continue
+        for key, value in values.items():
+            if not isinstance(value, str):
+                problems.append(f"{field[:-1]} {key} is a {type(value).__name__}, not a string")
+    name = rule.get('title') or uid or '?'
+    return [f"rule {name}: {problem}" for problem in problems]
+
+def group_problems(group: Dict[str, Any], folders: Optional[Set[str]] = None) -> List[str]:
+    """Problems of a rule group and its rules; folders=None skips the folder check."""
+    if not isinstance(group, dict):
+        return ["group is not a mapping"]
+    name = group.get('name') or '?'
+    problems = []
+    if not group.get('name'):
+        problems.append("missing name")
+    folder = group.get('folder')
+    if not folder:
+        problems.append("missing folder")
+    elif folders is not None and str(folder) not in folders:
+        problems.append(f"folder {folder!r} is not provisioned in {FOLDERS_FILE}")
+    interval = duration_seconds(group.get('interval', ''))
+    if interval is None:
+        problems.append(f"interval {group.get('interval')!r} is not a duration like 1m")
+    elif interval < BASE_INTERVAL or interval % BASE_INTERVAL:
+        problems.append(f"interval {group['interval']} is not a multiple of {BASE_INTERVAL}s")
+    rules = group.get('rules')
+    if not isinstance(rules, list):
+        problems.append("missing rules")
+        rules = []
+    titles = set()
+    for rule in rules:
+        title = rule.get('title') if isinstance(rule, dict) else None
+        if title in titles:
+            problems.append(f"rule title {title!r} used twice")
+        titles.add(title)
+    problems = [f"group {name}: {problem}" for problem in problems]
+    for rule in rules:
+        problems.extend(f"group {name}: {problem}" for problem in rule_problems(rule))
+    return problems
+
+def document_problems(document: Any, folders: Optional[Set[str]] = None) -> List[str]:
+    """Problems of one provisioning file: rules, folders, contact points or policies."""
+    if not isinstance(document, dict):
+        return ["file is not a mapping"]
+    problems = []
+    if document.get('apiVersion') != 1:
+        problems.append("apiVersion must be 1")
+    if 'folders' in document:
+        for folder in document['folders'] or []:
+            if not isinstance(folder, dict) or not folder.get('uid') or not folder.get('title'):
+                problems.append(f"folder {folder!r} needs a uid and a title")
+    elif 'contactPoints' in document:
+        for point in document['contactPoints'] or []:
+            if not point.get('name') or not point.get('receivers'):
+                problems.append(f"contact point {point.get('name', '?')!r} needs a name and receivers")
+            for receiver in point.get('receivers') or []:
+                if not receiver.get('uid') or not receiver.get('type'):
+                    problems.append(f"contact point {point.get('name', '?')}: receiver needs a uid and a type")
+    elif 'policies' in document:
+        for policy in document['policies'] or []:
+            if not policy.get('receiver'):
+                problems.append("notification policy without a receiver")
+    elif isinstance(document.get('groups'), list):
+        for group in document['groups']:
+            problems.extend(group_problems(group, folders))
+    else:
+        problems.append("expected groups, folders, contactPoints or policies")
+    return problems
+
+def provisioning_documents(document: Any) -> List[Any]:
+    """The provisioning files in a document: itself, the data of a ConfigMap, or none for a PrometheusRule."""
+    if not isinstance(document, dict):
+        return [document]
+    if document.get('kind') == 'PrometheusRule':
+        return []
+    if document.get('kind') == 'ConfigMap':
+        return [yaml_io.load(text) for text in (document.get('data') or {}).values()]
+    return [document]
+
+def document_uids(document: Any) -> List[str]:
+    """uids of every rule in a provisioning file."""
+    if not isinstance(document, dict):
+        return []
+    return [rule['uid'] for group in document.get('groups') or [] if isinstance(group, dict)
+            for rule in group.get('rules') or [] if isinstance(rule, dict) and rule.get('uid')]
+
+def duplicate_uids(uids_by_source: Iterable[Tuple[str, List[str]]]) -> List[str]:
+    """A problem for every uid that more than one rule uses."""
+    seen: Dict[str, str] = {}
+    problems = []
+    for source, uids in uids_by_source:
+        for uid in uids:
+            if uid in seen:
+                problems.append(f"uid {uid!r} of {source} is also used in {seen[uid]}")
+            else:
+                seen[uid] = source
+    return problems
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Backtest Grafana alert rules against recorded or synthetic time series.
+
+Replays a fixture (OpenMetrics text with timestamps, or a columnar .npz file)
+through every rule in helm/grafana-alerts/*.yaml, evaluating each group at its
+interval, and reports when each rule would have fired. PrometheusRule files
+(alerts/*.yaml, or the ones under helm/grafana-alerts/) are converted with
+convert-alerts.py first. See backtest.py for the evaluation model.
+
+Requires NumPy.
+
+Usage:
+    python backtest-alerts.py FIXTURE [--rules helm/grafana-alerts] [--rule TITLE]
+                              [--start 2026-10-01T00:00] [--end ...] [--save-columnar OUT.npz]
+"""
+
+import argparse
+import fnmatch
+import importlib.util
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+try:
+    import backtest
+except ImportError as e:
+    sys.exit(f"✗ {e}")
+
+import yaml_io
+
+def load_converter():
+    """Import convert-alerts.py (its hyphenated name rules out a plain import)."""
+    spec = importlib.util.spec_from_file_location('convert_alerts', Path(__file__).with_name('convert-alerts.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def parse_time(text: Optional[str]) -> Optional[float]:
+    """Unix seconds from an ISO 8601 time (UTC unless it has an offset) or a number."""
+    if text is None:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        parsed = datetime.fromisoformat(text)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+def format_time(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def format_duration(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    parts = [f"{days}d" if days else '', f"{hours}h" if hours else '', f"{minutes}m" if minutes else '',
+             f"{secs}s" if secs or not (days or hours or minutes) else '']
+    return ''.join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest Grafana alert rules against a time-series fixture.')
+    parser.add_argument('fixture', type=Path, help='OpenMetrics text (.txt/.om) or columnar .npz fixture')
+    parser.add_argument('--rules', type=Path, default=Path('helm/grafana-alerts'),
+                        help='directory of alert rule files (default: helm/grafana-alerts)')
+    parser.add_argument('--rule', metavar='TITLE', help='only rules whose title matches this glob pattern')
+    parser.add_argument('--start', help='first evaluation (ISO 8601 or unix seconds; default: fixture start)')
+    parser.add_argument('--end', help='last evaluation (default: fixture end)')
+    parser.add_argument('--save-columnar', type=Path, metavar='OUT.npz',
+                        help='also write the fixture in the compact columnar format')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    fixture = backtest.load_fixture(args.fixture)
+    samples = sum(len(s.timestamps) for s in fixture.series)
+    print(f"\nLoaded {len(fixture.series)} series, {samples:,} samples "
+          f"({format_time(fixture.start)} → {format_time(fixture.end)}) "
+          f"in {time.perf_counter() - started:.2f}s")
+    if args.save_columnar:
+        backtest.save_columnar(fixture, args.save_columnar)
+        print(f"✓ Wrote {args.save_columnar}")
+
+    converter = load_converter()
+    runner = backtest.RuleBacktest(fixture)
+    start, end = parse_time(args.start), parse_time(args.end)
+    evaluated = fired = skipped = without_data = 0
+    started = time.perf_counter()
+    for path in sorted(args.rules.glob('*.yaml')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                documents = list(yaml_io.load_all(f))
+        except Exception as e:
+            print(f"⚠️  Skipping {path}: {str(e).splitlines()[0]}")
+            continue
+        for document in documents:
+            for group in backtest.rule_groups(document, converter):
+                interval = backtest.seconds(str(group.get('interval') or '1m'))
+                for rule in group.get('rules') or []:
+                    title = rule.get('title', rule.get('uid', ''))
+                    if args.rule and not fnmatch.fnmatchcase(title, args.rule):
+                        continue
+                    if not runner.has_data(rule):
+                        without_data += 1
+                        continue
+                    try:
+                        result = runner.run(rule, interval, group.get('name', ''), str(path), start, end)
+                    except backtest.Unsupported as e:
+                        skipped += 1
+                        print(f"⚠️  {title}: not evaluated ({e})")
+                        continue
+                    evaluated += 1
+                    episodes = list(result.episodes())
+                    if result.error:
+                        print(f"✗ {title}: evaluation error ({result.error}), execErrState={rule.get('execErrState')}")
+                    if not episodes:
+                        continue
+                    fired += 1
+                    print(f"🔥 {title}  ({path.name} / {result.group}, every {format_duration(interval)}, "
+                          f"for {rule.get('for', '0s')})")
+                    for labels, begin, stop in episodes:
+                        until = format_time(stop) if stop is not None else 'end of fixture'
+                        length = (stop if stop is not None else result.times[-1]) - begin
+                        print(f"    {backtest.format_labels(labels)}  {format_time(begin)} → {until} "
+                              f"({format_duration(length)})")
+
+    print(f"\n✅ Replayed {evaluated} rules in {time.perf_counter() - started:.2f}s: "
+          f"{fired} would have fired, {evaluated - fired} stayed quiet"
+          + (f", {skipped} not evaluated" if skipped else '')
+          + (f", {without_data} skipped for lack of fixture data" if without_data else ''))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,939 @@
+"""
+Replay time-series fixtures through Grafana alert rules.
+
+The evaluator follows the structure convert-alerts.py emits and Grafana runs:
+a Prometheus query (A), server-side expressions (reduce, math, threshold)
+and the rule's `for`, noDataState and execErrState. Everything is evaluated
+for all evaluation times at once with NumPy: a series is an array over the
+evaluation grid, NaN meaning "no sample", and range functions are computed
+from cumulative sums and searchsorted window bounds instead of per-step loops.
+
+Fixtures are either
+- OpenMetrics / Prometheus text with timestamps, one sample per line
+  (`metric{label="value"} 3 1700000000`); files ending in `# EOF` use
+  OpenMetrics timestamps in seconds, others Prometheus milliseconds
+- a compact columnar .npz file with `timestamps` (T,), `values` (S, T) and
+  `series` (S,) holding `metric{label="value"}` strings (see save_columnar)
+
+Known differences from Prometheus: NaN sample values are treated as missing
+(no staleness markers), and a few functions (label_replace, quantile_over_time
+and friends) are not implemented; rules using them raise Unsupported.
+"""
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(f"backtest.py needs NumPy (pip install numpy): {e}") from e
+
+import promql
+import query_cost
+import recording_rules
+import yaml_io
+from promql import (
+    AggregateExpr, BinaryExpr, Call, MatrixSelector, Node, NumberLiteral,
+    ParenExpr, StringLiteral, SubqueryExpr, UnaryExpr, Variable, VectorSelector,
+)
+
+# How far back an instant selector looks for the latest sample
+LOOKBACK_DELTA = 300.0
+
+# Subquery step when none is given (Prometheus' default evaluation interval)
+DEFAULT_SUBQUERY_STEP = 60.0
+
+# Sorted (name, value) pairs identifying a series
+Labels = Tuple[Tuple[str, str], ...]
+
+SERIES_RE = re.compile(r'^([a-zA-Z_:][\w:]*)?\s*(?:\{(.*)\})?$')
+LABEL_RE = re.compile(r'\s*([a-zA-Z_][\w]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+SAMPLE_RE = re.compile(r'^(\S+?(?:\{.*\})?)\s+(\S+)(?:\s+(\S+))?\s*$')
+
+class BacktestError(Exception):
+    """Evaluation failed the way it would fail in Prometheus or Grafana."""
+
+class Unsupported(BacktestError):
+    """The rule uses a feature the backtester does not implement."""
+
+# --- Fixtures ---------------------------------------------------------------
+
+class Series:
+    """Raw samples of one series, sorted by time, without NaN values."""
+    __slots__ = ('labels', 'timestamps', 'values')
+
+    def __init__(self, labels: Labels, timestamps: np.ndarray, values: np.ndarray):
+        keep = ~np.isnan(values)
+        order = np.argsort(timestamps[keep], kind='stable')
+        self.labels = labels
+        self.timestamps = timestamps[keep][order]
+        self.values = values[keep][order]
+
+class Fixture:
+    """A set of series, indexed by metric name."""
+
+    def __init__(self, series: List[Series]):
+        self.series = [s for s in series if len(s.timestamps)]
+        self.by_name: Dict[str, List[Series]] = {}
+        for s in self.series:
+            self.by_name.setdefault(dict(s.labels).get('__name__', ''), []).append(s)
+
+    @property
+    def start(self) -> float:
+        return min(s.timestamps[0] for s in self.series)
+
+    @property
+    def end(self) -> float:
+        return max(s.timestamps[-1] for s in self.series)
+
+    def select(self, selector: VectorSelector) -> List[Series]:
+        """Series matching a vector selector's name and label matchers."""
+        name = selector.metric_name()
+        candidates = self.by_name.get(name, []) if name else self.series
+        if any(recording_rules.is_variable_matcher(m) for m in selector.matchers):
+            raise Unsupported(f"template variable in {selector}")
+        matchers = [(m.name, m.op, m.value) for m in selector.matchers]
+        if selector.name:
+            matchers.append(('__name__', '=', selector.name))
+        return [s for s in candidates if all(label_matches(dict(s.labels).get(n, ''), op, v) for n, op, v in matchers)]
+
+def label_matches(actual: str, op: str, value: str) -> bool:
+    if op == '=':
+        return actual == value
+    if op == '!=':
+        return actual != value
+    matched = re.fullmatch(value, actual) is not None
+    return matched if op == '=~' else not matched
+
+def parse_series(text: str) -> Labels:
+    """Labels of a `metric{label="value"}` series identifier."""
+    match = SERIES_RE.match(text.strip())
+    if not match:
+        raise ValueError(f"invalid series {text!r}")
+    name, body = match.groups()
+    labels = {'__name__': name} if name else {}
+    for label, value in LABEL_RE.findall(body or ''):
+        labels[label] = promql.unquote(f'"{value}"')
+    return tuple(sorted(labels.items()))
+
+def format_labels(labels: Labels) -> str:
+    """Series identifier for a label set, in PromQL notation."""
+    name = dict(labels).get('__name__', '')
+    body = ', '.join(f'{k}={promql.quote(v)}' for k, v in labels if k != '__name__')
+    return f"{name}{{{body}}}" if body or not name else name
+
+def load_text(path: Path) -> Fixture:
+    """Read an OpenMetrics or Prometheus text fixture with timestamped samples."""
+    lines = path.read_text(encoding='utf-8').splitlines()
+    openmetrics = any(line.strip() == '# EOF' for line in lines)
+    scale = 1.0 if openmetrics else 0.001
+    samples: Dict[Labels, Tuple[List[float], List[float]]] = {}
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE_RE.match(line)
+        if not match or match.group(3) is None:
+            raise ValueError(f"{path}:{number}: expected 'series value timestamp'")
+        labels = parse_series(match.group(1))
+        timestamps, values = samples.setdefault(labels, ([], []))
+        timestamps.append(float(match.group(3)) * scale)
+        values.append(float(match.group(2)))
+    return Fixture([Series(labels, np.array(ts, dtype=float), np.array(vs, dtype=float))
+                    for labels, (ts, vs) in samples.items()])
+
+def load_columnar(path: Path) -> Fixture:
+    """Read a .npz fixture written by save_columnar."""
+    with np.load(path, allow_pickle=False) as data:
+        timestamps = data['timestamps'].astype(float)
+        values = data['values'].astype(float)
+        names = [str(s) for s in data['series']]
+    return Fixture([Series(parse_series(name), timestamps, values[i]) for i, name in enumerate(names)])
+
+def save_columnar(fixture: Fixture, path: Path):
+    """Write a fixture as one shared time axis and a series x time value matrix."""
+    timestamps = np.unique(np.concatenate([s.timestamps for s in fixture.series]))
+    values = np.full((len(fixture.series), len(timestamps)), np.nan)
+    for i, s in enumerate(fixture.series):
+        values[i, np.searchsorted(timestamps, s.timestamps)] = s.values
+    series = np.array([format_labels(s.labels) for s in fixture.series])
+    np.savez_compressed(path, timestamps=timestamps, values=values, series=series)
+
+def load_fixture(path: Path) -> Fixture:
+    return load_columnar(path) if path.suffix == '.npz' else load_text(path)
+
+# --- PromQL -----------------------------------------------------------------
+
+# Instant vector over the evaluation times: labels -> values (NaN = absent)
+Vector = Dict[Labels, np.ndarray]
+
+def drop_labels(labels: Labels, names) -> Labels:
+    return tuple((k, v) for k, v in labels if k not in names)
+
+def keep_labels(labels: Labels, names) -> Labels:
+    return tuple((k, v) for k, v in labels if k in names)
+
+def drop_name(labels: Labels) -> Labels:
+    return drop_labels(labels, ('__name__',))
+
+def put(vector: Vector, labels: Labels, values: np.ndarray):
+    """Add a series, merging with an existing one as long as they never overlap."""
+    existing = vector.get(labels)
+    if existing is None:
+        vector[labels] = values
+        return
+    if np.any(~np.isnan(existing) & ~np.isnan(values)):
+        raise BacktestError(f"vector cannot contain metrics with the same labelset {format_labels(labels)}")
+    vector[labels] = np.where(np.isnan(existing), values, existing)
+
+def window_sum(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Sum of values[lo:hi] for every window, from one cumulative sum."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[hi] - cumulative[lo]
+
+def window_reduce(ufunc, values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """ufunc.reduce over values[lo:hi] for every window, via reduceat on interleaved bounds."""
+    padded = np.append(values, np.nan)
+    bounds = np.empty(2 * len(lo), dtype=np.intp)
+    bounds[0::2] = lo
+    bounds[1::2] = hi
+    return np.where(hi > lo, ufunc.reduceat(padded, bounds)[0::2], np.nan)
+
+def seconds(text: str) -> float:
+    """A duration with optional sign ('-5m'), in seconds."""
+    value = promql.parse_duration(text.lstrip('-'))
+    if value is None:
+        raise Unsupported(f"template variable {text}")
+    return -value if text.startswith('-') else value
+
+class RangeSamples:
+    """Samples of one series falling in the window before each evaluation time."""
+    __slots__ = ('labels', 'timestamps', 'values', 'lo', 'hi', 'times', 'window')
+
+    def __init__(self, labels: Labels, timestamps: np.ndarray, values: np.ndarray,
+                 times: np.ndarray, window: float):
+        self.labels = labels
+        self.timestamps = timestamps
+        self.values = values
+        self.times = times
+        self.window = window
+        # Prometheus ranges are left-open: (t - window, t]
+        self.lo = np.searchsorted(timestamps, times - window, side='right')
+        self.hi = np.searchsorted(timestamps, times, side='right')
+
+    @property
+    def count(self) -> np.ndarray:
+        return self.hi - self.lo
+
+    def at(self, array: np.ndarray, index: np.ndarray) -> np.ndarray:
+        return array[np.clip(index, 0, len(array) - 1)]
+
+    def window_sum(self, array: np.ndarray) -> np.ndarray:
+        return window_sum(array, self.lo, self.hi)
+
+    def pair_count(self, changed: np.ndarray) -> np.ndarray:
+        """How many consecutive sample pairs inside each window satisfy `changed`."""
+        cumulative = np.concatenate(([0], np.cumsum(changed)))
+        return self.at(cumulative, self.hi - 1) - self.at(cumulative, self.lo)
+
+def extrapolated_delta(r: RangeSamples, counter: bool, per_second: bool) -> np.ndarray:
+    """rate / increase / delta with Prometheus' extrapolation to the window edges."""
+    values = r.values
+    if counter:
+        previous = values[:-1]
+        resets = np.where(values[1:] < previous, previous, 0.0)
+        values = values + np.concatenate(([0.0], np.cumsum(resets)))
+    n = r.count
+    first_t, last_t = r.at(r.timestamps, r.lo), r.at(r.timestamps, r.hi - 1)
+    result = r.at(values, r.hi - 1) - r.at(values, r.lo)
+    sampled = last_t - first_t
+    average = sampled / np.maximum(n - 1, 1)
+    to_start = first_t - (r.times - r.window)
+    to_end = r.times - last_t
+    if counter:
+        first_value = r.at(r.values, r.lo)
+        to_zero = sampled * np.divide(first_value, result, out=np.full_like(result, np.inf), where=result > 0)
+        to_start = np.where((result > 0) & (first_value >= 0), np.minimum(to_start, to_zero), to_start)
+    threshold = average * 1.1
+    interval = sampled + np.where(to_start < threshold, to_start, average / 2) \
+        + np.where(to_end < threshold, to_end, average / 2)
+    result = result * np.divide(interval, sampled, out=np.zeros_like(interval), where=sampled > 0)
+    if per_second:
+        result = result / r.window
+    return np.where((n >= 2) & (sampled > 0), result, np.nan)
+
+def instant_delta(r: RangeSamples, counter: bool, per_second: bool) -> np.ndarray:
+    """irate / idelta from the last two samples of each window."""
+    last, previous = r.at(r.values, r.hi - 1), r.at(r.values, r.hi - 2)
+    result = last - previous
+    if counter:
+        result = np.where(last < previous, last, result)
+    if per_second:
+        dt = r.at(r.timestamps, r.hi - 1) - r.at(r.timestamps, r.hi - 2)
+        result = np.divide(result, dt, out=np.full_like(result, np.nan), where=dt > 0)
+    return np.where(r.count >= 2, result, np.nan)
+
+def regression(r: RangeSamples, at: Optional[np.ndarray] = None) -> np.ndarray:
+    """Least-squares slope (deriv) or the prediction at `at` (predict_linear)."""
+    origin = r.times[0] if len(r.times) else 0.0
+    t = r.timestamps - origin
+    n = r.count.astype(float)
+    sum_t, sum_v = r.window_sum(t), r.window_sum(r.values)
+    sum_tv, sum_tt = r.window_sum(t * r.values), r.window_sum(t * t)
+    denominator = n * sum_tt - sum_t * sum_t
+    slope = np.divide(n * sum_tv - sum_t * sum_v, denominator, out=np.full_like(n, np.nan),
+                      where=denominator != 0)
+    if at is None:
+        result = slope
+    else:
+        mean_t = np.divide(sum_t, n, out=np.zeros_like(n), where=n > 0)
+        mean_v = np.divide(sum_v, n, out=np.zeros_like(n), where=n > 0)
+        result = mean_v + slope * (at - origin - mean_t)
+    return np.where(n >= 2, result, np.nan)
+
+RANGE_FUNCTIONS = {
+    'rate': lambda r: extrapolated_delta(r, counter=True, per_second=True),
+    'increase': lambda r: extrapolated_delta(r, counter=True, per_second=False),
+    'delta': lambda r: extrapolated_delta(r, counter=False, per_second=False),
+    'irate': lambda r: instant_delta(r, counter=True, per_second=True),
+    'idelta': lambda r: instant_delta(r, counter=False, per_second=False),
+    'deriv': lambda r: regression(r),
+    'count_over_time': lambda r: r.count.astype(float),
+    'sum_over_time': lambda r: r.window_sum(r.values),
+    'avg_over_time': lambda r: r.window_sum(r.values) / np.maximum(r.count, 1),
+    'min_over_time': lambda r: window_reduce(np.fmin, r.values, r.lo, r.hi),
+    'max_over_time': lambda r: window_reduce(np.fmax, r.values, r.lo, r.hi),
+    'last_over_time': lambda r: r.at(r.values, r.hi - 1),
+    'present_over_time': lambda r: np.ones(len(r.times)),
+    'changes': lambda r: r.pair_count(r.values[1:] != r.values[:-1]).astype(float),
+    'resets': lambda r: r.pair_count(r.values[1:] < r.values[:-1]).astype(float),
+}
+
+# Range functions whose result keeps the metric name
+NAME_PRESERVING_FUNCTIONS = frozenset({'last_over_time'})
+
+MATH_FUNCTIONS = {
+    'abs': np.abs, 'ceil': np.ceil, 'floor': np.floor, 'exp': np.exp, 'ln': np.log,
+    'log2': np.log2, 'log10': np.log10, 'sqrt': np.sqrt, 'sgn': np.sign,
+}
+
+ARITHMETIC = {
+    '+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide,
+    '%': np.fmod, '^': np.power, 'atan2': np.arctan2,
+}
+
+COMPARISONS = {
+    '==': np.equal, '!=': np.not_equal, '>': np.greater, '<': np.less,
+    '>=': np.greater_equal, '<=': np.less_equal,
+}
+
+class Evaluator:
+    """Evaluates PromQL against a fixture at an array of evaluation times."""
+
+    def __init__(self, fixture: Fixture):
+        self.fixture = fixture
+
+    def query(self, expr: str, times: np.ndarray) -> Vector:
+        """Instant query at every time in `times`; scalars come back as a label-less series."""
+        with np.errstate(all='ignore'):
+            result = self.eval(promql.parse(expr), times)
+        if isinstance(result, np.ndarray):
+            return {(): result}
+        if isinstance(result, dict):
+            return {labels: values for labels, values in result.items() if not np.all(np.isnan(values))}
+        raise BacktestError(f"expression must return a vector or scalar: {expr}")
+
+    def eval(self, node: Node, times: np.ndarray):
+        if isinstance(node, ParenExpr):
+            return self.eval(node.expr, times)
+        if isinstance(node, NumberLiteral):
+            return np.full(len(times), node.value)
+        if isinstance(node, StringLiteral):
+            return node.value
+        if isinstance(node, Variable):
+            raise Unsupported(f"template variable {node}")
+        if isinstance(node, VectorSelector):
+            return self.select(node, times)
+        if isinstance(node, (MatrixSelector, SubqueryExpr)):
+            raise BacktestError(f"range vector {node} must be passed to a function")
+        if isinstance(node, UnaryExpr):
+            value = self.eval(node.expr, times)
+            if node.op == '+':
+                return value
+            if isinstance(value, np.ndarray):
+                return -value
+            return {drop_name(labels): -values for labels, values in value.items()}
+        if isinstance(node, Call):
+            return self.call(node, times)
+        if isinstance(node, AggregateExpr):
+            return self.aggregate(node, times)
+        if isinstance(node, BinaryExpr):
+            return self.binary(node, times)
+        raise Unsupported(f"{type(node).__name__} {node}")
+
+    def shifted(self, times: np.ndarray, offset: Optional[str], at: Optional[str]) -> np.ndarray:
+        """Evaluation times after applying offset and @ modifiers."""
+        if at:
+            if at == 'start()':
+                times = np.full(len(times), times[0])
+            elif at == 'end()':
+                times = np.full(len(times), times[-1])
+            else:
+                times = np.full(len(times), float(at))
+        if offset:
+            times = times - seconds(offset)
+        return times
+
+    def select(self, selector: VectorSelector, times: np.ndarray) -> Vector:
+        times = self.shifted(times, selector.offset, selector.at)
+        result = {}
+        for series in self.fixture.select(selector):
+            index = np.searchsorted(series.timestamps, times, side='right') - 1
+            clipped = np.clip(index, 0, None)
+            fresh = (index >= 0) & (times - series.timestamps[clipped] <= LOOKBACK_DELTA)
+            result[series.labels] = np.where(fresh, series.values[clipped], np.nan)
+        return result
+
+    def ranges(self, node: Node, times: np.ndarray) -> List[RangeSamples]:
+        """The samples a matrix selector or subquery yields for every evaluation time."""
+        if isinstance(node, ParenExpr):
+            return self.ranges(node.expr, times)
+        if isinstance(node, MatrixSelector):
+            window = seconds(node.range)
+            shifted = self.shifted(times, node.vector.offset, node.vector.at)
+            return [RangeSamples(s.labels, s.timestamps, s.values, shifted, window)
+                    for s in self.fixture.select(node.vector)]
+        if isinstance(node, SubqueryExpr):
+            window = seconds(node.range)
+            step = seconds(node.step) if node.step else DEFAULT_SUBQUERY_STEP
+            shifted = self.shifted(times, node.offset, node.at)
+            # Subquery steps are aligned to multiples of the step, like Prometheus
+            inner_times = np.arange(np.floor((shifted.min() - window) / step) * step, shifted.max() + step / 2, step)
+            inner = self.eval(node.expr, inner_times)
+            if isinstance(inner, np.ndarray):
+                raise BacktestError(f"subquery {node} must return a vector")
+            result = []
+            for labels, values in inner.items():
+                present = ~np.isnan(values)
+                result.append(RangeSamples(labels, inner_times[present], values[present], shifted, window))
+            return result
+        raise BacktestError(f"expected a range vector, got {node}")
+
+    def call(self, node: Call, times: np.ndarray):
+        func, args = node.func, node.args
+        if func in RANGE_FUNCTIONS or func == 'predict_linear':
+            result = {}
+            for r in self.ranges(args[0], times):
+                if func == 'predict_linear':
+                    horizon = self.eval(args[1], times)
+                    values = regression(r, r.times + horizon)
+                else:
+                    values = RANGE_FUNCTIONS[func](r)
+                values = np.where(r.count > 0, values, np.nan)
+                labels = r.labels if func in NAME_PRESERVING_FUNCTIONS else drop_name(r.labels)
+                put(result, labels, values)
+            return result
+        if func == 'time':
+            return times.astype(float)
+        if func == 'vector':
+            return {(): self.eval(args[0], times)}
+        if func == 'scalar':
+            vector = self.eval(args[0], times)
+            if not vector:
+                return np.full(len(times), np.nan)
+            matrix = np.vstack(list(vector.values()))
+            single = np.sum(~np.isnan(matrix), axis=0) == 1
+            return np.where(single, np.nanmax(np.where(np.isnan(matrix), -np.inf, matrix), axis=0), np.nan)
+        if func == 'absent':
+            vector = self.eval(args[0], times)
+            present = np.zeros(len(times), dtype=bool)
+            for values in vector.values():
+                present |= ~np.isnan(values)
+            labels = ()
+            if isinstance(args[0], VectorSelector):
+                labels = tuple(sorted((m.name, m.value) for m in args[0].matchers if m.op == '='))
+            return {labels: np.where(present, np.nan, 1.0)}
+        if func == 'histogram_quantile':
+            return self.histogram_quantile(self.eval(args[0], times), self.eval(args[1], times))
+        if func in MATH_FUNCTIONS or func in ('clamp', 'clamp_min', 'clamp_max', 'round'):
+            vector = self.eval(args[0], times)
+            bounds = [self.eval(a, times) for a in args[1:]]
+            result = {}
+            for labels, values in vector.items():
+                if func == 'clamp':
+                    values = np.where(bounds[0] > bounds[1], np.nan, np.clip(values, bounds[0], bounds[1]))
+                elif func == 'clamp_min':
+                    values = np.maximum(values, bounds[0])
+                elif func == 'clamp_max':
+                    values = np.minimum(values, bounds[0])
+                elif func == 'round':
+                    to = bounds[0] if bounds else 1.0
+                    values = np.floor(values / to + 0.5) * to
+                else:
+                    values = MATH_FUNCTIONS[func](values)
+                put(result, drop_name(labels), values)
+            return result
+        raise Unsupported(f"function {func}()")
+
+    def histogram_quantile(self, q: np.ndarray, buckets: Vector) -> Vector:
+        groups: Dict[Labels, List[Tuple[float, np.ndarray]]] = {}
+        for labels, values in buckets.items():
+            le = dict(labels).get('le')
+            if le is None:
+                continue
+            groups.setdefault(drop_labels(labels, ('le', '__name__')), []).append((float(le), values))
+        result = {}
+        for labels, items in groups.items():
+            items.sort(key=lambda item: item[0])
+            upper = np.array([le for le, _ in items])
+            counts = np.maximum.accumulate(np.vstack([values for _, values in items]), axis=0)
+            complete = ~np.any(np.isnan(counts), axis=0)
+            total = counts[-1]
+            rank = q * total
+            bucket = np.argmax(counts >= rank, axis=0)
+            column = np.arange(counts.shape[1])
+            below = np.where(bucket > 0, counts[np.maximum(bucket - 1, 0), column], 0.0)
+            start = np.where(bucket > 0, upper[np.maximum(bucket - 1, 0)], 0.0)
+            end = upper[bucket]
+            in_bucket = counts[bucket, column] - below
+            value = start + (end - start) * np.divide(rank - below, in_bucket, out=np.ones_like(rank),
+                                                      where=in_bucket > 0)
+            # The +Inf bucket has no upper bound: report the largest finite one
+            value = np.where(np.isinf(end), upper[-2] if len(upper) > 1 else np.nan, value)
+            value = np.where((bucket == 0) & (end <= 0), end, value)
+            value = np.where(q < 0, -np.inf, np.where(q > 1, np.inf, value))
+            valid = complete & (total > 0) & (len(upper) >= 2) & np.isinf(upper[-1])
+            result[labels] = np.where(valid, value, np.nan)
+        return result
+
+    def aggregate(self, node: AggregateExpr, times: np.ndarray) -> Vector:
+        vector = self.eval(node.expr, times)
+        if isinstance(vector, np.ndarray):
+            raise BacktestError(f"{node.op}() expects a vector")
+        grouping = node.grouping or ()
+        groups: Dict[Labels, List[Tuple[Labels, np.ndarray]]] = {}
+        for labels, values in vector.items():
+            if node.without:
+                key = drop_labels(labels, set(grouping) | {'__name__'})
+            else:
+                key = keep_labels(labels, grouping)
+            groups.setdefault(key, []).append((labels, values))
+        param = self.eval(node.param, times) if node.param is not None else None
+        result = {}
+        for key, members in groups.items():
+            matrix = np.vstack([values for _, values in members])
+            present = ~np.isnan(matrix)
+            count = present.sum(axis=0)
+            empty = count == 0
+            if node.op in ('topk', 'bottomk'):
+                k = int(param[0])
+                ordered = np.where(present, matrix if node.op == 'bottomk' else -matrix, np.inf)
+                rank = np.argsort(np.argsort(ordered, axis=0, kind='stable'), axis=0)
+                for (labels, values), keep in zip(members, rank < k):
+                    put(result, labels, np.where(keep, values, np.nan))
+                continue
+            if node.op == 'sum':
+                values = np.nansum(matrix, axis=0)
+            elif node.op == 'avg':
+                values = np.nansum(matrix, axis=0) / np.maximum(count, 1)
+            elif node.op == 'min':
+                values = np.where(present, matrix, np.inf).min(axis=0)
+            elif node.op == 'max':
+                values = np.where(present, matrix, -np.inf).max(axis=0)
+            elif node.op == 'count':
+                values = count.astype(float)
+            elif node.op == 'group':
+                values = np.ones(len(times))
+            elif node.op in ('stddev', 'stdvar'):
+                mean = np.nansum(matrix, axis=0) / np.maximum(count, 1)
+                variance = np.nansum((matrix - mean) ** 2, axis=0) / np.maximum(count, 1)
+                values = np.sqrt(variance) if node.op == 'stddev' else variance
+            elif node.op == 'quantile':
+                values = np.nanquantile(np.where(present, matrix, np.nan), float(param[0]), axis=0) \
+                    if not np.all(empty) else np.full(len(times), np.nan)
+            else:
+                raise Unsupported(f"aggregation {node.op}")
+            result[key] = np.where(empty, np.nan, values)
+        return result
+
+    def binary(self, node: BinaryExpr, times: np.ndarray):
+        lhs, rhs = self.eval(node.lhs, times), self.eval(node.rhs, times)
+        op = node.op
+        comparison = op in COMPARISONS
+        if isinstance(lhs, np.ndarray) and isinstance(rhs, np.ndarray):
+            if comparison and not node.return_bool:
+                raise BacktestError("comparisons between scalars must use bool")
+            return self.apply(op, lhs, rhs, node.return_bool)
+        if isinstance(lhs, np.ndarray) or isinstance(rhs, np.ndarray):
+            if op in promql.SET_OPERATORS:
+                raise BacktestError(f"set operator {op} not allowed with a scalar")
+            result = {}
+            for labels, values in (rhs if isinstance(lhs, np.ndarray) else lhs).items():
+                left, right = (lhs, values) if isinstance(lhs, np.ndarray) else (values, rhs)
+                computed = self.apply(op, left, right, node.return_bool, keep=values)
+                keep_name = comparison and not node.return_bool
+                put(result, labels if keep_name else drop_name(labels), computed)
+            return result
+        if op in promql.SET_OPERATORS:
+            return self.set_operation(node, lhs, rhs)
+        return self.vector_match(node, lhs, rhs)
+
+    def apply(self, op: str, lhs: np.ndarray, rhs: np.ndarray, return_bool: bool,
+              keep: Optional[np.ndarray] = None) -> np.ndarray:
+        """Apply an arithmetic or comparison operator; filtering comparisons keep `keep`."""
+        if op in ARITHMETIC:
+            return ARITHMETIC[op](lhs, rhs)
+        if op not in COMPARISONS:
+            raise Unsupported(f"operator {op}")
+        missing = np.isnan(lhs) | np.isnan(rhs)
+        matched = COMPARISONS[op](lhs, rhs)
+        if return_bool:
+            return np.where(missing, np.nan, matched.astype(float))
+        return np.where(matched & ~missing, lhs if keep is None else keep, np.nan)
+
+    def signature(self, node: BinaryExpr, labels: Labels) -> Labels:
+        matching = node.matching
+        if matching and matching.on:
+            return keep_labels(labels, matching.labels)
+        ignored = set(matching.labels) if matching else set()
+        return drop_labels(labels, ignored | {'__name__'})
+
+    def presence(self, node: BinaryExpr, vector: Vector, length: int) -> Dict[Labels, np.ndarray]:
+        """Per signature, whether any series with it has a value at each time."""
+        present: Dict[Labels, np.ndarray] = {}
+        for labels, values in vector.items():
+            sig = self.signature(node, labels)
+            present[sig] = present.get(sig, np.zeros(length, dtype=bool)) | ~np.isnan(values)
+        return present
+
+    def set_operation(self, node: BinaryExpr, lhs: Vector, rhs: Vector) -> Vector:
+        length = len(next(iter(lhs.values()), next(iter(rhs.values()), np.empty(0))))
+        result = {}
+        if node.op in ('and', 'unless'):
+            present = self.presence(node, rhs, length)
+            for labels, values in lhs.items():
+                matched = present.get(self.signature(node, labels), np.zeros(length, dtype=bool))
+                keep = matched if node.op == 'and' else ~matched
+                result[labels] = np.where(keep, values, np.nan)
+            return result
+        present = self.presence(node, lhs, length)
+        result.update(lhs)
+        for labels, values in rhs.items():
+            taken = present.get(self.signature(node, labels), np.zeros(length, dtype=bool))
+            put(result, labels, np.where(taken, np.nan, values))
+        return result
+
+    def vector_match(self, node: BinaryExpr, lhs: Vector, rhs: Vector) -> Vector:
+        matching = node.matching
+        group = matching.group if matching else None
+        many, one = (rhs, lhs) if group == 'group_right' else (lhs, rhs)
+        # The "one" side must have at most one series per signature at any time
+        one_side: Dict[Labels, Tuple[Labels, np.ndarray]] = {}
+        for labels, values in one.items():
+            sig = self.signature(node, labels)
+            if sig in one_side:
+                first_labels, first = one_side[sig]
+                if np.any(~np.isnan(first) & ~np.isnan(values)):
+                    raise BacktestError(f"many-to-many matching not allowed: multiple series for {format_labels(sig)}")
+                one_side[sig] = (first_labels, np.where(np.isnan(first), values, first))
+            else:
+                one_side[sig] = (labels, values)
+        if not group:
+            # One-to-one matching also allows only one left-hand series per signature
+            seen: Dict[Labels, np.ndarray] = {}
+            for labels, values in many.items():
+                sig = self.signature(node, labels)
+                if sig in seen and np.any(~np.isnan(seen[sig]) & ~np.isnan(values)):
+                    raise BacktestError(f"found duplicate series for the match group {format_labels(sig)}; "
+                                        f"many-to-one matching must be explicit (group_left/group_right)")
+                seen[sig] = values if sig not in seen else np.where(np.isnan(seen[sig]), values, seen[sig])
+        comparison = node.op in COMPARISONS
+        drop = not comparison or node.return_bool
+        result = {}
+        for labels, values in many.items():
+            sig = self.signature(node, labels)
+            if sig not in one_side:
+                continue
+            one_labels, other = one_side[sig]
+            left, right = (other, values) if group == 'group_right' else (values, other)
+            computed = self.apply(node.op, left, right, node.return_bool, keep=left)
+            out = drop_name(labels) if drop else labels
+            if not group and matching:
+                out = keep_labels(out, matching.labels) if matching.on else drop_labels(out, matching.labels)
+            elif group and matching.include:
+                extra = dict(one_labels)
+                out = dict(drop_labels(out, matching.include))
+                out.update({k: extra[k] for k in matching.include if extra.get(k)})
+                out = tuple(sorted(out.items()))
+            put(result, out, computed)
+        return result
+
+# --- Grafana rules ----------------------------------------------------------
+
+class Frames:
+    """A range query's series on a fine grid plus each evaluation's window of it."""
+    __slots__ = ('values', 'lo', 'hi')
+
+    def __init__(self, values: Vector, lo: np.ndarray, hi: np.ndarray):
+        self.values = values
+        self.lo = lo
+        self.hi = hi
+
+class Numbers:
+    """One number per series and evaluation (the output of reduce)."""
+    __slots__ = ('values',)
+
+    def __init__(self, values: Vector):
+        self.values = values
+
+THRESHOLDS = {
+    'gt': lambda v, p: v > p[0], 'lt': lambda v, p: v < p[0],
+    'gte': lambda v, p: v >= p[0], 'lte': lambda v, p: v <= p[0],
+    'eq': lambda v, p: v == p[0], 'ne': lambda v, p: v != p[0],
+    'within_range': lambda v, p: (v > p[0]) & (v < p[1]),
+    'outside_range': lambda v, p: (v < p[0]) | (v > p[1]),
+}
+
+def last_present(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Latest non-NaN value in values[lo:hi] for every window."""
+    index = np.where(np.isnan(values), -1, np.arange(len(values)))
+    latest = np.maximum.accumulate(index)[np.clip(hi - 1, 0, len(values) - 1)]
+    return np.where((latest >= lo) & (hi > lo), values[np.clip(latest, 0, None)], np.nan)
+
+def reduce_frames(frames: Frames, reducer: str) -> Numbers:
+    result = {}
+    for labels, values in frames.values.items():
+        if reducer == 'last':
+            result[labels] = last_present(values, frames.lo, frames.hi)
+            continue
+        # Windows over the points that exist, so NaN gaps don't count
+        present = ~np.isnan(values)
+        points = values[present]
+        positions = np.concatenate(([0], np.cumsum(present)))
+        lo, hi = positions[frames.lo], positions[frames.hi]
+        count = hi - lo
+        if reducer == 'count':
+            reduced = count.astype(float)
+        elif reducer == 'sum':
+            reduced = window_sum(points, lo, hi)
+        elif reducer == 'mean':
+            reduced = window_sum(points, lo, hi) / np.maximum(count, 1)
+        elif reducer in ('min', 'max'):
+            reduced = window_reduce(np.fmin if reducer == 'min' else np.fmax, points, lo, hi)
+        else:
+            raise Unsupported(f"reducer {reducer}")
+        result[labels] = np.where(count > 0, reduced, np.nan)
+    return Numbers(result)
+
+def join_series(lhs: Vector, rhs: Vector, fn) -> Vector:
+    """Grafana math on two sets of series: broadcast a lone label-less one, else join on label subsets."""
+    if len(lhs) == 1 and not next(iter(lhs)):
+        only = next(iter(lhs.values()))
+        return {labels: fn(only, values) for labels, values in rhs.items()}
+    if len(rhs) == 1 and not next(iter(rhs)):
+        only = next(iter(rhs.values()))
+        return {labels: fn(values, only) for labels, values in lhs.items()}
+    result = {}
+    for left_labels, left in lhs.items():
+        for right_labels, right in rhs.items():
+            if set(left_labels) <= set(right_labels) or set(right_labels) <= set(left_labels):
+                labels = max(left_labels, right_labels, key=len)
+                put(result, labels, fn(left, right))
+    return result
+
+def eval_math(node: Node, refs: Dict[str, Any], length: int):
+    """Evaluate a Grafana math expression ($A > 5) over Numbers or Frames values."""
+    node = promql.unwrap_parens(node)
+    if isinstance(node, Variable):
+        name = node.name.strip('${}')
+        if name not in refs:
+            raise BacktestError(f"math expression references unknown query ${name}")
+        return refs[name].values
+    if isinstance(node, NumberLiteral):
+        return {(): np.full(length, node.value)}
+    if isinstance(node, UnaryExpr):
+        return {labels: -values for labels, values in eval_math(node.expr, refs, length).items()}
+    if isinstance(node, Call) and node.func in MATH_FUNCTIONS and len(node.args) == 1:
+        return {labels: MATH_FUNCTIONS[node.func](values)
+                for labels, values in eval_math(node.args[0], refs, length).items()}
+    if isinstance(node, BinaryExpr) and (node.op in ARITHMETIC or node.op in COMPARISONS):
+        lhs, rhs = eval_math(node.lhs, refs, length), eval_math(node.rhs, refs, length)
+        if node.op in ARITHMETIC:
+            fn = ARITHMETIC[node.op]
+        else:
+            compare = COMPARISONS[node.op]
+            fn = lambda a, b: np.where(np.isnan(a) | np.isnan(b), np.nan, compare(a, b).astype(float))
+        return join_series(lhs, rhs, fn)
+    raise Unsupported(f"math expression {node}")
+
+class RuleResult:
+    """Outcome of replaying one alert rule."""
+    __slots__ = ('title', 'group', 'source', 'times', 'firing', 'no_data', 'error')
+
+    def __init__(self, title: str, group: str, source: str, times: np.ndarray):
+        self.title = title
+        self.group = group
+        self.source = source
+        self.times = times
+        # labels -> bool array over evaluation times
+        self.firing: Dict[Labels, np.ndarray] = {}
+        self.no_data = np.zeros(len(times), dtype=bool)
+        self.error: Optional[str] = None
+
+    def episodes(self) -> Iterator[Tuple[Labels, float, Optional[float]]]:
+        """(labels, first firing evaluation, first evaluation after it stopped or None)."""
+        for labels, firing in sorted(self.firing.items()):
+            edges = np.diff(np.concatenate(([0], firing.astype(np.int8), [0])))
+            for start, stop in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+                yield labels, self.times[start], self.times[stop] if stop < len(self.times) else None
+
+def pending_to_firing(active: np.ndarray, times: np.ndarray, for_seconds: float) -> np.ndarray:
+    """Evaluations at which an instance that is active there has been active for `for`."""
+    index = np.arange(len(active))
+    last_inactive = np.maximum.accumulate(np.where(active, -1, index))
+    started = times[np.clip(last_inactive + 1, 0, len(times) - 1)]
+    return active & (times - started >= for_seconds)
+
+class RuleBacktest:
+    """Replays Grafana alert rules against a fixture."""
+
+    def __init__(self, fixture: Fixture):
+        self.fixture = fixture
+        self.evaluator = Evaluator(fixture)
+
+    def evaluation_times(self, interval: float, start: Optional[float] = None,
+                         end: Optional[float] = None) -> np.ndarray:
+        start = self.fixture.start if start is None else start
+        end = self.fixture.end if end is None else end
+        return np.arange(np.ceil(start / interval) * interval, end + interval / 2, interval)
+
+    def query(self, data: Dict[str, Any], times: np.ndarray):
+        """Run a Prometheus query stage as Grafana would at every evaluation time."""
+        model = data.get('model') or {}
+        if 'expr' not in model:
+            raise Unsupported(f"non-Prometheus query ({model.get('queryType') or data.get('datasourceUid')})")
+        window = data.get('relativeTimeRange') or {}
+        start, end = window.get('from') or 0, window.get('to') or 0
+        if model.get('instant') or start <= end:
+            return Numbers(self.evaluator.query(model['expr'], times - end))
+        step = query_cost.grafana_step(start - end, model.get('intervalMs'), model.get('maxDataPoints'))
+        # Grafana aligns range queries to multiples of the step
+        first = np.floor((times - start) / step).astype(np.int64)
+        last = np.floor((times - end) / step).astype(np.int64)
+        grid = np.arange(first.min(), last.max() + 1) * step
+        return Frames(self.evaluator.query(model['expr'], grid), first - first.min(), last - first.min() + 1)
+
+    def has_data(self, rule: Dict[str, Any]) -> bool:
+        """Whether the fixture holds any metric the rule's queries select."""
+        for data in rule.get('data') or []:
+            expr = (data.get('model') or {}).get('expr')
+            if data.get('datasourceUid') == '__expr__' or not expr:
+                continue
+            try:
+                names = {s.metric_name() for s in promql.selectors(promql.parse(expr))}
+            except promql.PromQLSyntaxError:
+                return True
+            if any(name in self.fixture.by_name for name in names):
+                return True
+        return False
+
+    def stages(self, rule: Dict[str, Any], times: np.ndarray) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        for data in rule.get('data') or []:
+            model = data.get('model') or {}
+            ref = data.get('refId') or model.get('refId')
+            if data.get('datasourceUid') != '__expr__':
+                results[ref] = self.query(data, times)
+                continue
+            kind = model.get('type')
+            source = str(model.get('expression', '')).strip('$')
+            if kind == 'reduce':
+                inner = results[source]
+                results[ref] = reduce_frames(inner, model.get('reducer', 'last')) if isinstance(inner, Frames) else inner
+            elif kind == 'math':
+                tree = promql.parse(model['expression'])
+                frames = [results[n.name.strip('${}')] for n in promql.walk(tree)
+                          if isinstance(n, Variable) and isinstance(results.get(n.name.strip('${}')), Frames)]
+                length = len(times)
+                if frames:
+                    length = next((len(v) for v in frames[0].values.values()), length)
+                values = eval_math(tree, results, length)
+                results[ref] = Frames(values, frames[0].lo, frames[0].hi) if frames else Numbers(values)
+            elif kind == 'threshold':
+                evaluator = model['conditions'][0]['evaluator']
+                test = THRESHOLDS.get(evaluator['type'])
+                if test is None:
+                    raise Unsupported(f"threshold type {evaluator['type']}")
+                inner = results[source]
+                values = {labels: np.where(np.isnan(v), np.nan, test(v, evaluator['params']).astype(float))
+                          for labels, v in inner.values.items()}
+                results[ref] = Frames(values, inner.lo, inner.hi) if isinstance(inner, Frames) else Numbers(values)
+            else:
+                raise Unsupported(f"expression type {kind}")
+        return results
+
+    def run(self, rule: Dict[str, Any], interval: float, group: str = '', source: str = '',
+            start: Optional[float] = None, end: Optional[float] = None) -> RuleResult:
+        """Replay one Grafana alert rule evaluated every `interval` seconds."""
+        times = self.evaluation_times(interval, start, end)
+        result = RuleResult(rule.get('title', rule.get('uid', '')), group, source, times)
+        for_seconds = seconds(rule.get('for') or '0s')
+        try:
+            with np.errstate(all='ignore'):
+                condition = self.stages(rule, times).get(rule.get('condition', 'C'))
+            if condition is None:
+                raise BacktestError(f"condition {rule.get('condition')} is not a stage of the rule")
+            if isinstance(condition, Frames):
+                raise BacktestError("looks like time series data, only reduced data can be alerted on")
+        except Unsupported:
+            raise
+        except (BacktestError, KeyError, promql.PromQLSyntaxError) as e:
+            result.error = str(e)
+            if rule.get('execErrState', 'Error') == 'Alerting':
+                result.firing[(('alertname', 'DatasourceError'),)] = \
+                    pending_to_firing(np.ones(len(times), dtype=bool), times, for_seconds)
+            return result
+
+        present = np.zeros(len(times), dtype=bool)
+        for values in condition.values.values():
+            present |= ~np.isnan(values)
+        result.no_data = ~present
+        no_data_state = rule.get('noDataState', 'NoData')
+        for labels, values in condition.values.items():
+            active = ~np.isnan(values) & (values != 0)
+            if no_data_state == 'KeepLast':
+                active = last_present(np.where(present, active.astype(float), np.nan),
+                                      np.zeros(len(times), dtype=np.intp), np.arange(1, len(times) + 1)) == 1
+            firing = pending_to_firing(active, times, for_seconds)
+            if firing.any():
+                result.firing[labels] = firing
+        if no_data_state == 'Alerting' and result.no_data.any():
+            firing = pending_to_firing(result.no_data, times, for_seconds)
+            if firing.any():
+                result.firing[(('alertname', 'DatasourceNoData'),)] = firing
+        return result
+
+def rule_groups(document: Any, converter=None) -> Iterator[Dict[str, Any]]:
+    """
+    Grafana rule groups of an alert provisioning file, a ConfigMap wrapping
+    one, or (converted with convert-alerts.py's convert_rule) a PrometheusRule.
+    """
+    if not isinstance(document, dict):
+        return
+    if document.get('kind') == 'PrometheusRule':
+        if converter is None:
+            return
+        for group in document['spec']['groups']:
+            interval = group.get('interval', converter.DEFAULT_INTERVAL)
+            yield {
+                'name': group['name'],
+                'interval': interval,
+                'rules': [converter.convert_rule(rule, group['name'], interval).to_dict()
+                          for rule in group.get('rules', []) if 'alert' in rule],
+            }
+    elif document.get('kind') == 'ConfigMap':
+        for text in (document.get('data') or {}).values():
+            yield from rule_groups(yaml_io.load(text), converter)
+    else:
+        yield from document.get('groups') or []
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Benchmark the alert conversion and dashboard tooling on synthetic corpora.
+
+Builds PrometheusRule corpora of --rules sizes by cloning the rules in alerts/
+and dashboards of --panels sizes (rows nested --depth deep) by cloning the
+panels under helm/dashboards/, then times:
+
+- convert_prometheus_rule    whole files: load, convert, dump, write
+- convert_promql_to_grafana_query   per alert expression
+- update_expr                the namespace rewrite of fix-rabbitmq-dashboard.py
+                             (query_rewrite.Rewriter.rewrite_expr)
+- dashboard_load / dashboard_dump / dashboard_walk / dashboard_rewrite
+- dashboard_build            dashboard_builder.build() of the same panel count
+
+Each measurement is the best of --repeat runs (looped when a call is quicker
+than 50ms), with the PromQL parse cache cleared before every call; peak
+memory comes from a separate tracemalloc run. The 50k-rule corpus takes
+minutes; --quick only runs the small sizes. Results go to --output as JSON.
+With --baseline, a result more than --tolerance slower than the stored one
+fails the run, so a change can be checked with:
+
+    python benchmark-tooling.py --save-baseline benchmark-baseline.json   # before
+    python benchmark-tooling.py --baseline benchmark-baseline.json        # after
+
+Usage:
+    python benchmark-tooling.py [--quick] [--rules 10,1000,50000] [--panels 10,200,2000] [--depth 3]
+                                [--repeat 3] [--output FILE] [--baseline FILE] [--tolerance 0.25]
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import dashboard_builder
+import dashboards
+import promql
+import yaml_io
+from grafana_model import Target
+from query_rewrite import Rewriter, SetLabel
+
+RESULTS_VERSION = 1
+
+# Shortest timed run; quicker calls are looped
+MIN_RUN_SECONDS = 0.05
+
+# The rewrite fix-rabbitmq-dashboard.py applies
+NAMESPACE_RULES = [SetLabel('namespace', '$namespace', op='=~', mode='replace')]
+
+def load_script(name: str):
+    """Import a hyphen-named script of this directory as a module."""
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_')[:-3], Path(__file__).with_name(name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def sizes(text: str) -> List[int]:
+    return [int(n) for n in text.split(',') if n]
+
+# --- Corpora ----------------------------------------------------------------
+
+def template_rules(alerts_dir: Path) -> List[Dict[str, Any]]:
+    """Every alert rule of alerts/*.yaml that parses."""
+    rules = []
+    for path in sorted(alerts_dir.glob('*.yaml')):
+        try:
+            document = yaml_io.load(path.read_text(encoding='utf-8'))
+        except Exception:
+            continue
+        rules += [r for group in document['spec']['groups'] for r in group.get('rules', []) if 'alert' in r]
+    return rules
+
+def write_rule_corpus(templates: List[Dict[str, Any]], total: int, directory: Path,
+                      rules_per_file: int = 100) -> List[Path]:
+    """PrometheusRule files holding total cloned rules, rules_per_file each."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for start in range(0, total, rules_per_file):
+        index = start // rules_per_file
+        rules = []
+        for i in range(start, min(start + rules_per_file, total)):
+            rule = dict(templates[i % len(templates)])
+            rule['alert'] = f"{rule['alert']}Tenant{i}"
+            rule['labels'] = dict(rule.get('labels') or {}, tenant=f"tenant-{index}")
+            rules.append(rule)
+        document = {
+            'apiVersion': 'monitoring.coreos.com/v1',
+            'kind': 'PrometheusRule',
+            'metadata': {'name': f'synthetic-{index}'},
+            'spec': {'groups': [{'name': f'synthetic-{index}', 'interval': '30s', 'rules': rules}]},
+        }
+        path = directory / f'synthetic-{index}.yaml'
+        path.write_text(yaml_io.dump(document), encoding='utf-8')
+        paths.append(path)
+    return paths
+
+def template_panels() -> List[Dict[str, Any]]:
+    """Every panel with targets in helm/dashboards/."""
+    panels = []
+    for path in dashboards.dashboard_files():
+        dashboard, _ = dashboards.load(path)
+        panels += [p for p in dashboards.walk_panels(dashboard.get('panels') or []) if p.get('targets')]
+    return panels
+
+def synthetic_dashboard(templates: List[Dict[str, Any]], count: int, depth: int) -> Dict[str, Any]:
+    """A dashboard of count cloned panels, in rows of 10 nested depth levels deep."""
+    panels = []
+    for i in range(count):
+        panel = copy.deepcopy(templates[i % len(templates)])
+        panel['id'] = i + 1
+        panel['title'] = f"{panel.get('title', 'Panel')} {i}"
+        panels.append(panel)
+    for level in range(depth):
+        rows = []
+        for start in range(0, len(panels), 10):
+            rows.append({'type': 'row', 'title': f"Row {level}.{start // 10}", 'collapsed': True,
+                         'id': 100000 * (level + 1) + start, 'panels': panels[start:start + 10]})
+        panels = rows
+    return {'title': f'Synthetic {count}', 'uid': f'synthetic-{count}', 'refresh': '30s', 'panels': panels}
+
+def specs_for(templates: List[Dict[str, Any]], count: int) -> List[dashboard_builder.Section]:
+    sections = []
+    for start in range(0, count, 10):
+        specs = []
+        for i in range(start, min(start + 10, count)):
+            template = templates[i % len(templates)]
+            specs.append(dashboard_builder.PanelSpec(
+                f"Panel {i}", [Target(t['expr'], t.get('refId', 'A'), t.get('legendFormat', ''))
+                               for t in template['targets'] if t.get('expr')],
+                preset=('timeseries', 'stat', 'gauge')[i % 3], w=(12, 6, 6, 8)[i % 4], h=(8, 4)[i % 2]))
+        sections.append(dashboard_builder.Section(f"Section {start // 10}", specs))
+    return sections
+
+# --- Measurement ------------------------------------------------------------
+
+def measure(fn: Callable[[], Any], repeat: int, budget: float, memory: bool) -> Tuple[float, Optional[int]]:
+    """
+    (best seconds per call, peak bytes allocated by one call or None).
+
+    Calls that take under MIN_RUN_SECONDS are looped so the timer resolution
+    and noise don't dominate; repeats stop early once budget seconds are spent.
+    """
+    promql.parse.cache_clear()
+    started = time.perf_counter()
+    fn()
+    first = time.perf_counter() - started
+    loops = max(1, int(MIN_RUN_SECONDS / max(first, 1e-9)))
+    best = first
+    spent = first
+    for _ in range(repeat - 1 if loops == 1 else repeat):
+        if spent > budget:
+            break
+        started = time.perf_counter()
+        for _ in range(loops):
+            promql.parse.cache_clear()
+            fn()
+        elapsed = time.perf_counter() - started
+        spent += elapsed
+        best = min(best, elapsed / loops)
+    if not memory:
+        return best, None
+    promql.parse.cache_clear()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+class Suite:
+    """Collects results and prints them as they come."""
+
+    def __init__(self, repeat: int, budget: float, memory: bool):
+        self.repeat = repeat
+        self.budget = budget
+        self.memory = memory
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self, name: str, size: int, items: int, fn: Callable[[], Any]):
+        seconds, peak = measure(fn, self.repeat, self.budget, self.memory)
+        result = {
+            'name': name,
+            'size': size,
+            'seconds': round(seconds, 6),
+            'per_item_us': round(seconds / max(items, 1) * 1e6, 3),
+            'peak_kib': None if peak is None else round(peak / 1024, 1),
+        }
+        self.results.append(result)
+        memory = '' if peak is None else f"{result['peak_kib']:>11,.0f} KiB"
+        print(f"  {name:<34} {size:>7} {seconds * 1000:>10.2f}ms {result['per_item_us']:>10.1f}µs {memory}",
+              flush=True)
+
+def bench_rules(suite: Suite, converter, templates: List[Dict[str, Any]], total: int, workdir: Path):
+    paths = write_rule_corpus(templates, total, workdir / f'rules-{total}')
+    output = workdir / f'out-{total}'
+    output.mkdir(exist_ok=True)
+    suite.run('convert_prometheus_rule', total, total,
+              lambda: [converter.convert_prometheus_rule(path, output) for path in paths])
+
+    exprs = [templates[i % len(templates)]['expr'].strip() for i in range(total)]
+    suite.run('convert_promql_to_grafana_query', total, total,
+              lambda: [converter.convert_promql_to_grafana_query(expr, 'bench', 300, 30) for expr in exprs])
+    suite.run('update_expr', total, total,
+              lambda: [Rewriter(NAMESPACE_RULES).rewrite_expr(expr) for expr in exprs])
+
+def bench_dashboards(suite: Suite, templates: List[Dict[str, Any]], count: int, depth: int, workdir: Path):
+    path = workdir / f'dashboard-{count}.json'
+    style = dashboards.detect_style('{}')
+    path.write_text(dashboards.dumps(synthetic_dashboard(templates, count, depth), style), encoding='utf-8')
+    dashboard, _ = dashboards.load(path)
+
+    suite.run('dashboard_load', count, count, lambda: dashboards.load(path))
+    suite.run('dashboard_dump', count, count, lambda: dashboards.dumps(dashboard, style))
+    suite.run('dashboard_walk', count, count, lambda: sum(1 for _ in dashboards.iter_targets(dashboard)))
+    suite.run('dashboard_rewrite', count, count,
+              lambda: Rewriter(NAMESPACE_RULES).rewrite_dashboard(copy.deepcopy(dashboard)))
+    sections = specs_for(templates, count)
+    suite.run('dashboard_build', count, count,
+              lambda: [panel.to_dict() for panel in dashboard_builder.build(sections)])
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Messages for results slower than the baseline by more than tolerance."""
+    before = {(r['name'], r['size']): r for r in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'':42} {'baseline':>10} {'now':>10} {'change':>8}")
+    for result in results:
+        old = before.get((result['name'], result['size']))
+        if old is None or not old['seconds']:
+            continue
+        change = result['seconds'] / old['seconds'] - 1
+        marker = '✗' if change > tolerance else '✓'
+        print(f"{marker} {result['name']:<32} {result['size']:>7} {old['seconds'] * 1000:>8.1f}ms "
+              f"{result['seconds'] * 1000:>8.1f}ms {change:>+7.0%}")
+        if change > tolerance:
+            regressions.append(f"{result['name']} [{result['size']}] is {change:.0%} slower than the baseline")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the conversion and dashboard tooling.')
+    parser.add_argument('--rules', type=sizes, default=sizes('10,1000,50000'),
+                        help='comma-separated PrometheusRule corpus sizes (default: 10,1000,50000)')
+    parser.add_argument('--panels', type=sizes, default=sizes('10,200,2000'),
+                        help='comma-separated dashboard panel counts (default: 10,200,2000)')
+    parser.add_argument('--depth', type=int, default=3, help='row nesting depth of the dashboards (default: 3)')
+    parser.add_argument('--quick', action='store_true', help='small corpora only (--rules 10,1000 --panels 10,200)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is kept (default: 3)')
+    parser.add_argument('--budget', type=float, default=30,
+                        help='stop repeating a measurement after this many seconds (default: 30)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak-memory runs')
+    parser.add_argument('--output', type=Path, help='write results as JSON')
+    parser.add_argument('--save-baseline', type=Path, metavar='FILE', help='write results as the new baseline')
+    parser.add_argument('--baseline', type=Path, metavar='FILE', help='compare against a stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline (default: 0.25 = 25%%)')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.rules, args.panels = sizes('10,1000'), sizes('10,200')
+    converter = load_script('convert-alerts.py')
+    rules = template_rules(Path('alerts'))
+    panels = template_panels()
+    suite = Suite(args.repeat, args.budget, not args.no_memory)
+
+    print(f"\n{len(rules)} template rules, {len(panels)} template panels, best of {args.repeat}")
+    print(f"  {'benchmark':<34} {'size':>7} {'time':>12} {'per item':>11} {'peak memory':>15}")
+    with tempfile.TemporaryDirectory(prefix='benchmark-tooling-') as tmp:
+        workdir = Path(tmp)
+        for total in args.rules:
+            bench_rules(suite, converter, rules, total, workdir)
+        for count in args.panels:
+            bench_dashboards(suite, panels, count, args.depth, workdir)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'libyaml': yaml_io.LIBYAML,
+        'repeat': args.repeat,
+        'memory': not args.no_memory,
+        'results': suite.results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+            print(f"\n✓ Wrote {path}")
+
+    if args.baseline:
+        baseline: Optional[Dict[str, Any]] = json.loads(args.baseline.read_text(encoding='utf-8'))
+        regressions = compare(suite.results, baseline, args.tolerance)
+        if regressions:
+            for message in regressions:
+                print(f"✗ {message}")
+            sys.exit(1)
+        print(f"\n✅ No result more than {args.tolerance:.0%} slower than {args.baseline}")
+
+if __name__ == '__main__':
+    main()
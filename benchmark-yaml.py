@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pure-Python and libyaml YAML paths used by convert-alerts.py.
+
+Loads and converts the alerts/ corpus and a synthetic corpus built by cloning
+those rules, then times parse and dump with both backends. Fails if the two
+dumpers produce different bytes for any document.
+
+Usage:
+    python benchmark-yaml.py [--rules 10000] [--repeat 3]
+"""
+
+import argparse
+import copy
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+import yaml_io
+
+def load_converter():
+    """Import convert-alerts.py (its hyphenated name rules out a plain import)."""
+    spec = importlib.util.spec_from_file_location('convert_alerts', Path(__file__).with_name('convert-alerts.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def read_corpus(alerts_dir: Path):
+    """Return (name, text) for every PrometheusRule file that parses."""
+    corpus = []
+    for path in sorted(alerts_dir.glob('*.yaml')):
+        text = path.read_text(encoding='utf-8')
+        try:
+            yaml_io.load(text, loader=yaml_io.PurePythonLoader)
+        except Exception as e:
+            print(f"  skipping {path.name}: {str(e).splitlines()[0]}")
+            continue
+        corpus.append((path.name, text))
+    return corpus
+
+def synthetic_corpus(corpus, total_rules: int, rules_per_file: int = 100):
+    """
+    Clone the corpus into files of rules_per_file rules each.
+
+    Synthetic file k repeats the alert rules of corpus file k (round-robin), the
+    way per-tenant copies of a rule file would look.
+    """
+    templates = []
+    for _, text in corpus:
+        rules = [r for group in yaml_io.load(text)['spec']['groups'] for r in group.get('rules', []) if 'alert' in r]
+        if rules:
+            templates.append(rules)
+
+    files = []
+    for start in range(0, total_rules, rules_per_file):
+        index = start // rules_per_file
+        source = templates[index % len(templates)]
+        rules = []
+        for i in range(start, min(start + rules_per_file, total_rules)):
+            rule = copy.deepcopy(source[i % len(source)])
+            rule['alert'] = f"{rule['alert']}Tenant{i}"
+            rule.setdefault('labels', {})['tenant'] = f"tenant-{index}"
+            rules.append(rule)
+        doc = {
+            'apiVersion': 'monitoring.coreos.com/v1',
+            'kind': 'PrometheusRule',
+            'metadata': {'name': f'synthetic-{index}'},
+            'spec': {'groups': [{'name': f'synthetic-{index}', 'interval': '30s', 'rules': rules}]},
+        }
+        files.append((f'synthetic-{index}.yaml', yaml_io.dump(doc, dumper=yaml_io.PurePythonDumper)))
+    return files
+
+def convert_documents(converter, docs):
+    """Build the Grafana provisioning structure for each parsed document."""
+    outputs = []
+    for doc in docs:
+        groups = []
+        for group in doc['spec']['groups']:
+            rules = [converter.convert_rule(r, group['name']) for r in group.get('rules', []) if 'alert' in r]
+            groups.append({'orgId': 1, 'name': group['name'], 'folder': 'applications',
+                           'interval': group.get('interval', '30s'), 'rules': rules})
+        outputs.append({'apiVersion': 1, 'groups': groups})
+    return outputs
+
+def libyaml_can_dump(data) -> bool:
+    """Whether yaml_io.dump can keep this document on the libyaml path."""
+    try:
+        yaml.dump(data, Dumper=yaml_io.LibyamlDumper, **yaml_io.DUMP_OPTIONS)
+    except yaml_io.NeedsPurePythonDumper:
+        return False
+    return True
+
+def best_of(repeat: int, fn):
+    """Run fn repeat times, returning (best seconds, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench(label: str, corpus, converter, repeat: int) -> bool:
+    """Time both backends on a corpus and check their output matches."""
+    texts = [text for _, text in corpus]
+
+    py_load, docs = best_of(repeat, lambda: [yaml_io.load(t, loader=yaml_io.PurePythonLoader) for t in texts])
+    outputs = convert_documents(converter, docs)
+    rules = sum(len(g['rules']) for out in outputs for g in out['groups'])
+    py_dump, py_bytes = best_of(repeat, lambda: [yaml_io.dump(o, dumper=yaml_io.PurePythonDumper) for o in outputs])
+
+    print(f"\n{label}: {len(texts)} files, {rules} rules")
+    print(f"  {'':10} {'load':>10} {'dump':>10}")
+    print(f"  {'python':10} {py_load * 1000:>8.1f}ms {py_dump * 1000:>8.1f}ms")
+
+    if not yaml_io.LIBYAML:
+        print("  libyaml    not available (PyYAML built without it)")
+        return True
+
+    c_load, c_docs = best_of(repeat, lambda: [yaml_io.load(t, loader=yaml_io.Loader) for t in texts])
+    c_dump, c_bytes = best_of(repeat, lambda: [yaml_io.dump(o, dumper=yaml_io.LibyamlDumper) for o in outputs])
+    print(f"  {'libyaml':10} {c_load * 1000:>8.1f}ms {c_dump * 1000:>8.1f}ms")
+    print(f"  {'speedup':10} {py_load / c_load:>9.1f}x {py_dump / c_dump:>9.1f}x")
+    fallbacks = sum(1 for o in outputs if not libyaml_can_dump(o))
+    if fallbacks:
+        print(f"  {fallbacks} of {len(outputs)} documents contain strings libyaml would write differently "
+              f"and were dumped by the pure-Python dumper")
+
+    ok = True
+    if c_docs != docs:
+        print("  ✗ libyaml loader produced different documents")
+        ok = False
+    for (name, _), a, b in zip(corpus, py_bytes, c_bytes):
+        if a != b:
+            print(f"  ✗ dumpers disagree on {name}")
+            ok = False
+    if ok:
+        print("  ✓ identical output from both backends")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pure-Python vs libyaml YAML handling.')
+    parser.add_argument('--rules', type=int, default=10000, help='rules in the synthetic corpus')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    converter = load_converter()
+    corpus = read_corpus(Path('alerts'))
+
+    ok = bench('alerts/ corpus', corpus, converter, args.repeat)
+    ok = bench('synthetic corpus', synthetic_corpus(corpus, args.rules), converter, args.repeat) and ok
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Minify, measure and shard the dashboard and alert ConfigMaps of the Helm chart.
+
+Writes helm/build/, which the chart templates use instead of the source files
+when it exists. It is committed, because Argo CD renders the chart from git:
+re-run this after changing dashboards, alert files or .Values.alerts.files and
+commit the result. `--check` exits 1 when it is stale, and the test suite runs
+it (tests/test_build_configmaps.py):
+
+- build/dashboards/<folder>/<name>.json - minified dashboards (one ConfigMap each)
+- build/grafana-alerts/<file> - alert provisioning files listed in
+  .Values.alerts.files, minified to single-line JSON (valid YAML, so the
+  .yaml names stay)
+- build/grafana-alerts/shards.yaml - which files go in which ConfigMap
+
+Alert files are packed into ConfigMaps in the order of .Values.alerts.files,
+starting a new shard when the next file would push the object over --budget,
+so adding a file only changes the last shard. The default budget stays under
+256 KiB because kubectl and Argo CD (client-side apply) copy the whole object
+into the last-applied-configuration annotation, which is capped at that size;
+the hard limit for any object is 1 MiB.
+
+Unchanged files are not rewritten and stale ones are removed. Exits with
+status 1 when an object exceeds the budget and cannot be split (a single
+dashboard or alert file).
+
+Usage:
+    python build-configmaps.py [--budget 245760] [--check]
+"""
+
+import argparse
+import datetime
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import dashboards
+import yaml_io
+
+CHART_DIR = Path('helm')
+BUILD_DIR = CHART_DIR / 'build'
+ALERTS_DIR = CHART_DIR / 'grafana-alerts'
+VALUES_FILE = CHART_DIR / 'values.yaml'
+
+# Largest object the apiserver stores
+OBJECT_LIMIT = 1024 * 1024
+# Below the 256 KiB last-applied-configuration annotation limit, with room for metadata
+DEFAULT_BUDGET = 240 * 1024
+# Name, namespace, labels and annotations of a rendered ConfigMap
+METADATA_OVERHEAD = 512
+
+COMPACT = {'separators': (',', ':'), 'ensure_ascii': False}
+
+def minify_json(text: str) -> str:
+    return json.dumps(json.loads(text), **COMPACT)
+
+def minify_yaml(text: str) -> str:
+    """
+    YAML documents as single-line JSON, dropping comments and indentation.
+    Timestamps and dates have no JSON type and become their ISO strings.
+    """
+    return '\n---\n'.join(json.dumps(doc, default=iso_string, **COMPACT) for doc in yaml_io.load_all(text))
+
+def iso_string(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} value {value!r} cannot be written as JSON")
+
+def object_size(data: Dict[str, str]) -> int:
+    """Approximate stored size of a ConfigMap holding data."""
+    return METADATA_OVERHEAD + len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+def shard(files: List[Tuple[str, str]], budget: int) -> List[List[str]]:
+    """Pack (key, content) pairs into ConfigMaps in order, opening a new one at the budget."""
+    shards: List[List[str]] = []
+    current: Dict[str, str] = {}
+    for key, content in files:
+        if current and object_size({**current, key: content}) > budget:
+            shards.append(list(current))
+            current = {}
+        current[key] = content
+    if current:
+        shards.append(list(current))
+    return shards
+
+def build_dashboards(outputs: Dict[Path, str], budget: int) -> Tuple[int, int, List[str]]:
+    """Minified dashboards; returns (raw bytes, minified bytes, problems)."""
+    raw = minified = 0
+    problems = []
+    names: Dict[str, Path] = {}
+    for path in dashboards.dashboard_files():
+        text = path.read_text(encoding='utf-8')
+        small = minify_json(text)
+        raw += len(text.encode('utf-8'))
+        minified += len(small.encode('utf-8'))
+        outputs[BUILD_DIR / 'dashboards' / path.relative_to(dashboards.DASHBOARD_ROOT)] = small
+        # The chart names each ConfigMap after the file alone
+        name = f"dashboard-{path.stem}"
+        if name in names:
+            problems.append(f"⚠️  {path} and {names[name]} both render ConfigMap {name}")
+        names[name] = path
+        size = object_size({path.name: small})
+        if size > budget:
+            problems.append(f"✗ {path}: {size:,} bytes minified, over the budget of {budget:,}")
+    return raw, minified, problems
+
+def build_alerts(outputs: Dict[Path, str], files: List[str],
+                 budget: int) -> Tuple[int, int, List[Tuple[List[str], int]], List[str]]:
+    """Minified, sharded alert files; returns (raw bytes, minified bytes, [(shard files, size)], problems)."""
+    raw = minified = 0
+    problems = []
+    contents = []
+    for name in files:
+        text = (ALERTS_DIR / name).read_text(encoding='utf-8')
+        small = minify_yaml(text)
+        raw += len(text.encode('utf-8'))
+        minified += len(small.encode('utf-8'))
+        outputs[BUILD_DIR / 'grafana-alerts' / name] = small
+        size = object_size({name: small})
+        if size > budget:
+            problems.append(f"✗ {ALERTS_DIR / name}: {size:,} bytes minified, over the budget of {budget:,}")
+        contents.append((name, small))
+    by_name = dict(contents)
+    shards = [(names, object_size({n: by_name[n] for n in names})) for names in shard(contents, budget)]
+    index = {'shards': [{'files': names} for names, _ in shards]}
+    outputs[BUILD_DIR / 'grafana-alerts' / 'shards.yaml'] = yaml_io.dump(index)
+    return raw, minified, shards, problems
+
+def write_outputs(outputs: Dict[Path, str], check: bool) -> Tuple[List[Path], List[Path]]:
+    """Write changed files and remove stale ones; returns (changed, removed)."""
+    existing = {p for p in BUILD_DIR.glob('**/*') if p.is_file()} if BUILD_DIR.exists() else set()
+    changed = [p for p, text in sorted(outputs.items())
+               if not p.exists() or p.read_text(encoding='utf-8') != text]
+    removed = sorted(existing - set(outputs))
+    if not check:
+        for path in changed:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(outputs[path], encoding='utf-8')
+        for path in removed:
+            path.unlink()
+    return changed, removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Minify, measure and shard the chart ConfigMaps into helm/build/.')
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET,
+                        help=f'maximum bytes per ConfigMap (default: {DEFAULT_BUDGET}, hard limit {OBJECT_LIMIT})')
+    parser.add_argument('--check', action='store_true',
+                        help='only report; exit 1 if helm/build/ is out of date')
+    args = parser.parse_args()
+    budget = min(args.budget, OBJECT_LIMIT)
+
+    with open(VALUES_FILE, encoding='utf-8') as f:
+        files = yaml_io.load(f)['alerts']['files']
+
+    outputs: Dict[Path, str] = {}
+    raw, minified, problems = build_dashboards(outputs, budget)
+    print(f"\nDashboards: {len(outputs)} ConfigMaps, {raw:,} → {minified:,} bytes ({1 - minified / max(raw, 1):.0%} smaller)")
+
+    alerts_raw, alerts_minified, shards, alert_problems = build_alerts(outputs, files, budget)
+    problems += alert_problems
+    print(f"Alerts: {len(files)} files, {alerts_raw:,} → {alerts_minified:,} bytes "
+          f"({1 - alerts_minified / max(alerts_raw, 1):.0%} smaller), {len(shards)} ConfigMaps (budget {budget:,})")
+    for index, (keys, size) in enumerate(shards):
+        name = 'grafana-alerts' + (f"-{index + 1}" if index else '')
+        print(f"  {name:<20} {size:>9,} bytes  {len(keys)} files")
+
+    for problem in problems:
+        print(problem)
+
+    changed, removed = write_outputs(outputs, args.check)
+    if args.check:
+        if changed or removed:
+            print(f"\n✗ {BUILD_DIR} is out of date ({len(changed)} changed, {len(removed)} stale); "
+                  f"run python build-configmaps.py")
+            sys.exit(1)
+        print(f"\n✅ {BUILD_DIR} is up to date")
+    else:
+        print(f"\n✓ Wrote {len(changed)} files to {BUILD_DIR}" + (f", removed {len(removed)}" if removed else ''))
+    if any(p.startswith('✗') for p in problems):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Series counts of PromQL queries, evaluated against an exposition snapshot.
+
+Instead of sample values, the evaluator tracks label sets: a selector yields
+the snapshot series its matchers match, and every operator maps label sets
+the way Prometheus does (aggregations group them, functions drop the metric
+name, binary operators match on their signature, topk keeps k per group).
+The result says how many series a query reads and how many it returns.
+
+The series a query returns is what Grafana keeps alert state for and what a
+panel draws, so a query that returns every pod or queue unaggregated is
+flagged: its output grows with the deployment, not with the question.
+
+Grafana variables in matchers ($namespace) take the values given in
+`variables`; an unset variable is assumed to select the label value with
+the most series (`=`) or every value (`=~`, which is how "All" is sent).
+Metrics missing from the snapshot are reported in `missing` and count as
+no series.
+
+Usage:
+    estimate = estimate_query('rate(x[5m])', Snapshot.load(path))
+    estimate.returned, estimate.read, estimate.unaggregated
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Set
+
+import promql
+from exposition import Labels, Snapshot
+from promql import (AggregateExpr, BinaryExpr, Call, LabelMatcher, MatrixSelector, Node, NumberLiteral,
+                    ParenExpr, StringLiteral, SubqueryExpr, UnaryExpr, Variable, VectorSelector)
+
+VARIABLE = re.compile(r'\$(\w+)|\$\{(\w+)(?::\w+)?\}|\[\[(\w+)\]\]')
+
+# Aggregations keeping k series per group, with their input labels
+K_AGGREGATIONS = ('topk', 'bottomk', 'limitk')
+
+# Functions whose result has no series, or one without labels
+SCALAR_FUNCTIONS = ('scalar', 'time', 'pi', 'minute', 'hour', 'day_of_month', 'day_of_week', 'day_of_year',
+                    'days_in_month', 'month', 'year')
+SINGLE_SERIES_FUNCTIONS = ('absent', 'absent_over_time', 'vector')
+
+# Functions keeping the metric name of their input
+NAME_PRESERVING_FUNCTIONS = ('sort', 'sort_desc', 'sort_by_label', 'sort_by_label_desc', 'last_over_time',
+                             'label_replace', 'label_join', 'first_over_time')
+
+class Estimate:
+    """Series one query reads and returns."""
+    __slots__ = ('read', 'returned', 'aggregated', 'varying', 'missing')
+
+    def __init__(self, read: int, returned: int, aggregated: bool, varying: List[str], missing: List[str]):
+        self.read = read
+        self.returned = returned
+        # Whether an aggregation bounds the returned series
+        self.aggregated = aggregated
+        # Labels with more than one value among the returned series
+        self.varying = varying
+        self.missing = missing
+
+    @property
+    def unaggregated(self) -> bool:
+        """Returns more than one series that no aggregation groups."""
+        return not self.aggregated and self.returned > 1
+
+class Vector:
+    """Label sets of an intermediate result; aggregated when an aggregation produced it."""
+    __slots__ = ('series', 'aggregated')
+
+    def __init__(self, series: List[Labels], aggregated: bool = False):
+        self.series = series
+        self.aggregated = aggregated
+
+def drop(labels: Labels, names: Sequence[str]) -> Labels:
+    return tuple(item for item in labels if item[0] not in names)
+
+def keep(labels: Labels, names: Sequence[str]) -> Labels:
+    return tuple(item for item in labels if item[0] in names)
+
+def without_name(vector: Vector) -> Vector:
+    return Vector(unique(drop(labels, ('__name__',)) for labels in vector.series), vector.aggregated)
+
+def unique(series) -> List[Labels]:
+    return list(dict.fromkeys(series))
+
+class Evaluator:
+    """Evaluates label sets of expressions against one snapshot."""
+
+    def __init__(self, snapshot: Snapshot, variables: Optional[Dict[str, Sequence[str]]] = None):
+        self.snapshot = snapshot
+        self.variables = variables or {}
+        self.read = 0
+        self.missing: List[str] = []
+        self._patterns: Dict[str, re.Pattern] = {}
+
+    # --- Selectors ---
+
+    def candidates(self, selector: VectorSelector) -> List[Labels]:
+        name = selector.metric_name()
+        if name:
+            if name not in self.snapshot.series:
+                if name not in self.missing:
+                    self.missing.append(name)
+                return []
+            names = [name]
+        else:
+            names = list(self.snapshot.series)
+        return [(('__name__', metric),) + tuple(sorted(labels.items()))
+                for metric in names for labels in self.snapshot.series[metric]]
+
+    def pattern(self, regex: str) -> re.Pattern:
+        if regex not in self._patterns:
+            try:
+                self._patterns[regex] = re.compile(f"(?:{regex})\\Z", re.DOTALL)
+            except re.error:
+                self._patterns[regex] = re.compile(r'.*\Z', re.DOTALL)
+        return self._patterns[regex]
+
+    def resolve(self, matcher: LabelMatcher, series: List[Labels]) -> Optional[LabelMatcher]:
+        """The matcher with variables substituted; None when it matches everything."""
+        names = [next(group for group in m.groups() if group) for m in VARIABLE.finditer(matcher.value)]
+        if not names:
+            return matcher
+        if all(name in self.variables for name in names):
+            def substitute(match):
+                values = self.variables[next(group for group in match.groups() if group)]
+                if matcher.op in ('=~', '!~'):
+                    return '|'.join(re.escape(value) for value in values) if len(values) > 1 else \
+                        re.escape(values[0])
+                return values[0]
+            return LabelMatcher(matcher.name, matcher.op, VARIABLE.sub(substitute, matcher.value))
+        if matcher.op == '=' and VARIABLE.fullmatch(matcher.value):
+            # One selected value: assume the busiest one
+            counts: Dict[str, int] = {}
+            for labels in series:
+                value = dict(labels).get(matcher.name)
+                if value is not None:
+                    counts[value] = counts.get(value, 0) + 1
+            if counts:
+                return LabelMatcher(matcher.name, '=', max(counts, key=counts.get))
+        return None
+
+    def matches(self, matcher: LabelMatcher, labels: Labels) -> bool:
+        value = dict(labels).get(matcher.name, '')
+        if matcher.op == '=':
+            return value == matcher.value
+        if matcher.op == '!=':
+            return value != matcher.value
+        found = self.pattern(matcher.value).match(value) is not None
+        return found if matcher.op == '=~' else not found
+
+    def select(self, selector: VectorSelector) -> Vector:
+        series = self.candidates(selector)
+        for matcher in selector.matchers:
+            if matcher.name == '__name__' and matcher.op == '=':
+                continue
+            resolved = self.resolve(matcher, series)
+            if resolved is not None:
+                series = [labels for labels in series if self.matches(resolved, labels)]
+        self.read += len(series)
+        return Vector(series)
+
+    # --- Expressions ---
+
+    def eval(self, node: Node) -> Optional[Vector]:
+        """Label sets of node's result, None for scalars and strings."""
+        if isinstance(node, (NumberLiteral, StringLiteral, Variable)):
+            return None
+        if isinstance(node, VectorSelector):
+            return self.select(node)
+        if isinstance(node, MatrixSelector):
+            return self.select(node.vector)
+        if isinstance(node, (ParenExpr, SubqueryExpr)):
+            return self.eval(node.expr)
+        if isinstance(node, UnaryExpr):
+            inner = self.eval(node.expr)
+            return without_name(inner) if inner is not None and node.op == '-' else inner
+        if isinstance(node, Call):
+            return self.call(node)
+        if isinstance(node, AggregateExpr):
+            return self.aggregate(node)
+        if isinstance(node, BinaryExpr):
+            return self.binary(node)
+        return None
+
+    def call(self, node: Call) -> Optional[Vector]:
+        results = [self.eval(arg) for arg in node.args]
+        vectors = [result for result in results if result is not None]
+        if node.func in SCALAR_FUNCTIONS:
+            return None
+        if node.func in SINGLE_SERIES_FUNCTIONS:
+            return Vector([()], aggregated=True)
+        if not vectors:
+            return None
+        vector = vectors[0]
+        if node.func == 'histogram_quantile':
+            return Vector(unique(drop(labels, ('__name__', 'le')) for labels in vector.series), vector.aggregated)
+        if node.func in NAME_PRESERVING_FUNCTIONS:
+            return vector
+        return without_name(vector)
+
+    def aggregate(self, node: AggregateExpr) -> Optional[Vector]:
+        if node.param is not None:
+            self.eval(node.param)
+        inner = self.eval(node.expr)
+        if inner is None:
+            return None
+        grouping = node.grouping or ()
+
+        def group_key(labels: Labels) -> Labels:
+            if node.without:
+                return drop(labels, tuple(grouping) + ('__name__',))
+            return keep(labels, grouping)
+
+        if node.op in K_AGGREGATIONS:
+            k = promql.scalar_value(node.param) if node.param is not None else None
+            if k is None:
+                return Vector(inner.series, aggregated=True)
+            taken: Dict[Labels, int] = {}
+            series = []
+            for labels in inner.series:
+                key = group_key(labels)
+                if taken.get(key, 0) < k:
+                    taken[key] = taken.get(key, 0) + 1
+                    series.append(labels)
+            return Vector(series, aggregated=True)
+        if node.op == 'count_values':
+            # One series per distinct sample value: at most one per input series
+            return Vector(list(inner.series), aggregated=True)
+        return Vector(unique(group_key(labels) for labels in inner.series), aggregated=True)
+
+    def binary(self, node: BinaryExpr) -> Optional[Vector]:
+        lhs, rhs = self.eval(node.lhs), self.eval(node.rhs)
+        if lhs is None and rhs is None:
+            return None
+        keeps_name = node.op in ('and', 'or', 'unless') or (node.is_comparison and not node.return_bool)
+        if lhs is None or rhs is None:
+            vector = lhs if lhs is not None else rhs
+            return vector if keeps_name else without_name(vector)
+        matching = node.matching
+
+        def signature(labels: Labels) -> Labels:
+            if matching is not None and matching.on:
+                return keep(labels, matching.labels)
+            return drop(labels, tuple(matching.labels if matching else ()) + ('__name__',))
+
+        rhs_signatures = {signature(labels) for labels in rhs.series}
+        if node.op == 'and':
+            return Vector([labels for labels in lhs.series if signature(labels) in rhs_signatures], lhs.aggregated)
+        if node.op == 'unless':
+            return Vector([labels for labels in lhs.series if signature(labels) not in rhs_signatures],
+                          lhs.aggregated)
+        if node.op == 'or':
+            lhs_signatures = {signature(labels) for labels in lhs.series}
+            return Vector(lhs.series + [labels for labels in rhs.series if signature(labels) not in lhs_signatures],
+                          lhs.aggregated and rhs.aggregated)
+        if matching is not None and matching.group == 'right':
+            lhs_signatures = {signature(labels) for labels in lhs.series}
+            many = Vector([labels for labels in rhs.series if signature(labels) in lhs_signatures], rhs.aggregated)
+        else:
+            many = Vector([labels for labels in lhs.series if signature(labels) in rhs_signatures], lhs.aggregated)
+        if keeps_name:
+            return many
+        return without_name(many)
+
+def varying_labels(series: Sequence[Labels]) -> List[str]:
+    values: Dict[str, Set[str]] = {}
+    for labels in series:
+        for name, value in labels:
+            values.setdefault(name, set()).add(value)
+    present = {name for name, found in values.items()
+               if len(found) > 1 or sum(1 for labels in series if name in dict(labels)) < len(series)}
+    return sorted(name for name in present if name != '__name__')
+
+def estimate(tree: Node, snapshot: Snapshot, variables: Optional[Dict[str, Sequence[str]]] = None) -> Estimate:
+    evaluator = Evaluator(snapshot, variables)
+    result = evaluator.eval(tree)
+    if result is None:
+        return Estimate(evaluator.read, 1, True, [], evaluator.missing)
+    return Estimate(evaluator.read, len(result.series), result.aggregated, varying_labels(result.series),
+                    evaluator.missing)
+
+def estimate_query(expr: str, snapshot: Snapshot,
+                   variables: Optional[Dict[str, Sequence[str]]] = None) -> Estimate:
+    """Estimate for a query; raises promql.PromQLSyntaxError for invalid expressions."""
+    return estimate(promql.parse(expr), snapshot, variables)
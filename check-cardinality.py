@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Count the series every alert and dashboard query reads and returns, against a
+metrics snapshot, and flag queries that fan out unaggregated.
+
+Evaluates (see cardinality.py):
+- alerts/*.yaml, as convert-alerts.py deploys them: Grafana keeps alert
+  state for every series stage A returns
+- targets[].expr of helm/dashboards/**/*.json: a panel draws every series
+
+The snapshot is Prometheus text exposition format, e.g. the /metrics output
+of the pods behind the ServiceMonitors concatenated into one file;
+fixtures/metrics-snapshot.prom stands in for it by default. Queries that
+return more than one series without a sum by/topk around them are flagged
+with the labels they fan out by. Exits with status 1 when a query returns
+more than --max-series series.
+
+Usage:
+    python check-cardinality.py [--snapshot FILE ...] [--var namespace=n8n-prod] [--top 20] [--max-series 100]
+"""
+
+import argparse
+import importlib.util
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import cardinality
+import dashboards
+import promql
+import query_cost
+import yaml_io
+from exposition import ExpositionError, Snapshot
+from query_cost import Query
+
+DEFAULT_SNAPSHOT = Path('fixtures/metrics-snapshot.prom')
+DEFAULT_MAX_SERIES = 100
+
+def load_converter():
+    """Import convert-alerts.py (its hyphenated name rules out a plain import)."""
+    spec = importlib.util.spec_from_file_location('convert_alerts', Path(__file__).with_name('convert-alerts.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def alert_queries(alerts_dir: Path) -> List[Query]:
+    """Stage A queries of alerts/*.yaml after conversion to Grafana alert rules."""
+    converter = load_converter()
+    queries = []
+    for path in sorted(alerts_dir.glob('*.yaml')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                prom_rule = yaml_io.load(f)
+        except Exception as e:
+            print(f"⚠️  Skipping {path}: {str(e).splitlines()[0]}")
+            continue
+        for group in prom_rule['spec']['groups']:
+            for rule in group.get('rules', []):
+                if 'alert' in rule:
+                    grafana_rule = converter.convert_rule(rule, group['name'],
+                                                          group.get('interval', converter.DEFAULT_INTERVAL))
+                    queries.extend(query_cost.grafana_rule_queries(grafana_rule.to_dict(), f"alerts/{path.name}"))
+    return queries
+
+def dashboard_queries(root: Path) -> List[Query]:
+    queries = []
+    for path in dashboards.dashboard_files(root):
+        dashboard, _ = dashboards.load(path)
+        queries.extend(query_cost.dashboard_queries(dashboard, str(path)))
+    return queries
+
+def parse_variables(pairs: List[str]) -> Dict[str, List[str]]:
+    """--var name=value[,value...] into {name: [values]}."""
+    variables: Dict[str, List[str]] = {}
+    for pair in pairs:
+        name, sep, values = pair.partition('=')
+        if not sep or not name:
+            raise SystemExit(f"✗ --var expects name=value, got {pair!r}")
+        variables.setdefault(name.lstrip('$'), []).extend(values.split(','))
+    return variables
+
+def main():
+    parser = argparse.ArgumentParser(description='Count the series alert and dashboard queries read and return.')
+    parser.add_argument('--snapshot', type=Path, nargs='+', default=[DEFAULT_SNAPSHOT], metavar='FILE',
+                        help=f'metrics in text exposition format (default: {DEFAULT_SNAPSHOT})')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='value of a dashboard variable, e.g. namespace=n8n-prod (repeatable, comma for several)')
+    parser.add_argument('--top', type=int, default=20, help='number of queries to list (default: 20)')
+    parser.add_argument('--max-series', type=int, default=DEFAULT_MAX_SERIES,
+                        help=f'maximum series a single query may return (default: {DEFAULT_MAX_SERIES})')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='list metrics missing from the snapshot per query')
+    args = parser.parse_args()
+
+    try:
+        snapshot = Snapshot.load(*args.snapshot)
+    except (OSError, ExpositionError) as e:
+        print(f"✗ Cannot read snapshot: {e}")
+        sys.exit(1)
+    variables = parse_variables(args.var)
+    print(f"\nSnapshot: {len(snapshot)} series of {len(snapshot.series)} metrics")
+
+    queries = alert_queries(Path('alerts')) + dashboard_queries(dashboards.DASHBOARD_ROOT)
+    results = []
+    for query in queries:
+        try:
+            results.append((cardinality.estimate_query(query.expr, snapshot, variables), query))
+        except promql.PromQLSyntaxError as e:
+            print(f"⚠️  Skipping {query.source}: {e}")
+    results.sort(key=lambda item: (item[0].returned, item[0].read), reverse=True)
+
+    print(f"\nEstimated {len(results)} queries\n")
+    print(f"{'returns':>8}  {'reads':>6}  query")
+    for estimate, query in results[:args.top]:
+        flag = '  ⚠️ unaggregated' if estimate.unaggregated else ''
+        print(f"{estimate.returned:>8}  {estimate.read:>6}  {query.source}{flag}")
+
+    unaggregated = [(estimate, query) for estimate, query in results if estimate.unaggregated]
+    if unaggregated:
+        print(f"\n● Queries returning every series unaggregated ({len(unaggregated)}); "
+              f"wrap them in sum by (...) or topk(k, ...)")
+        for estimate, query in unaggregated:
+            by = f" by {', '.join(estimate.varying)}" if estimate.varying else ''
+            print(f"  {estimate.returned:>6}  {query.source}: fans out{by}")
+            print(f"          {query.expr}")
+
+    missing = [(estimate, query) for estimate, query in results if estimate.missing]
+    if missing:
+        metrics = sorted({name for estimate, _ in missing for name in estimate.missing})
+        print(f"\n⚠️  {len(missing)} queries use {len(metrics)} metrics missing from the snapshot; "
+              f"their counts are a lower bound")
+        if args.verbose:
+            for estimate, query in missing:
+                print(f"    - {query.source}: {', '.join(estimate.missing)}")
+
+    over = [(estimate, query) for estimate, query in results if estimate.returned > args.max_series]
+    if over:
+        print(f"\n✗ {len(over)} queries return more than {args.max_series} series:")
+        for estimate, query in over:
+            print(f"  {estimate.returned:>8}  {query.source}")
+        sys.exit(1)
+    print(f"\n✅ All queries return at most {args.max_series} series "
+          f"({len(unaggregated)} unaggregated fan-outs to review)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Find alert and dashboard queries that select metrics or label values that do
+not exist, before they are deployed and cost a round-trip on every refresh.
+
+Checks every selector of (see metric_catalog.py):
+- alerts/*.yaml and helm/grafana-alerts/*.yaml (PrometheusRules, Grafana
+  provisioning files and ConfigMaps wrapping them)
+- targets[].expr of helm/dashboards/**/*.json
+
+against a catalog built from exposition snapshots (--snapshot, by default
+fixtures/metrics-snapshot.prom) and, with --synthetic, the payload of
+generate-metrics.py's default topology. Metrics recorded by recording rules in
+those files and in helm/recording-rules/ count as existing.
+
+Selectors of exporters the catalog has not seen at all are listed as not
+covered rather than dead; --strict counts them as dead. Exits with status 1
+when a query has a dead selector.
+
+Usage:
+    python check-dead-queries.py [--snapshot FILE ...] [--synthetic] [--strict] [--verbose]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import dashboards
+import metric_catalog
+import promql
+import query_cost
+import synthetic_metrics
+import yaml_io
+from exposition import ExpositionError
+from query_cost import Query
+
+DEFAULT_SNAPSHOT = Path('fixtures/metrics-snapshot.prom')
+ALERT_DIRS = (Path('alerts'), Path('helm/grafana-alerts'))
+RECORDING_RULE_DIR = Path('helm/recording-rules')
+ENVIRONMENTS_FILE = Path('overlays/environments.yaml')
+
+def alert_documents(directories) -> List[tuple]:
+    """(path, document) of every YAML document in the alert directories."""
+    documents = []
+    for directory in directories:
+        for path in sorted(directory.glob('*.yaml')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    documents.extend((path, document) for document in yaml_io.load_all(f))
+            except Exception as e:
+                print(f"⚠️  Skipping {path}: {str(e).splitlines()[0]}")
+    return documents
+
+def recorded_names(documents) -> List[str]:
+    return [rule['record'] for _, document in documents
+            if isinstance(document, dict) and document.get('kind') == 'PrometheusRule'
+            for group in (document.get('spec') or {}).get('groups') or []
+            for rule in group.get('rules') or [] if rule.get('record')]
+
+def alert_queries(documents) -> List[Query]:
+    queries = []
+    for path, document in documents:
+        try:
+            queries.extend(query_cost.provisioning_queries(document, str(path)))
+        except Exception as e:
+            print(f"⚠️  Skipping {path}: {str(e).splitlines()[0]}")
+    return queries
+
+def dashboard_queries(root: Path) -> List[Query]:
+    queries = []
+    for path in dashboards.dashboard_files(root):
+        dashboard, _ = dashboards.load(path)
+        queries.extend(query_cost.dashboard_queries(dashboard, str(path)))
+    return queries
+
+def synthetic_lines():
+    with open(ENVIRONMENTS_FILE, encoding='utf-8') as f:
+        environments = yaml_io.load(f)['environments']
+    topology = synthetic_metrics.Topology.build([(env['namespace'], env['instance']) for env in environments])
+    for chunk in synthetic_metrics.render_snapshot(topology, synthetic_metrics.Shape('steady'), 0):
+        yield from chunk.splitlines()
+
+def main():
+    parser = argparse.ArgumentParser(description='Find queries selecting metrics or label values that do not exist.')
+    parser.add_argument('--snapshot', type=Path, nargs='+', default=[DEFAULT_SNAPSHOT], metavar='FILE',
+                        help=f'metrics in text exposition format (default: {DEFAULT_SNAPSHOT})')
+    parser.add_argument('--synthetic', action='store_true',
+                        help="add the series of generate-metrics.py's default topology to the catalog")
+    parser.add_argument('--strict', action='store_true',
+                        help='count selectors of exporters missing from the catalog as dead')
+    parser.add_argument('--verbose', '-v', action='store_true', help='list the selectors not covered by the catalog')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        catalog = metric_catalog.Catalog.load(*args.snapshot)
+        if args.synthetic:
+            catalog.add_lines(synthetic_lines())
+    except (OSError, ExpositionError) as e:
+        print(f"✗ Cannot read snapshot: {e}")
+        sys.exit(1)
+    documents = alert_documents(ALERT_DIRS) + alert_documents([RECORDING_RULE_DIR])
+    catalog.add_recorded(recorded_names(documents))
+    loaded = time.perf_counter()
+    print(f"\nCatalog: {len(catalog)} series of {len(catalog.metrics)} metrics, "
+          f"{len(catalog.recorded)} recorded ({(loaded - started) * 1000:.0f}ms)")
+
+    queries = alert_queries(documents) + dashboard_queries(dashboards.DASHBOARD_ROOT)
+    dead: Dict[str, List[metric_catalog.Finding]] = {}
+    uncovered: Dict[str, List[metric_catalog.Finding]] = {}
+    for query in queries:
+        try:
+            findings = catalog.check(query.expr)
+        except promql.PromQLSyntaxError as e:
+            print(f"⚠️  Skipping {query.source}: {e}")
+            continue
+        for finding in findings:
+            strict = args.strict and finding.kind == metric_catalog.UNCOVERED
+            target = dead if finding.kind == metric_catalog.DEAD or strict else uncovered
+            target.setdefault(query.source, []).append(finding)
+    checked = time.perf_counter()
+    print(f"Checked {len(queries)} queries in {(checked - loaded) * 1000:.0f}ms")
+
+    if uncovered:
+        prefixes = sorted({metric_catalog.prefix(f.selector.split('{')[0]) for findings in uncovered.values()
+                           for f in findings})
+        print(f"\n⚠️  {len(uncovered)} queries select exporters the catalog has not seen "
+              f"({', '.join(p + '_*' for p in prefixes)}); add a snapshot of them or use --strict")
+        if args.verbose:
+            for source, findings in uncovered.items():
+                print(f"    - {source}: {', '.join(dict.fromkeys(f.selector for f in findings))}")
+
+    if dead:
+        print(f"\n✗ {len(dead)} queries select series that do not exist:")
+        for source, findings in dead.items():
+            print(f"  {source}")
+            for finding in {f.selector: f for f in findings}.values():
+                print(f"    {finding.selector}")
+                print(f"      - {finding.reason}")
+        sys.exit(1)
+    print("\n✅ Every selector matches series in the catalog")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Rank alert and dashboard queries by estimated cost and enforce a budget.
+
+Estimates every query in:
+- alerts/*.yaml, as convert-alerts.py deploys them to Grafana
+- helm/grafana-alerts/*.yaml (Grafana provisioning files and PrometheusRules)
+- targets[].expr of helm/dashboards/**/*.json, at each dashboard's default range
+
+See query_cost.py for the cost model. Exits with status 1 when a query costs
+more than --budget or all queries together cost more than --total-budget.
+
+Usage:
+    python check-query-cost.py [--top 20] [--budget 50000] [--total-budget 1000000]
+"""
+
+import argparse
+import importlib.util
+import sys
+from pathlib import Path
+from typing import List
+
+import dashboards
+import promql
+import query_cost
+import yaml_io
+from query_cost import Query
+
+DEFAULT_BUDGET = 50000
+DEFAULT_TOTAL_BUDGET = 1000000
+
+def load_converter():
+    """Import convert-alerts.py (its hyphenated name rules out a plain import)."""
+    spec = importlib.util.spec_from_file_location('convert_alerts', Path(__file__).with_name('convert-alerts.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def converted_alert_queries(alerts_dir: Path) -> List[Query]:
+    """Queries of alerts/*.yaml after conversion to Grafana alert rules."""
+    converter = load_converter()
+    queries = []
+    for path in sorted(alerts_dir.glob('*.yaml')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                prom_rule = yaml_io.load(f)
+        except Exception as e:
+            print(f"⚠️  Skipping {path}: {str(e).splitlines()[0]}")
+            continue
+        for group in prom_rule['spec']['groups']:
+            for rule in group.get('rules', []):
+                if 'alert' in rule:
+                    grafana_rule = converter.convert_rule(rule, group['name'],
+                                                          group.get('interval', converter.DEFAULT_INTERVAL))
+                    queries.extend(query_cost.grafana_rule_queries(grafana_rule.to_dict(), f"alerts/{path.name}"))
+    return queries
+
+def provisioned_alert_queries(alerts_dir: Path) -> List[Query]:
+    """Queries of the alert files shipped in the Helm chart."""
+    queries = []
+    for path in sorted(alerts_dir.glob('*.yaml')):
+        with open(path, encoding='utf-8') as f:
+            for document in yaml_io.load_all(f):
+                queries.extend(query_cost.provisioning_queries(document, str(path)))
+    return queries
+
+def dashboard_queries(root: Path) -> List[Query]:
+    queries = []
+    for path in dashboards.dashboard_files(root):
+        dashboard, _ = dashboards.load(path)
+        queries.extend(query_cost.dashboard_queries(dashboard, str(path)))
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank alert and dashboard queries by estimated cost.')
+    parser.add_argument('--top', type=int, default=20, help='number of queries to list (default: 20)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help=f'maximum cost of a single query (default: {DEFAULT_BUDGET})')
+    parser.add_argument('--total-budget', type=float, default=DEFAULT_TOTAL_BUDGET,
+                        help=f'maximum cost of all queries together (default: {DEFAULT_TOTAL_BUDGET})')
+    parser.add_argument('--scrape-interval', type=float, default=query_cost.SCRAPE_INTERVAL,
+                        help=f'scrape interval in seconds (default: {query_cost.SCRAPE_INTERVAL})')
+    args = parser.parse_args()
+
+    queries = (converted_alert_queries(Path('alerts'))
+               + provisioned_alert_queries(Path('helm/grafana-alerts'))
+               + dashboard_queries(dashboards.DASHBOARD_ROOT))
+
+    costs = []
+    for query in queries:
+        try:
+            costs.append((query_cost.estimate(query, args.scrape_interval), query))
+        except promql.PromQLSyntaxError as e:
+            print(f"⚠️  Skipping {query.source}: {e}")
+    costs.sort(key=lambda item: item[0].total, reverse=True)
+    total = sum(cost.total for cost, _ in costs)
+
+    print(f"\nEstimated {len(costs)} queries, total cost {total:,.0f}\n")
+    print(f"{'cost':>12}  {'steps':>6}  {'per step':>9}  query")
+    for cost, query in costs[:args.top]:
+        print(f"{cost.total:>12,.0f}  {cost.steps:>6}  {cost.samples_per_step:>9,.0f}  {query.source}")
+        for reason in cost.reasons:
+            print(f"{'':>33}- {reason}")
+
+    over = [(cost, query) for cost, query in costs if cost.total > args.budget]
+    failed = False
+    if over:
+        failed = True
+        print(f"\n✗ {len(over)} queries exceed the per-query budget of {args.budget:,.0f}:")
+        for cost, query in over:
+            print(f"  {cost.total:>12,.0f}  {query.source}")
+    if total > args.total_budget:
+        failed = True
+        print(f"\n✗ Total cost {total:,.0f} exceeds the budget of {args.total_budget:,.0f}")
+    if failed:
+        sys.exit(1)
+    print("\n✅ All queries within budget")
+
+if __name__ == '__main__':
+    main()
@@ -6,13 +6,89 @@ This script reads PrometheusRule YAML files from alerts/ and converts them
 to Grafana alert provisioning format in grafana-alerts/.
 
 Usage:
-    python convert-alerts.py
+    python convert-alerts.py [--changed-only] [--no-cache] [--jobs N] [--recording-rules FILE] [--profile [FILE]]
+                             [--plan [--max-interval 5m] [--ceiling 2000]]
+    kubectl get prometheusrules -A -o yaml | python convert-alerts.py --stream - [--output FILE]
+
+Conversion results are cached in .convert-alerts-cache.json, keyed by a hash of
+each input file and CONVERTER_VERSION. Unchanged inputs whose output is still
+on disk are skipped. With --jobs N the remaining files are converted in N
+worker processes; output files and the report are identical to a serial run.
+With --recording-rules, alert queries use the series recorded by a
+PrometheusRule written by extract-recording-rules.py.
+
+--stream converts a multi-document bundle or kind: List export into a single
+provisioning file, parsing one PrometheusRule at a time and writing each group
+as it is converted, so memory is bounded by the largest PrometheusRule rather
+than the bundle. The cache is not used in this mode.
+
+--profile times the parse, folder, query build, dump and write phases of
+every file and rule and counts fallbacks (default_threshold: no comparison in
+the expression, so the condition became `$B > 0`; default_folder,
+default_interval, multiline_expr), writing a Chrome trace (see profiling.py).
+
+Each alert queries Prometheus once per group interval over a single step
+(see query_timing). A rule can override this with the annotations
+grafana_query_window and grafana_query_step (durations like 10m / 1m).
+
+--plan evaluates each rule at an interval derived from its `for` duration and
+range windows instead of its group's, splits groups by interval and into
+groups reading at most --ceiling samples per evaluation, and prints the
+resulting evaluation schedule (see evaluation_plan.py).
+
+Every converted group is checked against the Grafana provisioning schema
+(see alert_schema.py) before it is written, with folders checked against
+grafana-alerts/folders.yaml; a file with problems is reported and not
+written. Rule uids must also be unique across files. The exit status is 1
+when any file fails.
 """
 
-import yaml
+import argparse
+import hashlib
+import json
+import os
 import re
+import sys
 from pathlib import Path
-from typing import Dict, List, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Any, Optional, Set, TextIO, Tuple, Union
+
+import alert_schema
+import evaluation_plan
+import profiling
+import promql
+import query_cost
+import recording_rules
+import yaml_io
+from evaluation_plan import GroupLoad, PlanSettings
+from grafana_model import Expression, Query, Rule, RuleGroup
+
+# Bump whenever the generated output (or what the cache records about it, such
+# as alert counts) changes for the same input, so cached conversions are invalidated.
+CONVERTER_VERSION = '6'
+
+CACHE_FILE = Path('.convert-alerts-cache.json')
+
+# Default trace file of --profile
+PROFILE_FILE = Path('convert-alerts-profile.json')
+
+# Evaluation interval for groups that don't set one
+DEFAULT_INTERVAL = '30s'
+
+# Reducer applied to the query result by stage B
+REDUCER = 'last'
+
+# Annotations overriding the derived query window and step of one rule
+WINDOW_ANNOTATION = 'grafana_query_window'
+STEP_ANNOTATION = 'grafana_query_step'
+
+DURATION_RE = re.compile(r'(\d+(ms|[smhdwy]))+')
+
+# Phase timings and fallback counters; set to a profiling.Profiler by --profile
+profiler = profiling.NULL
+
+# Folder of rules whose labels match no FOLDER_MAPPING entry or category
+DEFAULT_FOLDER = 'applications'
 
 # Mapping of components to Grafana folders
 FOLDER_MAPPING = {
@@ -31,6 +107,10 @@ FOLDER_MAPPING = {
 
 def determine_folder(alert_rule: Dict[str, Any]) -> str:
     """Determine which Grafana folder this alert belongs to."""
+    return match_folder(alert_rule) or DEFAULT_FOLDER
+
+def match_folder(alert_rule: Dict[str, Any]) -> Optional[str]:
+    """The folder named by the rule's component or category label, if any."""
     labels = alert_rule.get('labels', {})
     component = labels.get('component', '').lower()
     category = labels.get('category', '').lower()
@@ -48,8 +128,7 @@ def determine_folder(alert_rule: Dict[str, Any]) -> str:
     elif category == 'application':
         return 'applications'
     
-    # Default
-    return 'applications'
+    return None
 
 def generate_uid(alert_name: str) -> str:
     """Generate a UID from alert name (max 40 chars, only alphanumeric, -, _)."""
@@ -60,194 +139,610 @@ def generate_uid(alert_name: str) -> str:
     # Trim to 40 chars
     return uid[:40].rstrip('-')
 
-def convert_promql_to_grafana_query(expr: str, rule_name: str) -> List[Dict[str, Any]]:
+def split_condition(expr: str) -> Tuple[str, str]:
+    """
+    Split an alert expression into the query for stage A and the math for C.
+
+    - `X > 5`, `(X > 5)`, `X > bool 5`, `5 < X`: query X, math `$B > 5`
+    - `X > 5 and Y`, `X > 5 unless Y`: the set operator only filters the
+      comparison's series, so the whole expression is queried and the
+      comparison is kept as the math condition
+    - anything else: query the whole expression, math `$B > 0`
+    """
+    tree = promql.parse(expr)
+    comparison = promql.threshold_comparison(tree)
+    if comparison:
+        vector, operator, threshold = comparison
+        return promql.source(expr, vector).strip(), f"$B {operator} {promql.scalar_text(threshold)}"
+    
+    root = promql.unwrap_parens(tree)
+    if isinstance(root, promql.BinaryExpr) and root.op in ('and', 'unless'):
+        comparison = promql.threshold_comparison(root.lhs)
+        if comparison:
+            _, operator, threshold = comparison
+            return expr.strip(), f"$B {operator} {promql.scalar_text(threshold)}"
+    
+    # No usable comparison - use > 0 as default
+    profiler.count('default_threshold', math='$B > 0')
+    return expr.strip(), "$B > 0"
+
+def duration_seconds(text: str, what: str) -> int:
+    """Seconds in a Prometheus duration ('30s', '1m30s'); ValueError naming `what` otherwise."""
+    text = str(text).strip()
+    if not DURATION_RE.fullmatch(text):
+        raise ValueError(f"invalid {what} {text!r}: expected a duration like 30s or 5m")
+    return max(int(promql.parse_duration(text)), 1)
+
+def longest_range(expr: str) -> int:
+    """Longest range selector or subquery range in expr, in seconds (0 if none)."""
+    ranges = [n.range_seconds for n in promql.walk(promql.parse(expr))
+              if isinstance(n, (promql.MatrixSelector, promql.SubqueryExpr))]
+    return int(max((r for r in ranges if r is not None), default=0))
+
+def query_timing(expr: str, interval: str, annotations: Dict[str, Any],
+                 reducer: str = REDUCER) -> Tuple[int, int]:
+    """
+    Window and step (seconds) of the Prometheus query in stage A.
+
+    The step is the group's evaluation interval: points in between would only
+    be computed for the reducer to discard. `last` keeps the final point, so a
+    window of one step is enough; Prometheus evaluates the expression's own
+    range selectors at every step, so they don't widen it. Reducers over the
+    whole result (mean, max, ...) get a window covering the longest range
+    selector. WINDOW_ANNOTATION and STEP_ANNOTATION override either value.
+    """
+    if STEP_ANNOTATION in annotations:
+        step = duration_seconds(annotations[STEP_ANNOTATION], STEP_ANNOTATION)
+    else:
+        step = duration_seconds(interval, 'group interval')
+    if WINDOW_ANNOTATION in annotations:
+        window = duration_seconds(annotations[WINDOW_ANNOTATION], WINDOW_ANNOTATION)
+    elif reducer == 'last':
+        window = step
+    else:
+        window = max(longest_range(expr), step)
+    return max(window, step), step
+
+def convert_promql_to_grafana_query(expr: str, rule_name: str, window: int,
+                                    step: int) -> List[Union[Query, Expression]]:
     """
     Convert a PromQL expression to Grafana query structure.
     
     Grafana needs:
-    - Query (refId: A) - Prometheus query
+    - Query (refId: A) - Prometheus query over `window` seconds every `step` seconds
     - Reduce (refId: B) - Reduces time series to single value
     - Threshold (refId: C) - Math expression for condition
     """
     
-    # Extract comparison operator and threshold from expression
-    # Common patterns: expr > N, expr < N, expr == N
-    comparison_match = re.search(r'([<>=!]+)\s*(\d+\.?\d*)\s*$', expr)
-    
-    if comparison_match:
-        # Expression has inline comparison - split it
-        operator = comparison_match.group(1)
-        threshold = comparison_match.group(2)
-        base_expr = expr[:comparison_match.start()].strip()
-        
-        # Map operator for math expression
-        math_expr = f"$B {operator} {threshold}"
-    else:
-        # No inline comparison - use > 0 as default
-        base_expr = expr.strip()
-        math_expr = "$B > 0"
+    base_expr, math_expr = split_condition(expr)
     
     return [
-        {
-            'refId': 'A',
-            'relativeTimeRange': {
-                'from': 600,  # 10 minutes
-                'to': 0
-            },
-            'datasourceUid': 'prometheus',  # Will be templated in Helm
-            'model': {
-                'expr': base_expr,
-                'refId': 'A',
-                'datasource': {
-                    'type': 'prometheus',
-                    'uid': 'prometheus'
-                },
-                'intervalMs': 1000,
-                'maxDataPoints': 43200
-            }
-        },
-        {
-            'refId': 'B',
-            'relativeTimeRange': {
-                'from': 0,
-                'to': 0
-            },
-            'datasourceUid': '__expr__',
-            'model': {
-                'type': 'reduce',
-                'expression': 'A',
-                'reducer': 'last',
-                'refId': 'B',
-                'datasource': {
-                    'type': '__expr__',
-                    'uid': '__expr__'
-                }
-            }
-        },
-        {
-            'refId': 'C',
-            'relativeTimeRange': {
-                'from': 0,
-                'to': 0
-            },
-            'datasourceUid': '__expr__',
-            'model': {
-                'type': 'math',
-                'expression': math_expr,
-                'refId': 'C',
-                'datasource': {
-                    'type': '__expr__',
-                    'uid': '__expr__'
-                }
-            }
-        }
+        Query(base_expr, window, step),
+        Expression('B', 'reduce', 'A', reducer=REDUCER),
+        Expression('C', 'math', math_expr),
     ]
 
-def convert_rule(rule: Dict[str, Any], group_name: str) -> Dict[str, Any]:
+def convert_rule(rule: Dict[str, Any], group_name: str, interval: str = DEFAULT_INTERVAL,
+                 recording: Optional[recording_rules.RecordingPlan] = None) -> Rule:
     """Convert a single PrometheusRule to Grafana alert rule."""
     alert_name = rule['alert']
+    with profiler.phase('rule', alert=alert_name):
+        return build_rule(rule, alert_name, interval, recording)
+
+def build_rule(rule: Dict[str, Any], alert_name: str, interval: str,
+               recording: Optional[recording_rules.RecordingPlan]) -> Rule:
     uid = generate_uid(alert_name)
     
     # Parse PromQL expression
     expr = rule['expr'].strip()
     if expr.startswith('|\n'):
         # Multi-line expression
+        profiler.count('multiline_expr')
         expr = ' '.join(line.strip() for line in expr.split('\n') if line.strip() and not line.strip().startswith('|'))
     
-    # Convert to Grafana query structure
-    data = convert_promql_to_grafana_query(expr, alert_name)
+    with profiler.phase('query build'):
+        # Use recorded series for shared subexpressions
+        if recording:
+            expr = recording.rewrite(expr)
+        
+        # Query timing overrides are consumed here, not passed on to Grafana
+        annotations = dict(rule.get('annotations', {}))
+        window, step = query_timing(expr, interval, annotations)
+        annotations.pop(WINDOW_ANNOTATION, None)
+        annotations.pop(STEP_ANNOTATION, None)
+        
+        # Convert to Grafana query structure
+        data = convert_promql_to_grafana_query(expr, alert_name, window, step)
     
     # Parse 'for' duration
     for_duration = rule.get('for', '0s')
     
-    # Convert annotations and labels
-    annotations = rule.get('annotations', {})
+    # Convert labels
     labels = rule.get('labels', {})
     
     # Determine folder
-    folder = determine_folder(rule)
-    
-    return {
-        'uid': uid,
-        'title': alert_name,
-        'condition': 'C',  # Always the math expression
-        'for': for_duration,
-        'noDataState': 'OK',
-        'execErrState': 'Alerting',
-        'annotations': annotations,
-        'labels': labels,
-        'data': data
-    }
-
-def convert_prometheus_rule(input_file: Path, output_dir: Path):
-    """Convert a PrometheusRule YAML to Grafana alert format."""
-    with open(input_file) as f:
-        prom_rule = yaml.safe_load(f)
-    
-    spec = prom_rule['spec']
-    groups = spec['groups']
-    
-    # Convert each group
-    grafana_groups = []
-    for group in groups:
+    with profiler.phase('folder'):
+        folder = match_folder(rule)
+    if folder is None:
+        profiler.count('default_folder', folder=DEFAULT_FOLDER)
+    
+    return Rule(
+        uid=uid,
+        title=alert_name,
+        data=data,
+        condition='C',  # Always the math expression
+        for_=for_duration,
+        no_data_state='OK',
+        exec_err_state='Alerting',
+        annotations=annotations,
+        labels=labels,
+    )
+
+def validate_group(group: RuleGroup, folders: Optional[Set[str]] = None):
+    """Raise alert_schema.SchemaError if Grafana would reject the group; folders=None skips the folder check."""
+    with profiler.phase('validate'):
+        problems = alert_schema.group_problems(group.to_dict(), folders)
+    if problems:
+        raise alert_schema.SchemaError(problems)
+
+def rule_cost(rule: Rule) -> float:
+    """Estimated samples the rule's Prometheus queries read per evaluation."""
+    return sum(query_cost.estimate(query).total for query in query_cost.grafana_rule_queries(rule.to_dict(), rule.uid))
+
+def group_load(group: RuleGroup) -> GroupLoad:
+    cost = sum(rule_cost(rule) for rule in group.rules)
+    return GroupLoad(group.name, group.folder, evaluation_plan.parse_interval(group.interval), cost, len(group.rules))
+
+def planned_interval(rule: Dict[str, Any], declared: int, plan: PlanSettings) -> int:
+    """Seconds between evaluations of a PrometheusRule alert under the plan."""
+    for_duration = promql.parse_duration(str(rule.get('for', '0s')).strip())
+    try:
+        window = longest_range(rule['expr'])
+    except promql.PromQLSyntaxError:
+        window = 0
+    return evaluation_plan.rule_interval(declared, for_duration, window, plan.max_interval)
+
+def plan_groups(group_name: str, folder: str, interval: str, rules: List[Dict[str, Any]],
+                recording: Optional[recording_rules.RecordingPlan], plan: PlanSettings) -> List[RuleGroup]:
+    """
+    Convert a group's alerts at their planned intervals, as one group per
+    interval (named <group>-<interval> unless it is the group's own) split
+    into groups of at most plan.ceiling samples per evaluation (<name>-2, ...).
+    """
+    declared = evaluation_plan.parse_interval(interval)
+    by_interval: Dict[int, List[Rule]] = {}
+    for rule in rules:
+        seconds = planned_interval(rule, declared, plan)
+        text = interval if seconds == declared else evaluation_plan.format_interval(seconds)
+        by_interval.setdefault(seconds, []).append(convert_rule(rule, group_name, text, recording))
+    groups = []
+    for seconds, grafana_rules in by_interval.items():
+        text = interval if seconds == declared else evaluation_plan.format_interval(seconds)
+        name = group_name if seconds == declared else f"{group_name}-{text}"
+        chunks = evaluation_plan.split_by_cost([rule_cost(rule) for rule in grafana_rules], plan.ceiling)
+        for n, chunk in enumerate(chunks):
+            groups.append(RuleGroup(name if n == 0 else f"{name}-{n + 1}", folder, text,
+                                    [grafana_rules[i] for i in chunk]))
+    return groups
+
+def convert_groups(prom_rule: Dict[str, Any],
+                   recording: Optional[recording_rules.RecordingPlan] = None,
+                   folders: Optional[Set[str]] = None,
+                   plan: Optional[PlanSettings] = None) -> Iterator[RuleGroup]:
+    """Convert and validate each group of a parsed PrometheusRule, one at a time."""
+    for group in prom_rule['spec']['groups']:
         group_name = group['name']
-        interval = group.get('interval', '30s')
-        rules = group.get('rules', [])
+        with profiler.phase('group', group=group_name):
+            if 'interval' not in group:
+                profiler.count('default_interval', interval=DEFAULT_INTERVAL)
+            interval = group.get('interval', DEFAULT_INTERVAL)
+            rules = group.get('rules', [])
+            
+            # Determine folder from first rule
+            folder = DEFAULT_FOLDER
+            if rules:
+                with profiler.phase('folder'):
+                    folder = determine_folder(rules[0])
+            
+            alerts = [rule for rule in rules if 'alert' in rule]  # Skip recording rules
+            if plan:
+                grafana_groups = plan_groups(group_name, folder, interval, alerts, recording, plan)
+            else:
+                grafana_groups = [RuleGroup(group_name, folder, interval,
+                                            [convert_rule(rule, group_name, interval, recording) for rule in alerts])]
+            for grafana_group in grafana_groups:
+                validate_group(grafana_group, folders)
         
-        # Determine folder from first rule
-        folder = 'applications'  # default
-        if rules:
-            folder = determine_folder(rules[0])
+        yield from grafana_groups
+
+def convert_prometheus_rule(input_file: Path, output_dir: Path,
+                            recording: Optional[recording_rules.RecordingPlan] = None,
+                            folders: Optional[Set[str]] = None,
+                            plan: Optional[PlanSettings] = None) -> Tuple[int, List[str], List[Dict[str, Any]]]:
+    """
+    Convert a PrometheusRule YAML to Grafana alert format, returning (alert
+    count, rule uids, GroupLoad dicts of its groups with plan set).
+    """
+    with profiler.phase('file', file=input_file.name):
+        with profiler.phase('parse'):
+            with open(input_file, encoding='utf-8') as f:
+                prom_rule = yaml_io.load(f)
+        
+        # Convert each group
+        grafana_groups = list(convert_groups(prom_rule, recording, folders, plan))
         
-        grafana_rules = []
-        for rule in rules:
-            if 'alert' in rule:  # Skip recording rules
-                grafana_rules.append(convert_rule(rule, group_name))
+        # Write output file
+        output_file = output_dir / input_file.name
+        output_data = {
+            'apiVersion': 1,
+            'groups': grafana_groups
+        }
         
-        grafana_groups.append({
-            'orgId': 1,
-            'name': group_name,
-            'folder': folder,
-            'interval': interval,
-            'rules': grafana_rules
-        })
-    
-    # Write output file
-    output_file = output_dir / input_file.name
-    output_data = {
-        'apiVersion': 1,
-        'groups': grafana_groups
-    }
-    
-    with open(output_file, 'w') as f:
-        f.write(f"# Grafana Unified Alerting Rules: {input_file.stem}\n")
-        f.write(f"# Converted from PrometheusRule: {prom_rule['metadata']['name']}\n")
-        yaml.dump(output_data, f, default_flow_style=False, sort_keys=False, width=120)
-    
-    print(f"✓ Converted {input_file.name} -> {output_file.name} ({len(grafana_rules)} alerts)")
-    return len(grafana_rules)
+        with profiler.phase('dump'):
+            text = yaml_io.dump(output_data)
+        with profiler.phase('write'):
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(f"# Grafana Unified Alerting Rules: {input_file.stem}\n")
+                f.write(f"# Converted from PrometheusRule: {prom_rule['metadata']['name']}\n")
+                f.write(text)
+    
+    uids = [rule.uid for group in grafana_groups for rule in group.rules]
+    loads = [group_load(group).to_dict() for group in grafana_groups] if plan else []
+    return sum(len(group.rules) for group in grafana_groups), uids, loads
+
+def convert_stream(source: TextIO, output: TextIO, title: str,
+                   recording: Optional[recording_rules.RecordingPlan] = None,
+                   folders: Optional[Set[str]] = None, plan: Optional[PlanSettings] = None,
+                   loads: Optional[List[GroupLoad]] = None) -> Tuple[int, int, int]:
+    """
+    Convert every PrometheusRule of a multi-document YAML stream or kind: List
+    export into one provisioning file, writing each group as it is converted.
+
+    Only one PrometheusRule is in memory at a time. Rule uids and group names
+    that repeat across PrometheusRules (the same rules deployed to several
+    namespaces) get the namespace appended, since Grafana needs them unique.
+    Returns (PrometheusRules, groups, alerts); other kinds are skipped. With
+    plan set, the GroupLoad of every group is appended to loads.
+    """
+    output.write(f"# Grafana Unified Alerting Rules: {title}\n")
+    output.write("# Converted from a PrometheusRule stream\n")
+    output.write("apiVersion: 1\ngroups:")
+    uids, groups = set(), set()
+    documents = group_count = alert_count = 0
+    items = yaml_io.iter_items(source)
+    while True:
+        with profiler.phase('parse'):
+            prom_rule = next(items, None)
+        if prom_rule is None:
+            break
+        if not isinstance(prom_rule, dict) or prom_rule.get('kind') != 'PrometheusRule':
+            continue
+        documents += 1
+        metadata = prom_rule.get('metadata') or {}
+        namespace = metadata.get('namespace') or 'default'
+        with profiler.phase('file', file=f"{namespace}/{metadata.get('name')}"):
+            for group in convert_groups(prom_rule, recording, folders, plan):
+                if (group.folder, group.name) in groups:
+                    group.name = f"{group.name}-{namespace}"
+                groups.add((group.folder, group.name))
+                for rule in group.rules:
+                    if rule.uid in uids:
+                        suffix = '-' + hashlib.sha1(f"{namespace}/{rule.title}".encode('utf-8')).hexdigest()[:8]
+                        rule.uid = rule.uid[:40 - len(suffix)] + suffix
+                    uids.add(rule.uid)
+                if loads is not None:
+                    loads.append(group_load(group))
+                # A one-item list dumps exactly as that entry of the groups list would
+                with profiler.phase('dump'):
+                    text = yaml_io.dump([group])
+                with profiler.phase('write'):
+                    output.write(('\n' if group_count == 0 else '') + text)
+                group_count += 1
+                alert_count += len(group.rules)
+    if group_count == 0:
+        output.write(' []\n')
+    return documents, group_count, alert_count
+
+def convert_file(input_file: Path, output_dir: Path,
+                 recording: Optional[recording_rules.RecordingPlan] = None,
+                 folders: Optional[Set[str]] = None, plan: Optional[PlanSettings] = None,
+                 profile: bool = False) -> Tuple[Optional[int], List[str], List[Dict[str, Any]],
+                                                 Optional[str], List[Dict[str, Any]]]:
+    """
+    Convert one file, returning (alert_count, uids, group loads, None, trace)
+    or (None, [], [], error message, trace); trace holds the file's profiling
+    events with profile set.
+
+    Errors are returned rather than raised so results can be collected from
+    worker processes and reported in input order.
+    """
+    global profiler
+    profiler = profiling.Profiler() if profile else profiling.NULL
+    try:
+        count, uids, loads = convert_prometheus_rule(input_file, output_dir, recording, folders, plan)
+        return count, uids, loads, None, getattr(profiler, 'events', [])
+    except Exception as e:
+        return None, [], [], str(e), getattr(profiler, 'events', [])
+    finally:
+        profiler = profiling.NULL
+
+def file_sha256(path: Path) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def cache_key(input_file: Path, salt: str = '') -> str:
+    """
+    Cache key for an input file: its content hash plus the converter version.
+
+    salt covers any other input that changes the output (the recording rules).
+    """
+    return hashlib.sha256(f"{CONVERTER_VERSION}:{salt}:{file_sha256(input_file)}".encode()).hexdigest()
+
+def load_cache(cache_file: Path) -> Dict[str, Any]:
+    """Load the conversion cache, returning an empty one if missing or unreadable."""
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+def save_cache(cache_file: Path, cache: Dict[str, Any]):
+    """Write the conversion cache atomically."""
+    tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+        f.write('\n')
+    tmp_file.replace(cache_file)
+
+def cached_alert_count(entry: Optional[Dict[str, Any]], key: str, output_file: Path) -> Optional[int]:
+    """
+    Return the cached alert count if the entry is still valid, else None.
+    The entry's rule uids (entry['uids']) and group loads (entry['groups'])
+    are then valid too.
+
+    An entry is valid when the input key matches and the output file is still
+    the one we wrote (not deleted or edited by hand).
+    """
+    if not entry or entry.get('key') != key:
+        return None
+    if not output_file.exists() or file_sha256(output_file) != entry.get('output_sha256'):
+        return None
+    return entry.get('alerts', 0)
+
+def write_profile(path: Path, events: List[Dict[str, Any]], report: TextIO = sys.stdout):
+    """Save a --profile trace and print where the time went and which fallbacks were taken."""
+    profiling.save(path, events, {'converter_version': CONVERTER_VERSION})
+    phases, fallbacks = profiling.summarize(events)
+    print("\n● Profile (total ms / calls / slowest ms)", file=report)
+    for name, entry in sorted(phases.items(), key=lambda item: -item[1]['total_ms']):
+        print(f"    {name:<12} {entry['total_ms']:>10.1f} {entry['calls']:>7} {entry['max_ms']:>10.2f}", file=report)
+    for name, count in sorted(fallbacks.items()):
+        print(f"⚠️  {name}: {count}", file=report)
+    print(f"Profile written to {path} (chrome://tracing, ui.perfetto.dev or speedscope)", file=report)
+
+def write_schedule(loads: List[GroupLoad], plan: PlanSettings, report: TextIO = sys.stdout):
+    """Schedule the planned groups and print when each evaluates and what it costs."""
+    if not loads:
+        return
+    ticks, lockstep = evaluation_plan.schedule(loads)
+    print(f"\n● Evaluation plan ({evaluation_plan.BASE_INTERVAL}s ticks, ceiling {plan.ceiling:,.0f} samples per tick)",
+          file=report)
+    print(f"    {'folder':<16} {'group':<36} {'interval':>8} {'offset':>7} {'rules':>5} {'samples':>9} "
+          f"{'samples/s':>9}", file=report)
+    for load in sorted(loads, key=lambda g: (g.folder, g.interval, g.slot, g.name)):
+        offset = evaluation_plan.format_interval(load.slot * evaluation_plan.BASE_INTERVAL) if load.slot else '0s'
+        print(f"    {load.folder:<16} {load.name:<36} {evaluation_plan.format_interval(load.interval):>8} "
+              f"{offset:>7} {load.rules:>5} {load.cost:>9,.0f} {load.cost / load.interval:>9,.1f}", file=report)
+    peak = max(ticks)
+    print(f"Peak per tick {peak:,.0f} samples with the offsets above, {lockstep:,.0f} in lockstep "
+          f"(Grafana without the jitterAlertRules feature toggle); "
+          f"{sum(g.cost / g.interval for g in loads):,.1f} samples/s on average", file=report)
+    for load in loads:
+        if load.cost > plan.ceiling:
+            print(f"⚠️  {load.folder}/{load.name} alone reads {load.cost:,.0f} samples per evaluation", file=report)
+    if peak > plan.ceiling:
+        print(f"⚠️  Peak exceeds the ceiling of {plan.ceiling:,.0f}", file=report)
+
+def load_folders(output_dir: Path) -> Optional[Set[str]]:
+    """Folders provisioned by output_dir/folders.yaml, or None (no folder check) without one."""
+    folders_file = output_dir / alert_schema.FOLDERS_FILE
+    return alert_schema.load_folders(folders_file) if folders_file.exists() else None
+
+def stream_main(source: str, output_file: Optional[Path], output_dir: Path,
+                recording: Optional[recording_rules.RecordingPlan] = None,
+                profile: Optional[Path] = None, plan: Optional[PlanSettings] = None):
+    """--stream: convert one bundle, reporting on stderr when writing to stdout."""
+    global profiler
+    title = 'stdin' if source == '-' else Path(source).stem
+    if output_file is None and source != '-':
+        output_dir.mkdir(exist_ok=True)
+        output_file = output_dir / Path(source).name
+    report = sys.stderr if output_file is None or str(output_file) == '-' else sys.stdout
+    inp = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    out = sys.stdout if report is sys.stderr else open(output_file, 'w', encoding='utf-8')
+    if profile:
+        profiler = profiling.Profiler()
+    try:
+        loads: List[GroupLoad] = []
+        documents, groups, alerts = convert_stream(inp, out, title, recording, load_folders(output_dir),
+                                                   plan, loads if plan else None)
+    except Exception as e:
+        print(f"✗ Error converting {source}: {e}", file=report)
+        sys.exit(1)
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
+    target = 'stdout' if out is sys.stdout else output_file
+    print(f"✓ Converted {documents} PrometheusRules from {source} -> {target} "
+          f"({groups} groups, {alerts} alerts)", file=report)
+    if plan:
+        write_schedule(loads, plan, report)
+    if profile:
+        write_profile(profile, profiler.events, report)
 
 def main():
     """Main conversion function."""
+    parser = argparse.ArgumentParser(description='Convert PrometheusRule CRDs to Grafana alert provisioning files.')
+    parser.add_argument('--changed-only', action='store_true',
+                        help='only report outputs that were regenerated')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='ignore the conversion cache and regenerate every output')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='convert files in N worker processes (0 = one per CPU)')
+    parser.add_argument('--recording-rules', type=Path, metavar='FILE',
+                        help='PrometheusRule from extract-recording-rules.py whose series alerts should query')
+    parser.add_argument('--stream', metavar='INPUT',
+                        help='convert a multi-document bundle or kind: List export (- for stdin) into one file, '
+                             'group by group')
+    parser.add_argument('--output', '-o', type=Path, metavar='FILE',
+                        help='output file of --stream (default grafana-alerts/<input name>, stdout for stdin)')
+    parser.add_argument('--profile', type=Path, nargs='?', const=PROFILE_FILE, metavar='FILE',
+                        help=f'time every phase per file and rule, count fallbacks, and write a Chrome trace '
+                             f'(default {PROFILE_FILE}); converts every file regardless of the cache')
+    parser.add_argument('--plan', action='store_true',
+                        help="evaluate rules at intervals derived from their for/range windows, split groups under "
+                             "--ceiling and print the evaluation schedule")
+    parser.add_argument('--max-interval', default=evaluation_plan.format_interval(evaluation_plan.DEFAULT_MAX_INTERVAL),
+                        help='longest evaluation interval --plan picks (default %(default)s)')
+    parser.add_argument('--ceiling', type=float, default=evaluation_plan.DEFAULT_CEILING,
+                        help='most estimated samples a group may read per evaluation under --plan (default %(default)g)')
+    args = parser.parse_args()
+
+    plan = None
+    if args.plan:
+        try:
+            plan = PlanSettings(duration_seconds(args.max_interval, '--max-interval'), args.ceiling)
+        except ValueError as e:
+            parser.error(str(e))
+
     alerts_dir = Path('alerts')
     output_dir = Path('grafana-alerts')
+    
+    recording = None
+    if args.recording_rules:
+        with open(args.recording_rules, encoding='utf-8') as f:
+            recording = recording_rules.RecordingPlan.load(yaml_io.load(f))
+    
+    if args.stream:
+        stream_main(args.stream, args.output, output_dir, recording, args.profile, plan)
+        return
+    
     output_dir.mkdir(exist_ok=True)
+    folders = load_folders(output_dir)
     
     # Get all PrometheusRule files
     prom_files = list(alerts_dir.glob('*.yaml'))
     
     print(f"\nConverting {len(prom_files)} PrometheusRule files...\n")
     
-    total_alerts = 0
-    for prom_file in sorted(prom_files):
+    salt = ''
+    if args.recording_rules:
+        salt = file_sha256(args.recording_rules)
+        print(f"Using {len(recording.rules)} recording rules from {args.recording_rules}\n")
+    if plan:
+        salt += ':' + plan.key()
+    
+    cache = {} if args.no_cache or args.profile else load_cache(CACHE_FILE)
+    entries = cache.get('files', {}) if cache.get('version') == CONVERTER_VERSION else {}
+    new_entries = {}
+    regenerated = []
+    
+    # Split inputs into cache hits and files that need converting
+    prom_files = sorted(prom_files)
+    keys = {}
+    cached_counts = {}
+    stale = []
+    for prom_file in prom_files:
         try:
-            count = convert_prometheus_rule(prom_file, output_dir)
-            total_alerts += count
-        except Exception as e:
+            keys[prom_file] = cache_key(prom_file, salt)
+        except OSError as e:
             print(f"✗ Error converting {prom_file.name}: {e}")
+            continue
+        count = cached_alert_count(entries.get(prom_file.name), keys[prom_file], output_dir / prom_file.name)
+        if count is None:
+            stale.append(prom_file)
+        else:
+            cached_counts[prom_file] = count
     
-    print(f"\n✓ Successfully converted {total_alerts} alerts across {len(prom_files)} files")
+    # Convert stale files, in parallel when requested
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    if jobs > 1 and len(stale) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(stale))) as executor:
+            results = dict(zip(stale, executor.map(convert_file, stale, [output_dir] * len(stale),
+                                                   [recording] * len(stale), [folders] * len(stale),
+                                                   [plan] * len(stale), [bool(args.profile)] * len(stale))))
+    else:
+        results = {prom_file: convert_file(prom_file, output_dir, recording, folders, plan, bool(args.profile))
+                   for prom_file in stale}
+    
+    # Report in input order
+    total_alerts = 0
+    failed = len(prom_files) - len(keys)
+    events = []
+    uids_by_file = []
+    loads = []
+    for prom_file in prom_files:
+        if prom_file not in keys:
+            continue
+        output_file = output_dir / prom_file.name
+        if prom_file in results:
+            count, uids, groups, error, trace = results[prom_file]
+            events.extend(trace)
+            if error is not None:
+                print(f"✗ Error converting {prom_file.name}: {error}")
+                failed += 1
+                continue
+            print(f"✓ Converted {prom_file.name} -> {output_file.name} ({count} alerts)")
+            regenerated.append(output_file.name)
+        else:
+            count = cached_counts[prom_file]
+            uids = entries[prom_file.name].get('uids', [])
+            groups = entries[prom_file.name].get('groups', [])
+            if not args.changed_only:
+                print(f"· Unchanged {prom_file.name} -> {output_file.name} ({count} alerts, cached)")
+        new_entries[prom_file.name] = {
+            'key': keys[prom_file],
+            'output_sha256': file_sha256(output_file),
+            'alerts': count,
+            'uids': uids,
+            'groups': groups,
+        }
+        uids_by_file.append((output_file.name, uids))
+        loads.extend(GroupLoad.from_dict(entry) for entry in groups)
+        total_alerts += count
+    
+    # Grafana needs rule uids unique across every provisioned file
+    duplicates = alert_schema.duplicate_uids(uids_by_file)
+    for problem in duplicates:
+        print(f"✗ Duplicate {problem}")
+    
+    save_cache(CACHE_FILE, {'version': CONVERTER_VERSION, 'files': new_entries})
+    
+    if args.changed_only:
+        print(f"\n{len(regenerated)} of {len(prom_files)} outputs regenerated")
+        for name in regenerated:
+            print(f"  {output_dir / name}")
+    
+    if failed or duplicates:
+        print(f"\n✗ Conversion failed: {failed} of {len(prom_files)} files with errors, "
+              f"{len(duplicates)} duplicate uids")
+    else:
+        print(f"\n✓ Successfully converted {total_alerts} alerts across {len(prom_files)} files")
     print(f"Output directory: {output_dir.absolute()}")
+    
+    if plan:
+        write_schedule(loads, plan)
+    
+    if args.profile:
+        write_profile(args.profile, events)
+    
+    if failed or duplicates:
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
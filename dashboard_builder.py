@@ -0,0 +1,160 @@
+"""
+Declarative dashboard panels: specs in, numbered and laid-out panels out.
+
+A PanelSpec names a preset ('timeseries', 'stat', 'gauge') and only what
+differs from it; the preset builds the shared field defaults and options
+(interned by grafana_model, so a hundred panels reference one style block).
+Sections start on a new grid row; within a section every panel drops to the
+highest free spot of the 24-column grid, left first, the way Grafana packs a
+dashboard - two h=4 stats next to an h=8 panel stack on top of each other.
+
+apply() patches the panels a previous run added (see
+dashboards.patch_panels) instead of appending copies, so a generator script
+can be rerun. Layout and numbering are one pass over the specs after one
+pass over the dashboard.
+
+Usage:
+    added, updated, unchanged = apply(dashboard, [Section('Throughput', [PanelSpec('Jobs', [Target(expr)])])])
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import dashboards
+from grafana_model import (Dashboard, FieldDefaults, GaugeOptions, GridPos, Panel, StatOptions, Target,
+                           TimeseriesOptions, TimeseriesStyle, thresholds)
+
+GRID_WIDTH = 24
+
+# dashboards.OWNER_KEY value on the panels apply() writes
+OWNER = 'dashboard_builder'
+
+Steps = Tuple[Union[str, Tuple[str, float]], ...]
+
+@dataclass(slots=True)
+class PanelSpec:
+    """What a panel shows; everything else comes from its preset."""
+    title: str
+    targets: Sequence[Target]
+    preset: str = 'timeseries'
+    w: int = 12
+    h: int = 8
+    description: str = ''
+    unit: str = 'short'
+    steps: Steps = ('green',)
+    style: Optional[TimeseriesStyle] = None
+    calcs: Tuple[str, ...] = ('mean', 'last')
+    tooltip: str = 'multi'
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return PRESETS[self.preset][0], self.title
+
+@dataclass(slots=True)
+class Section:
+    """Panels laid out together, starting below everything before them."""
+    title: str
+    panels: List[PanelSpec] = field(default_factory=list)
+
+LINE = TimeseriesStyle()
+
+def timeseries_panel(spec: PanelSpec, grid_pos: GridPos) -> Panel:
+    return Panel(spec.title, 'timeseries', grid_pos, list(spec.targets),
+                 FieldDefaults(spec.unit, thresholds(*spec.steps), custom=spec.style or LINE,
+                               min=spec.min, max=spec.max),
+                 TimeseriesOptions(spec.calcs, tooltip_mode=spec.tooltip), spec.description)
+
+def stat_panel(spec: PanelSpec, grid_pos: GridPos) -> Panel:
+    return Panel(spec.title, 'stat', grid_pos, list(spec.targets),
+                 FieldDefaults(spec.unit, thresholds(*spec.steps), color_mode='thresholds',
+                               min=spec.min, max=spec.max),
+                 StatOptions(), spec.description, plugin_version='10.0.0')
+
+def gauge_panel(spec: PanelSpec, grid_pos: GridPos) -> Panel:
+    return Panel(spec.title, 'gauge', grid_pos, list(spec.targets),
+                 FieldDefaults(spec.unit, thresholds(*spec.steps), color_mode='thresholds',
+                               min=spec.min, max=spec.max),
+                 GaugeOptions(), spec.description, plugin_version='10.0.0')
+
+# preset -> (panel type, builder)
+PRESETS: Dict[str, Tuple[str, Callable[[PanelSpec, GridPos], Panel]]] = {
+    'timeseries': ('timeseries', timeseries_panel),
+    'stat': ('stat', stat_panel),
+    'gauge': ('gauge', gauge_panel),
+}
+
+class GridLayout:
+    """Skyline of the 24-column grid: the first free row of every column."""
+    __slots__ = ('skyline',)
+
+    def __init__(self, top: int = 0):
+        self.skyline = [top] * GRID_WIDTH
+
+    def new_section(self):
+        floor = max(self.skyline)
+        self.skyline = [floor] * GRID_WIDTH
+
+    def place(self, w: int, h: int) -> GridPos:
+        """The highest, then leftmost, free w×h spot; O(GRID_WIDTH²) at most."""
+        w = max(1, min(w, GRID_WIDTH))
+        best_x, best_y = 0, None
+        for x in range(GRID_WIDTH - w + 1):
+            y = max(self.skyline[x:x + w])
+            if best_y is None or y < best_y:
+                best_x, best_y = x, y
+        for x in range(best_x, best_x + w):
+            self.skyline[x] = best_y + h
+        return GridPos(h, w, best_x, best_y)
+
+def specs_of(sections: Sequence[Section]) -> List[PanelSpec]:
+    return [spec for section in sections for spec in section.panels]
+
+def build(sections: Sequence[Section], top: int = 0, first_id: int = 1,
+          ids: Optional[Dict[Tuple[str, str], int]] = None) -> List[Panel]:
+    """Panels for every spec, laid out from row top; ids keeps the id of a known key."""
+    ids = ids or {}
+    layout = GridLayout(top)
+    panels = []
+    next_id = first_id
+    for section in sections:
+        layout.new_section()
+        for spec in section.panels:
+            panel = PRESETS[spec.preset][1](spec, layout.place(spec.w, spec.h))
+            if spec.key in ids:
+                panel.id = ids[spec.key]
+            else:
+                panel.id = next_id
+                next_id += 1
+            panels.append(panel)
+    return panels
+
+def apply(dashboard: Dashboard, sections: Sequence[Section]) -> Tuple[int, int, int]:
+    """
+    Patch the panels built from these specs into the dashboard; returns
+    (added, updated, unchanged) as dashboards.patch_panels() does.
+
+    Panels a previous run built (marked with OWNER) are found by
+    dashboards.PanelIndex and updated where they are, keeping their ids; the
+    layout starts below the other panels, so it comes out the same on every
+    run.
+    """
+    panels = [panel.to_dict() if isinstance(panel, Panel) else panel for panel in dashboard.panels]
+    index = dashboards.PanelIndex(panels)
+    matches = {spec.key: index.find(panel.to_dict(), OWNER) for spec, panel in zip(specs_of(sections), build(sections))}
+    ours = {id(panel) for panel in matches.values() if panel is not None}
+    last_id = bottom = 0
+    for panel in panels:
+        if id(panel) in ours:
+            continue
+        if isinstance(panel.get('id'), int):
+            last_id = max(last_id, panel['id'])
+        pos = panel.get('gridPos') or {}
+        bottom = max(bottom, pos.get('y', 0) + pos.get('h', 0))
+    ids = {key: panel['id'] for key, panel in matches.items() if panel is not None and isinstance(panel.get('id'), int)}
+    # New panels are numbered after every other panel
+    generated = build(sections, bottom, max([last_id] + list(ids.values())) + 1, ids)
+    counts = dashboards.patch_panels(panels, [panel.to_dict() for panel in generated], OWNER)
+    dashboard.panels = panels
+    return counts
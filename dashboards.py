@@ -0,0 +1,177 @@
+"""
+Shared helpers for the Grafana dashboard JSON files under helm/dashboards/.
+
+Dashboards are stored either minified (as exported by the JS fixers) or
+pretty-printed with two-space indentation. load() remembers which, and save()
+writes the file back in the same style and only when its bytes change.
+patch_panels() updates generated panels in place, so regenerating a
+dashboard only touches the panels that actually differ. It marks the panels
+it writes with the generator's name (OWNER_KEY) and only replaces a panel on
+its title alone when that panel carries the same mark; a hand-made panel
+with the same title is replaced only if its queries are the same too.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DASHBOARD_ROOT = Path('helm/dashboards')
+
+MINIFIED = {'separators': (',', ':'), 'ensure_ascii': False}
+
+# Panel key naming the generator that wrote the panel
+OWNER_KEY = 'generatedBy'
+
+def dashboard_files(root: Path = DASHBOARD_ROOT) -> List[Path]:
+    """Every dashboard JSON file below root, in a stable order."""
+    return sorted(root.glob('**/*.json'))
+
+def detect_style(text: str) -> Dict[str, Any]:
+    """json.dumps keyword arguments that reproduce the file's formatting."""
+    if '\n' not in text.rstrip('\n'):
+        return dict(MINIFIED, trailing_newline=text.endswith('\n'))
+    return {
+        'indent': 2,
+        'ensure_ascii': text.isascii(),
+        'trailing_newline': text.endswith('\n'),
+    }
+
+def load(path: Path) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Read a dashboard, returning (dashboard, style)."""
+    text = path.read_text(encoding='utf-8')
+    return json.loads(text), detect_style(text)
+
+def dumps(dashboard: Dict[str, Any], style: Dict[str, Any]) -> str:
+    """Serialize a dashboard in the given style."""
+    options = {k: v for k, v in style.items() if k != 'trailing_newline'}
+    text = json.dumps(dashboard, **options)
+    return text + '\n' if style.get('trailing_newline') else text
+
+def save(path: Path, dashboard: Dict[str, Any], style: Dict[str, Any]) -> bool:
+    """Write a dashboard if its serialized bytes changed; returns whether it did."""
+    text = dumps(dashboard, style)
+    if path.exists() and path.read_text(encoding='utf-8') == text:
+        return False
+    path.write_text(text, encoding='utf-8')
+    return True
+
+def walk_panels(panels: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield every panel, descending into rows and nested panels at any depth."""
+    stack = list(reversed(panels))
+    while stack:
+        panel = stack.pop()
+        yield panel
+        stack.extend(reversed(panel.get('panels') or []))
+
+def iter_targets(dashboard: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Yield (panel, target) for every Prometheus target with an expression."""
+    for panel in walk_panels(dashboard.get('panels') or []):
+        for target in panel.get('targets') or []:
+            if isinstance(target.get('expr'), str) and target['expr']:
+                yield panel, target
+
+# --- Patching ---------------------------------------------------------------
+
+def target_hash(panel: Dict[str, Any]) -> str:
+    """Short hash of a panel's queries, stable under whitespace changes."""
+    queries = [(t.get('refId'), ' '.join(str(t.get('expr', '')).split())) for t in panel.get('targets') or []]
+    return hashlib.sha1(json.dumps(queries).encode('utf-8')).hexdigest()[:12]
+
+def merge(old: Any, new: Any, keep_extra: bool = False) -> Any:
+    """
+    new, reusing old's key order (and old itself where nothing differs).
+
+    Keys only in new are appended; keys only in old are dropped, except at
+    the top level with keep_extra, where they are kept in place.
+    """
+    if old == new:
+        return old
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    merged = {}
+    for key, value in old.items():
+        if key in new:
+            merged[key] = merge(value, new[key])
+        elif keep_extra:
+            merged[key] = value
+    for key, value in new.items():
+        if key not in merged:
+            merged[key] = value
+    return old if merged == old else merged
+
+class PanelIndex:
+    """Panels at any depth by (type, title), and by (type, target hash) for renamed ones."""
+    __slots__ = ('by_title', 'by_targets', 'location')
+
+    def __init__(self, panels: List[Dict[str, Any]]):
+        self.by_title: Dict[Tuple[Any, Any], List[Dict[str, Any]]] = {}
+        self.by_targets: Dict[Tuple[Any, str], List[Dict[str, Any]]] = {}
+        # id(panel) -> (list holding it, position)
+        self.location: Dict[int, Tuple[List[Dict[str, Any]], int]] = {}
+        stack = [panels]
+        while stack:
+            container = stack.pop()
+            for position, panel in enumerate(container):
+                self.add(panel, container, position)
+                if panel.get('panels'):
+                    stack.append(panel['panels'])
+
+    def add(self, panel: Dict[str, Any], container: List[Dict[str, Any]], position: int):
+        self.by_title.setdefault((panel.get('type'), panel.get('title')), []).append(panel)
+        if panel.get('targets'):
+            self.by_targets.setdefault((panel.get('type'), target_hash(panel)), []).append(panel)
+        self.location[id(panel)] = (container, position)
+
+    def find(self, panel: Dict[str, Any], owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        The existing panel new panel replaces: same title and queries, else
+        same title and written by owner, else same queries.
+        """
+        digest = target_hash(panel)
+        same_title = self.by_title.get((panel.get('type'), panel.get('title')), [])
+        for candidate in same_title:
+            if target_hash(candidate) == digest:
+                return candidate
+        owned = [candidate for candidate in same_title if owner and candidate.get(OWNER_KEY) == owner]
+        if len(owned) == 1:
+            return owned[0]
+        same_targets = self.by_targets.get((panel.get('type'), digest), [])
+        return same_targets[0] if len(same_targets) == 1 and not same_title else None
+
+    def replace(self, old: Dict[str, Any], new: Dict[str, Any]):
+        container, position = self.location.pop(id(old))
+        container[position] = new
+        self.location[id(new)] = (container, position)
+
+def patch_panels(panels: List[Dict[str, Any]], updates: List[Dict[str, Any]],
+                 owner: str) -> Tuple[int, int, int]:
+    """
+    Update panels in place from the ones owner generated; returns (added,
+    updated, unchanged).
+
+    A generated panel replaces the existing panel PanelIndex.find() matches
+    where it is, keeping its id, its key order and any keys the generator
+    does not set; panels without a match are appended. Either way it is
+    marked with OWNER_KEY. Unchanged panels are left as the same objects, so
+    an unchanged dashboard serializes to the same bytes.
+    """
+    index = PanelIndex(panels)
+    added = updated = unchanged = 0
+    for new in updates:
+        old = index.find(new, owner)
+        new = dict(new, **{OWNER_KEY: owner})
+        if old is None:
+            panels.append(new)
+            index.add(new, panels, len(panels) - 1)
+            added += 1
+            continue
+        if old.get('id') is not None:
+            new = dict(new, id=old['id'])
+        merged = merge(old, new, keep_extra=True)
+        if merged is old:
+            unchanged += 1
+        else:
+            index.replace(old, merged)
+            updated += 1
+    return added, updated, unchanged
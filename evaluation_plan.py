@@ -0,0 +1,156 @@
+"""
+Evaluation intervals, group splits and a tick schedule for Grafana alert rules.
+
+Grafana's scheduler ticks every BASE_INTERVAL seconds and evaluates a group
+with interval I on every (I / BASE_INTERVAL)-th tick, counted from the Unix
+epoch, so without jitter every group evaluates together on ticks that are a
+multiple of all intervals. Copying each PrometheusRule group's interval
+verbatim puts most rules on the same 30s beat.
+
+A plan:
+
+- picks each rule's interval from its `for` duration and longest range
+  window: evaluating EVALUATIONS_PER_WINDOW times per window is enough
+  (a `for: 15m` rule over [15m] is evaluated every 3m), rounded down to one
+  of PLAN_INTERVALS, never more often than the group asked for and never
+  less often than max_interval
+- splits each group by interval, and then into groups costing at most the
+  ceiling per evaluation, keeping the rules' order
+- gives every group a tick offset (slot) within its interval, largest groups
+  first, on the least loaded slot
+
+Cost is query_cost's estimate of the samples stage A reads per evaluation.
+Grafana itself only spreads groups over their interval with the
+jitterAlertRules feature toggle, placing them by a hash of the group; the
+planned slots are the spread an even placement reaches, and the lockstep
+peak is what happens without jitter.
+"""
+
+import math
+from functools import reduce
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import promql
+
+# Grafana's scheduler tick
+BASE_INTERVAL = 10
+
+# Evaluations per `for` duration or range window a rule needs at most
+EVALUATIONS_PER_WINDOW = 5
+
+# Intervals the planner picks from; their ticks share factors, so the
+# schedule repeats within an hour
+PLAN_INTERVALS = (10, 20, 30, 60, 120, 180, 300, 600, 900, 1800, 3600)
+
+# Longest interval the planner picks
+DEFAULT_MAX_INTERVAL = 300
+
+# Samples read per scheduler tick, see query_cost
+DEFAULT_CEILING = 2000
+
+class PlanSettings:
+    """Longest interval to pick and most samples a group may read per evaluation."""
+    __slots__ = ('max_interval', 'ceiling')
+
+    def __init__(self, max_interval: int = DEFAULT_MAX_INTERVAL, ceiling: float = DEFAULT_CEILING):
+        self.max_interval = max_interval
+        self.ceiling = ceiling
+
+    def key(self) -> str:
+        """Identifies the settings in cache keys."""
+        return f"plan:{self.max_interval}:{self.ceiling:g}"
+
+class GroupLoad:
+    """A planned rule group: its interval, cost per evaluation and rules."""
+    __slots__ = ('name', 'folder', 'interval', 'cost', 'rules', 'slot')
+
+    def __init__(self, name: str, folder: str, interval: int, cost: float, rules: int, slot: int = 0):
+        self.name = name
+        self.folder = folder
+        # Seconds between evaluations
+        self.interval = interval
+        self.cost = cost
+        self.rules = rules
+        # Tick offset within the interval, set by schedule()
+        self.slot = slot
+
+    @property
+    def ticks(self) -> int:
+        return max(self.interval // BASE_INTERVAL, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'folder': self.folder, 'interval': self.interval,
+                'cost': self.cost, 'rules': self.rules}
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> 'GroupLoad':
+        return cls(entry['name'], entry['folder'], entry['interval'], entry['cost'], entry['rules'])
+
+def format_interval(seconds: int) -> str:
+    """Seconds as the largest whole unit: 90 -> '90s', 120 -> '2m', 3600 -> '1h'."""
+    for unit, size in (('h', 3600), ('m', 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+def rule_interval(declared: int, for_duration: Optional[float], longest_range: float,
+                  max_interval: int = DEFAULT_MAX_INTERVAL) -> int:
+    """
+    Seconds between evaluations of a rule: the longest of PLAN_INTERVALS within
+    its shortest `for` duration or range window divided by
+    EVALUATIONS_PER_WINDOW and within max_interval, but at least declared.
+    Rules with neither keep the declared interval.
+    """
+    windows = [w for w in (for_duration, longest_range) if w]
+    if not windows:
+        return declared
+    limit = min(min(windows) / EVALUATIONS_PER_WINDOW, max_interval)
+    return max([declared] + [interval for interval in PLAN_INTERVALS if interval <= limit])
+
+def split_by_cost(costs: List[float], ceiling: float) -> List[List[int]]:
+    """
+    Indexes of `costs` packed first-fit, in order, into chunks costing at most
+    ceiling; a single cost over the ceiling gets a chunk of its own.
+    """
+    chunks: List[List[int]] = []
+    totals: List[float] = []
+    for i, cost in enumerate(costs):
+        for n, total in enumerate(totals):
+            if total + cost <= ceiling:
+                chunks[n].append(i)
+                totals[n] += cost
+                break
+        else:
+            chunks.append([i])
+            totals.append(cost)
+    return chunks
+
+def hyperperiod(groups: Iterable[GroupLoad]) -> int:
+    """Ticks after which the schedule repeats."""
+    return reduce(lambda a, b: a * b // math.gcd(a, b), (group.ticks for group in groups), 1)
+
+def schedule(groups: List[GroupLoad]) -> Tuple[List[float], float]:
+    """
+    Give every group the slot that keeps the busiest tick lowest, largest
+    groups first; returns (load of every tick over the hyperperiod, lockstep peak).
+    """
+    period = hyperperiod(groups)
+    loads = [0.0] * period
+    for group in sorted(groups, key=lambda g: (-g.cost, g.ticks, g.folder, g.name)):
+        best: Optional[Tuple[float, float, int]] = None
+        for slot in range(group.ticks):
+            ticks = range(slot, period, group.ticks)
+            candidate = (max(loads[t] for t in ticks), sum(loads[t] for t in ticks), slot)
+            if best is None or candidate < best:
+                best = candidate
+        group.slot = best[2]
+        for tick in range(group.slot, period, group.ticks):
+            loads[tick] += group.cost
+    return loads, sum(group.cost for group in groups)
+
+def parse_interval(text: Any) -> int:
+    """A group interval ('30s', '1m') in whole seconds, at least BASE_INTERVAL."""
+    seconds = promql.parse_duration(str(text).strip())
+    if seconds is None:
+        raise ValueError(f"invalid interval {text!r}: expected a duration like 30s or 1m")
+    return max(int(seconds), BASE_INTERVAL)
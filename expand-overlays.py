@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Expand the per-environment overlays in overlays/ into the files they replace.
+
+Every overlay overlays/<path>.yaml is written to <path>.yaml, with its marked
+items expanded for each environment of overlays/environments.yaml (see
+overlays.py for the format). Adding an environment is one line there; every
+overlay picks it up on the next run.
+
+Files whose content is unchanged are not rewritten. With --check nothing is
+written and the exit status is 1 when an output is out of date, for CI.
+
+Usage:
+    python expand-overlays.py [--check] [OVERLAY...]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List
+
+import overlays
+import yaml_io
+
+OVERLAY_DIR = Path('overlays')
+ENVIRONMENTS_FILE = OVERLAY_DIR / 'environments.yaml'
+
+def overlay_files(root: Path = OVERLAY_DIR) -> List[Path]:
+    return [path for path in sorted(root.glob('**/*.yaml')) if path != root / ENVIRONMENTS_FILE.name]
+
+def render(path: Path, environments: overlays.Environments) -> str:
+    text = path.read_text(encoding='utf-8')
+    document = overlays.expand(yaml_io.load(text), environments)
+    return overlays.output_header(path.as_posix(), overlays.leading_comments(text)) + yaml_io.dump(document)
+
+def main():
+    parser = argparse.ArgumentParser(description='Expand per-environment overlays into rule and monitor files.')
+    parser.add_argument('overlays', nargs='*', type=Path, metavar='OVERLAY',
+                        help=f'overlay files (default: every *.yaml below {OVERLAY_DIR}/)')
+    parser.add_argument('--check', action='store_true', help='only report outputs that are out of date')
+    args = parser.parse_args()
+
+    try:
+        with open(ENVIRONMENTS_FILE, encoding='utf-8') as f:
+            environments = overlays.Environments.load(yaml_io.load(f))
+    except (OSError, overlays.OverlayError) as e:
+        sys.exit(f"✗ {ENVIRONMENTS_FILE}: {e}")
+
+    paths = args.overlays or overlay_files()
+    written = unchanged = stale = failed = 0
+    for path in paths:
+        output = path.relative_to(OVERLAY_DIR)
+        try:
+            text = render(path, environments)
+        except Exception as e:
+            print(f"✗ {path}: {str(e).splitlines()[0]}")
+            failed += 1
+            continue
+        if output.exists() and output.read_text(encoding='utf-8') == text:
+            unchanged += 1
+        elif args.check:
+            print(f"✗ {output} is out of date")
+            stale += 1
+        else:
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(text, encoding='utf-8')
+            print(f"✓ {path} -> {output}")
+            written += 1
+
+    print(f"\n✅ Expanded {len(paths)} overlays × {len(environments.names)} environments "
+          f"({', '.join(environments.names)}): {written} written, {unchanged} unchanged"
+          + (f", {stale} out of date" if stale else '') + (f", {failed} failed" if failed else ''))
+    if stale or failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Prometheus text exposition format: parse a /metrics snapshot into series.
+
+A snapshot (curl http://pod:port/metrics > snapshot.prom, or a fixture under
+fixtures/) stands in for Prometheus when tools need to know which series
+exist: `# TYPE` lines give metric types, every sample line is one series;
+sample values and timestamps are ignored. Several snapshots can be
+concatenated; repeated series are kept once.
+
+Usage:
+    snapshot = Snapshot.load(Path('fixtures/metrics-snapshot.prom'))
+    snapshot.series['rabbitmq_queue_messages_ready']   # [{'queue': ..., ...}, ...]
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+METRIC_NAME = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*')
+LABEL_NAME = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"')
+ESCAPES = {'\\': '\\', '"': '"', 'n': '\n'}
+# A label value up to its closing quote, and one escape sequence in it
+LABEL_VALUE = re.compile(r'([^"\\]*(?:\\.[^"\\]*)*)"', re.DOTALL)
+ESCAPE = re.compile(r'\\(.)', re.DOTALL)
+# Fast path: a whole `{...}` without escapes, split into pairs in one findall
+LABEL_BLOCK = re.compile(r'\{((?:\s*[a-zA-Z_][a-zA-Z0-9_]*\s*=\s*"[^"\\]*"\s*,?)*)\s*\}')
+LABEL_PAIR = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"([^"\\]*)"')
+
+class ExpositionError(ValueError):
+    """A line that is not valid text exposition format."""
+
+    def __init__(self, message: str, line_number: int):
+        super().__init__(f"line {line_number}: {message}")
+        self.line_number = line_number
+
+def unescape(match: re.Match) -> str:
+    return ESCAPES.get(match.group(1), match.group(0))
+
+def parse_labels(text: str, pos: int, line_number: int) -> Tuple[Dict[str, str], int]:
+    """Labels of `{a="1",b="2"}` starting after the `{` at pos; returns them and the offset after `}`."""
+    labels: Dict[str, str] = {}
+    while True:
+        while pos < len(text) and text[pos] in ' \t,':
+            pos += 1
+        if pos < len(text) and text[pos] == '}':
+            return labels, pos + 1
+        match = LABEL_NAME.match(text, pos)
+        if not match:
+            raise ExpositionError(f"expected a label name at column {pos + 1}", line_number)
+        value = LABEL_VALUE.match(text, match.end())
+        if not value:
+            raise ExpositionError("unterminated label value", line_number)
+        raw, pos = value.group(1), value.end()
+        labels[match.group(1)] = ESCAPE.sub(unescape, raw) if '\\' in raw else raw
+
+def parse(lines: Iterable[str]) -> Iterator[Tuple[str, Dict[str, str], str]]:
+    """(metric name, labels, value text) of every sample line."""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = METRIC_NAME.match(line)
+        if not match:
+            raise ExpositionError(f"expected a metric name: {line[:60]}", line_number)
+        name, pos = match.group(0), match.end()
+        labels: Dict[str, str] = {}
+        if pos < len(line) and line[pos] == '{':
+            block = LABEL_BLOCK.match(line, pos)
+            if block:
+                labels, pos = dict(LABEL_PAIR.findall(block.group(1))), block.end()
+            else:
+                labels, pos = parse_labels(line, pos + 1, line_number)
+        fields = line[pos:].split()
+        if not fields:
+            raise ExpositionError(f"sample without a value: {line[:60]}", line_number)
+        yield name, labels, fields[0]
+
+TYPE_LINE = re.compile(r'#\s*TYPE\s+(\S+)\s+(\S+)')
+
+class Snapshot:
+    """Series of a snapshot, by metric name."""
+    __slots__ = ('series', 'types', 'keys')
+
+    def __init__(self):
+        # metric name -> label sets (without __name__), in snapshot order
+        self.series: Dict[str, List[Dict[str, str]]] = {}
+        self.types: Dict[str, str] = {}
+        self.keys: set = set()
+
+    @classmethod
+    def load(cls, *paths: Path) -> 'Snapshot':
+        snapshot = cls()
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                snapshot.add_lines(f)
+        return snapshot
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Snapshot':
+        snapshot = cls()
+        snapshot.add_lines(text.splitlines())
+        return snapshot
+
+    def add_lines(self, lines: Iterable[str]):
+        lines = list(lines)
+        for line in lines:
+            match = TYPE_LINE.match(line.strip())
+            if match:
+                self.types[match.group(1)] = match.group(2)
+        for name, labels, _ in parse(lines):
+            key = (name, labels_key(labels))
+            if key not in self.keys:
+                self.keys.add(key)
+                self.series.setdefault(name, []).append(labels)
+
+    def __len__(self):
+        return sum(len(sets) for sets in self.series.values())
+
+    def metric_type(self, name: str) -> Optional[str]:
+        """TYPE of a metric, including histogram/summary series like x_bucket and x_count."""
+        if name in self.types:
+            return self.types[name]
+        for suffix in ('_bucket', '_count', '_sum', '_total', '_created'):
+            if name.endswith(suffix) and name[:-len(suffix)] in self.types:
+                return self.types[name[:-len(suffix)]]
+        return None
+
+def labels_key(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Extract shared expensive PromQL subexpressions into recording rules.
+
+Scans alert expressions in alerts/*.yaml and every panel target in
+helm/dashboards/**/*.json, picks subexpressions used at least --min-uses
+times (see recording_rules.py), and reports them. With --write it also:
+
+- writes a PrometheusRule with the recording rules to
+  helm/recording-rules/recording-rules.yaml (deployed by the Helm chart)
+- rewrites dashboard targets to select the recorded series
+
+Alert rules pick up the same rewrite when converted with
+`python convert-alerts.py --recording-rules helm/recording-rules/recording-rules.yaml`.
+
+Usage:
+    python extract-recording-rules.py [--min-uses 2] [--generalize-label namespace] [--write]
+"""
+
+import argparse
+from pathlib import Path
+from typing import List, Tuple
+
+import dashboards
+import recording_rules
+import yaml_io
+
+OUTPUT_FILE = Path('helm/recording-rules/recording-rules.yaml')
+RULE_NAME = 'copperiq-recording-rules'
+
+def alert_expressions(alerts_dir: Path) -> List[Tuple[str, str]]:
+    """(source, expr) for every alert and recording rule in alerts/*.yaml."""
+    found = []
+    for path in sorted(alerts_dir.glob('*.yaml')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                prom_rule = yaml_io.load(f)
+        except Exception as e:
+            print(f"⚠️  Skipping {path}: {str(e).splitlines()[0]}")
+            continue
+        for group in prom_rule['spec']['groups']:
+            for rule in group.get('rules', []):
+                found.append((f"{path.name}:{rule.get('alert') or rule.get('record')}", rule['expr']))
+    return found
+
+def dashboard_expressions(root: Path) -> List[Tuple[str, str]]:
+    """(source, expr) for every Prometheus target of every dashboard."""
+    found = []
+    for path in dashboards.dashboard_files(root):
+        dashboard, _ = dashboards.load(path)
+        for panel, target in dashboards.iter_targets(dashboard):
+            found.append((f"{path.relative_to(root)}:{panel.get('title', panel.get('id'))}", target['expr']))
+    return found
+
+def rewrite_dashboards(plan: recording_rules.RecordingPlan, root: Path) -> List[Path]:
+    """Point dashboard targets at recorded series; returns the files changed."""
+    changed = []
+    for path in dashboards.dashboard_files(root):
+        dashboard, style = dashboards.load(path)
+        updated = False
+        for _, target in dashboards.iter_targets(dashboard):
+            new_expr = plan.rewrite(target['expr'])
+            if new_expr != target['expr']:
+                target['expr'] = new_expr
+                updated = True
+        if updated and dashboards.save(path, dashboard, style):
+            changed.append(path)
+    return changed
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract shared expensive PromQL subexpressions into recording rules.')
+    parser.add_argument('--min-uses', type=int, default=2,
+                        help='record subexpressions used at least this many times (default: 2)')
+    parser.add_argument('--generalize-label', action='append', metavar='LABEL',
+                        help=f"label whose matchers are applied to the recorded series instead of inside the rule "
+                             f"(repeatable, default: {', '.join(recording_rules.GENERALIZED_LABELS)})")
+    parser.add_argument('--output', type=Path, default=OUTPUT_FILE, help=f'PrometheusRule output (default: {OUTPUT_FILE})')
+    parser.add_argument('--write', action='store_true',
+                        help='write the PrometheusRule and rewrite dashboard targets')
+    args = parser.parse_args()
+
+    labels = tuple(args.generalize_label or recording_rules.GENERALIZED_LABELS)
+    sources = alert_expressions(Path('alerts')) + dashboard_expressions(dashboards.DASHBOARD_ROOT)
+    plan = recording_rules.build_plan((expr for _, expr in sources), args.min_uses, labels)
+
+    uses = {name: [] for name, _ in plan.rules}
+    for source, expr in sources:
+        for _, name, _ in plan.uses(expr):
+            uses[name].append(source)
+
+    print(f"\nScanned {len(sources)} expressions, {len(plan.rules)} recording rules selected\n")
+    for name, expr in plan.rules:
+        print(f"● {name}  ({len(uses[name])} uses)")
+        print(f"    {expr}")
+        for source in uses[name]:
+            print(f"    - {source}")
+
+    if not args.write:
+        print("\nDry run: pass --write to emit the PrometheusRule and rewrite dashboards")
+        return
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write("# Generated by extract-recording-rules.py - do not edit by hand\n")
+        yaml_io.dump(plan.to_prometheus_rule(RULE_NAME, 'observability'), f)
+    print(f"\n✓ Wrote {len(plan.rules)} recording rules to {args.output}")
+
+    for path in rewrite_dashboards(plan, dashboards.DASHBOARD_ROOT):
+        print(f"✓ Rewrote targets in {path}")
+    print(f"\nNext: python convert-alerts.py --recording-rules {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+A stand-in Prometheus that records the queries it receives.
+
+Point a local Grafana's Prometheus datasource at it (http://localhost:9091),
+open dashboards in a few browser tabs, and every query Grafana sends is
+appended to a JSON lines log with its time, endpoint, expression, range and
+step, and the X-Dashboard-Uid / X-Panel-Id headers Grafana sends with panel
+queries. plan-dashboard-refresh.py --compare LOG checks the modelled
+queries per second against it.
+
+Queries succeed with empty results, so panels show "No data"; the label and
+series endpoints and buildinfo answer enough for the datasource health check
+and the variable editor.
+
+Usage:
+    python fake-prometheus.py [--port 9091] [--log fake-prometheus.jsonl]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PORT = 9091
+DEFAULT_LOG = Path('fake-prometheus.jsonl')
+
+EMPTY_RESULTS = {
+    '/api/v1/query': {'resultType': 'vector', 'result': []},
+    '/api/v1/query_range': {'resultType': 'matrix', 'result': []},
+    '/api/v1/query_exemplars': [],
+    '/api/v1/series': [],
+    '/api/v1/labels': [],
+    '/api/v1/metadata': {},
+    '/api/v1/rules': {'groups': []},
+    '/api/v1/status/buildinfo': {'version': '2.53.0', 'revision': 'fake', 'branch': 'fake'},
+}
+
+class QueryLog:
+    """Appends one JSON line per received query; shared by the handler threads."""
+
+    def __init__(self, path: Path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.count += 1
+
+class Handler(BaseHTTPRequestHandler):
+    log: QueryLog
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.answer(url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        params = parse_qs(url.query)
+        params.update(parse_qs(self.rfile.read(length).decode('utf-8')))
+        self.answer(url.path, params)
+
+    def answer(self, path: str, params: Dict[str, list]):
+        if path in EMPTY_RESULTS or path.startswith('/api/v1/label/'):
+            data = EMPTY_RESULTS.get(path, [])
+            if path in ('/api/v1/query', '/api/v1/query_range'):
+                self.log.write({
+                    'time': time.time(),
+                    'endpoint': path.rsplit('/', 1)[-1],
+                    'query': first(params, 'query'),
+                    'start': first(params, 'start'),
+                    'end': first(params, 'end'),
+                    'step': first(params, 'step'),
+                    'dashboard': self.headers.get('X-Dashboard-Uid'),
+                    'panel': self.headers.get('X-Panel-Id'),
+                })
+            self.reply(200, {'status': 'success', 'data': data})
+        else:
+            self.reply(404, {'status': 'error', 'errorType': 'not_found', 'error': f"unknown endpoint {path}"})
+
+    def reply(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def first(params: Dict[str, list], name: str):
+    values = params.get(name)
+    return values[0] if values else None
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve empty Prometheus API responses and log every query.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default {DEFAULT_PORT})')
+    parser.add_argument('--log', type=Path, default=DEFAULT_LOG, help=f'query log to append to (default {DEFAULT_LOG})')
+    args = parser.parse_args()
+
+    Handler.log = QueryLog(args.log)
+    server = ThreadingHTTPServer(('', args.port), Handler)
+    print(f"Fake Prometheus on http://localhost:{args.port}, logging queries to {args.log}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n{Handler.log.count} queries logged to {args.log}")
+
+if __name__ == '__main__':
+    main()
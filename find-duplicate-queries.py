@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Find PromQL queries that dashboards send to Prometheus more than once.
+
+Indexes every target of every dashboard under helm/dashboards/ by its
+normalized expression (see query_index.py) and reports:
+
+- panels whose queries are all sent by another panel of the same dashboard;
+  with --write they are pointed at that panel through Grafana's
+  `-- Dashboard --` datasource, so a refresh sends each query once
+- queries repeated across dashboards, with the recording rule that would
+  share them (extract-recording-rules.py creates it)
+- the same query twice in one panel, near-identical queries (differing only
+  in namespace matchers or range), and subexpressions repeated inside one
+  query
+
+Usage:
+    python find-duplicate-queries.py [--dashboard GLOB] [--write] [--verbose]
+"""
+
+import argparse
+import fnmatch
+from typing import Dict, List
+
+import dashboards
+import query_index
+import recording_rules
+
+def plural(n: int, word: str) -> str:
+    return f"{n} {word}" if n == 1 else f"{n} {word[:-1]}ies" if word.endswith('y') else f"{n} {word}s"
+
+def recording_rule_for(expr: str) -> str:
+    plan = recording_rules.build_plan([expr, expr], min_uses=2)
+    if not plan.rules:
+        return "cheap query, nothing to precompute"
+    return f"record as {', '.join(name for name, _ in plan.rules)}"
+
+def print_uses(uses: List[query_index.Use]):
+    for use in uses:
+        print(f"    - {use}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Find dashboard queries sent to Prometheus more than once.')
+    parser.add_argument('--dashboard', metavar='GLOB',
+                        help='only dashboards whose path below helm/dashboards matches this glob')
+    parser.add_argument('--write', action='store_true',
+                        help='point panels at the panel already sending their queries (-- Dashboard -- datasource)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='also list near-identical queries and repeated subexpressions')
+    args = parser.parse_args()
+
+    index = query_index.QueryIndex()
+    plans: Dict[str, List[query_index.Reuse]] = {}
+    for path in dashboards.dashboard_files():
+        relative = path.relative_to(dashboards.DASHBOARD_ROOT).as_posix()
+        if args.dashboard and not fnmatch.fnmatchcase(relative, args.dashboard):
+            continue
+        dashboard, style = dashboards.load(path)
+        index.add_dashboard(dashboard, relative)
+        plan = query_index.dashboard_datasource_plan(dashboard)
+        if not plan:
+            continue
+        plans[relative] = plan
+        if args.write:
+            for reuse in plan:
+                reuse.apply()
+            dashboards.save(path, dashboard, style)
+
+    targets = sum(len(uses) for uses in index.exact.values())
+    print(f"\nIndexed {targets} queries, {len(index.exact)} distinct")
+
+    reusable = sum(reuse.saved for plan in plans.values() for reuse in plan)
+    if plans:
+        print(f"\n● Panels that can reuse another panel's results ({plural(reusable, 'query')})")
+        for relative, plan in plans.items():
+            for reuse in plan:
+                note = f", filtered to {', '.join(sorted(set(reuse.ref_ids.values())))}" if reuse.filtered() else ''
+                print(f"    - {relative}: {reuse.panel.get('title')} ← panel {reuse.source['id']} "
+                      f"{reuse.source.get('title')} ({plural(reuse.saved, 'query')}{note})")
+
+    duplicates = index.duplicates()
+    across = [uses for uses in duplicates if len({use.path for use in uses}) > 1]
+    if across:
+        print(f"\n● Queries repeated across dashboards ({len(across)})")
+        for uses in across:
+            print(f"  {uses[0].key}\n    {recording_rule_for(uses[0].target['expr'])}")
+            print_uses(uses)
+
+    in_panel = [uses for uses in duplicates if len({id(use.panel) for use in uses}) < len(uses)]
+    if in_panel:
+        print(f"\n● Queries repeated within one panel ({len(in_panel)}); drop the copy or tell them apart by label")
+        for uses in in_panel:
+            print(f"  {uses[0].key}")
+            print_uses(uses)
+
+    if args.verbose:
+        near = index.near_duplicates()
+        if near:
+            print(f"\n● Near-identical queries ({len(near)}); align them to share one query or recording rule")
+            for uses in near:
+                for use in uses:
+                    print(f"    - {use}: {use.key}")
+        if index.repeated:
+            print(f"\n● Subexpressions repeated within one query ({len(index.repeated)}); "
+                  f"a recording rule evaluates them once")
+            for use, repeated in index.repeated:
+                print(f"    - {use}")
+                for text, count in repeated:
+                    print(f"        {count}× {text}")
+
+    for use in index.unparsed:
+        print(f"⚠️  {use}: query does not parse, not indexed")
+
+    action = 'now reuse' if args.write else 'can reuse'
+    print(f"\n✅ {index.redundant_queries()} of {targets} queries repeat another one per full refresh; "
+          f"{reusable} in {sum(len(p) for p in plans.values())} panels {action} another panel's results")
+    if plans and not args.write:
+        print("Dry run: pass --write to switch those panels to the -- Dashboard -- datasource")
+
+if __name__ == '__main__':
+    main()
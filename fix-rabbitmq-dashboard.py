@@ -2,88 +2,43 @@
 """
 Fix RabbitMQ dashboard to use namespace template variable instead of hardcoded namespaces.
 """
-import json
-import re
-import sys
+from pathlib import Path
+
+import dashboards
+from grafana_model import Dashboard, QueryVariable
+from query_rewrite import Rewriter, SetLabel
+
+# Hardcoded namespace filters (namespace="n8n-dev", namespace='n8n-prod') become the variable;
+# exclusions (namespace!="n8n-test") keep their meaning
+NAMESPACE_RULES = [SetLabel('namespace', '$namespace', op='=~', mode='replace', replace_ops=['='])]
 
 def fix_rabbitmq_dashboard(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        dashboard = json.load(f)
-    
-    # Add namespace template variable
-    namespace_var = {
-        "current": {
-            "selected": True,
-            "text": ["All"],
-            "value": ["$__all"]
-        },
-        "hide": 0,
-        "includeAll": True,
-        "label": "Namespace",
-        "multi": True,
-        "name": "namespace",
-        "options": [],
-        "query": {
-            "query": "label_values(rabbitmq_queue_messages, namespace)",
-            "refId": "StandardVariableQuery"
-        },
-        "refresh": 1,
-        "regex": "",
-        "skipUrlSync": False,
-        "sort": 1,
-        "type": "query"
-    }
-    
-    # Add namespace variable to templating list
-    if 'templating' not in dashboard:
-        dashboard['templating'] = {'list': []}
-    
-    # Check if namespace variable already exists
-    has_namespace = any(v.get('name') == 'namespace' for v in dashboard['templating']['list'])
-    if not has_namespace:
-        dashboard['templating']['list'].append(namespace_var)
-    
-    # Function to update query expressions
-    def update_expr(expr):
-        if not expr or not isinstance(expr, str):
-            return expr
-        
-        # Replace hardcoded namespace filters with variable
-        # Pattern: namespace="n8n-dev" or namespace="n8n-prod"
-        expr = re.sub(r'namespace="[^"]*"', 'namespace=~"$namespace"', expr)
-        expr = re.sub(r"namespace='[^']*'", 'namespace=~"$namespace"', expr)
-        
-        # Also handle namespace filters in curly braces
-        expr = re.sub(r'\{([^}]*?)namespace="[^"]*"([^}]*?)\}', r'{\1namespace=~"$namespace"\2}', expr)
-        
-        return expr
-    
-    # Update all panel queries
-    if 'panels' in dashboard:
-        for panel in dashboard['panels']:
-            if 'targets' in panel:
-                for target in panel['targets']:
-                    if 'expr' in target:
-                        target['expr'] = update_expr(target['expr'])
-            
-            # Handle row panels with nested panels
-            if panel.get('type') == 'row' and 'panels' in panel:
-                for subpanel in panel['panels']:
-                    if 'targets' in subpanel:
-                        for target in subpanel['targets']:
-                            if 'expr' in target:
-                                target['expr'] = update_expr(target['expr'])
-    
-    # Write updated dashboard
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(dashboard, f, indent=2)
-    
-    print(f"✅ Updated RabbitMQ dashboard")
-    print(f"   - Added namespace template variable")
-    print(f"   - Replaced hardcoded namespace filters with $namespace variable")
+    dashboard, style = dashboards.load(Path(input_file))
+    
+    # Add namespace template variable (unless it already exists)
+    model = Dashboard.from_dict(dashboard)
+    added_variable = model.variable('namespace') is None
+    if added_variable:
+        model.variables.append(QueryVariable('namespace', 'Namespace',
+                                             'label_values(rabbitmq_queue_messages, namespace)'))
+    dashboard = model.to_dict()
+    
+    # Update all panel queries, including panels nested in rows
+    changes = Rewriter(NAMESPACE_RULES).rewrite_dashboard(dashboard)
+    rewritten = sum(1 for _, _, new in changes if new)
+    
+    # Write updated dashboard in the input's formatting, only if its bytes changed
+    if not dashboards.save(Path(output_file), dashboard, style):
+        print(f"✓ RabbitMQ dashboard already up to date, {output_file} not rewritten")
+        return
+    
+    print("✅ Updated RabbitMQ dashboard")
+    if added_variable:
+        print("   - Added namespace template variable")
+    print(f"   - Replaced hardcoded namespace filters with $namespace variable ({rewritten} queries)")
 
 if __name__ == '__main__':
-    input_file = 'helm/dashboards/rabbitmq.json'
-    output_file = 'helm/dashboards/rabbitmq.json'
+    input_file = dashboards.DASHBOARD_ROOT / 'infrastructure' / 'rabbitmq.json'
+    output_file = input_file
     
     fix_rabbitmq_dashboard(input_file, output_file)
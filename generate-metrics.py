@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic /metrics payloads for the families alerts and dashboards
+read, write them as a snapshot, serve them, or scrape them through the
+ServiceMonitors and PodMonitors in servicemonitors/.
+
+The topology is one n8n namespace per environment of
+overlays/environments.yaml (--namespaces N adds n8n-envN namespaces or keeps
+the first N), each with a main pod, --workers worker pods, RabbitMQ with
+--queues queues and Valkey, plus --gateways websocket gateway pods; values
+follow the --shape load shape over --period (see synthetic_metrics.py).
+
+Without --serve or --check-monitors, writes the snapshot at --at seconds
+into the shape to --output (default stdout), with the namespace, pod, job and
+instance labels Prometheus attaches, in the format of
+fixtures/metrics-snapshot.prom, for check-cardinality.py and friends.
+
+--serve listens on --port, with the shape's clock starting at --at and
+running --speed times real time:
+
+    /metrics                            every target, with target labels
+    /targets/<namespace>/<pod>/metrics  one target, as its exporter serves it
+    /targets                            HTTP service discovery for a scraper
+
+Payloads are streamed chunked, gzipped when the scraper accepts it. Point a
+local Prometheus at it with
+
+    scrape_configs:
+      - job_name: synthetic
+        http_sd_configs: [{url: 'http://localhost:9102/targets'}]
+
+--check-monitors resolves every ServiceMonitor and PodMonitor under
+servicemonitors/ against the topology (namespaceSelector, selector, endpoint
+port), scrapes each selected target at the endpoint's path over HTTP within
+its scrapeTimeout and parses the payload. Monitors of namespaces outside the
+topology are skipped; exits with status 1 when a monitor selects nothing or a
+scrape fails.
+
+Usage:
+    python generate-metrics.py [--namespaces N] [--workers 3] [--queues 6] [--gateways 2]
+                               [--shape steady|diurnal|spike|backlog] [--period 1h] [--seed 0] [--at 0]
+                               [--output FILE | --serve [--port 9102] [--speed 1] | --check-monitors [DIR]]
+"""
+
+import argparse
+import gzip
+import json
+import re
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import exposition
+import promql
+import synthetic_metrics
+import yaml_io
+
+DEFAULT_PORT = 9102
+ENVIRONMENTS_FILE = Path('overlays/environments.yaml')
+MONITOR_DIR = Path('servicemonitors')
+MONITOR_KINDS = ('ServiceMonitor', 'PodMonitor')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_SCRAPE_TIMEOUT = 10.0
+# Bytes gathered before a chunk is written
+CHUNK_SIZE = 64 * 1024
+
+TARGET_PATH = re.compile(r'/targets/([^/]+)/([^/]+)(/.*)')
+
+def load_namespaces(count: int = None) -> List[Tuple[str, str]]:
+    """(namespace, n8n release) of every environment, cut or extended to count."""
+    with open(ENVIRONMENTS_FILE, encoding='utf-8') as f:
+        environments = yaml_io.load(f)['environments']
+    namespaces = [(env['namespace'], env['instance']) for env in environments]
+    if count is None:
+        return namespaces
+    extra = [(f"n8n-env{n}", f"n8n-env{n}") for n in range(len(namespaces) + 1, count + 1)]
+    return (namespaces + extra)[:count]
+
+class Clock:
+    """Seconds into the shape: `at` when started, advancing `speed` times real time."""
+
+    def __init__(self, at: float, speed: float):
+        self.at = at
+        self.speed = speed
+        self.started = time.monotonic()
+
+    def now(self) -> float:
+        return self.at + (time.monotonic() - self.started) * self.speed
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    topology: synthetic_metrics.Topology
+    shape: synthetic_metrics.Shape
+    clock: Clock
+    scrapes = 0
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            self.stream(synthetic_metrics.render_snapshot(self.topology, self.shape, self.clock.now()))
+            return
+        if path == '/targets':
+            self.reply(200, 'application/json', json.dumps(self.discovery()).encode('utf-8'))
+            return
+        match = TARGET_PATH.fullmatch(path)
+        target = match and self.topology.find(match.group(1), match.group(2))
+        if target and match.group(3) == target.path:
+            self.stream(synthetic_metrics.render_target(target, self.shape, self.clock.now()))
+            return
+        self.reply(404, 'text/plain', f"no target at {path}\n".encode('utf-8'))
+
+    def discovery(self) -> list:
+        host = self.headers.get('Host') or f"localhost:{self.server.server_address[1]}"
+        return [{'targets': [host],
+                 'labels': {'__metrics_path__': f"/targets/{target.namespace}/{target.pod}{target.path}",
+                            'namespace': target.namespace, 'pod': target.pod, 'job': target.job,
+                            'instance': target.address}}
+                for target in self.topology.targets]
+
+    def stream(self, chunks: Iterable[str]):
+        """Write chunks with chunked transfer encoding, gzipped when accepted, without holding the payload."""
+        compress = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Transfer-Encoding', 'chunked')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        writer = ChunkWriter(self.wfile)
+        sink = gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=1) if compress else writer
+        buffer, size = [], 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= CHUNK_SIZE:
+                sink.write(''.join(buffer).encode('utf-8'))
+                buffer, size = [], 0
+        sink.write(''.join(buffer).encode('utf-8'))
+        if compress:
+            sink.close()
+        writer.finish()
+        type(self).scrapes += 1
+
+    def reply(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class ChunkWriter:
+    """File-like sink writing each write as one HTTP/1.1 chunk."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        self.wfile.write(b'0\r\n\r\n')
+
+def start_server(topology, shape, clock, port: int) -> ThreadingHTTPServer:
+    Handler.topology, Handler.shape, Handler.clock = topology, shape, clock
+    server = ThreadingHTTPServer(('', port), Handler)
+    server.daemon_threads = True
+    return server
+
+def scrape(url: str, timeout: float) -> Tuple[int, int, float]:
+    """(series, bytes on the wire, seconds) of one scrape, as Prometheus asks for it."""
+    request = urllib.request.Request(url, headers={'Accept': CONTENT_TYPE, 'Accept-Encoding': 'gzip'})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = response.read()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            wire, body = len(body), gzip.decompress(body)
+        else:
+            wire = len(body)
+    elapsed = time.perf_counter() - started
+    series = sum(1 for _ in exposition.parse(body.decode('utf-8').splitlines()))
+    return series, wire, elapsed
+
+def load_monitors(root: Path) -> List[Tuple[Path, dict]]:
+    monitors = []
+    for path in sorted(root.glob('*.yaml')):
+        with open(path, encoding='utf-8') as f:
+            monitors.extend((path, item) for item in yaml_io.iter_items(f)
+                            if isinstance(item, dict) and item.get('kind') in MONITOR_KINDS)
+    return monitors
+
+def check_monitors(topology, root: Path, port: int) -> bool:
+    ok = True
+    monitored = set()
+    for path, monitor in load_monitors(root):
+        metadata = monitor.get('metadata') or {}
+        name = f"{monitor['kind']} {metadata.get('namespace')}/{metadata.get('name')}"
+        if not synthetic_metrics.monitor_namespaces(monitor, topology.namespaces):
+            print(f"  – {name} ({path}): namespaces not in the topology, skipped")
+            continue
+        selected = synthetic_metrics.monitor_targets(monitor, topology)
+        if not selected:
+            print(f"✗ {name} ({path}): selects no target")
+            ok = False
+            continue
+        series = wire = 0
+        slowest = 0.0
+        failures = []
+        for target, endpoint in selected:
+            monitored.add(id(target))
+            timeout = promql.parse_duration(str(endpoint.get('scrapeTimeout', ''))) or DEFAULT_SCRAPE_TIMEOUT
+            url = f"http://127.0.0.1:{port}/targets/{target.namespace}/{target.pod}{endpoint.get('path', '/metrics')}"
+            try:
+                count, size, elapsed = scrape(url, timeout)
+            except Exception as e:
+                failures.append(f"{target.pod}: {e}")
+                continue
+            if elapsed > timeout:
+                failures.append(f"{target.pod}: scrape took {elapsed:.1f}s, scrapeTimeout {timeout:g}s")
+            series += count
+            wire += size
+            slowest = max(slowest, elapsed)
+        if failures:
+            ok = False
+            print(f"✗ {name} ({path}): {len(failures)} of {len(selected)} scrapes failed")
+            for failure in failures:
+                print(f"    - {failure}")
+        else:
+            print(f"✓ {name}: {len(selected)} targets, {series:,} series, {wire / 1024:,.1f} KiB gzipped, "
+                  f"slowest scrape {slowest * 1000:.0f}ms")
+    for target in topology.targets:
+        if id(target) not in monitored:
+            print(f"  – {target.namespace}/{target.pod} ({target.job}) is not selected by any monitor")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate, serve or scrape synthetic Prometheus metrics.')
+    parser.add_argument('--namespaces', type=int, metavar='N',
+                        help=f'n8n namespaces (default: one per environment in {ENVIRONMENTS_FILE})')
+    parser.add_argument('--workers', type=int, default=3, metavar='N', help='n8n worker pods per namespace (default 3)')
+    parser.add_argument('--queues', type=int, default=len(synthetic_metrics.QUEUES), metavar='N',
+                        help=f'RabbitMQ queues per namespace (default {len(synthetic_metrics.QUEUES)})')
+    parser.add_argument('--gateways', type=int, default=2, metavar='N',
+                        help=f'websocket gateway pods in {synthetic_metrics.WEBSOCKET_NAMESPACE} (default 2)')
+    parser.add_argument('--shape', choices=list(synthetic_metrics.SHAPES), default='steady',
+                        help='load over time (default steady)')
+    parser.add_argument('--period', default='1h', help='period of the load shape (default 1h)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of pod names and per-series factors (default 0)')
+    parser.add_argument('--at', type=float, default=0.0, metavar='SECONDS',
+                        help='seconds into the shape to render, or to start serving at (default 0)')
+    parser.add_argument('--output', default='-', metavar='FILE', help='snapshot to write (default stdout)')
+    parser.add_argument('--serve', action='store_true', help='serve the targets over HTTP')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to serve on (default {DEFAULT_PORT})')
+    parser.add_argument('--speed', type=float, default=1.0, help='shape seconds per real second when serving')
+    parser.add_argument('--check-monitors', nargs='?', const=MONITOR_DIR, type=Path, metavar='DIR',
+                        help=f'scrape the targets every monitor in DIR selects (default {MONITOR_DIR})')
+    args = parser.parse_args()
+
+    period = promql.parse_duration(args.period)
+    if period is None:
+        sys.exit(f"✗ --period expects a duration like 1h, got {args.period!r}")
+    shape = synthetic_metrics.Shape(args.shape, period)
+    topology = synthetic_metrics.Topology.build(load_namespaces(args.namespaces), args.workers, args.queues,
+                                                args.gateways, args.seed)
+    summary = (f"{len(topology.targets)} targets in {len(topology.namespaces)} namespaces, "
+               f"{topology.series_count():,} series, {args.shape} load")
+
+    if args.check_monitors:
+        server = start_server(topology, shape, Clock(args.at, args.speed), 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Scraping {summary}\n")
+        ok = check_monitors(topology, args.check_monitors, server.server_address[1])
+        server.shutdown()
+        if not ok:
+            sys.exit(1)
+        print("\n✅ Every monitor scrapes its targets")
+        return
+
+    if args.serve:
+        server = start_server(topology, shape, Clock(args.at, args.speed), args.port)
+        print(f"Serving {summary} on http://localhost:{args.port}/metrics "
+              f"(per target under /targets/, discovery at /targets)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            print(f"\n{Handler.scrapes} scrapes served")
+        return
+
+    started = time.perf_counter()
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='\n')
+    try:
+        for chunk in synthetic_metrics.render_snapshot(topology, shape, args.at):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if out is not sys.stdout:
+        print(f"✓ Wrote {summary} to {args.output} in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
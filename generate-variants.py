@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Generate per-namespace / per-tenant copies of alert rules and dashboards.
+
+Each template (a PrometheusRule .yaml or a dashboard .json) is parsed once
+and rendered for every variant of the matrix (see variants.py for the matrix
+format and what changes per variant). Outputs are written one at a time as
+they are rendered, so memory stays flat however many variants there are:
+
+- PrometheusRules go to alerts/<template>-<variant>.yaml, where
+  convert-alerts.py picks them up
+- dashboards go next to the template as <template>-<variant>.json, in the
+  template's JSON formatting
+
+Files whose content is unchanged are not rewritten. With --stream, rendered
+PrometheusRules are written as one multi-document YAML stream instead
+(`-` for stdout, e.g. to pipe into kubectl apply -f -).
+
+Usage:
+    python generate-variants.py TEMPLATE... --matrix FILE [--output-dir DIR] [--stream FILE]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import dashboards
+import variants
+import yaml_io
+
+ALERTS_DIR = Path('alerts')
+
+def load_template(path: Path, matrix: variants.Matrix):
+    """(template, dashboard style or None) for a template file."""
+    if path.suffix == '.json':
+        document, style = dashboards.load(path)
+        return variants.Template(document, matrix), style
+    with open(path, encoding='utf-8') as f:
+        document = yaml_io.load(f)
+    if not isinstance(document, dict) or document.get('kind') != 'PrometheusRule':
+        raise ValueError("expected a PrometheusRule or a dashboard .json")
+    return variants.Template(document, matrix), None
+
+def write_if_changed(path: Path, text: str) -> bool:
+    if path.exists() and path.read_text(encoding='utf-8') == text:
+        return False
+    path.write_text(text, encoding='utf-8')
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Render alert rule and dashboard templates for every variant.')
+    parser.add_argument('templates', nargs='+', type=Path, metavar='TEMPLATE',
+                        help='PrometheusRule .yaml or dashboard .json template')
+    parser.add_argument('--matrix', type=Path, required=True, help='YAML file listing the variants')
+    parser.add_argument('--output-dir', type=Path,
+                        help='write every output here (default: alerts/ for rules, the template directory for dashboards)')
+    parser.add_argument('--stream', metavar='FILE',
+                        help="write PrometheusRules as one multi-document YAML stream ('-' for stdout)")
+    args = parser.parse_args()
+
+    try:
+        with open(args.matrix, encoding='utf-8') as f:
+            matrix = variants.Matrix.load(yaml_io.load(f))
+    except (OSError, variants.MatrixError) as e:
+        sys.exit(f"✗ {args.matrix}: {e}")
+
+    stream = None
+    if args.stream:
+        stream = sys.stdout if args.stream == '-' else open(args.stream, 'w', encoding='utf-8')
+    # Progress goes to stderr when the stream is stdout
+    log = sys.stderr if stream is sys.stdout else sys.stdout
+
+    started = time.perf_counter()
+    written = unchanged = failed = 0
+    for path in args.templates:
+        try:
+            template, style = load_template(path, matrix)
+        except Exception as e:
+            print(f"✗ {path}: {str(e).splitlines()[0]}", file=log)
+            failed += 1
+            continue
+        if stream and style is not None:
+            print(f"✗ {path}: --stream only takes PrometheusRule templates", file=log)
+            failed += 1
+            continue
+        output_dir: Optional[Path] = args.output_dir or (ALERTS_DIR if style is None else path.parent)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for variant in matrix.variants:
+            try:
+                document = template.render(variant)
+            except KeyError as e:
+                print(f"✗ {path} [{variant['name']}]: missing value {e}", file=log)
+                failed += 1
+                continue
+            if stream:
+                stream.write(f"---\n# Generated from {path} for {variant['name']}\n")
+                yaml_io.dump(document, stream)
+                written += 1
+                continue
+            output = output_dir / f"{path.stem}-{variant['name']}{path.suffix}"
+            if style is not None:
+                changed = dashboards.save(output, document, style)
+            else:
+                header = f"# Generated by generate-variants.py from {path} for {variant['name']} - do not edit\n"
+                changed = write_if_changed(output, header + yaml_io.dump(document))
+            if changed:
+                written += 1
+                print(f"✓ {output}", file=log)
+            else:
+                unchanged += 1
+    if stream and stream is not sys.stdout:
+        stream.close()
+
+    print(f"\n✅ Rendered {len(args.templates)} templates × {len(matrix.variants)} variants "
+          f"in {time.perf_counter() - started:.2f}s: {written} written, {unchanged} unchanged"
+          + (f", {failed} failed" if failed else ''), file=log)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
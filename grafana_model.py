@@ -0,0 +1,436 @@
+"""
+Typed model of the Grafana alert rules and dashboard panels the tooling generates.
+
+Rules, queries, panels, targets and dashboards are slotted dataclasses
+(dataclass(slots=True), so Python 3.10 or later) instead of nested dicts.
+The blocks that repeat across rules and panels (datasources, the reduce
+stage, thresholds, the timeseries `custom` field config, legend and tooltip
+options, ...) are frozen and interned: equal blocks share one instance and
+one serialized dict, so generating a copy of every dashboard per tenant
+does not copy them.
+
+Serialization goes straight to the output formats:
+
+- yaml_io.dump() accepts model objects anywhere in the data (a representer
+  is registered for each class).
+- json.dump(..., default=to_data) does the same for JSON.
+- to_dict() returns the plain structure, with keys in the order Grafana
+  exports them. Dicts of interned blocks are shared: treat them as read-only.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import yaml_io
+
+# Interned frozen blocks and their serialized form, keyed by type and repr so
+# that 0, 0.0 and False stay distinct
+_INTERNED: Dict[Tuple[type, str], Any] = {}
+_SERIALIZED: Dict[Tuple[type, str], Dict[str, Any]] = {}
+
+def intern(block):
+    """The shared instance equal to a frozen block."""
+    return _INTERNED.setdefault((type(block), repr(block)), block)
+
+class Shared:
+    """Base of frozen blocks: to_dict() is built once per distinct value."""
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        key = (type(self), repr(self))
+        data = _SERIALIZED.get(key)
+        if data is None:
+            data = _SERIALIZED[key] = self._build()
+        return data
+
+    def _build(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+# --- Shared blocks ----------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Datasource(Shared):
+    type: str
+    uid: str
+
+    def _build(self):
+        return {'type': self.type, 'uid': self.uid}
+
+PROMETHEUS = intern(Datasource('prometheus', 'prometheus'))  # uid templated in Helm
+EXPRESSION = intern(Datasource('__expr__', '__expr__'))
+
+@dataclass(frozen=True, slots=True)
+class ThresholdStep(Shared):
+    color: str
+    value: Optional[float] = None
+
+    def _build(self):
+        return {'color': self.color, 'value': self.value}
+
+@dataclass(frozen=True, slots=True)
+class Thresholds(Shared):
+    steps: Tuple[ThresholdStep, ...] = (ThresholdStep('green'),)
+    mode: str = 'absolute'
+
+    def _build(self):
+        return {'mode': self.mode, 'steps': [step.to_dict() for step in self.steps]}
+
+def thresholds(*steps: Union[str, Tuple[str, float]]) -> Thresholds:
+    """Absolute thresholds from a base color and (color, value) pairs: thresholds('green', ('red', 80))."""
+    return intern(Thresholds(tuple(ThresholdStep(s) if isinstance(s, str) else ThresholdStep(*s) for s in steps)))
+
+@dataclass(frozen=True, slots=True)
+class TimeseriesStyle(Shared):
+    """fieldConfig.defaults.custom of a timeseries panel."""
+    draw_style: str = 'line'
+    line_interpolation: str = 'linear'
+    line_width: int = 1
+    fill_opacity: int = 10
+    gradient_mode: str = 'none'
+    point_size: int = 5
+    show_points: str = 'never'
+    span_nulls: bool = False
+    stacking: str = 'none'
+    thresholds_style: str = 'off'
+
+    def _build(self):
+        return {
+            'axisCenteredZero': False,
+            'axisColorMode': 'text',
+            'axisLabel': '',
+            'axisPlacement': 'auto',
+            'barAlignment': 0,
+            'drawStyle': self.draw_style,
+            'fillOpacity': self.fill_opacity,
+            'gradientMode': self.gradient_mode,
+            'hideFrom': {'tooltip': False, 'viz': False, 'legend': False},
+            'lineInterpolation': self.line_interpolation,
+            'lineWidth': self.line_width,
+            'pointSize': self.point_size,
+            'scaleDistribution': {'type': 'linear'},
+            'showPoints': self.show_points,
+            'spanNulls': self.span_nulls,
+            'stacking': {'mode': self.stacking, 'group': 'A'},
+            'thresholdsStyle': {'mode': self.thresholds_style},
+        }
+
+@dataclass(frozen=True, slots=True)
+class FieldDefaults(Shared):
+    """fieldConfig.defaults of a panel."""
+    unit: str = 'short'
+    thresholds: Thresholds = Thresholds()
+    color_mode: str = 'palette-classic'
+    custom: Optional[TimeseriesStyle] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    def _build(self):
+        data = {'color': {'mode': self.color_mode}}
+        if self.custom is not None:
+            data['custom'] = self.custom.to_dict()
+        data['mappings'] = []
+        if self.max is not None:
+            data['max'] = self.max
+        if self.min is not None:
+            data['min'] = self.min
+        data['thresholds'] = self.thresholds.to_dict()
+        data['unit'] = self.unit
+        return data
+
+@dataclass(frozen=True, slots=True)
+class TimeseriesOptions(Shared):
+    legend_calcs: Tuple[str, ...] = ()
+    legend_mode: str = 'table'
+    legend_placement: str = 'bottom'
+    tooltip_mode: str = 'multi'
+    tooltip_sort: str = 'none'
+
+    def _build(self):
+        return {
+            'legend': {'calcs': list(self.legend_calcs), 'displayMode': self.legend_mode,
+                       'placement': self.legend_placement},
+            'tooltip': {'mode': self.tooltip_mode, 'sort': self.tooltip_sort},
+        }
+
+@dataclass(frozen=True, slots=True)
+class ReduceOptions(Shared):
+    calcs: Tuple[str, ...] = ('lastNotNull',)
+    values: bool = False
+    fields: str = ''
+
+    def _build(self):
+        return {'values': self.values, 'calcs': list(self.calcs), 'fields': self.fields}
+
+@dataclass(frozen=True, slots=True)
+class GaugeOptions(Shared):
+    reduce: ReduceOptions = ReduceOptions()
+    orientation: str = 'auto'
+    show_threshold_labels: bool = False
+    show_threshold_markers: bool = True
+
+    def _build(self):
+        return {
+            'orientation': self.orientation,
+            'reduceOptions': self.reduce.to_dict(),
+            'showThresholdLabels': self.show_threshold_labels,
+            'showThresholdMarkers': self.show_threshold_markers,
+        }
+
+@dataclass(frozen=True, slots=True)
+class StatOptions(Shared):
+    reduce: ReduceOptions = ReduceOptions()
+    color_mode: str = 'value'
+    graph_mode: str = 'area'
+    justify_mode: str = 'center'
+    orientation: str = 'auto'
+    text_mode: str = 'value_and_name'
+
+    def _build(self):
+        return {
+            'colorMode': self.color_mode,
+            'graphMode': self.graph_mode,
+            'justifyMode': self.justify_mode,
+            'orientation': self.orientation,
+            'reduceOptions': self.reduce.to_dict(),
+            'textMode': self.text_mode,
+        }
+
+PanelOptions = Union[TimeseriesOptions, GaugeOptions, StatOptions]
+
+# --- Alert rules ------------------------------------------------------------
+
+@dataclass(slots=True)
+class Query:
+    """Stage A of an alert rule: a Prometheus query over `window` seconds every `step` seconds."""
+    expr: str
+    window: int
+    step: int
+    ref_id: str = 'A'
+    datasource: Datasource = PROMETHEUS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'refId': self.ref_id,
+            'relativeTimeRange': {'from': self.window, 'to': 0},
+            'datasourceUid': self.datasource.uid,
+            'model': {
+                'expr': self.expr,
+                'refId': self.ref_id,
+                'datasource': self.datasource.to_dict(),
+                'intervalMs': self.step * 1000,
+                'maxDataPoints': self.window // self.step + 1,
+            },
+        }
+
+@dataclass(frozen=True, slots=True)
+class Expression(Shared):
+    """A server-side expression stage: reduce (with a reducer) or math. Shared between rules."""
+    ref_id: str
+    type: str
+    expression: str
+    reducer: Optional[str] = None
+
+    def _build(self):
+        model = {'type': self.type, 'expression': self.expression}
+        if self.reducer is not None:
+            model['reducer'] = self.reducer
+        model['refId'] = self.ref_id
+        model['datasource'] = EXPRESSION.to_dict()
+        return {
+            'refId': self.ref_id,
+            'relativeTimeRange': {'from': 0, 'to': 0},
+            'datasourceUid': EXPRESSION.uid,
+            'model': model,
+        }
+
+@dataclass(slots=True)
+class Rule:
+    """A Grafana alert rule."""
+    uid: str
+    title: str
+    data: List[Union[Query, Expression]]
+    condition: str = 'C'
+    for_: str = '0s'
+    no_data_state: str = 'OK'
+    exec_err_state: str = 'Alerting'
+    annotations: Dict[str, Any] = field(default_factory=dict)
+    labels: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.data = [intern(stage) if isinstance(stage, Expression) else stage for stage in self.data]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'uid': self.uid,
+            'title': self.title,
+            'condition': self.condition,
+            'for': self.for_,
+            'noDataState': self.no_data_state,
+            'execErrState': self.exec_err_state,
+            'annotations': self.annotations,
+            'labels': self.labels,
+            'data': [stage.to_dict() for stage in self.data],
+        }
+
+@dataclass(slots=True)
+class RuleGroup:
+    name: str
+    folder: str
+    interval: str
+    rules: List[Rule] = field(default_factory=list)
+    org_id: int = 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'orgId': self.org_id,
+            'name': self.name,
+            'folder': self.folder,
+            'interval': self.interval,
+            'rules': [rule.to_dict() for rule in self.rules],
+        }
+
+# --- Dashboards -------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class GridPos(Shared):
+    h: int
+    w: int
+    x: int
+    y: int
+
+    def _build(self):
+        return {'h': self.h, 'w': self.w, 'x': self.x, 'y': self.y}
+
+@dataclass(slots=True)
+class Target:
+    expr: str
+    ref_id: str = 'A'
+    legend_format: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {'expr': self.expr}
+        if self.legend_format is not None:
+            data['legendFormat'] = self.legend_format
+        data['refId'] = self.ref_id
+        return data
+
+@dataclass(slots=True)
+class Panel:
+    """A dashboard panel with Prometheus targets."""
+    title: str
+    type: str
+    grid_pos: GridPos
+    targets: List[Target]
+    defaults: FieldDefaults
+    options: PanelOptions
+    description: str = ''
+    id: Optional[int] = None
+    plugin_version: Optional[str] = None
+    datasource: Datasource = PROMETHEUS
+
+    def __post_init__(self):
+        self.defaults = intern(self.defaults)
+        self.options = intern(self.options)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'datasource': self.datasource.to_dict(),
+            'description': self.description,
+            'fieldConfig': {'defaults': self.defaults.to_dict()},
+            'gridPos': self.grid_pos.to_dict(),
+            'id': self.id,
+            'options': self.options.to_dict(),
+        }
+        if self.plugin_version is not None:
+            data['pluginVersion'] = self.plugin_version
+        data['targets'] = [target.to_dict() for target in self.targets]
+        data['title'] = self.title
+        data['type'] = self.type
+        return data
+
+@dataclass(slots=True)
+class QueryVariable:
+    """A query template variable, e.g. a namespace selector."""
+    name: str
+    label: str
+    query: str
+    multi: bool = True
+    include_all: bool = True
+    refresh: int = 1
+    sort: int = 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        current = ({'selected': True, 'text': ['All'], 'value': ['$__all']} if self.include_all else {})
+        return {
+            'current': current,
+            'hide': 0,
+            'includeAll': self.include_all,
+            'label': self.label,
+            'multi': self.multi,
+            'name': self.name,
+            'options': [],
+            'query': {'query': self.query, 'refId': 'StandardVariableQuery'},
+            'refresh': self.refresh,
+            'regex': '',
+            'skipUrlSync': False,
+            'sort': self.sort,
+            'type': 'query',
+        }
+
+@dataclass(slots=True)
+class Dashboard:
+    """
+    A dashboard loaded from JSON. Existing panels and variables stay plain
+    dicts; new ones can be model objects. Other keys are kept as loaded.
+    """
+    panels: List[Union[Panel, Dict[str, Any]]] = field(default_factory=list)
+    variables: List[Union[QueryVariable, Dict[str, Any]]] = field(default_factory=list)
+    document: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, document: Dict[str, Any]) -> 'Dashboard':
+        return cls(list(document.get('panels') or []),
+                   list((document.get('templating') or {}).get('list') or []), document)
+
+    def variable(self, name: str) -> Optional[Union[QueryVariable, Dict[str, Any]]]:
+        for variable in self.variables:
+            if (variable.name if isinstance(variable, QueryVariable) else variable.get('name')) == name:
+                return variable
+        return None
+
+    def next_id(self) -> int:
+        """An id after every top-level panel."""
+        ids = [panel.id if isinstance(panel, Panel) else panel.get('id') for panel in self.panels]
+        return max((i for i in ids if isinstance(i, int)), default=0) + 1
+
+    def bottom(self) -> int:
+        """First free grid row below the top-level panels."""
+        positions = [panel.grid_pos.to_dict() if isinstance(panel, Panel) else panel.get('gridPos') or {}
+                     for panel in self.panels]
+        return max((p.get('y', 0) + p.get('h', 0) for p in positions), default=0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = dict(self.document)
+        data['panels'] = [panel.to_dict() if isinstance(panel, Panel) else panel for panel in self.panels]
+        if self.variables or 'templating' in data:
+            variables = [v.to_dict() if isinstance(v, QueryVariable) else v for v in self.variables]
+            data['templating'] = dict(data.get('templating') or {}, list=variables)
+        return data
+
+# --- Serialization ----------------------------------------------------------
+
+MODEL_TYPES = (Datasource, ThresholdStep, Thresholds, TimeseriesStyle, FieldDefaults, TimeseriesOptions,
+               ReduceOptions, GaugeOptions, StatOptions, Query, Expression, Rule, RuleGroup, GridPos, Target,
+               Panel, QueryVariable, Dashboard)
+
+def to_data(obj: Any) -> Dict[str, Any]:
+    """json.dump default= hook for model objects."""
+    if isinstance(obj, MODEL_TYPES):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def represent(dumper, obj):
+    return dumper.represent_dict(obj.to_dict())
+
+for _cls in MODEL_TYPES:
+    yaml_io.add_representer(_cls, represent)
@@ -0,0 +1,242 @@
+"""
+A metric catalog: which metrics and label values exist, indexed for
+constant-time lookups, and whether a selector can match anything.
+
+Built from exposition text (snapshots, or synthetic_metrics output) one line
+at a time. Per metric name the catalog keeps a posting list per label value:
+the ids of the series carrying it, as Prometheus' index does. Checking a
+selector is a dict lookup for the metric, a set lookup per `=` matcher and a
+scan of the label's distinct values for regex and negative matchers, then an
+intersection of the matched postings, smallest first. Results are cached per
+metric and matcher, so checking thousands of queries costs little more than
+parsing them.
+
+A selector is dead when its metric does not exist, a matcher matches no value
+of its label (a missing label counts as the empty value, as in Prometheus), or
+no series satisfies all matchers together. Metrics produced by recording rules
+exist without being scraped, so `recorded` names pass with any labels.
+Matchers on Grafana variables ($namespace) are not checked.
+
+The catalog only knows the exporters it has seen: a metric whose prefix (the
+part before the first underscore, the exporter's namespace by Prometheus
+naming conventions) matches no metric in the catalog is `uncovered`, not dead.
+
+Usage:
+    catalog = Catalog.load(Path('fixtures/metrics-snapshot.prom'))
+    catalog.check('redis_pubsub_num_messages_total{namespace="n8n-prod"}')   # [Finding(...)]
+"""
+
+import difflib
+import re
+from array import array
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import promql
+from cardinality import VARIABLE
+from exposition import parse
+from promql import Call, LabelMatcher, VectorSelector
+
+DEAD = 'dead'
+UNCOVERED = 'uncovered'
+
+ABSENT_FUNCTIONS = ('absent', 'absent_over_time')
+
+class Metric:
+    """Series of one metric name: count and label -> value -> posting list of series ids."""
+    __slots__ = ('count', 'postings')
+
+    def __init__(self):
+        self.count = 0
+        # Ids are added in increasing order; 4 bytes each instead of a set entry
+        self.postings: Dict[str, Dict[str, array]] = {}
+
+    def add(self, labels: Dict[str, str]):
+        series = self.count
+        self.count += 1
+        for name, value in labels.items():
+            values = self.postings.get(name)
+            if values is None:
+                values = self.postings[name] = {}
+            ids = values.get(value)
+            if ids is None:
+                ids = values[value] = array('I')
+            ids.append(series)
+
+class Finding:
+    """A selector that matches nothing (DEAD) or whose exporter the catalog has not seen (UNCOVERED)."""
+    __slots__ = ('kind', 'selector', 'reason')
+
+    def __init__(self, kind: str, selector: str, reason: str):
+        self.kind = kind
+        self.selector = selector
+        self.reason = reason
+
+class Catalog:
+    """Metrics, their label values and series postings."""
+    __slots__ = ('metrics', 'prefixes', 'recorded', '_seen', '_patterns', '_matched', '_selectors')
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.prefixes: Set[str] = set()
+        # Metrics produced by recording rules
+        self.recorded: Set[str] = set()
+        self._seen: Set[int] = set()
+        self._patterns: Dict[str, Optional[re.Pattern]] = {}
+        self._matched: Dict[Tuple[str, str, str, str], FrozenSet[int]] = {}
+        self._selectors: Dict[str, List[Finding]] = {}
+
+    @classmethod
+    def load(cls, *paths: Path) -> 'Catalog':
+        catalog = cls()
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                catalog.add_lines(f)
+        return catalog
+
+    def add_lines(self, lines: Iterable[str]):
+        """Add the series of exposition lines; a series seen twice (by the hash of its labels) is added once."""
+        seen = self._seen
+        for name, labels, _ in parse(lines):
+            key = hash((name,) + tuple(sorted(labels.items())))
+            if key in seen:
+                continue
+            seen.add(key)
+            if name not in self.metrics:
+                self.metrics[name] = Metric()
+                self.prefixes.add(prefix(name))
+            self.metrics[name].add(labels)
+        self._matched.clear()
+        self._selectors.clear()
+
+    def add_recorded(self, names: Iterable[str]):
+        self.recorded.update(names)
+        self.prefixes.update(prefix(name) for name in names)
+        self._selectors.clear()
+
+    def __len__(self):
+        return sum(metric.count for metric in self.metrics.values())
+
+    def covers(self, name: str) -> bool:
+        return name in self.metrics or name in self.recorded or prefix(name) in self.prefixes
+
+    # --- Checks ---
+
+    def check(self, expr: str) -> List[Finding]:
+        """Findings for every selector of a query; raises promql.PromQLSyntaxError for invalid ones."""
+        findings = []
+        for selector, absent in query_selectors(promql.parse(expr)):
+            findings.extend(self.check_selector(selector, absent))
+        return findings
+
+    def check_selector(self, selector: VectorSelector, absent: bool = False) -> List[Finding]:
+        """
+        Findings for one selector; inside absent() matching nothing is the
+        point, so only a metric that does not exist at all is reported.
+        """
+        key = ('absent:' if absent else '') + str(selector)
+        if key not in self._selectors:
+            self._selectors[key] = self._check_selector(selector, absent)
+        return self._selectors[key]
+
+    def _check_selector(self, selector: VectorSelector, absent: bool) -> List[Finding]:
+        text = str(selector)
+        name = selector.metric_name()
+        matchers = [] if absent else [m for m in selector.matchers
+                                      if m.name != '__name__' and not VARIABLE.search(m.value)]
+        if name is None:
+            names = [m for m in selector.matchers if m.name == '__name__' and not VARIABLE.search(m.value)]
+            if not names:
+                return []
+            candidates = [metric for metric in list(self.metrics) + sorted(self.recorded)
+                          if all(self.value_matches(m, metric) for m in names)]
+            if not candidates:
+                return [Finding(DEAD, text, f"no metric name matches {', '.join(map(str, names))}")]
+            if any(metric in self.recorded or not self.dead_matchers(metric, matchers) for metric in candidates):
+                return []
+            return [Finding(DEAD, text, f"none of {len(candidates)} metrics matching the name has series "
+                                        f"matching {', '.join(map(str, matchers))}")]
+        if name in self.recorded:
+            return []
+        if name not in self.metrics:
+            if not self.covers(name):
+                return [Finding(UNCOVERED, text, f"no {prefix(name)}_* metrics in the catalog")]
+            return [Finding(DEAD, text, f"metric {name} does not exist{self.suggestion(name)}")]
+        reason = self.dead_matchers(name, matchers)
+        return [Finding(DEAD, text, reason)] if reason else []
+
+    def dead_matchers(self, name: str, matchers: List[LabelMatcher]) -> Optional[str]:
+        """Why no series of a metric satisfies the matchers, or None."""
+        metric = self.metrics[name]
+        matched = []
+        for matcher in matchers:
+            series = self.matched(name, matcher)
+            if not series:
+                values = sorted(metric.postings.get(matcher.name, {}))
+                if not values:
+                    return f"{name} has no {matcher.name} label"
+                shown = ', '.join(values[:5]) + (f", ... ({len(values)} values)" if len(values) > 5 else '')
+                return f"no {name} series with {matcher} ({matcher.name}: {shown})"
+            matched.append(series)
+        matched.sort(key=len)
+        if len(matched) > 1 and not frozenset.intersection(*matched):
+            return f"no {name} series with {', '.join(map(str, matchers))} together"
+        return None
+
+    def matched(self, name: str, matcher: LabelMatcher) -> FrozenSet[int]:
+        """Ids of the metric's series the matcher selects, cached."""
+        key = (name, matcher.name, matcher.op, matcher.value)
+        if key in self._matched:
+            return self._matched[key]
+        metric = self.metrics[name]
+        values = metric.postings.get(matcher.name, {})
+        if matcher.op == '=' and matcher.value:
+            series = frozenset(values.get(matcher.value, ()))
+        else:
+            series = set()
+            for value, ids in values.items():
+                if self.value_matches(matcher, value):
+                    series.update(ids)
+            if self.value_matches(matcher, ''):
+                series |= set(range(metric.count)).difference(*values.values())
+            series = frozenset(series)
+        self._matched[key] = series
+        return series
+
+    def value_matches(self, matcher: LabelMatcher, value: str) -> bool:
+        if matcher.op in ('=', '!='):
+            return (value == matcher.value) == (matcher.op == '=')
+        pattern = self.pattern(matcher.value)
+        if pattern is None:
+            return True
+        return bool(pattern.match(value)) == (matcher.op == '=~')
+
+    def pattern(self, regex: str) -> Optional[re.Pattern]:
+        """Anchored pattern of a matcher regex; None for one Python cannot compile (assumed to match)."""
+        if regex not in self._patterns:
+            try:
+                self._patterns[regex] = re.compile(f"(?:{regex})\\Z", re.DOTALL)
+            except re.error:
+                self._patterns[regex] = None
+        return self._patterns[regex]
+
+    def suggestion(self, name: str) -> str:
+        names = [metric for metric in self.metrics if prefix(metric) == prefix(name)]
+        close = difflib.get_close_matches(name, names, n=2, cutoff=0.6)
+        return f" (did you mean {' or '.join(close)}?)" if close else ''
+
+def query_selectors(tree: promql.Node) -> List[Tuple[VectorSelector, bool]]:
+    """Every selector of a query, and whether it is inside absent() or absent_over_time()."""
+    found = []
+    stack = [(tree, False)]
+    while stack:
+        node, absent = stack.pop()
+        if isinstance(node, VectorSelector):
+            found.append((node, absent))
+            continue
+        absent = absent or (isinstance(node, Call) and node.func in ABSENT_FUNCTIONS)
+        stack.extend((child, absent) for child in reversed(node.children()))
+    return found
+
+def prefix(name: str) -> str:
+    return name.split('_', 1)[0]
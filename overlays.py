@@ -0,0 +1,191 @@
+"""
+Per-environment expansion of PrometheusRules and ServiceMonitor lists.
+
+An overlay is the document as it is deployed, written once, where list items
+that differ per environment are marked:
+
+    rules:
+      - $environments: '*'          # one copy per environment, in order
+        $patch:                     # merge patch (RFC 7386) for some of them
+          prod:
+            for: 5m
+        alert: QueueBacklog
+        expr: queue_messages{namespace="${namespace}"} > ${backlog_threshold}
+      - $environments: [prod]       # only some environments
+        alert: QueueCritical
+        ...
+      - alert: QueueStale           # everything else is emitted once, as is
+        expr: queue_age{namespace=~"${all:namespace}"} > 600
+
+The environments come from one file, one line each:
+
+    environments:
+      - {name: dev, namespace: n8n-dev, backlog_threshold: 200}
+      - {name: prod, namespace: n8n-prod, backlog_threshold: 500}
+
+Inside a marked item, `${key}` is the environment's value (see
+variants.compile_text). Anywhere, `${all:key}` is every environment's value
+as a regex alternation with the common prefix factored out, so
+`namespace=~"${all:namespace}"` becomes namespace=~"n8n-(dev|prod)".
+
+Each marked item is compiled once and rendered per environment, sharing
+every subtree without a placeholder with the overlay; a patch only copies
+the containers on its own paths. Expansion is linear in environments x
+items, and outputs must be treated as read-only.
+"""
+
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import variants
+
+ENVIRONMENTS_KEY = '$environments'
+PATCH_KEY = '$patch'
+ALL_ENVIRONMENTS = '*'
+ALL_PREFIX = 'all:'
+
+class OverlayError(ValueError):
+    """Raised for an invalid overlay or environments file."""
+
+class Environments:
+    """The environments every overlay is expanded for, in order."""
+    __slots__ = ('matrix', 'names', 'pattern')
+
+    def __init__(self, environments: List[Dict[str, Any]]):
+        matrix = variants.Matrix.load({'variants': environments})
+        keys = list(matrix.keys)
+        combined = {ALL_PREFIX + key: regex_union([str(env[key]) for env in environments if key in env])
+                    for key in keys}
+        self.matrix = variants.Matrix([dict(env, **combined) for env in environments])
+        self.names = [env['name'] for env in environments]
+        self.pattern = variants.placeholder_pattern(self.matrix.keys)
+
+    @classmethod
+    def load(cls, document: Any) -> 'Environments':
+        if not isinstance(document, dict) or not isinstance(document.get('environments'), list):
+            raise OverlayError("environments file needs an 'environments' list")
+        try:
+            return cls(document['environments'])
+        except variants.MatrixError as e:
+            raise OverlayError(str(e).replace('variant', 'environment'))
+
+    def select(self, selector: Any) -> List[Dict[str, Any]]:
+        """Environments named by an item's $environments: '*' or a list of names."""
+        if selector == ALL_ENVIRONMENTS:
+            return self.matrix.variants
+        if not isinstance(selector, list):
+            raise OverlayError(f"{ENVIRONMENTS_KEY} must be '*' or a list of names, not {selector!r}")
+        unknown = [name for name in selector if name not in self.names]
+        if unknown:
+            raise OverlayError(f"unknown environments {', '.join(map(str, unknown))}")
+        return [env for env in self.matrix.variants if env['name'] in selector]
+
+    @property
+    def shared(self) -> Dict[str, Any]:
+        """The ${all:key} values, the same for every environment."""
+        first = self.matrix.variants[0] if self.matrix.variants else {}
+        return {key: value for key, value in first.items() if key.startswith(ALL_PREFIX)}
+
+def regex_union(values: List[str]) -> str:
+    """values as one regex alternation: ['n8n-dev', 'n8n-prod'] -> 'n8n-(dev|prod)'."""
+    values = list(dict.fromkeys(values))
+    if len(values) <= 1:
+        return values[0] if values else ''
+    prefix = os.path.commonprefix(values)
+    return f"{prefix}({'|'.join(value[len(prefix):] for value in values)})"
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """RFC 7386 merge patch, copying only the mappings on the patch's paths."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+class Item:
+    """A marked list item, compiled once for every environment it is expanded for."""
+    __slots__ = ('environments', 'body', 'renderer', 'patches')
+
+    def __init__(self, item: Dict[str, Any], environments: Environments):
+        self.environments = environments.select(item[ENVIRONMENTS_KEY])
+        self.body = {key: value for key, value in item.items() if key not in (ENVIRONMENTS_KEY, PATCH_KEY)}
+        self.renderer = variants.compile_value(self.body, environments.matrix, environments.pattern)
+        patches = item.get(PATCH_KEY) or {}
+        if not isinstance(patches, dict):
+            raise OverlayError(f"{PATCH_KEY} must map environment names to patches")
+        environments.select(list(patches))
+        self.patches = {name: (patch, variants.compile_value(patch, environments.matrix, environments.pattern))
+                        for name, patch in patches.items()}
+
+    def render(self) -> List[Any]:
+        out = []
+        for env in self.environments:
+            try:
+                document = self.renderer(env) if self.renderer else self.body
+                if env['name'] in self.patches:
+                    patch, renderer = self.patches[env['name']]
+                    document = merge_patch(document, renderer(env) if renderer else patch)
+            except KeyError as e:
+                raise OverlayError(f"environment {env['name']!r} has no value for {e}")
+            out.append(document)
+        return out
+
+def expand(node: Any, environments: Environments) -> Any:
+    """The overlay with every marked item expanded; unchanged subtrees are shared."""
+    substitute = shared_substitution(environments)
+    return expand_node(node, environments, substitute)
+
+def shared_substitution(environments: Environments) -> Callable[[str], str]:
+    shared = environments.shared
+    pattern = variants.placeholder_pattern(shared)
+
+    def substitute(text: str) -> str:
+        if '${' not in text:
+            return text
+        if pattern is not None:
+            text = pattern.sub(lambda m: str(shared[m.group(1)]), text)
+        if environments.pattern is not None:
+            match = environments.pattern.search(text)
+            if match:
+                raise OverlayError(f"${{{match.group(1)}}} outside an item with {ENVIRONMENTS_KEY}")
+        return text
+    return substitute
+
+def expand_node(node: Any, environments: Environments, substitute: Callable[[str], str]) -> Any:
+    if isinstance(node, str):
+        return substitute(node)
+    if isinstance(node, dict):
+        if ENVIRONMENTS_KEY in node or PATCH_KEY in node:
+            raise OverlayError(f"{ENVIRONMENTS_KEY} only marks items of a list")
+        expanded = {key: expand_node(value, environments, substitute) for key, value in node.items()}
+        return node if all(expanded[key] is node[key] for key in node) else expanded
+    if isinstance(node, list):
+        expanded: List[Any] = []
+        changed = False
+        for item in node:
+            if isinstance(item, dict) and ENVIRONMENTS_KEY in item:
+                expanded.extend(Item(item, environments).render())
+                changed = True
+            else:
+                value = expand_node(item, environments, substitute)
+                changed = changed or value is not item
+                expanded.append(value)
+        return expanded if changed else node
+    return node
+
+def leading_comments(text: str) -> List[str]:
+    """The comment lines at the top of an overlay, carried over to its output."""
+    lines = []
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            break
+        lines.append(line)
+    return lines
+
+def output_header(source: str, comments: Optional[List[str]] = None) -> str:
+    header = [f"# Generated by expand-overlays.py from {source} - do not edit"]
+    return '\n'.join(header + (comments or [])) + '\n'
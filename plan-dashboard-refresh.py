@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Model the Prometheus load of the dashboards under helm/dashboards/ on
+auto-refresh, and propose refresh intervals and collapsed rows that fit a
+queries-per-second budget.
+
+For every dashboard, reports the queries and estimated samples per refresh,
+the queries and samples per second with --viewers browsers open on it, and
+the range queries of stat/gauge/pie panels that could be instant queries.
+If the total is over --budget, the planner (see refresh_load.py) lengthens
+refresh intervals up to --max-refresh and collapses rows, keeping the first
+--keep-open rows of each dashboard expanded, and lists the changes. --write
+applies them to the dashboard files. Exits with status 1 when the budget
+cannot be met.
+
+--compare LOG checks the model against the queries a Grafana instance
+actually sent to fake-prometheus.py, per dashboard uid, for the viewer
+counts given.
+
+Usage:
+    python plan-dashboard-refresh.py [--viewers 5] [--viewers aks-cluster=20] [--budget 10] [--max-refresh 5m]
+                                     [--keep-open 1] [--write] [--compare fake-prometheus.jsonl]
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+import dashboards
+import promql
+import query_cost
+import refresh_load
+
+DEFAULT_BUDGET = 10.0
+DEFAULT_MAX_REFRESH = '5m'
+
+def parse_viewers(values: List[str]) -> Dict[str, int]:
+    """--viewers N or uid=N into {uid: viewers}, '*' for every other dashboard."""
+    viewers = {'*': 1}
+    for value in values:
+        uid, sep, count = value.rpartition('=')
+        try:
+            viewers[uid if sep else '*'] = int(count)
+        except ValueError:
+            raise SystemExit(f"✗ --viewers expects N or uid=N, got {value!r}")
+    return viewers
+
+def compare(plans: List[refresh_load.Plan], log_file: Path):
+    """Modelled vs observed queries per second, per dashboard uid in the fake Prometheus log."""
+    with open(log_file, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if len(entries) < 2:
+        print(f"\n⚠️  {log_file} has fewer than two queries, nothing to compare")
+        return
+    times = [entry['time'] for entry in entries]
+    span = max(times) - min(times)
+    observed = Counter(entry.get('dashboard') for entry in entries)
+    print(f"\n● Observed over {span:.0f}s in {log_file} (queries/s modelled / observed)")
+    for plan in plans:
+        if plan.dashboard.uid in observed:
+            print(f"    {plan.dashboard.uid:<32} {plan.dashboard.qps(plan.viewers):>8.2f} "
+                  f"{observed.pop(plan.dashboard.uid) / span:>8.2f}")
+    for uid, count in observed.most_common():
+        print(f"    {uid or '(no dashboard)':<32} {'-':>8} {count / span:>8.2f}")
+
+def write_plans(plans: List[refresh_load.Plan]) -> int:
+    written = 0
+    for plan in plans:
+        if not plan.changes():
+            continue
+        dashboard, style = dashboards.load(plan.dashboard.path)
+        if plan.refresh != plan.dashboard.refresh:
+            dashboard['refresh'] = refresh_load.format_interval(plan.refresh)
+        titles = [plan.dashboard.sections[i].title for i in plan.collapsed - plan.dashboard.collapsed()]
+        refresh_load.collapse_rows(dashboard, titles)
+        if dashboards.save(plan.dashboard.path, dashboard, style):
+            print(f"  ✓ {plan.dashboard.path}")
+            written += 1
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Model dashboard refresh load and plan refresh intervals.')
+    parser.add_argument('--viewers', action='append', default=[], metavar='N|UID=N',
+                        help='concurrent viewers of every dashboard, or of one dashboard uid (default 1)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help=f'Prometheus queries per second for all dashboards together (default {DEFAULT_BUDGET:g})')
+    parser.add_argument('--max-refresh', default=DEFAULT_MAX_REFRESH,
+                        help=f'longest refresh interval to propose (default {DEFAULT_MAX_REFRESH})')
+    parser.add_argument('--keep-open', type=int, default=1, metavar='N',
+                        help='rows at the top of each dashboard never to collapse (default 1)')
+    parser.add_argument('--viewport-width', type=int, default=refresh_load.VIEWPORT_WIDTH,
+                        help=f'screen width in pixels behind default maxDataPoints (default {refresh_load.VIEWPORT_WIDTH})')
+    parser.add_argument('--scrape-interval', type=float, default=query_cost.SCRAPE_INTERVAL,
+                        help=f'scrape interval in seconds (default: {query_cost.SCRAPE_INTERVAL})')
+    parser.add_argument('--write', action='store_true', help='apply the proposed changes to the dashboard files')
+    parser.add_argument('--compare', type=Path, metavar='LOG',
+                        help='compare the model with a query log written by fake-prometheus.py')
+    args = parser.parse_args()
+
+    viewers = parse_viewers(args.viewers)
+    max_refresh = promql.parse_duration(args.max_refresh)
+    if max_refresh is None:
+        raise SystemExit(f"✗ --max-refresh expects a duration like 5m, got {args.max_refresh!r}")
+
+    loads = refresh_load.load_dashboards(dashboards.DASHBOARD_ROOT, args.scrape_interval, args.viewport_width)
+    for load in loads:
+        for problem in load.skipped:
+            print(f"⚠️  Skipping {problem}")
+
+    plans, met = refresh_load.plan_refresh(loads, viewers, args.budget, max_refresh, args.keep_open)
+    current = sum(load.qps(plan.viewers) for load, plan in zip(loads, plans))
+
+    print(f"\nRefresh load of {len(loads)} dashboards\n")
+    print(f"{'refresh':>7}  {'viewers':>7}  {'queries':>7}  {'samples':>12}  {'queries/s':>9}  {'samples/s':>11}  dashboard")
+    for load, plan in zip(loads, plans):
+        samples = load.samples_per_refresh()
+        samples_per_second = plan.viewers * samples / load.refresh if load.refresh else 0.0
+        print(f"{refresh_load.format_interval(load.refresh):>7}  {plan.viewers:>7}  {load.queries_per_refresh():>7}  "
+              f"{samples:>12,.0f}  {load.qps(plan.viewers):>9.2f}  {samples_per_second:>11,.0f}  {load.path}")
+        candidates = sum(panel.instant_candidates for section in load.loaded() for panel in section.panels)
+        if candidates:
+            print(f"{'':>61}- {candidates} range queries in stat/gauge/pie panels could be instant")
+    print(f"\nTotal {current:.2f} queries/s, budget {args.budget:g}")
+
+    changed = [plan for plan in plans if plan.changes()]
+    if changed:
+        print(f"\n● Proposed changes ({sum(plan.qps for plan in plans):.2f} queries/s)")
+        for plan in changed:
+            print(f"  {plan.dashboard.path}: {plan.qps:.2f} queries/s")
+            for change in plan.changes():
+                print(f"    - {change}")
+        if args.write:
+            print(f"\n{write_plans(changed)} dashboards updated")
+
+    if args.compare:
+        compare(plans, args.compare)
+
+    if not met:
+        print(f"\n✗ No plan within --max-refresh {args.max_refresh} and --keep-open {args.keep_open} "
+              f"fits {args.budget:g} queries/s")
+        sys.exit(1)
+    print("\n✅ Refresh load within budget")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Opt-in phase timings and fallback counters, saved as a Chrome trace.
+
+A Profiler records nested phases (`with profiler.phase('parse', file=...)`)
+as complete ('X') events and fallbacks (`profiler.count('default_threshold')`)
+as instant ('i') events tagged with the phase they happened in. The saved
+file is Chrome's JSON trace format: chrome://tracing, https://ui.perfetto.dev
+and speedscope load it as a timeline or flamegraph. Alongside traceEvents it
+carries a summary (total time and calls per phase, count per fallback) and
+the list of fallbacks with where they happened, for reading without a viewer.
+
+Code that is profiled takes the module-level NULL profiler by default, whose
+phase() and count() do nothing, so the hot path costs one call when
+profiling is off.
+
+Usage:
+    profiler = Profiler()
+    with profiler.phase('file', file='n8n.yaml'):
+        ...
+        profiler.count('default_threshold')
+    profiling.save(Path('profile.json'), profiler.events)
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+class _Phase:
+    """One open phase; emits its complete event on exit."""
+    __slots__ = ('profiler', 'name', 'args', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str, args: Dict[str, Any]):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.profiler.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.stack.pop()
+        self.profiler.close(self, end)
+        return False
+
+class Profiler:
+    """Collects trace events for one process."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.events: List[Dict[str, Any]] = []
+        self.stack: List[_Phase] = []
+
+    @staticmethod
+    def _us(t: float) -> float:
+        # perf_counter is system-wide monotonic time, so events of worker
+        # processes line up with the parent's
+        return round(t * 1e6, 3)
+
+    def phase(self, name: str, **args) -> _Phase:
+        return _Phase(self, name, args)
+
+    def close(self, phase: _Phase, end: float):
+        event = {'name': phase.name, 'cat': 'phase', 'ph': 'X', 'ts': self._us(phase.start),
+                 'dur': round((end - phase.start) * 1e6, 3), 'pid': self.pid, 'tid': self.tid}
+        if phase.args:
+            event['args'] = phase.args
+        self.events.append(event)
+
+    def context(self) -> Dict[str, Any]:
+        """Arguments of every open phase, innermost last."""
+        merged: Dict[str, Any] = {}
+        for phase in self.stack:
+            merged.update(phase.args)
+        return merged
+
+    def count(self, name: str, **args):
+        """Record one fallback, tagged with the open phases' arguments."""
+        self.events.append({'name': name, 'cat': 'fallback', 'ph': 'i', 's': 't',
+                            'ts': self._us(time.perf_counter()), 'pid': self.pid, 'tid': self.tid,
+                            'args': {**self.context(), **args}})
+
+class NullProfiler:
+    """Profiler that records nothing."""
+    __slots__ = ()
+
+    class _NullPhase:
+        __slots__ = ()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    _PHASE = _NullPhase()
+
+    def __bool__(self):
+        return False
+
+    def phase(self, name: str, **args):
+        return self._PHASE
+
+    def count(self, name: str, **args):
+        pass
+
+NULL = NullProfiler()
+
+def summarize(events: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, float]], Dict[str, int]]:
+    """(phase -> {calls, total_ms, max_ms}, fallback -> count) over trace events."""
+    phases: Dict[str, Dict[str, float]] = {}
+    counters: Dict[str, int] = {}
+    for event in events:
+        if event['ph'] == 'X':
+            entry = phases.setdefault(event['name'], {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['calls'] += 1
+            entry['total_ms'] += event['dur'] / 1000
+            entry['max_ms'] = max(entry['max_ms'], event['dur'] / 1000)
+        elif event['ph'] == 'i':
+            counters[event['name']] = counters.get(event['name'], 0) + 1
+    for entry in phases.values():
+        entry['total_ms'] = round(entry['total_ms'], 3)
+        entry['max_ms'] = round(entry['max_ms'], 3)
+    return phases, counters
+
+def save(path: Path, events: List[Dict[str, Any]], metadata: Optional[Dict[str, Any]] = None):
+    """Write events (from one or more Profilers) as a Chrome trace with a summary."""
+    phases, counters = summarize(events)
+    trace = {
+        'traceEvents': events,
+        'displayTimeUnit': 'ms',
+        'otherData': metadata or {},
+        'summary': {'phases': phases, 'fallbacks': counters},
+        'fallbacks': [{'fallback': e['name'], **e.get('args', {})} for e in events if e['ph'] == 'i'],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=1)
+        f.write('\n')
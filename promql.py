@@ -0,0 +1,770 @@
+"""
+PromQL tokenizer, parser and AST shared by the alert and dashboard tooling.
+
+parse() turns an expression into a tree of slotted nodes once and memoizes
+the result, so every later pass (threshold extraction, label rewriting, cost
+analysis, dedup) is a tree walk instead of another regex scan. Trees are
+shared between callers and must be treated as read-only.
+
+Every node records the [start, end) offsets of the source text it was parsed
+from. Rewrites that need to keep the author's formatting edit those spans in
+the original string (see replace_spans); str(node) gives a canonical
+single-line rendering instead.
+
+Grafana template variables ($namespace, ${var}, $__rate_interval) are accepted
+wherever a number, duration or expression may appear.
+
+Usage:
+    from promql import parse, walk, VectorSelector
+    tree = parse('sum(rate(x{job="a"}[5m])) by (pod) > 1')
+    metrics = {n.name for n in walk(tree) if isinstance(n, VectorSelector)}
+"""
+
+import copy
+import re
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+AGGREGATORS = frozenset({
+    'sum', 'avg', 'count', 'min', 'max', 'group', 'stddev', 'stdvar',
+    'topk', 'bottomk', 'quantile', 'count_values', 'limitk', 'limit_ratio',
+})
+
+# Aggregators whose first argument is a parameter rather than the vector
+PARAMETRIC_AGGREGATORS = frozenset({'topk', 'bottomk', 'quantile', 'count_values', 'limitk', 'limit_ratio'})
+
+COMPARISON_OPERATORS = frozenset({'==', '!=', '>', '<', '>=', '<='})
+SET_OPERATORS = frozenset({'and', 'or', 'unless'})
+
+# Binary operator precedence, lowest first. '^' is right-associative.
+PRECEDENCE = {
+    'or': 1,
+    'and': 2, 'unless': 2,
+    '==': 3, '!=': 3, '>': 3, '<': 3, '>=': 3, '<=': 3,
+    '+': 4, '-': 4,
+    '*': 5, '/': 5, '%': 5, 'atan2': 5,
+    '^': 6,
+}
+
+KEYWORDS = frozenset({
+    'and', 'or', 'unless', 'atan2', 'by', 'without', 'on', 'ignoring',
+    'group_left', 'group_right', 'bool', 'offset',
+})
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+class PromQLSyntaxError(ValueError):
+    """Raised when an expression cannot be parsed."""
+
+    def __init__(self, message: str, expr: str, pos: int):
+        super().__init__(f"{message} at position {pos}: {expr[max(0, pos - 20):pos + 20]!r}")
+        self.expr = expr
+        self.pos = pos
+
+# --- Tokenizer --------------------------------------------------------------
+
+TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+|\#[^\n]*)
+  | (?P<duration>(?:\d+(?:ms|[smhdwy]))+(?![\w.]))
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![\w.])|(?i:inf|nan)(?![\w:]))
+  | (?P<variable>\$\{[^}]+\}|\$\w+|\[\[\w+\]\])
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`]*`)
+  | (?P<ident>[a-zA-Z_][\w:]*)
+  | (?P<op>==|!=|>=|<=|=~|!~|[-+*/%^<>=,(){}\[\]:@])
+''', re.VERBOSE)
+
+class Token:
+    __slots__ = ('kind', 'text', 'start', 'end')
+
+    def __init__(self, kind: str, text: str, start: int, end: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r})"
+
+def tokenize(expr: str) -> List[Token]:
+    """Split an expression into tokens, dropping whitespace and comments."""
+    tokens = []
+    pos = 0
+    while pos < len(expr):
+        match = TOKEN_RE.match(expr, pos)
+        if not match:
+            raise PromQLSyntaxError(f"unexpected character {expr[pos]!r}", expr, pos)
+        kind = match.lastgroup
+        text = match.group()
+        if kind == 'ident' and text.lower() in KEYWORDS:
+            # Keywords are case-insensitive ('OR' == 'or')
+            text = text.lower()
+        if kind != 'ws':
+            tokens.append(Token(kind, text, match.start(), match.end()))
+        pos = match.end()
+    tokens.append(Token('eof', '', len(expr), len(expr)))
+    return tokens
+
+def unquote(text: str) -> str:
+    """Decode a PromQL string literal (Go-style escapes in "..." and '...')."""
+    if text[0] == '`':
+        return text[1:-1]
+    body = text[1:-1]
+    if '\\' not in body:
+        return body
+    return body.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+def parse_duration(text: str) -> Optional[float]:
+    """Duration literal ('1h30m') in seconds, or None for template variables."""
+    if text.startswith('$') or text.startswith('[['):
+        return None
+    return sum(int(n) * DURATION_UNITS[unit] for n, unit in re.findall(r'(\d+)(ms|[smhdwy])', text))
+
+# --- AST --------------------------------------------------------------------
+
+class Node:
+    """Base class for AST nodes; start/end are offsets into the source text."""
+    __slots__ = ('start', 'end')
+    fields: Tuple[str, ...] = ()
+    # Fields holding child nodes (or tuples of them), used by transform()
+    child_fields: Tuple[str, ...] = ()
+
+    def children(self) -> Sequence['Node']:
+        return ()
+
+    def replace(self, **changes) -> 'Node':
+        """Shallow copy with some fields replaced (nodes are never mutated)."""
+        node = copy.copy(self)
+        for name, value in changes.items():
+            setattr(node, name, value)
+        return node
+
+    def __repr__(self):
+        args = ', '.join(f"{f}={getattr(self, f)!r}" for f in self.fields)
+        return f"{type(self).__name__}({args})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.fields)
+
+    def __hash__(self):
+        return hash((type(self).__name__,) + tuple(getattr(self, f) for f in self.fields))
+
+class NumberLiteral(Node):
+    __slots__ = ('value', 'text')
+    fields = ('value',)
+
+    def __init__(self, value: float, text: str):
+        self.value = value
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+class StringLiteral(Node):
+    __slots__ = ('value',)
+    fields = ('value',)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def __str__(self):
+        return quote(self.value)
+
+class Variable(Node):
+    """A Grafana template variable used as an expression ($threshold)."""
+    __slots__ = ('name',)
+    fields = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+class LabelMatcher(Node):
+    __slots__ = ('name', 'op', 'value')
+    fields = ('name', 'op', 'value')
+
+    def __init__(self, name: str, op: str, value: str):
+        self.name = name
+        self.op = op
+        self.value = value
+
+    def __str__(self):
+        return f"{self.name}{self.op}{quote(self.value)}"
+
+class VectorSelector(Node):
+    __slots__ = ('name', 'matchers', 'offset', 'at')
+    fields = ('name', 'matchers', 'offset', 'at')
+    child_fields = ('matchers',)
+
+    def __init__(self, name: Optional[str], matchers: Tuple[LabelMatcher, ...],
+                 offset: Optional[str] = None, at: Optional[str] = None):
+        self.name = name
+        self.matchers = matchers
+        self.offset = offset
+        self.at = at
+
+    def children(self):
+        return self.matchers
+
+    def metric_name(self) -> Optional[str]:
+        """The metric name, including one given as {__name__="..."}."""
+        if self.name:
+            return self.name
+        for m in self.matchers:
+            if m.name == '__name__' and m.op == '=':
+                return m.value
+        return None
+
+    def __str__(self):
+        text = self.name or ''
+        if self.matchers or not self.name:
+            text += '{' + ', '.join(str(m) for m in self.matchers) + '}'
+        return text + modifiers(self.offset, self.at)
+
+class MatrixSelector(Node):
+    __slots__ = ('vector', 'range')
+    fields = ('vector', 'range')
+    child_fields = ('vector',)
+
+    def __init__(self, vector: VectorSelector, range: str):
+        self.vector = vector
+        self.range = range
+
+    def children(self):
+        return (self.vector,)
+
+    @property
+    def range_seconds(self) -> Optional[float]:
+        return parse_duration(self.range)
+
+    def __str__(self):
+        inner = VectorSelector(self.vector.name, self.vector.matchers)
+        return f"{inner}[{self.range}]" + modifiers(self.vector.offset, self.vector.at)
+
+class SubqueryExpr(Node):
+    __slots__ = ('expr', 'range', 'step', 'offset', 'at')
+    fields = ('expr', 'range', 'step', 'offset', 'at')
+    child_fields = ('expr',)
+
+    def __init__(self, expr: Node, range: str, step: Optional[str],
+                 offset: Optional[str] = None, at: Optional[str] = None):
+        self.expr = expr
+        self.range = range
+        self.step = step
+        self.offset = offset
+        self.at = at
+
+    def children(self):
+        return (self.expr,)
+
+    @property
+    def range_seconds(self) -> Optional[float]:
+        return parse_duration(self.range)
+
+    def __str__(self):
+        return f"{self.expr}[{self.range}:{self.step or ''}]" + modifiers(self.offset, self.at)
+
+class Call(Node):
+    __slots__ = ('func', 'args')
+    fields = ('func', 'args')
+    child_fields = ('args',)
+
+    def __init__(self, func: str, args: Tuple[Node, ...]):
+        self.func = func
+        self.args = args
+
+    def children(self):
+        return self.args
+
+    def __str__(self):
+        return f"{self.func}({', '.join(str(a) for a in self.args)})"
+
+class AggregateExpr(Node):
+    __slots__ = ('op', 'expr', 'param', 'grouping', 'without')
+    fields = ('op', 'expr', 'param', 'grouping', 'without')
+    child_fields = ('param', 'expr')
+
+    def __init__(self, op: str, expr: Node, param: Optional[Node] = None,
+                 grouping: Optional[Tuple[str, ...]] = None, without: bool = False):
+        self.op = op
+        self.expr = expr
+        self.param = param
+        self.grouping = grouping
+        self.without = without
+
+    def children(self):
+        return (self.param, self.expr) if self.param is not None else (self.expr,)
+
+    def __str__(self):
+        text = self.op
+        if self.grouping is not None:
+            text += f" {'without' if self.without else 'by'} ({', '.join(self.grouping)})"
+        args = f"{self.param}, {self.expr}" if self.param is not None else str(self.expr)
+        return f"{text} ({args})"
+
+class VectorMatching:
+    """on()/ignoring() and group_left()/group_right() modifiers of a binary op."""
+    __slots__ = ('on', 'labels', 'group', 'include')
+
+    def __init__(self, on: bool, labels: Tuple[str, ...], group: Optional[str] = None,
+                 include: Tuple[str, ...] = ()):
+        self.on = on
+        self.labels = labels
+        self.group = group
+        self.include = include
+
+    def __eq__(self, other):
+        return isinstance(other, VectorMatching) and (self.on, self.labels, self.group, self.include) == \
+            (other.on, other.labels, other.group, other.include)
+
+    def __hash__(self):
+        return hash((self.on, self.labels, self.group, self.include))
+
+    def __repr__(self):
+        return f"VectorMatching(on={self.on}, labels={self.labels}, group={self.group!r}, include={self.include})"
+
+    def __str__(self):
+        text = f"{'on' if self.on else 'ignoring'} ({', '.join(self.labels)})"
+        if self.group:
+            text += f" group_{self.group} ({', '.join(self.include)})"
+        return text
+
+class BinaryExpr(Node):
+    __slots__ = ('op', 'lhs', 'rhs', 'return_bool', 'matching')
+    fields = ('op', 'lhs', 'rhs', 'return_bool', 'matching')
+    child_fields = ('lhs', 'rhs')
+
+    def __init__(self, op: str, lhs: Node, rhs: Node, return_bool: bool = False,
+                 matching: Optional[VectorMatching] = None):
+        self.op = op
+        self.lhs = lhs
+        self.rhs = rhs
+        self.return_bool = return_bool
+        self.matching = matching
+
+    def children(self):
+        return (self.lhs, self.rhs)
+
+    @property
+    def is_comparison(self) -> bool:
+        return self.op in COMPARISON_OPERATORS
+
+    def __str__(self):
+        op = self.op
+        if self.return_bool:
+            op += ' bool'
+        if self.matching:
+            op += f" {self.matching}"
+        return f"{self.lhs} {op} {self.rhs}"
+
+class UnaryExpr(Node):
+    __slots__ = ('op', 'expr')
+    fields = ('op', 'expr')
+    child_fields = ('expr',)
+
+    def __init__(self, op: str, expr: Node):
+        self.op = op
+        self.expr = expr
+
+    def children(self):
+        return (self.expr,)
+
+    def __str__(self):
+        return f"{self.op}{self.expr}"
+
+class ParenExpr(Node):
+    __slots__ = ('expr',)
+    fields = ('expr',)
+    child_fields = ('expr',)
+
+    def __init__(self, expr: Node):
+        self.expr = expr
+
+    def children(self):
+        return (self.expr,)
+
+    def __str__(self):
+        return f"({self.expr})"
+
+def quote(value: str) -> str:
+    """Render a string as a double-quoted PromQL literal."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+def modifiers(offset: Optional[str], at: Optional[str]) -> str:
+    text = ''
+    if offset:
+        text += f" offset {offset}"
+    if at:
+        text += f" @ {at}"
+    return text
+
+# --- Parser -----------------------------------------------------------------
+
+class Parser:
+    """Recursive-descent / precedence-climbing parser over a token list."""
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.tokens = tokenize(expr)
+        self.pos = 0
+
+    @property
+    def tok(self) -> Token:
+        return self.tokens[self.pos]
+
+    def peek(self, offset: int = 1) -> Token:
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def advance(self) -> Token:
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def error(self, message: str, tok: Optional[Token] = None):
+        tok = tok or self.tok
+        raise PromQLSyntaxError(message, self.expr, tok.start)
+
+    def expect(self, text: str) -> Token:
+        if self.tok.text != text or self.tok.kind not in ('op', 'ident'):
+            self.error(f"expected {text!r}, found {self.tok.text or 'end of input'!r}")
+        return self.advance()
+
+    def at_op(self, text: str) -> bool:
+        return self.tok.kind == 'op' and self.tok.text == text
+
+    def at_keyword(self, *words: str) -> bool:
+        return self.tok.kind == 'ident' and self.tok.text in words
+
+    def finish(self, node: Node, start: int) -> Node:
+        node.start = start
+        node.end = self.tokens[self.pos - 1].end
+        return node
+
+    def parse(self) -> Node:
+        node = self.parse_expr(0)
+        if self.tok.kind != 'eof':
+            self.error(f"unexpected {self.tok.text!r}")
+        return node
+
+    def binary_operator(self) -> Optional[str]:
+        tok = self.tok
+        if tok.kind == 'op' and tok.text in PRECEDENCE:
+            return tok.text
+        if tok.kind == 'ident' and tok.text in ('and', 'or', 'unless', 'atan2'):
+            return tok.text
+        return None
+
+    def parse_expr(self, min_prec: int) -> Node:
+        start = self.tok.start
+        lhs = self.parse_unary()
+        while True:
+            op = self.binary_operator()
+            if op is None or PRECEDENCE[op] < min_prec:
+                return lhs
+            self.advance()
+            return_bool = False
+            if self.at_keyword('bool'):
+                if op not in COMPARISON_OPERATORS:
+                    self.error("bool modifier is only allowed on comparison operators")
+                self.advance()
+                return_bool = True
+            matching = self.parse_vector_matching()
+            prec = PRECEDENCE[op]
+            rhs = self.parse_expr(prec if op == '^' else prec + 1)
+            lhs = self.finish(BinaryExpr(op, lhs, rhs, return_bool, matching), start)
+
+    def parse_vector_matching(self) -> Optional[VectorMatching]:
+        if not self.at_keyword('on', 'ignoring'):
+            return None
+        on = self.advance().text == 'on'
+        labels = self.parse_label_list()
+        group = None
+        include = ()
+        if self.at_keyword('group_left', 'group_right'):
+            group = self.advance().text[len('group_'):]
+            if self.at_op('('):
+                include = self.parse_label_list()
+        return VectorMatching(on, labels, group, include)
+
+    def parse_label_list(self) -> Tuple[str, ...]:
+        self.expect('(')
+        labels = []
+        while not self.at_op(')'):
+            if self.tok.kind != 'ident':
+                self.error("expected label name")
+            labels.append(self.advance().text)
+            if not self.at_op(','):
+                break
+            self.advance()
+        self.expect(')')
+        return tuple(labels)
+
+    def parse_unary(self) -> Node:
+        if self.tok.kind == 'op' and self.tok.text in ('-', '+'):
+            start = self.tok.start
+            op = self.advance().text
+            # Unary minus binds tighter than * but looser than ^
+            operand = self.parse_expr(PRECEDENCE['^'])
+            if isinstance(operand, NumberLiteral) and operand.start == start + 1:
+                number = NumberLiteral(-operand.value if op == '-' else operand.value, op + operand.text)
+                return self.finish(number, start)
+            return self.finish(UnaryExpr(op, operand), start)
+        return self.parse_postfix(self.parse_primary())
+
+    def parse_primary(self) -> Node:
+        tok = self.tok
+        start = tok.start
+        if tok.kind == 'number':
+            self.advance()
+            return self.finish(NumberLiteral(parse_number(tok.text), tok.text), start)
+        if tok.kind == 'string':
+            self.advance()
+            return self.finish(StringLiteral(unquote(tok.text)), start)
+        if tok.kind == 'variable':
+            self.advance()
+            return self.finish(Variable(tok.text), start)
+        if tok.kind == 'op' and tok.text == '(':
+            self.advance()
+            inner = self.parse_expr(0)
+            self.expect(')')
+            return self.finish(ParenExpr(inner), start)
+        if tok.kind == 'op' and tok.text == '{':
+            return self.finish(VectorSelector(None, self.parse_matchers()), start)
+        if tok.kind == 'ident' and tok.text not in KEYWORDS:
+            name = self.advance().text
+            if name in AGGREGATORS and (self.at_op('(') or self.at_keyword('by', 'without')):
+                return self.parse_aggregate(name, start)
+            if self.at_op('('):
+                return self.finish(Call(name, self.parse_args()), start)
+            matchers = self.parse_matchers() if self.at_op('{') else ()
+            return self.finish(VectorSelector(name, matchers), start)
+        self.error(f"unexpected {tok.text or 'end of input'!r}")
+
+    def parse_args(self) -> Tuple[Node, ...]:
+        self.expect('(')
+        args = []
+        while not self.at_op(')'):
+            args.append(self.parse_expr(0))
+            if not self.at_op(','):
+                break
+            self.advance()
+        self.expect(')')
+        return tuple(args)
+
+    def parse_aggregate(self, op: str, start: int) -> Node:
+        grouping = None
+        without = False
+        if self.at_keyword('by', 'without'):
+            without = self.advance().text == 'without'
+            grouping = self.parse_label_list()
+        args = self.parse_args()
+        if self.at_keyword('by', 'without'):
+            if grouping is not None:
+                self.error("duplicate grouping clause")
+            without = self.advance().text == 'without'
+            grouping = self.parse_label_list()
+        expected = 2 if op in PARAMETRIC_AGGREGATORS else 1
+        if len(args) != expected:
+            self.error(f"{op} expects {expected} argument(s), got {len(args)}")
+        param = args[0] if expected == 2 else None
+        return self.finish(AggregateExpr(op, args[-1], param, grouping, without), start)
+
+    def parse_matchers(self) -> Tuple[LabelMatcher, ...]:
+        self.expect('{')
+        matchers = []
+        while not self.at_op('}'):
+            tok = self.tok
+            if tok.kind == 'string':
+                # Quoted metric name: {"metric.name", job="x"}
+                self.advance()
+                matcher = LabelMatcher('__name__', '=', unquote(tok.text))
+            else:
+                if tok.kind != 'ident':
+                    self.error("expected label name")
+                self.advance()
+                if not (self.tok.kind == 'op' and self.tok.text in ('=', '!=', '=~', '!~')):
+                    self.error("expected label matching operator")
+                op = self.advance().text
+                if self.tok.kind != 'string':
+                    self.error("expected label value string")
+                matcher = LabelMatcher(tok.text, op, unquote(self.advance().text))
+            matchers.append(self.finish(matcher, tok.start))
+            if not self.at_op(','):
+                break
+            self.advance()
+        self.expect('}')
+        return tuple(matchers)
+
+    def parse_duration_token(self) -> str:
+        if self.tok.kind not in ('duration', 'variable'):
+            self.error("expected duration")
+        return self.advance().text
+
+    def parse_postfix(self, node: Node) -> Node:
+        start = node.start
+        while True:
+            if self.at_op('['):
+                self.advance()
+                range_ = self.parse_duration_token()
+                if self.at_op(':'):
+                    self.advance()
+                    step = None if self.at_op(']') else self.parse_duration_token()
+                    self.expect(']')
+                    node = self.finish(SubqueryExpr(node, range_, step), start)
+                else:
+                    self.expect(']')
+                    if not isinstance(node, VectorSelector) or node.offset or node.at:
+                        self.error("range selector must follow a plain vector selector")
+                    node = self.finish(MatrixSelector(node, range_), start)
+            elif self.at_keyword('offset') or self.at_op('@'):
+                node = self.parse_modifier(node, start)
+            else:
+                return node
+
+    def parse_modifier(self, node: Node, start: int) -> Node:
+        target = node.vector if isinstance(node, MatrixSelector) else node
+        if not isinstance(target, (VectorSelector, SubqueryExpr)):
+            self.error("offset and @ modifiers must follow a selector or subquery")
+        if self.advance().text == 'offset':
+            sign = self.advance().text if self.at_op('-') else ''
+            target.offset = sign + self.parse_duration_token()
+        else:
+            if self.tok.kind in ('number', 'variable'):
+                target.at = self.advance().text
+            elif self.at_keyword('start', 'end'):
+                target.at = self.advance().text + '()'
+                self.expect('(')
+                self.expect(')')
+            else:
+                self.error("expected timestamp after @")
+        return self.finish(node, start)
+
+def parse_number(text: str) -> float:
+    if text[:2].lower() == '0x':
+        return float(int(text, 16))
+    return float(text)
+
+# --- Public API -------------------------------------------------------------
+
+@lru_cache(maxsize=8192)
+def parse(expr: str) -> Node:
+    """
+    Parse a PromQL expression into an AST.
+
+    Results are memoized per expression string; callers share the returned
+    tree and must not mutate it.
+    """
+    return Parser(expr).parse()
+
+def walk(node: Node) -> Iterator[Node]:
+    """Yield node and all of its descendants, depth first, in source order."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(current.children()))
+
+def transform(node: Node, fn) -> Node:
+    """
+    Rebuild a tree bottom-up, replacing nodes for which fn returns a node.
+
+    fn is called on every node after its children were transformed and
+    returns a replacement or None to keep it. Unchanged subtrees are shared
+    with the input tree.
+    """
+    changes = {}
+    for field in node.child_fields:
+        value = getattr(node, field)
+        if value is None:
+            continue
+        if isinstance(value, tuple):
+            new_value = tuple(transform(child, fn) for child in value)
+            if any(a is not b for a, b in zip(new_value, value)):
+                changes[field] = new_value
+        else:
+            new_value = transform(value, fn)
+            if new_value is not value:
+                changes[field] = new_value
+    if changes:
+        node = node.replace(**changes)
+    replacement = fn(node)
+    return node if replacement is None else replacement
+
+def selectors(node: Node) -> List[VectorSelector]:
+    """Every vector selector in the tree, including those inside range selectors."""
+    return [n for n in walk(node) if isinstance(n, VectorSelector)]
+
+def unwrap_parens(node: Node) -> Node:
+    """Strip any number of enclosing parentheses."""
+    while isinstance(node, ParenExpr):
+        node = node.expr
+    return node
+
+def scalar_value(node: Node) -> Optional[float]:
+    """Numeric value of a literal (possibly parenthesized or negated), else None."""
+    node = unwrap_parens(node)
+    if isinstance(node, NumberLiteral):
+        return node.value
+    if isinstance(node, UnaryExpr):
+        inner = scalar_value(node.expr)
+        if inner is not None:
+            return -inner if node.op == '-' else inner
+    return None
+
+FLIPPED_COMPARISONS = {'>': '<', '<': '>', '>=': '<=', '<=': '>=', '==': '==', '!=': '!='}
+
+def threshold_comparison(node: Node) -> Optional[Tuple[Node, str, Node]]:
+    """
+    Split a comparison against a scalar literal into (vector side, op, literal).
+
+    Handles enclosing parentheses, the bool modifier and a literal on the
+    left-hand side ('5 < x' is returned as (x, '>', 5)). Returns None when the
+    node is not such a comparison.
+    """
+    node = unwrap_parens(node)
+    if not isinstance(node, BinaryExpr) or not node.is_comparison:
+        return None
+    if scalar_value(node.rhs) is not None and scalar_value(node.lhs) is None:
+        return node.lhs, node.op, node.rhs
+    if scalar_value(node.lhs) is not None and scalar_value(node.rhs) is None:
+        return node.rhs, FLIPPED_COMPARISONS[node.op], node.lhs
+    return None
+
+PLAIN_DECIMAL = re.compile(r'-?\d+(?:\.\d+)?')
+
+def scalar_text(node: Node) -> str:
+    """
+    Text of a scalar literal for use outside PromQL (e.g. Grafana math).
+
+    Plain decimals keep the author's spelling ('0.90'); hex, scientific
+    notation, parentheses and unary signs are normalized ('1e3' -> '1000').
+    """
+    literal = unwrap_parens(node)
+    if isinstance(literal, NumberLiteral) and PLAIN_DECIMAL.fullmatch(literal.text):
+        return literal.text
+    value = scalar_value(node)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return 'Inf' if value > 0 else '-Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def source(expr: str, node: Node) -> str:
+    """The exact source text a node was parsed from."""
+    return expr[node.start:node.end]
+
+def replace_spans(expr: str, edits: Sequence[Tuple[int, int, str]]) -> str:
+    """Apply non-overlapping (start, end, replacement) edits to expr."""
+    parts = []
+    pos = 0
+    for start, end, replacement in sorted(edits):
+        if start < pos:
+            raise ValueError(f"overlapping edit at position {start}")
+        parts.append(expr[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(expr[pos:])
+    return ''.join(parts)
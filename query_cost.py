@@ -0,0 +1,214 @@
+"""
+Static cost estimates for the PromQL queries run by alerts and dashboards.
+
+The estimate counts roughly how many samples Prometheus has to read for one
+evaluation of a query:
+
+    cost = steps x sum(series factor x samples per series, for every selector)
+
+- steps: 1 for instant queries, otherwise the query range divided by the step
+  Grafana picks (max of intervalMs, the panel's min interval and
+  range / maxDataPoints).
+- samples per series: a range selector reads its window divided by the scrape
+  interval, an instant selector one sample; subqueries multiply their inner
+  cost by the number of inner steps.
+- series factor: how much of the index a selector is likely to match. A
+  selector without label filters, negative matchers and unanchored regex
+  matchers (pod=~".*worker.*") each multiply it.
+
+The numbers are relative, not a prediction of query latency. They are meant
+for ranking queries and for a budget gate (see check-query-cost.py).
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import dashboards
+import promql
+import yaml_io
+from promql import LabelMatcher, MatrixSelector, Node, SubqueryExpr, VectorSelector
+
+# Matches the ServiceMonitors in servicemonitors/
+SCRAPE_INTERVAL = 30
+
+# Grafana's maxDataPoints for a panel is its width in pixels; assume a wide one
+DEFAULT_MAX_DATA_POINTS = 1000
+
+# Range shown by a dashboard without a time setting
+DEFAULT_DASHBOARD_RANGE = 6 * 3600
+
+# Series factors for selectors that hit a large part of the index
+UNFILTERED_FACTOR = 10
+NO_METRIC_NAME_FACTOR = 10
+NEGATIVE_MATCHER_FACTOR = 2
+UNANCHORED_REGEX_FACTOR = 3
+REGEX_FACTOR = 1.5
+
+UNANCHORED_REGEX = re.compile(r'^\.[*+]|\.[*+]$')
+
+RELATIVE_TIME = re.compile(r'^now-(\d+[smhdwy])$')
+
+class Cost:
+    """Estimated cost of one query evaluation and what drives it."""
+    __slots__ = ('total', 'steps', 'samples_per_step', 'reasons')
+
+    def __init__(self, total: float, steps: int, samples_per_step: float, reasons: List[str]):
+        self.total = total
+        self.steps = steps
+        self.samples_per_step = samples_per_step
+        self.reasons = reasons
+
+class Query:
+    """A PromQL query as Grafana or Prometheus runs it."""
+    __slots__ = ('source', 'expr', 'range', 'step', 'instant')
+
+    def __init__(self, source: str, expr: str, range: float, step: float, instant: bool):
+        self.source = source
+        self.expr = expr
+        # Seconds of data the query covers and seconds between evaluation steps
+        self.range = range
+        self.step = step
+        self.instant = instant
+
+    @property
+    def steps(self) -> int:
+        if self.instant or self.range <= 0:
+            return 1
+        return int(self.range // max(self.step, 1)) + 1
+
+def grafana_step(range_seconds: float, interval_ms: Optional[float], max_data_points: Optional[float],
+                 min_interval: float = 0) -> float:
+    """Step Grafana uses for a range query: the widest of its three limits."""
+    step = max((interval_ms or 0) / 1000, min_interval)
+    if max_data_points:
+        step = max(step, range_seconds / max_data_points)
+    return max(step, 1)
+
+def series_factor(selector: VectorSelector) -> Tuple[float, List[str]]:
+    """How many series a selector is likely to touch, relative to a well filtered one."""
+    factor = 1.0
+    reasons = []
+    name = selector.metric_name()
+    filters = [m for m in selector.matchers if m.name != '__name__']
+    if not name:
+        factor *= NO_METRIC_NAME_FACTOR
+        reasons.append(f"selector without metric name: {selector}")
+    elif not filters:
+        factor *= UNFILTERED_FACTOR
+        reasons.append(f"no label filter on {name}")
+    for matcher in filters:
+        if matcher.op in ('!=', '!~'):
+            factor *= NEGATIVE_MATCHER_FACTOR
+            reasons.append(f"negative matcher {matcher}")
+        elif matcher.op == '=~':
+            if UNANCHORED_REGEX.search(matcher.value):
+                factor *= UNANCHORED_REGEX_FACTOR
+                reasons.append(f"unanchored regex {matcher}")
+            else:
+                factor *= REGEX_FACTOR
+    return factor, reasons
+
+def resolve_range(text: str, query: Query, scrape_interval: float) -> float:
+    """Seconds covered by a range or subquery step, resolving Grafana's interval variables."""
+    seconds = promql.parse_duration(text)
+    if seconds is not None:
+        return seconds
+    name = text.strip('$[]{}')
+    if name == '__range':
+        return query.range
+    if name == '__interval':
+        return query.step
+    if name == '__rate_interval':
+        return max(4 * scrape_interval, query.step + scrape_interval)
+    return 4 * scrape_interval
+
+def samples(node: Node, query: Query, scrape_interval: float, reasons: List[str]) -> float:
+    """Samples read per evaluation step by the tree below node."""
+    if isinstance(node, MatrixSelector):
+        window = resolve_range(node.range, query, scrape_interval)
+        factor, why = series_factor(node.vector)
+        reasons.extend(why)
+        if window >= 86400:
+            reasons.append(f"{node.range} range on {node.vector.metric_name() or node.vector}")
+        return factor * max(window / scrape_interval, 1)
+    if isinstance(node, VectorSelector):
+        factor, why = series_factor(node)
+        reasons.extend(why)
+        return factor
+    if isinstance(node, SubqueryExpr):
+        window = resolve_range(node.range, query, scrape_interval)
+        step = resolve_range(node.step, query, scrape_interval) if node.step else scrape_interval
+        inner_steps = max(window / max(step, 1), 1)
+        reasons.append(f"subquery [{node.range}:{node.step or ''}] runs its expression {inner_steps:.0f} times")
+        return inner_steps * samples(node.expr, query, scrape_interval, reasons)
+    return sum(samples(child, query, scrape_interval, reasons) for child in node.children()
+               if not isinstance(child, LabelMatcher))
+
+def estimate(query: Query, scrape_interval: float = SCRAPE_INTERVAL) -> Cost:
+    """Estimate a query's cost; raises promql.PromQLSyntaxError for invalid expressions."""
+    reasons = []
+    per_step = samples(promql.parse(query.expr), query, scrape_interval, reasons)
+    steps = query.steps
+    if steps > 1:
+        reasons.insert(0, f"{steps} steps ({query.range:.0f}s range at {query.step:g}s)")
+    # Keep the first occurrence of each reason, in order
+    reasons = list(dict.fromkeys(reasons))
+    return Cost(steps * per_step, steps, per_step, reasons)
+
+# --- Query sources ----------------------------------------------------------
+
+def grafana_rule_queries(rule: Dict[str, Any], source: str) -> Iterator[Query]:
+    """Prometheus queries of a Grafana alert rule (server-side expressions excluded)."""
+    for data in rule.get('data') or []:
+        model = data.get('model') or {}
+        if data.get('datasourceUid') == '__expr__' or not model.get('expr'):
+            continue
+        window = data.get('relativeTimeRange') or {}
+        range_seconds = (window.get('from') or 0) - (window.get('to') or 0)
+        step = grafana_step(range_seconds, model.get('intervalMs'), model.get('maxDataPoints'))
+        instant = bool(model.get('instant')) or range_seconds <= 0
+        yield Query(f"{source}:{rule.get('title') or rule.get('uid')}", model['expr'], range_seconds, step, instant)
+
+def prometheus_rule_queries(prom_rule: Dict[str, Any], source: str) -> Iterator[Query]:
+    """Rules of a PrometheusRule, evaluated by Prometheus as instant queries."""
+    for group in prom_rule['spec']['groups']:
+        for rule in group.get('rules', []):
+            name = rule.get('alert') or rule.get('record')
+            yield Query(f"{source}:{name}", rule['expr'], 0, 0, True)
+
+def provisioning_queries(document: Dict[str, Any], source: str) -> Iterator[Query]:
+    """Queries in a Grafana alert provisioning file, a ConfigMap wrapping one, or a PrometheusRule."""
+    if not isinstance(document, dict):
+        return
+    if document.get('kind') == 'PrometheusRule':
+        yield from prometheus_rule_queries(document, source)
+    elif document.get('kind') == 'ConfigMap':
+        for text in (document.get('data') or {}).values():
+            yield from provisioning_queries(yaml_io.load(text), source)
+    else:
+        for group in document.get('groups') or []:
+            for rule in group.get('rules') or []:
+                yield from grafana_rule_queries(rule, source)
+
+def dashboard_range(dashboard: Dict[str, Any]) -> float:
+    """Default time range of a dashboard in seconds."""
+    match = RELATIVE_TIME.match(str((dashboard.get('time') or {}).get('from', '')))
+    return promql.parse_duration(match.group(1)) if match else DEFAULT_DASHBOARD_RANGE
+
+def dashboard_queries(dashboard: Dict[str, Any], source: str,
+                      scrape_interval: float = SCRAPE_INTERVAL) -> Iterator[Query]:
+    """Queries a dashboard runs when it is opened with its default time range."""
+    range_seconds = dashboard_range(dashboard)
+    for panel, target in dashboards.iter_targets(dashboard):
+        min_interval = resolve_min_interval(target.get('interval') or panel.get('interval'), scrape_interval)
+        step = grafana_step(range_seconds, None, panel.get('maxDataPoints') or DEFAULT_MAX_DATA_POINTS,
+                            min_interval)
+        yield Query(f"{source}:{panel.get('title', panel.get('id'))}", target['expr'], range_seconds, step,
+                    bool(target.get('instant')) and not target.get('range'))
+
+def resolve_min_interval(text: Optional[str], scrape_interval: float) -> float:
+    """A panel or target min interval ('1m', '>=30s'), defaulting to the scrape interval."""
+    if not text:
+        return scrape_interval
+    seconds = promql.parse_duration(text.lstrip('>='))
+    return seconds if seconds else scrape_interval
@@ -0,0 +1,229 @@
+"""
+Index of the PromQL queries dashboard panels send, to find the ones Prometheus
+is asked to run more than once per refresh.
+
+Expressions are indexed by a normalized form (parsed and re-rendered with
+sorted matchers, outer parentheses dropped), so whitespace, quoting and
+matcher order don't hide a duplicate. The index reports:
+
+- duplicates: the same normalized query with the same result options
+  (instant/range, format, interval, ...) in more than one target
+- near duplicates: queries that only differ in their matchers on
+  GENERALIZED_LABELS (namespace="$namespace" vs namespace=~"$namespace") or
+  in range durations ([5m] vs [$__rate_interval])
+- repeated subexpressions: the same expensive subexpression several times in
+  one query, e.g. a / (a + b), which no dashboard trick can share
+
+Within a dashboard, a panel whose queries are all sent by another panel can
+reuse that panel's results through Grafana's `-- Dashboard --` datasource
+(dashboard_datasource_plan()). Across dashboards the shared form is a
+recording rule (see recording_rules.py / extract-recording-rules.py).
+
+Usage:
+    index = QueryIndex()
+    index.add_dashboard(dashboard, 'infrastructure/rabbitmq.json')
+    index.duplicates()          # [[Use, ...], ...]
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import dashboards
+import promql
+import recording_rules
+from promql import LabelMatcher, MatrixSelector, Node, SubqueryExpr, VectorSelector
+
+# Grafana's dashboard datasource, which replays another panel's query results
+DASHBOARD_DATASOURCE = {'type': 'datasource', 'uid': '-- Dashboard --'}
+
+# Target and panel options that change what a query returns
+TARGET_RESULT_OPTIONS = ('instant', 'range', 'format', 'interval', 'intervalFactor', 'step', 'exemplar')
+PANEL_RESULT_OPTIONS = ('interval', 'maxDataPoints', 'timeFrom', 'timeShift', 'hideTimeOverride')
+
+GENERALIZED_RANGE = '$range'
+
+class Use:
+    """One target of one panel of one dashboard."""
+    __slots__ = ('path', 'panel', 'target', 'key')
+
+    def __init__(self, path: str, panel: Dict[str, Any], target: Dict[str, Any], key: str):
+        self.path = path
+        self.panel = panel
+        self.target = target
+        self.key = key
+
+    def __str__(self):
+        title = self.panel.get('title') or f"panel {self.panel.get('id')}"
+        return f"{self.path}: {title} [{self.target.get('refId', '?')}]"
+
+def normalize(tree: Node) -> str:
+    """Canonical text of an expression: matchers sorted, outer parentheses dropped."""
+    def sort_matchers(node: Node) -> Optional[Node]:
+        if isinstance(node, VectorSelector) and len(node.matchers) > 1:
+            ordered = tuple(sorted(node.matchers, key=lambda m: (m.name, m.op, m.value)))
+            if ordered != node.matchers:
+                return node.replace(matchers=ordered)
+        return None
+    return str(promql.unwrap_parens(promql.transform(tree, sort_matchers)))
+
+def generalize(tree: Node, labels: Sequence[str] = recording_rules.GENERALIZED_LABELS) -> str:
+    """normalize() with matcher values on labels and range durations blanked out."""
+    def blank(node: Node) -> Optional[Node]:
+        if isinstance(node, LabelMatcher) and node.name in labels:
+            return LabelMatcher(node.name, '=', '*')
+        if isinstance(node, MatrixSelector) and node.range != GENERALIZED_RANGE:
+            return node.replace(range=GENERALIZED_RANGE)
+        if isinstance(node, SubqueryExpr) and node.range != GENERALIZED_RANGE:
+            return node.replace(range=GENERALIZED_RANGE)
+        return None
+    return normalize(promql.transform(tree, blank))
+
+def result_options(panel: Dict[str, Any], target: Dict[str, Any]) -> Tuple:
+    """The options besides the expression that decide a target's result."""
+    return (tuple(target.get(k) for k in TARGET_RESULT_OPTIONS) +
+            tuple(panel.get(k) for k in PANEL_RESULT_OPTIONS))
+
+def repeated_subexpressions(tree: Node) -> List[Tuple[str, int]]:
+    """Expensive subexpressions found more than once in tree, outermost only."""
+    counts: Dict[str, int] = {}
+    for node in promql.walk(tree):
+        if recording_rules.is_candidate_shape(node) and recording_rules.is_expensive(node):
+            text = normalize(node)
+            counts[text] = counts.get(text, 0) + 1
+    repeated = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        text = normalize(node) if recording_rules.is_candidate_shape(node) else None
+        if counts.get(text, 0) > 1:
+            if (text, counts[text]) not in repeated:
+                repeated.append((text, counts[text]))
+            continue
+        stack.extend(reversed(node.children()))
+    return repeated
+
+class QueryIndex:
+    """Every dashboard target, by normalized and by generalized expression."""
+    __slots__ = ('labels', 'exact', 'similar', 'unparsed', 'repeated')
+
+    def __init__(self, labels: Sequence[str] = recording_rules.GENERALIZED_LABELS):
+        self.labels = tuple(labels)
+        self.exact: Dict[Tuple[str, Tuple], List[Use]] = {}
+        self.similar: Dict[str, List[Use]] = {}
+        self.unparsed: List[Use] = []
+        self.repeated: List[Tuple[Use, List[Tuple[str, int]]]] = []
+
+    def add_dashboard(self, dashboard: Dict[str, Any], path: str):
+        for panel, target in dashboards.iter_targets(dashboard):
+            try:
+                tree = promql.parse(target['expr'])
+            except promql.PromQLSyntaxError:
+                self.unparsed.append(Use(path, panel, target, target['expr']))
+                continue
+            use = Use(path, panel, target, normalize(tree))
+            self.exact.setdefault((use.key, result_options(panel, target)), []).append(use)
+            self.similar.setdefault(generalize(tree, self.labels), []).append(use)
+            repeated = repeated_subexpressions(tree)
+            if repeated:
+                self.repeated.append((use, repeated))
+
+    def duplicates(self) -> List[List[Use]]:
+        """Groups of targets sending the same query, largest first."""
+        groups = [uses for uses in self.exact.values() if len(uses) > 1]
+        return sorted(groups, key=lambda uses: (-len(uses), uses[0].key))
+
+    def near_duplicates(self) -> List[List[Use]]:
+        """Groups of targets whose queries differ only in generalized labels or ranges."""
+        groups = [uses for uses in self.similar.values() if len({use.key for use in uses}) > 1]
+        return sorted(groups, key=lambda uses: (-len(uses), uses[0].key))
+
+    def redundant_queries(self) -> int:
+        """Queries per full refresh of every dashboard that repeat another one."""
+        return sum(len(uses) - 1 for uses in self.exact.values())
+
+# --- Dashboard datasource ---------------------------------------------------
+
+class Reuse:
+    """A panel that can take its data from another panel of the same dashboard."""
+    __slots__ = ('panel', 'source', 'ref_ids', 'saved')
+
+    def __init__(self, panel: Dict[str, Any], source: Dict[str, Any], ref_ids: Dict[str, str]):
+        self.panel = panel
+        self.source = source
+        # panel refId -> source refId
+        self.ref_ids = ref_ids
+        # Prometheus queries the panel stops sending
+        self.saved = len(ref_ids)
+
+    def filtered(self) -> bool:
+        """Whether the source sends queries the panel does not show."""
+        return len(set(self.ref_ids.values())) < len(self.source['targets'])
+
+    def apply(self):
+        """Point the panel at the source panel's results."""
+        panel = self.panel
+        panel['datasource'] = dict(DASHBOARD_DATASOURCE)
+        panel['targets'] = [{'datasource': dict(DASHBOARD_DATASOURCE), 'panelId': self.source['id'], 'refId': 'A'}]
+        if self.filtered():
+            include = sorted(set(self.ref_ids.values()))
+            pattern = include[0] if len(include) == 1 else f"/^({'|'.join(include)})$/"
+            panel['transformations'] = ([{'id': 'filterByRefId', 'options': {'include': pattern}}] +
+                                        (panel.get('transformations') or []))
+
+def query_keys(panel: Dict[str, Any]) -> Optional[List[Tuple[str, str, Tuple]]]:
+    """(refId, normalized expr, result options) of a panel's targets, None if it can't share them."""
+    targets = panel.get('targets') or []
+    if not targets or not isinstance(panel.get('id'), int):
+        return None
+    datasource = panel.get('datasource')
+    if isinstance(datasource, dict) and datasource.get('uid') == DASHBOARD_DATASOURCE['uid']:
+        return None
+    keys = []
+    for target in targets:
+        if not isinstance(target.get('expr'), str) or not target['expr'] or target.get('hide'):
+            return None
+        try:
+            tree = promql.parse(target['expr'])
+        except promql.PromQLSyntaxError:
+            return None
+        keys.append((target.get('refId', ''), normalize(tree), result_options(panel, target)))
+    return keys
+
+def refers_to_ref_ids(panel: Dict[str, Any]) -> bool:
+    """Whether transformations or overrides name the panel's refIds."""
+    text = json.dumps([panel.get('transformations'), (panel.get('fieldConfig') or {}).get('overrides')])
+    return 'Value #' in text or 'byFrameRefID' in text or 'refId' in text
+
+def dashboard_datasource_plan(dashboard: Dict[str, Any]) -> List[Reuse]:
+    """
+    Panels whose every query is already sent by another panel of the dashboard.
+
+    Panels with the most queries are kept as sources; a source never becomes a
+    consumer itself, since the dashboard datasource does not chain. A panel
+    whose transformations or overrides name refIds only reuses a source with
+    the same refIds.
+    """
+    panels = [(panel, query_keys(panel)) for panel in dashboards.walk_panels(dashboard.get('panels') or [])]
+    panels = [(panel, keys) for panel, keys in panels if keys]
+    order = sorted(range(len(panels)), key=lambda i: -len(panels[i][1]))
+    plan: List[Reuse] = []
+    for position, i in enumerate(order):
+        panel, keys = panels[i]
+        for j in order[:position]:
+            source, source_keys = panels[j]
+            if any(source is reuse.panel for reuse in plan):
+                continue
+            by_query = {}
+            for ref_id, expr, options in source_keys:
+                by_query.setdefault((expr, options), ref_id)
+            if not all((expr, options) in by_query for _, expr, options in keys):
+                continue
+            ref_ids = {ref_id: by_query[(expr, options)] for ref_id, expr, options in keys}
+            if len(set(ref_ids.values())) < len(ref_ids):
+                # Two targets of the panel would map onto one source series
+                continue
+            if any(a != b for a, b in ref_ids.items()) and refers_to_ref_ids(panel):
+                continue
+            plan.append(Reuse(panel, source, ref_ids))
+            break
+    return plan
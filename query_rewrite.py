@@ -0,0 +1,284 @@
+"""
+Rule-based PromQL rewrites for dashboard targets, applied in a single pass.
+
+Rules are compiled once and applied in order to each expression's parse tree:
+
+- SetLabel: set a matcher on every selector (namespace=~"$namespace",
+  pod=~"websocket-.*"); mode 'add' only adds it where the label is not
+  matched yet, 'replace' only replaces existing matchers on the label whose
+  operator is in `replace_ops` (all by default; ['='] keeps negative
+  matchers such as namespace!="kube-system" from being inverted)
+- RenameMetric: rename a metric, optionally adding matchers
+  (redis_pubsub_num_messages_total -> redis_commands_total{cmd="publish"})
+- OrVector: append `or vector(0)` so empty results draw as zero
+- ReplaceQuery: swap a whole query for another (compared as parsed trees,
+  so whitespace and quoting don't matter)
+
+Every rule can be limited to metrics matching a regex and to dashboards
+matching a glob. Selector rules are merged per selector before the text is
+edited, so one expression is parsed once and edited once however many rules
+touch it; only the changed spans are rewritten, the rest of the author's
+formatting is kept. Results are memoized per expression and rule set.
+
+Usage:
+    rewriter = Rewriter(load_rules(yaml_io.load(f)))
+    changes = rewriter.rewrite_dashboard(dashboard, 'applications/content-platform.json')
+"""
+
+import fnmatch
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import dashboards
+import promql
+from promql import AggregateExpr, BinaryExpr, Call, LabelMatcher, VectorSelector
+
+class RuleError(ValueError):
+    """Raised for an invalid rewrite rule."""
+
+class Rule:
+    """Base rule: which metrics and dashboards it applies to."""
+    __slots__ = ('metrics', 'dashboards')
+
+    def __init__(self, metrics: Optional[str] = None, dashboards: Optional[str] = None):
+        self.metrics = re.compile(metrics) if metrics else None
+        self.dashboards = dashboards
+
+    def applies_to(self, path: str) -> bool:
+        return self.dashboards is None or fnmatch.fnmatchcase(path, self.dashboards)
+
+    def matches(self, selector: VectorSelector) -> bool:
+        if self.metrics is None:
+            return True
+        name = selector.metric_name()
+        return bool(name) and bool(self.metrics.search(name))
+
+class SelectorEdit:
+    """Pending changes to one selector: its new name and the matchers to set."""
+    __slots__ = ('name', 'matchers')
+
+    def __init__(self, selector: VectorSelector):
+        self.name = selector.name
+        self.matchers: Dict[str, Tuple[str, str]] = {}
+
+class SetLabel(Rule):
+    __slots__ = ('label', 'op', 'value', 'mode', 'replace_ops')
+
+    MODES = ('set', 'add', 'replace')
+    OPS = ('=', '!=', '=~', '!~')
+
+    def __init__(self, label: str, value: str, op: str = '=', mode: str = 'set',
+                 replace_ops: Sequence[str] = OPS, **scope):
+        super().__init__(**scope)
+        if op not in self.OPS:
+            raise RuleError(f"invalid matcher operator {op!r}")
+        if mode not in self.MODES:
+            raise RuleError(f"invalid set_label mode {mode!r}, expected one of {', '.join(self.MODES)}")
+        invalid = [o for o in replace_ops if o not in self.OPS]
+        if invalid:
+            raise RuleError(f"invalid matcher operator {invalid[0]!r} in replace_ops")
+        self.label, self.op, self.value, self.mode = label, op, value, mode
+        self.replace_ops = frozenset(replace_ops)
+
+    def apply(self, selector: VectorSelector, edit: SelectorEdit):
+        if self.mode == 'add':
+            present = self.label in edit.matchers or any(m.name == self.label for m in selector.matchers)
+            if present:
+                return
+        elif self.mode == 'replace':
+            pending = edit.matchers.get(self.label)
+            present = (pending is not None and pending[0] in self.replace_ops) or any(
+                m.name == self.label and m.op in self.replace_ops for m in selector.matchers)
+            if not present:
+                return
+        edit.matchers[self.label] = (self.op, self.value)
+
+class RenameMetric(Rule):
+    __slots__ = ('old', 'new', 'add')
+
+    def __init__(self, old: str, new: str, matchers: Optional[Dict[str, str]] = None, **scope):
+        super().__init__(**scope)
+        self.old, self.new = old, new
+        self.add = dict(matchers or {})
+
+    def matches(self, selector: VectorSelector) -> bool:
+        return selector.name == self.old and super().matches(selector)
+
+    def apply(self, selector: VectorSelector, edit: SelectorEdit):
+        edit.name = self.new
+        for label, value in self.add.items():
+            edit.matchers[label] = ('=', value)
+
+class OrVector(Rule):
+    """Append `or vector(N)` to queries using one of `functions` (any query if empty)."""
+    __slots__ = ('value', 'functions')
+
+    def __init__(self, value: float = 0, functions: Sequence[str] = (), **scope):
+        super().__init__(**scope)
+        self.value = value
+        self.functions = frozenset(functions)
+
+    def wants(self, tree: promql.Node) -> bool:
+        root = promql.unwrap_parens(tree)
+        if isinstance(root, BinaryExpr) and root.op == 'or' and isinstance(
+                promql.unwrap_parens(root.rhs), Call) and promql.unwrap_parens(root.rhs).func == 'vector':
+            return False
+        nodes = list(promql.walk(tree))
+        if not any(isinstance(n, VectorSelector) and self.matches(n) for n in nodes):
+            return False
+        return not self.functions or any(
+            (isinstance(n, Call) and n.func in self.functions) or
+            (isinstance(n, AggregateExpr) and n.op in self.functions) for n in nodes)
+
+    def append(self, expr: str) -> str:
+        return f"{expr.rstrip()} or vector({float(self.value):g})"
+
+class ReplaceQuery(Rule):
+    __slots__ = ('old', 'new')
+
+    def __init__(self, old: str, new: str, **scope):
+        super().__init__(**scope)
+        try:
+            self.old = promql.parse(old)
+            promql.parse(new)
+        except promql.PromQLSyntaxError as e:
+            raise RuleError(f"invalid query in replace_query: {e}")
+        self.new = new
+
+RULE_TYPES = {
+    'set_label': SetLabel,
+    'rename_metric': RenameMetric,
+    'or_vector': OrVector,
+    'replace_query': ReplaceQuery,
+}
+
+def load_rules(document: Dict[str, Any]) -> List[Rule]:
+    """
+    Rules from a YAML document:
+
+        rules:
+          - set_label: {label: pod, op: '=~', value: 'websocket-.*'}
+            metrics: '^websocket_'
+            dashboards: 'applications/*.json'
+          - rename_metric: {old: a_total, new: b_total, matchers: {cmd: publish}}
+          - or_vector: {functions: [rate, increase]}
+          - replace_query: {old: 'x > 0', new: 'y > 0'}
+    """
+    rules = []
+    for index, entry in enumerate((document or {}).get('rules') or []):
+        kinds = [k for k in entry if k in RULE_TYPES]
+        if len(kinds) != 1:
+            raise RuleError(f"rule {index} needs exactly one of {', '.join(RULE_TYPES)}")
+        options = entry[kinds[0]] or {}
+        scope = {k: entry[k] for k in ('metrics', 'dashboards') if k in entry}
+        try:
+            rules.append(RULE_TYPES[kinds[0]](**options, **scope))
+        except TypeError as e:
+            raise RuleError(f"rule {index} ({kinds[0]}): {e}")
+    return rules
+
+def selector_edits(expr: str, selector: VectorSelector, edit: SelectorEdit) -> List[Tuple[int, int, str]]:
+    """Span edits turning selector into the edited one, keeping the rest of its text."""
+    text = promql.source(expr, selector)
+    edits = []
+    if edit.name != selector.name:
+        if selector.name and text.startswith(selector.name):
+            edits.append((selector.start, selector.start + len(selector.name), edit.name))
+        else:
+            # {__name__="x"} form: set the name through its matcher
+            edit.matchers['__name__'] = ('=', edit.name)
+    added = []
+    for label, (op, value) in edit.matchers.items():
+        # A label can be matched more than once (namespace=~"n8n-.*", namespace!="n8n-test");
+        # edit the last matcher of the same polarity as the new one
+        matchers = [m for m in selector.matchers if m.name == label]
+        same = [m for m in matchers if m.op.startswith('!') == op.startswith('!')]
+        matcher = (same or matchers)[-1] if matchers else None
+        new = str(LabelMatcher(label, op, value))
+        if matcher is None:
+            added.append(new)
+        elif (matcher.op, matcher.value) != (op, value):
+            edits.append((matcher.start, matcher.end, new))
+    if added:
+        # Follow the selector's own separator style
+        separator = ',' if ',' in text and ', ' not in text else ', '
+        if selector.matchers:
+            edits.append((selector.matchers[-1].end, selector.matchers[-1].end, separator + separator.join(added)))
+        else:
+            brace = text.find('{')
+            if brace >= 0:
+                edits.append((selector.start + brace + 1, selector.start + brace + 1, separator.join(added)))
+            else:
+                end = selector.start + len(selector.name)
+                edits.append((end, end, '{' + separator.join(added) + '}'))
+    return edits
+
+class Rewriter:
+    """Applies an ordered rule list to expressions and dashboards."""
+    __slots__ = ('rules', 'cache')
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = list(rules)
+        self.cache: Dict[Tuple[str, Tuple[int, ...]], str] = {}
+
+    def active(self, path: str) -> Tuple[int, ...]:
+        return tuple(i for i, rule in enumerate(self.rules) if rule.applies_to(path))
+
+    def rewrite_expr(self, expr: str, active: Optional[Tuple[int, ...]] = None) -> str:
+        """expr with the rules applied; raises promql.PromQLSyntaxError if it does not parse."""
+        if active is None:
+            active = tuple(range(len(self.rules)))
+        key = (expr, active)
+        if key not in self.cache:
+            self.cache[key] = self._rewrite(expr, [self.rules[i] for i in active])
+        return self.cache[key]
+
+    def _rewrite(self, expr: str, rules: List[Rule]) -> str:
+        tree = promql.parse(expr)
+        for rule in rules:
+            if isinstance(rule, ReplaceQuery) and tree == rule.old:
+                expr, tree = rule.new, promql.parse(rule.new)
+        selector_rules = [r for r in rules if isinstance(r, (SetLabel, RenameMetric))]
+        edits = []
+        for node in promql.walk(tree):
+            if not isinstance(node, VectorSelector):
+                continue
+            edit = None
+            for rule in selector_rules:
+                if rule.matches(node):
+                    edit = edit or SelectorEdit(node)
+                    rule.apply(node, edit)
+            if edit is not None:
+                edits.extend(selector_edits(expr, node, edit))
+        text = expr
+        if edits:
+            text = promql.replace_spans(expr, edits)
+            tree = promql.parse(text)
+        for rule in rules:
+            if isinstance(rule, OrVector) and rule.wants(tree):
+                text = rule.append(text)
+                tree = promql.parse(text)
+        return text
+
+    def rewrite_dashboard(self, dashboard: Dict[str, Any], path: str = '') -> List[Tuple[Dict[str, Any], str, str]]:
+        """
+        Rewrite every Prometheus target in place, at any panel depth.
+
+        Returns (panel, old expr, new expr) for each changed target. Targets
+        that do not parse are left alone and reported with new expr None.
+        """
+        active = self.active(path)
+        changes = []
+        if not active:
+            return changes
+        for panel, target in dashboards.iter_targets(dashboard):
+            old = target['expr']
+            try:
+                new = self.rewrite_expr(old, active)
+            except promql.PromQLSyntaxError:
+                changes.append((panel, old, None))
+                continue
+            if new != old:
+                target['expr'] = new
+                changes.append((panel, old, new))
+        return changes
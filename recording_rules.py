@@ -0,0 +1,342 @@
+"""
+Find expensive PromQL subexpressions shared between alerts and dashboards and
+replace them with recording rules.
+
+A subexpression is a candidate when it does real work on every evaluation (it
+contains a range selector, a subquery or a vector/vector binary operation)
+and is a function call, aggregation or arithmetic operation whose result can
+be precomputed.
+
+Dashboard queries filter on Grafana variables (namespace="$namespace"), which
+a recording rule cannot contain. Such matchers, and matchers on the labels in
+GENERALIZED_LABELS, are lifted out of the candidate: the rule records the
+unfiltered expression and each use selects from the recorded series with the
+original matcher. This is only done when the label survives to the
+candidate's output and every selector inside it filters that label the same
+way, so the rewritten query returns exactly the same series.
+
+Usage:
+    plan = build_plan(expressions, min_uses=2)
+    plan.rules                  # [(record name, expression), ...]
+    plan.rewrite(expr)          # expr using the recorded series
+"""
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import promql
+from promql import (
+    AggregateExpr, BinaryExpr, Call, LabelMatcher, MatrixSelector, Node,
+    SubqueryExpr, UnaryExpr, Variable, VectorSelector,
+)
+
+# Labels whose literal matchers are lifted out of candidates by default, so
+# per-environment copies of a query (namespace="n8n-dev" / "n8n-prod") share
+# one recording rule.
+GENERALIZED_LABELS = ('namespace',)
+
+# Functions that keep every input label on their output series
+LABEL_PRESERVING_FUNCTIONS = frozenset({
+    'rate', 'irate', 'increase', 'delta', 'idelta', 'deriv', 'predict_linear', 'changes', 'resets',
+    'avg_over_time', 'min_over_time', 'max_over_time', 'sum_over_time', 'count_over_time',
+    'quantile_over_time', 'stddev_over_time', 'stdvar_over_time', 'last_over_time', 'present_over_time',
+    'abs', 'ceil', 'floor', 'round', 'exp', 'ln', 'log2', 'log10', 'sqrt', 'sgn',
+    'clamp', 'clamp_min', 'clamp_max', 'histogram_quantile', 'holt_winters', 'double_exponential_smoothing',
+})
+
+# Functions returning a scalar, which costs nothing to combine with a vector
+SCALAR_FUNCTIONS = frozenset({'time', 'pi', 'scalar'})
+
+ARITHMETIC_OPERATORS = frozenset({'+', '-', '*', '/', '%', '^', 'atan2'})
+
+BINARY_OP_NAMES = {'/': 'ratio', '*': 'product', '-': 'diff', '+': 'sum', '%': 'mod', '^': 'pow', 'atan2': 'atan2'}
+
+VARIABLE_RE = re.compile(r'\$\w|\$\{|\[\[')
+
+def is_variable_matcher(matcher: LabelMatcher) -> bool:
+    return bool(VARIABLE_RE.search(matcher.value))
+
+def contains_variables(node: Node) -> bool:
+    """Whether any part of the tree still depends on a Grafana variable."""
+    for n in promql.walk(node):
+        if isinstance(n, Variable):
+            return True
+        if isinstance(n, (MatrixSelector, SubqueryExpr)) and promql.parse_duration(n.range) is None:
+            return True
+        if isinstance(n, SubqueryExpr) and n.step and promql.parse_duration(n.step) is None:
+            return True
+        if isinstance(n, LabelMatcher) and is_variable_matcher(n):
+            return True
+    return False
+
+def is_scalar(node: Node) -> bool:
+    node = promql.unwrap_parens(node)
+    return promql.scalar_value(node) is not None or (isinstance(node, Call) and node.func in SCALAR_FUNCTIONS)
+
+def is_expensive(node: Node) -> bool:
+    """Whether evaluating the tree reads ranges or joins two vectors."""
+    for n in promql.walk(node):
+        if isinstance(n, (MatrixSelector, SubqueryExpr)):
+            return True
+        if isinstance(n, BinaryExpr) and n.op in ARITHMETIC_OPERATORS \
+                and not is_scalar(n.lhs) and not is_scalar(n.rhs):
+            return True
+    return False
+
+def is_candidate_shape(node: Node) -> bool:
+    """Calls, aggregations and vector/vector arithmetic can be recorded."""
+    if isinstance(node, Call):
+        return node.func in LABEL_PRESERVING_FUNCTIONS
+    if isinstance(node, AggregateExpr):
+        return True
+    if isinstance(node, BinaryExpr):
+        return node.op in ARITHMETIC_OPERATORS and not node.return_bool
+    return False
+
+def retains_label(node: Node, label: str) -> bool:
+    """Whether every output series of node still carries its input's label."""
+    node = promql.unwrap_parens(node)
+    if isinstance(node, (VectorSelector, MatrixSelector)):
+        return True
+    if isinstance(node, SubqueryExpr) or isinstance(node, UnaryExpr):
+        return retains_label(node.expr, label)
+    if isinstance(node, Call):
+        vectors = [a for a in node.args if promql.scalar_value(a) is None and not isinstance(a, promql.StringLiteral)]
+        return node.func in LABEL_PRESERVING_FUNCTIONS and all(retains_label(a, label) for a in vectors)
+    if isinstance(node, AggregateExpr):
+        in_grouping = node.grouping is not None and label in node.grouping
+        kept = (not in_grouping) if node.without else in_grouping
+        return kept and retains_label(node.expr, label)
+    if isinstance(node, BinaryExpr):
+        sides = [s for s in (node.lhs, node.rhs) if not is_scalar(s)]
+        if node.matching:
+            if node.matching.group:
+                return False
+            if node.matching.on != (label in node.matching.labels):
+                return False
+        return all(retains_label(s, label) for s in sides)
+    return False
+
+def lift_matchers(node: Node, labels: Sequence[str]) -> Optional[Tuple[Node, Tuple[LabelMatcher, ...]]]:
+    """
+    Remove generalizable matchers from every selector in node.
+
+    Returns (stripped tree, lifted matchers) or None if the matchers cannot be
+    lifted (selectors disagree, or the label does not survive to the output).
+    """
+    vectors = [n for n in promql.walk(node) if isinstance(n, VectorSelector)]
+    lifted: Dict[str, Tuple[Tuple[str, str], ...]] = {}
+    for label in sorted({m.name for v in vectors for m in v.matchers if m.name in labels or is_variable_matcher(m)}):
+        # Every selector must filter the label identically
+        filters = {tuple(sorted((m.op, m.value) for m in v.matchers if m.name == label)) for v in vectors}
+        liftable = len(filters) == 1 and () not in filters and retains_label(node, label)
+        if liftable:
+            lifted[label] = filters.pop()
+        elif any(is_variable_matcher(m) for v in vectors for m in v.matchers if m.name == label):
+            # A variable cannot stay in a recording rule
+            return None
+        # Otherwise the literal matcher simply stays in the recorded expression
+    if not lifted:
+        return node, ()
+
+    def strip(n: Node) -> Optional[Node]:
+        if isinstance(n, VectorSelector):
+            return n.replace(matchers=tuple(m for m in n.matchers if m.name not in lifted))
+        return None
+
+    matchers = tuple(LabelMatcher(label, op, value) for label in sorted(lifted) for op, value in lifted[label])
+    return promql.transform(node, strip), matchers
+
+class Candidate:
+    """A recordable subexpression, keyed by its canonical generalized form."""
+    __slots__ = ('key', 'tree', 'labels')
+
+    def __init__(self, key: str, tree: Node, labels: Tuple[str, ...]):
+        self.key = key
+        self.tree = tree
+        self.labels = labels
+
+def candidate(node: Node, labels: Sequence[str]) -> Optional[Tuple[Candidate, Tuple[LabelMatcher, ...]]]:
+    """The candidate for a node and the matchers its uses must reapply, if any."""
+    if not is_candidate_shape(node) or not is_expensive(node):
+        return None
+    result = lift_matchers(node, labels)
+    if result is None:
+        return None
+    tree, matchers = result
+    if contains_variables(tree):
+        return None
+    lifted_labels = tuple(sorted({m.name for m in matchers}))
+    return Candidate(str(tree), tree, lifted_labels), matchers
+
+def candidates_in(tree: Node, labels: Sequence[str]) -> Iterable[Tuple[Node, Candidate, Tuple[LabelMatcher, ...]]]:
+    """Every (node, candidate, lifted matchers) in an expression tree."""
+    for node in promql.walk(tree):
+        found = candidate(node, labels)
+        if found:
+            yield (node,) + found
+
+def record_name(cand: Candidate) -> str:
+    """Prometheus-style level:metric:operations name for a candidate."""
+    tree = promql.unwrap_parens(cand.tree)
+    level = None
+    ops = []
+    node = tree
+    while True:
+        node = promql.unwrap_parens(node)
+        if isinstance(node, AggregateExpr):
+            if level is None and node.grouping is not None and not node.without:
+                level = '_'.join(node.grouping)
+            ops.append(node.op)
+            node = node.expr
+        elif isinstance(node, Call):
+            inner = [a for a in node.args if promql.scalar_value(a) is None]
+            if inner and isinstance(inner[0], MatrixSelector):
+                ops.append(f"{node.func}{inner[0].range}")
+                break
+            ops.append(node.func)
+            if not inner:
+                break
+            node = inner[0]
+        elif isinstance(node, BinaryExpr):
+            ops.append(BINARY_OP_NAMES.get(node.op, node.op))
+            break
+        else:
+            break
+    metrics = [v.metric_name() for v in promql.selectors(tree) if v.metric_name()]
+    metric = metrics[0] if metrics else 'expr'
+    if level is None:
+        level = '_'.join(cand.labels) or 'series'
+    return f"{level}:{metric}:{'_'.join(ops)}"
+
+class RecordingPlan:
+    """Selected recording rules and the rewrite that uses them."""
+
+    def __init__(self, rules: Dict[str, str], labels: Sequence[str]):
+        # canonical candidate key -> record name
+        self.names = rules
+        self.labels = tuple(labels)
+
+    @property
+    def rules(self) -> List[Tuple[str, str]]:
+        """(record name, expression) pairs, sorted by name."""
+        return sorted((name, key) for key, name in self.names.items())
+
+    def uses(self, expr: str) -> List[Tuple[Node, str, Tuple[LabelMatcher, ...]]]:
+        """Outermost nodes of expr that the plan replaces, with their record names."""
+        if not self.names:
+            return []
+        try:
+            tree = promql.parse(expr)
+        except promql.PromQLSyntaxError:
+            return []
+        found = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            match = candidate(node, self.labels)
+            if match and match[0].key in self.names:
+                found.append((node, self.names[match[0].key], match[1]))
+                continue
+            stack.extend(reversed(node.children()))
+        return found
+
+    def rewrite(self, expr: str) -> str:
+        """Replace recorded subexpressions of expr, keeping the rest of its text."""
+        edits = []
+        for node, name, matchers in self.uses(expr):
+            selector = name
+            if matchers:
+                selector += '{' + ', '.join(str(m) for m in matchers) + '}'
+            edits.append((node.start, node.end, selector))
+        return promql.replace_spans(expr, edits)
+
+    @classmethod
+    def load(cls, prometheus_rule: dict, labels: Sequence[str] = GENERALIZED_LABELS) -> 'RecordingPlan':
+        """Rebuild a plan from a PrometheusRule written by to_prometheus_rule()."""
+        names = {}
+        for group in prometheus_rule['spec']['groups']:
+            for rule in group.get('rules', []):
+                if 'record' in rule:
+                    names[str(promql.parse(rule['expr']))] = rule['record']
+        return cls(names, labels)
+
+    def to_prometheus_rule(self, name: str, namespace: str, interval: str = '30s') -> dict:
+        """The plan's rules as a PrometheusRule resource."""
+        return {
+            'apiVersion': 'monitoring.coreos.com/v1',
+            'kind': 'PrometheusRule',
+            'metadata': {
+                'name': name,
+                'namespace': namespace,
+                'labels': {
+                    'prometheus': 'kube-prometheus',
+                    'role': 'recording-rules',
+                    'app.kubernetes.io/name': 'copperiq-monitoring',
+                    'app.kubernetes.io/component': 'recording-rules',
+                },
+            },
+            'spec': {
+                'groups': [{
+                    'name': name,
+                    'interval': interval,
+                    'rules': [{'record': record, 'expr': expr} for record, expr in self.rules],
+                }],
+            },
+        }
+
+def build_plan(expressions: Iterable[str], min_uses: int = 2,
+               labels: Sequence[str] = GENERALIZED_LABELS) -> RecordingPlan:
+    """
+    Choose recording rules for subexpressions used at least min_uses times.
+
+    Only the outermost recorded subexpression of each use counts, so inner
+    candidates that are always covered by a larger one are dropped. Selection
+    repeats until every chosen rule has min_uses real uses.
+    """
+    trees = []
+    for expr in expressions:
+        try:
+            trees.append(promql.parse(expr))
+        except promql.PromQLSyntaxError:
+            continue
+
+    counts: Dict[str, int] = {}
+    by_key: Dict[str, Candidate] = {}
+    for tree in trees:
+        for _, cand, _ in candidates_in(tree, labels):
+            counts[cand.key] = counts.get(cand.key, 0) + 1
+            by_key[cand.key] = cand
+    selected: Set[str] = {key for key, n in counts.items() if n >= min_uses}
+
+    while True:
+        uses: Dict[str, int] = {}
+        for tree in trees:
+            stack = [tree]
+            while stack:
+                node = stack.pop()
+                match = candidate(node, labels)
+                if match and match[0].key in selected:
+                    uses[match[0].key] = uses.get(match[0].key, 0) + 1
+                    continue
+                stack.extend(node.children())
+        still_used = {key for key in selected if uses.get(key, 0) >= min_uses}
+        if still_used == selected:
+            break
+        selected = still_used
+
+    by_name: Dict[str, List[str]] = {}
+    for key in selected:
+        by_name.setdefault(record_name(by_key[key]), []).append(key)
+    names: Dict[str, str] = {}
+    for base, keys in by_name.items():
+        for key in keys:
+            # Rules sharing a name are told apart by their own expression, so
+            # adding or removing another rule does not rename them
+            names[key] = base if len(keys) == 1 else f"{base}_{key_hash(key)}"
+    return RecordingPlan(names, labels)
+
+def key_hash(key: str) -> str:
+    """Short hash of a candidate's canonical expression."""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:6]
@@ -0,0 +1,303 @@
+"""
+Prometheus load of dashboards left open on auto-refresh, and a planner that
+trades refresh intervals and collapsed rows for a queries-per-second budget.
+
+Every refresh, each viewer's browser re-runs the targets of every loaded
+panel:
+
+- panels of a collapsed row are not loaded until the row is expanded, so they
+  cost nothing here
+- a range query's step is the widest of the target/panel min interval and
+  range / maxDataPoints; without maxDataPoints Grafana uses the panel's width
+  in pixels, assumed from gridPos on a VIEWPORT_WIDTH screen
+- stat, gauge, bar gauge and pie chart panels reduce each series to one value,
+  so their range queries could be instant queries; these are counted as
+  instant candidates
+- query variables refreshed on time range change (refresh: 2) re-run on every
+  refresh too
+
+Samples per query come from query_cost.estimate(). The planner starts from the
+dashboards as they are and repeatedly applies the move that saves the most
+queries per second, either the next longer interval of Grafana's refresh
+picker (up to a maximum) or collapsing the row with the most queries, until
+the total fits the budget or nothing is left to change.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import dashboards
+import promql
+import query_cost
+from query_cost import Query
+
+# Width of the screen a dashboard is assumed to be viewed on, in pixels
+VIEWPORT_WIDTH = 1920
+GRID_COLUMNS = 24
+
+# Grafana's refresh picker
+REFRESH_INTERVALS = ('5s', '10s', '30s', '1m', '5m', '15m', '30m', '1h', '2h', '1d')
+
+# Panel types showing one reduced value per series
+REDUCING_PANEL_TYPES = ('stat', 'gauge', 'bargauge', 'piechart')
+
+# templating.list[].refresh of variables re-queried on time range change
+REFRESH_ON_TIME_RANGE = 2
+
+class PanelLoad:
+    """Queries one panel runs per refresh."""
+    __slots__ = ('title', 'type', 'queries', 'samples', 'instant_candidates')
+
+    def __init__(self, title: str, type: str, queries: List[Query], samples: float, instant_candidates: int):
+        self.title = title
+        self.type = type
+        self.queries = queries
+        self.samples = samples
+        self.instant_candidates = instant_candidates
+
+class Section:
+    """The panels above the first row (title None), or those of one row."""
+    __slots__ = ('title', 'collapsed', 'panels')
+
+    def __init__(self, title: Optional[str], collapsed: bool, panels: List[PanelLoad]):
+        self.title = title
+        self.collapsed = collapsed
+        self.panels = panels
+
+    @property
+    def queries(self) -> int:
+        return sum(len(panel.queries) for panel in self.panels)
+
+    @property
+    def samples(self) -> float:
+        return sum(panel.samples for panel in self.panels)
+
+class DashboardLoad:
+    """Per-refresh load of one dashboard, by section."""
+    __slots__ = ('path', 'uid', 'title', 'refresh', 'sections', 'variable_queries', 'skipped')
+
+    def __init__(self, path: Path, uid: str, title: str, refresh: Optional[float], sections: List[Section],
+                 variable_queries: int, skipped: List[str]):
+        self.path = path
+        self.uid = uid
+        self.title = title
+        # Seconds between refreshes, None when auto-refresh is off
+        self.refresh = refresh
+        self.sections = sections
+        self.variable_queries = variable_queries
+        self.skipped = skipped
+
+    def collapsed(self) -> FrozenSet[int]:
+        """Indexes of the sections collapsed as the dashboard is saved."""
+        return frozenset(i for i, section in enumerate(self.sections) if section.collapsed)
+
+    def loaded(self, collapsed: Optional[Iterable[int]] = None) -> List[Section]:
+        collapsed = self.collapsed() if collapsed is None else frozenset(collapsed)
+        return [section for i, section in enumerate(self.sections) if i not in collapsed]
+
+    def queries_per_refresh(self, collapsed: Optional[Iterable[int]] = None) -> int:
+        return self.variable_queries + sum(section.queries for section in self.loaded(collapsed))
+
+    def samples_per_refresh(self, collapsed: Optional[Iterable[int]] = None) -> float:
+        return sum(section.samples for section in self.loaded(collapsed))
+
+    def qps(self, viewers: int, refresh: Optional[float] = None,
+            collapsed: Optional[Iterable[int]] = None) -> float:
+        """Prometheus queries per second with `viewers` browsers open on the dashboard."""
+        refresh = self.refresh if refresh is None else refresh
+        if not refresh:
+            return 0.0
+        return viewers * self.queries_per_refresh(collapsed) / refresh
+
+class Plan:
+    """A proposed refresh interval and set of collapsed sections for one dashboard."""
+    __slots__ = ('dashboard', 'viewers', 'refresh', 'collapsed')
+
+    def __init__(self, dashboard: DashboardLoad, viewers: int, refresh: Optional[float], collapsed: FrozenSet[int]):
+        self.dashboard = dashboard
+        self.viewers = viewers
+        self.refresh = refresh
+        self.collapsed = collapsed
+
+    @property
+    def qps(self) -> float:
+        return self.dashboard.qps(self.viewers, self.refresh, self.collapsed)
+
+    @property
+    def samples_per_second(self) -> float:
+        if not self.refresh:
+            return 0.0
+        return self.viewers * self.dashboard.samples_per_refresh(self.collapsed) / self.refresh
+
+    def changes(self) -> List[str]:
+        """What differs from the dashboard as saved."""
+        changes = []
+        if self.refresh != self.dashboard.refresh:
+            changes.append(f"refresh {format_interval(self.dashboard.refresh)} -> {format_interval(self.refresh)}")
+        for i in sorted(self.collapsed - self.dashboard.collapsed()):
+            section = self.dashboard.sections[i]
+            changes.append(f"collapse row {section.title!r} ({section.queries} queries)")
+        return changes
+
+def format_interval(seconds: Optional[float]) -> str:
+    if not seconds:
+        return 'off'
+    for text in REFRESH_INTERVALS:
+        if promql.parse_duration(text) == seconds:
+            return text
+    return f"{seconds:g}s"
+
+def refresh_seconds(value: Any) -> Optional[float]:
+    """A dashboard's refresh setting ('30s', '' or false) in seconds."""
+    if not value or not isinstance(value, str):
+        return None
+    return promql.parse_duration(value)
+
+def panel_max_data_points(panel: Dict[str, Any], viewport_width: int = VIEWPORT_WIDTH) -> float:
+    """maxDataPoints of a panel, defaulting to its width in pixels like Grafana does."""
+    if panel.get('maxDataPoints'):
+        return panel['maxDataPoints']
+    width = (panel.get('gridPos') or {}).get('w') or GRID_COLUMNS
+    return max(int(viewport_width * width / GRID_COLUMNS), 1)
+
+def panel_load(panel: Dict[str, Any], range_seconds: float, source: str, skipped: List[str],
+               scrape_interval: float = query_cost.SCRAPE_INTERVAL,
+               viewport_width: int = VIEWPORT_WIDTH) -> PanelLoad:
+    title = str(panel.get('title', panel.get('id')))
+    queries, samples, candidates = [], 0.0, 0
+    max_data_points = panel_max_data_points(panel, viewport_width)
+    for target in panel.get('targets') or []:
+        if not isinstance(target.get('expr'), str) or not target['expr'] or target.get('hide'):
+            continue
+        min_interval = query_cost.resolve_min_interval(target.get('interval') or panel.get('interval'),
+                                                       scrape_interval)
+        step = query_cost.grafana_step(range_seconds, None, max_data_points, min_interval)
+        instant = bool(target.get('instant')) and not target.get('range')
+        query = Query(f"{source}:{title}", target['expr'], range_seconds, step, instant)
+        try:
+            samples += query_cost.estimate(query, scrape_interval).total
+        except promql.PromQLSyntaxError as e:
+            skipped.append(f"{query.source}: {e}")
+        queries.append(query)
+        if not instant and panel.get('type') in REDUCING_PANEL_TYPES:
+            candidates += 1
+    return PanelLoad(title, str(panel.get('type')), queries, samples, candidates)
+
+def dashboard_load(dashboard: Dict[str, Any], path: Path,
+                   scrape_interval: float = query_cost.SCRAPE_INTERVAL,
+                   viewport_width: int = VIEWPORT_WIDTH) -> DashboardLoad:
+    """Split a dashboard into sections at its rows and measure each panel."""
+    range_seconds = query_cost.dashboard_range(dashboard)
+    skipped: List[str] = []
+    sections = [Section(None, False, [])]
+    for panel in dashboard.get('panels') or []:
+        if panel.get('type') == 'row':
+            sections.append(Section(panel.get('title') or '', bool(panel.get('collapsed')), []))
+            # A collapsed row keeps its panels nested in it, an expanded one after it
+            nested = panel.get('panels') or []
+        else:
+            nested = [panel]
+        for inner in nested:
+            for child in dashboards.walk_panels([inner]):
+                if child.get('type') != 'row':
+                    sections[-1].panels.append(panel_load(child, range_seconds, str(path), skipped,
+                                                          scrape_interval, viewport_width))
+    if not sections[0].panels and len(sections) > 1:
+        sections.pop(0)
+    variables = sum(1 for variable in (dashboard.get('templating') or {}).get('list') or []
+                    if variable.get('type') == 'query' and variable.get('refresh') == REFRESH_ON_TIME_RANGE)
+    return DashboardLoad(path, str(dashboard.get('uid') or path.stem), str(dashboard.get('title') or path.stem),
+                         refresh_seconds(dashboard.get('refresh')), sections, variables, skipped)
+
+def load_dashboards(root: Path = dashboards.DASHBOARD_ROOT,
+                    scrape_interval: float = query_cost.SCRAPE_INTERVAL,
+                    viewport_width: int = VIEWPORT_WIDTH) -> List[DashboardLoad]:
+    loads = []
+    for path in dashboards.dashboard_files(root):
+        dashboard, _ = dashboards.load(path)
+        loads.append(dashboard_load(dashboard, path, scrape_interval, viewport_width))
+    return loads
+
+def next_refresh(seconds: Optional[float], max_refresh: float) -> Optional[float]:
+    """The next longer interval of the refresh picker, if it is within max_refresh."""
+    for text in REFRESH_INTERVALS:
+        candidate = promql.parse_duration(text)
+        if seconds and candidate > seconds:
+            return candidate if candidate <= max_refresh else None
+    return None
+
+def collapsible(plan: Plan) -> List[int]:
+    """Sections the plan could still collapse: rows, never the panels above the first row."""
+    return [i for i, section in enumerate(plan.dashboard.sections)
+            if section.title is not None and i not in plan.collapsed and section.queries]
+
+def plan_refresh(loads: List[DashboardLoad], viewers: Dict[str, int], budget: float,
+                 max_refresh: float, keep_open: int = 1) -> Tuple[List[Plan], bool]:
+    """
+    Refresh intervals and collapsed rows keeping the total queries per second
+    within budget, returning (plans, whether the budget is met).
+
+    viewers maps dashboard uids to concurrent viewers ('*' for the rest).
+    keep_open rows of each dashboard, the first ones, are never collapsed.
+    """
+    plans = [Plan(load, viewers.get(load.uid, viewers.get('*', 1)), load.refresh, load.collapsed())
+             for load in loads]
+    total = sum(plan.qps for plan in plans)
+    while total > budget:
+        best: Optional[Tuple[float, Plan, Optional[float], FrozenSet[int]]] = None
+        for plan in plans:
+            moves = []
+            refresh = next_refresh(plan.refresh, max_refresh)
+            if refresh:
+                moves.append((refresh, plan.collapsed))
+            rows = collapsible(plan)
+            if len(rows) > keep_open:
+                row = max(rows[keep_open:], key=lambda i: plan.dashboard.sections[i].queries)
+                moves.append((plan.refresh, plan.collapsed | {row}))
+            for refresh, collapsed in moves:
+                saving = plan.qps - plan.dashboard.qps(plan.viewers, refresh, collapsed)
+                if saving > 0 and (best is None or saving > best[0]):
+                    best = (saving, plan, refresh, collapsed)
+        if best is None:
+            return plans, False
+        saving, plan, refresh, collapsed = best
+        plan.refresh, plan.collapsed = refresh, collapsed
+        total -= saving
+    return plans, True
+
+def collapse_rows(dashboard: Dict[str, Any], titles: Iterable[str]) -> int:
+    """
+    Collapse the expanded rows with the given titles, moving the panels below
+    each into it and closing the gap; returns how many rows were collapsed.
+    """
+    titles = set(titles)
+    panels = dashboard.get('panels') or []
+    result: List[Dict[str, Any]] = []
+    collapsed = 0
+    shift = 0
+    i = 0
+    while i < len(panels):
+        panel = panels[i]
+        i += 1
+        if shift and 'gridPos' in panel:
+            panel['gridPos']['y'] -= shift
+        result.append(panel)
+        if panel.get('type') != 'row' or panel.get('collapsed') or panel.get('title') not in titles:
+            continue
+        members = []
+        while i < len(panels) and panels[i].get('type') != 'row':
+            members.append(panels[i])
+            i += 1
+        row_y = (panel.get('gridPos') or {}).get('y', 0)
+        bottom = max(((p.get('gridPos') or {}).get('y', 0) + (p.get('gridPos') or {}).get('h', 0)
+                      for p in members), default=row_y + 1)
+        # Nested panels keep the positions they had below the expanded row
+        for member in members:
+            if shift and 'gridPos' in member:
+                member['gridPos']['y'] -= shift
+        panel['panels'] = members
+        panel['collapsed'] = True
+        shift += max(bottom - row_y - 1, 0)
+        collapsed += 1
+    dashboard['panels'] = result
+    return collapsed
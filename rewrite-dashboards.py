@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Apply PromQL rewrite rules to every dashboard under helm/dashboards/ in one pass.
+
+Each dashboard is loaded once, every Prometheus target at any panel depth is
+rewritten once with all rules (see query_rewrite.py for the rule types), and
+the file is written back in its own formatting only if it changed.
+dashboard-rewrites.yaml holds the fixes that used to live in
+fix-dashboard-queries.js and fix-redis-queries.js; rerunning it is a no-op.
+
+Usage:
+    python rewrite-dashboards.py [RULES] [--dashboard GLOB] [--check] [--verbose]
+"""
+
+import argparse
+import fnmatch
+import sys
+import time
+from pathlib import Path
+
+import dashboards
+import query_rewrite
+import yaml_io
+
+DEFAULT_RULES = Path('dashboard-rewrites.yaml')
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite dashboard queries with an ordered rule list.')
+    parser.add_argument('rules', nargs='?', type=Path, default=DEFAULT_RULES,
+                        help=f'YAML rule file (default: {DEFAULT_RULES})')
+    parser.add_argument('--dashboard', metavar='GLOB',
+                        help='only dashboards whose path below helm/dashboards matches this glob')
+    parser.add_argument('--check', action='store_true', help="report changes without writing; exit 1 if any")
+    parser.add_argument('--verbose', '-v', action='store_true', help='print every changed query')
+    args = parser.parse_args()
+
+    try:
+        with open(args.rules, encoding='utf-8') as f:
+            rewriter = query_rewrite.Rewriter(query_rewrite.load_rules(yaml_io.load(f)))
+    except (OSError, query_rewrite.RuleError) as e:
+        sys.exit(f"✗ {args.rules}: {e}")
+
+    started = time.perf_counter()
+    files = targets = 0
+    changed_files = []
+    for path in dashboards.dashboard_files():
+        relative = path.relative_to(dashboards.DASHBOARD_ROOT).as_posix()
+        if args.dashboard and not fnmatch.fnmatchcase(relative, args.dashboard):
+            continue
+        files += 1
+        dashboard, style = dashboards.load(path)
+        changes = rewriter.rewrite_dashboard(dashboard, relative)
+        rewritten = [(panel, old, new) for panel, old, new in changes if new is not None]
+        for panel, old, new in changes:
+            title = panel.get('title') or panel.get('id')
+            if new is None:
+                print(f"⚠️  {relative}: {title}: query does not parse, left as is")
+            elif args.verbose:
+                print(f"  {relative}: {title}\n    OLD: {old}\n    NEW: {new}")
+        if not rewritten:
+            continue
+        targets += len(rewritten)
+        changed_files.append(relative)
+        if not args.check:
+            dashboards.save(path, dashboard, style)
+        print(f"✓ {relative}: {len(rewritten)} queries {'to rewrite' if args.check else 'rewritten'}")
+
+    print(f"\n✅ {len(rewriter.rules)} rules over {files} dashboards in {time.perf_counter() - started:.2f}s: "
+          f"{targets} queries in {len(changed_files)} files {'need rewriting' if args.check else 'rewritten'}")
+    if args.check and changed_files:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
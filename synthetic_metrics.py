@@ -0,0 +1,397 @@
+"""
+Synthetic Prometheus exposition for the metric families alerts and dashboards read.
+
+A Topology is what the cluster would expose: per n8n namespace a main pod
+and `workers` worker pods (n8n_scaling_mode_queue_jobs_*,
+n8n_nodejs_eventloop_lag_p99_seconds), a RabbitMQ pod with series per queue
+(rabbitmq_*) and a Valkey primary (redis_*), plus websocket gateway pods in
+content-platform (websocket_*). Names, label sets and ports follow
+fixtures/metrics-snapshot.prom, and every pod is a Target carrying the pod and
+Service labels the ServiceMonitors and PodMonitors in servicemonitors/ select
+it by (see monitor_targets).
+
+Values follow a load Shape over time t in seconds: gauges such as queue
+depth follow its level, counters its integral, so rate() of a counter follows
+the level and counters never decrease between scrapes. Every label set has a
+fixed factor from a hash of its labels and the seed, and gauges get +/-JITTER
+of noise per second, so a topology, seed and t always render the same payload.
+
+Payloads are generated as they are written: render_target() and
+render_snapshot() yield text chunks per metric family and target and keep
+nothing per series, so memory stays flat however many series a topology has.
+
+Usage:
+    topology = Topology.build([('n8n-dev', 'n8n-dev')], workers=3, queues=6, gateways=2)
+    for chunk in render_snapshot(topology, Shape('spike', 3600), t=120):
+        out.write(chunk)
+"""
+
+import math
+import random
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Noise on gauges, as a fraction of the value
+JITTER = 0.05
+
+DIURNAL_AMPLITUDE = 0.5
+# A spike multiplies load by SPIKE_HEIGHT + 1 for the first SPIKE_WIDTH of each period
+SPIKE_HEIGHT = 4.0
+SPIKE_WIDTH = 0.1
+# A backlog grows load to BACKLOG_GROWTH + 1 times over each period, then drains at once
+BACKLOG_GROWTH = 9.0
+
+WEBSOCKET_NAMESPACE = 'content-platform'
+
+# Queues and Redis commands of the snapshot fixture; --queues beyond these are queue-NNN
+QUEUES = ('llm-seo', 'content-platform-ingest', 'content-platform-publish',
+          'content-platform-enrich', 'content-platform-dlq', 'n8n-webhook-events')
+REDIS_COMMANDS = ('get', 'set', 'del', 'exists', 'expire', 'hget', 'hset', 'lpush', 'brpoplpush',
+                  'evalsha', 'publish', 'subscribe', 'zadd', 'zrangebyscore', 'info', 'ping')
+
+# Characters of Kubernetes generated name suffixes
+NAME_ALPHABET = 'bcdfghjklmnpqrstvwxz2456789'
+
+# ---------------------------------------------------------------------------
+# Load shapes
+
+def steady(t: float, period: float) -> Tuple[float, float]:
+    return 1.0, t
+
+def diurnal(t: float, period: float) -> Tuple[float, float]:
+    angle = 2 * math.pi * t / period
+    return (1 + DIURNAL_AMPLITUDE * math.sin(angle),
+            t + DIURNAL_AMPLITUDE * period / (2 * math.pi) * (1 - math.cos(angle)))
+
+def spike(t: float, period: float) -> Tuple[float, float]:
+    cycles, offset = divmod(t, period)
+    width = SPIKE_WIDTH * period
+    level = 1 + (SPIKE_HEIGHT if offset < width else 0.0)
+    return level, t + SPIKE_HEIGHT * (cycles * width + min(offset, width))
+
+def backlog(t: float, period: float) -> Tuple[float, float]:
+    cycles, offset = divmod(t, period)
+    return (1 + BACKLOG_GROWTH * offset / period,
+            t + BACKLOG_GROWTH * (cycles * period / 2 + offset * offset / (2 * period)))
+
+SHAPES: Dict[str, Callable[[float, float], Tuple[float, float]]] = {
+    'steady': steady,
+    'diurnal': diurnal,
+    'spike': spike,
+    'backlog': backlog,
+}
+
+class Shape:
+    """Load factor over time: (level at t, integral of the level from 0 to t)."""
+    __slots__ = ('name', 'period', 'function')
+
+    def __init__(self, name: str, period: float = 3600.0):
+        if name not in SHAPES:
+            raise ValueError(f"unknown shape {name!r}, expected one of {', '.join(SHAPES)}")
+        if period <= 0:
+            raise ValueError(f"shape period must be positive, got {period:g}")
+        self.name = name
+        self.period = period
+        self.function = SHAPES[name]
+
+    def at(self, t: float) -> Tuple[float, float]:
+        return self.function(max(t, 0.0), self.period)
+
+# ---------------------------------------------------------------------------
+# Metric families
+
+# How a family's value follows the shape
+LEVEL = 'level'        # gauge: base x level
+TOTAL = 'total'        # counter: base per second x integral of the level
+INVERSE = 'inverse'    # ratio falling as load rises, at most 1
+FIXED = 'fixed'        # gauge independent of load (limits, alarms)
+
+class Family:
+    """A metric family: name, TYPE and HELP, and how its value is generated."""
+    __slots__ = ('name', 'type', 'help', 'kind', 'base', 'dimension', 'integer')
+
+    def __init__(self, name: str, help: str, kind: str, base: float,
+                 dimension: Optional[str] = None, integer: bool = True):
+        self.name = name
+        self.type = 'counter' if kind == TOTAL else 'gauge'
+        self.help = help
+        self.kind = kind
+        self.base = base
+        # Target dimension ('queue', 'cmd') with one series per value, None for one series per target
+        self.dimension = dimension
+        self.integer = integer
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.type}\n"
+
+N8N_FAMILIES = (
+    Family('n8n_scaling_mode_queue_jobs_waiting',
+           'Current number of enqueued jobs waiting for pickup in scaling mode.', LEVEL, 10),
+    Family('n8n_scaling_mode_queue_jobs_active',
+           'Current number of jobs being processed across all workers in scaling mode.', LEVEL, 4),
+    Family('n8n_scaling_mode_queue_jobs_completed',
+           'Total number of jobs completed across all workers in scaling mode since instance start.', TOTAL, 2),
+    Family('n8n_scaling_mode_queue_jobs_failed',
+           'Total number of jobs failed across all workers in scaling mode since instance start.', TOTAL, 0.02),
+    Family('n8n_nodejs_eventloop_lag_p99_seconds',
+           'The 99th percentile of the recorded event loop delays.', LEVEL, 0.05, integer=False),
+)
+
+RABBITMQ_FAMILIES = (
+    Family('rabbitmq_connections', 'Connections currently open', LEVEL, 15),
+    Family('rabbitmq_channels', 'Channels currently open', LEVEL, 40),
+    Family('rabbitmq_channel_messages_published_total',
+           'Total number of messages published into an exchange on a channel', TOTAL, 20),
+    Family('rabbitmq_channel_messages_delivered_total',
+           'Total number of messages delivered to consumers in automatic acknowledgement mode', TOTAL, 20),
+    Family('rabbitmq_process_resident_memory_bytes', 'Memory used in bytes', LEVEL, 4e8),
+    Family('rabbitmq_resident_memory_limit_bytes', 'Memory high watermark in bytes', FIXED, 1717567488),
+    Family('rabbitmq_disk_space_available_bytes', 'Disk space available in bytes', FIXED, 4e9),
+    Family('rabbitmq_disk_space_available_limit_bytes', 'Free disk space low watermark in bytes', FIXED, 52428800),
+    Family('rabbitmq_process_open_fds', 'Open file descriptors', LEVEL, 100),
+    Family('rabbitmq_process_max_fds', 'Open file descriptors limit', FIXED, 1048576),
+    Family('rabbitmq_alarms_memory_used_watermark',
+           'is 1 if VM memory watermark alarm is in effect', FIXED, 0),
+    Family('rabbitmq_alarms_free_disk_space_watermark',
+           'is 1 if free disk space watermark alarm is in effect', FIXED, 0),
+    Family('rabbitmq_queue_messages_ready', 'Messages ready to be delivered to consumers', LEVEL, 100, 'queue'),
+    Family('rabbitmq_queue_messages_unacked',
+           'Messages delivered to consumers but not yet acknowledged', LEVEL, 10, 'queue'),
+    Family('rabbitmq_queue_messages',
+           'Sum of ready and unacknowledged messages - total queue depth', LEVEL, 110, 'queue'),
+    Family('rabbitmq_queue_consumers', 'Consumers on a queue', FIXED, 3, 'queue'),
+    Family('rabbitmq_queue_consumer_utilisation', 'Consumer utilisation', INVERSE, 0.9, 'queue', integer=False),
+    Family('rabbitmq_queue_messages_published_total',
+           'Total number of messages published to queues', TOTAL, 5, 'queue'),
+    Family('rabbitmq_queue_messages_delivered_total',
+           'Total number of messages delivered to consumers', TOTAL, 5, 'queue'),
+    Family('rabbitmq_queue_messages_ack_total',
+           'Total number of messages acknowledged by consumers', TOTAL, 5, 'queue'),
+)
+
+REDIS_FAMILIES = (
+    Family('redis_connected_clients', 'connected_clients metric', LEVEL, 30),
+    Family('redis_memory_used_bytes', 'memory_used_bytes metric', LEVEL, 5e7),
+    Family('redis_memory_max_bytes', 'memory_max_bytes metric', FIXED, 1073741824),
+    Family('redis_pubsub_channels', 'pubsub_channels metric', LEVEL, 5),
+    Family('redis_commands_processed_total', 'commands_processed_total metric', TOTAL, 800),
+    Family('redis_commands_total', 'Total number of calls per command', TOTAL, 50, 'cmd'),
+)
+
+WEBSOCKET_FAMILIES = (
+    Family('websocket_connections_total', 'Currently open websocket connections', LEVEL, 2000),
+    Family('websocket_rooms_total', 'Active rooms', LEVEL, 1000),
+    Family('websocket_connections_established_total', 'Websocket connections established', TOTAL, 3),
+    Family('websocket_connections_closed_total', 'Websocket connections closed', TOTAL, 3),
+    Family('websocket_broadcasts_total', 'Broadcast messages sent', TOTAL, 40),
+    Family('websocket_auth_failures_total', 'Failed websocket authentications', TOTAL, 0.05),
+    Family('websocket_subscription_errors_total', 'Failed room subscriptions', TOTAL, 0.02),
+)
+
+# ---------------------------------------------------------------------------
+# Topology
+
+def label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(labels: Sequence[Tuple[str, str]]) -> str:
+    return ','.join(f'{name}="{label_value(value)}"' for name, value in labels)
+
+class Target:
+    """A scraped pod: its target labels, address, the labels monitors select it by, and its families."""
+    __slots__ = ('namespace', 'pod', 'job', 'address', 'port', 'port_name', 'path',
+                 'pod_labels', 'service_labels', 'families', 'dimensions', 'labels', 'hash')
+
+    def __init__(self, namespace: str, pod: str, job: str, address: str, port: int, port_name: str,
+                 pod_labels: Dict[str, str], service_labels: Optional[Dict[str, str]],
+                 families: Sequence[Family], dimensions: Dict[str, List[str]], seed: int):
+        self.namespace = namespace
+        self.pod = pod
+        self.job = job
+        self.address = address
+        self.port = port
+        self.port_name = port_name
+        self.path = '/metrics'
+        self.pod_labels = pod_labels
+        # Labels of the Service in front of the pod, None when it has none
+        self.service_labels = service_labels
+        self.families = families
+        # dimension -> label text of each of its series, shared between targets
+        self.dimensions = dimensions
+        # The labels Prometheus attaches to every series of the target
+        self.labels = label_text([('namespace', namespace), ('pod', pod), ('job', job), ('instance', address)])
+        self.hash = zlib.crc32(self.labels.encode('utf-8'), seed & 0xffffffff)
+
+    def series_count(self) -> int:
+        return sum(len(self.dimensions[f.dimension]) if f.dimension else 1 for f in self.families)
+
+class Topology:
+    """The targets of a synthetic cluster."""
+    __slots__ = ('targets', 'namespaces')
+
+    def __init__(self, targets: List[Target]):
+        self.targets = targets
+        self.namespaces = list(dict.fromkeys(target.namespace for target in targets))
+
+    @classmethod
+    def build(cls, namespaces: Sequence[Tuple[str, str]], workers: int = 3, queues: int = len(QUEUES),
+              gateways: int = 2, seed: int = 0) -> 'Topology':
+        """
+        namespaces are (namespace, n8n release) pairs; every namespace gets a
+        main pod, `workers` worker pods, RabbitMQ with `queues` queues and
+        Valkey, and content-platform gets `gateways` websocket gateway pods.
+        """
+        rng = random.Random(seed)
+        queue_labels = [label_text([('vhost', '/'), ('queue', name)]) for name in queue_names(queues)]
+        command_labels = [label_text([('cmd', command)]) for command in REDIS_COMMANDS]
+        targets: List[Target] = []
+
+        def add(namespace, pod, job, port, port_name, pod_labels, service_labels, families, dimensions=None):
+            targets.append(Target(namespace, pod, job, f"{pod_ip(len(targets))}:{port}", port, port_name,
+                                  pod_labels, service_labels, families, dimensions or {}, seed))
+
+        for namespace, release in namespaces:
+            app = {'app.kubernetes.io/name': 'n8n', 'app.kubernetes.io/instance': release}
+            add(namespace, pod_name(release, rng), release, 5678, 'http',
+                dict(app, **{'app.kubernetes.io/type': 'main'}), app, N8N_FAMILIES)
+            template = template_hash(rng)
+            for _ in range(workers):
+                add(namespace, pod_name(f"{release}-worker", rng, template), f"{release}-worker", 5678, 'http',
+                    dict(app, **{'app.kubernetes.io/type': 'worker'}), None, N8N_FAMILIES)
+            rabbitmq = {'app.kubernetes.io/name': 'rabbitmq', 'app.kubernetes.io/instance': 'rabbitmq'}
+            add(namespace, 'rabbitmq-0', 'rabbitmq', 15692, 'metrics', rabbitmq, rabbitmq,
+                RABBITMQ_FAMILIES, {'queue': queue_labels})
+            valkey = {'app.kubernetes.io/name': 'valkey', 'app.kubernetes.io/instance': f"{release}-valkey",
+                      'app.kubernetes.io/component': 'primary'}
+            add(namespace, f"{release}-valkey-primary-0", f"{release}-valkey-primary-metrics", 9121, 'metrics',
+                valkey, valkey, REDIS_FAMILIES, {'cmd': command_labels})
+        gateway = {'app.kubernetes.io/name': 'websocket-gateway'}
+        template = template_hash(rng)
+        for _ in range(gateways):
+            add(WEBSOCKET_NAMESPACE, pod_name('websocket-gateway', rng, template), 'websocket-gateway', 9464,
+                'metrics', gateway, gateway, WEBSOCKET_FAMILIES)
+        return cls(targets)
+
+    def series_count(self) -> int:
+        return sum(target.series_count() for target in self.targets)
+
+    def find(self, namespace: str, pod: str) -> Optional[Target]:
+        for target in self.targets:
+            if target.namespace == namespace and target.pod == pod:
+                return target
+        return None
+
+def queue_names(count: int) -> List[str]:
+    return list(QUEUES[:count]) + [f"queue-{n:03d}" for n in range(len(QUEUES), count)]
+
+def template_hash(rng: random.Random) -> str:
+    return ''.join(rng.choice(NAME_ALPHABET) for _ in range(10))
+
+def pod_name(deployment: str, rng: random.Random, template: Optional[str] = None) -> str:
+    suffix = ''.join(rng.choice(NAME_ALPHABET) for _ in range(5))
+    return f"{deployment}-{template or template_hash(rng)}-{suffix}"
+
+def pod_ip(index: int) -> str:
+    """Addresses in 10.244.0.0/14, one per target."""
+    address = (244 << 16) + index + 1
+    return f"10.{(address >> 16) & 255}.{(address >> 8) & 255}.{address & 255}"
+
+# ---------------------------------------------------------------------------
+# Rendering
+
+def series_lines(family: Family, target: Target, level: float, total: float, tick: bytes,
+                 prefix: str) -> str:
+    """The sample lines of a family on a target; prefix is the target labels plus a comma, or ''."""
+    kind, base = family.kind, family.base
+    rows = target.dimensions[family.dimension] if family.dimension else ('',)
+    lines = []
+    for row in rows:
+        key = zlib.crc32(row.encode('utf-8'), target.hash) if row else target.hash
+        factor = 0.5 + (key & 0xffff) / 0xffff
+        if kind == TOTAL:
+            value = base * factor * total
+        elif kind == FIXED:
+            value = base * factor
+        else:
+            noise = 1 + JITTER * ((zlib.crc32(tick, key) & 0xffff) / 0x7fff - 1)
+            value = base * factor * noise * (level if kind == LEVEL else 1 / level)
+            if kind == INVERSE:
+                value = min(value, 1.0)
+        labels = prefix + row if row else prefix[:-1]
+        text = f"{value:.0f}" if family.integer else f"{value:.4g}"
+        lines.append(f"{family.name}{{{labels}}} {text}\n" if labels else f"{family.name} {text}\n")
+    return ''.join(lines)
+
+def render_target(target: Target, shape: Shape, t: float) -> Iterator[str]:
+    """A target's /metrics payload at t, as the exporter serves it: without target labels."""
+    level, total = shape.at(t)
+    tick = str(int(t)).encode('ascii')
+    for family in target.families:
+        yield family.header() + series_lines(family, target, level, total, tick, '')
+
+def render_snapshot(topology: Topology, shape: Shape, t: float) -> Iterator[str]:
+    """Every target's series at t with the labels Prometheus attaches, grouped by family like a fixture."""
+    level, total = shape.at(t)
+    tick = str(int(t)).encode('ascii')
+    by_family: Dict[str, Tuple[Family, List[Target]]] = {}
+    for target in topology.targets:
+        for family in target.families:
+            by_family.setdefault(family.name, (family, []))[1].append(target)
+    for family, targets in by_family.values():
+        yield family.header()
+        for target in targets:
+            yield series_lines(family, target, level, total, tick, target.labels + ',')
+
+# ---------------------------------------------------------------------------
+# ServiceMonitors and PodMonitors
+
+def matches(selector: Optional[Dict[str, Any]], labels: Dict[str, str]) -> bool:
+    """Kubernetes label selector (matchLabels, matchExpressions) against labels."""
+    selector = selector or {}
+    for name, value in (selector.get('matchLabels') or {}).items():
+        if labels.get(name) != str(value):
+            return False
+    for expression in selector.get('matchExpressions') or []:
+        name, operator = expression.get('key'), expression.get('operator')
+        values = [str(value) for value in expression.get('values') or []]
+        if operator == 'In' and labels.get(name) not in values:
+            return False
+        if operator == 'NotIn' and labels.get(name) in values:
+            return False
+        if operator == 'Exists' and name not in labels:
+            return False
+        if operator == 'DoesNotExist' and name in labels:
+            return False
+    return True
+
+def monitor_namespaces(monitor: Dict[str, Any], namespaces: Sequence[str]) -> List[str]:
+    """The namespaces of `namespaces` a monitor's namespaceSelector covers."""
+    selector = (monitor.get('spec') or {}).get('namespaceSelector') or {}
+    if selector.get('any'):
+        return list(namespaces)
+    names = selector.get('matchNames') or [(monitor.get('metadata') or {}).get('namespace')]
+    return [namespace for namespace in namespaces if namespace in names]
+
+def monitor_endpoints(monitor: Dict[str, Any]) -> List[Dict[str, Any]]:
+    spec = monitor.get('spec') or {}
+    return spec.get('podMetricsEndpoints' if monitor.get('kind') == 'PodMonitor' else 'endpoints') or []
+
+def monitor_targets(monitor: Dict[str, Any], topology: Topology) -> List[Tuple[Target, Dict[str, Any]]]:
+    """
+    (target, endpoint) of every endpoint of a ServiceMonitor or PodMonitor
+    and target it selects: ServiceMonitors select by Service labels, so
+    targets without a Service are never selected, PodMonitors by pod labels;
+    the endpoint's port must name the target's port (or targetPort its number).
+    """
+    pod_monitor = monitor.get('kind') == 'PodMonitor'
+    selector = (monitor.get('spec') or {}).get('selector')
+    namespaces = set(monitor_namespaces(monitor, topology.namespaces))
+    selected = []
+    for target in topology.targets:
+        labels = target.pod_labels if pod_monitor else target.service_labels
+        if target.namespace not in namespaces or labels is None or not matches(selector, labels):
+            continue
+        for endpoint in monitor_endpoints(monitor):
+            if endpoint.get('port') == target.port_name or str(endpoint.get('targetPort')) == str(target.port):
+                selected.append((target, endpoint))
+    return selected
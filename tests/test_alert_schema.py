@@ -0,0 +1,64 @@
+import pytest
+
+import alert_schema
+import yaml_io
+from conftest import ROOT, load_script
+
+convert_alerts = load_script('convert-alerts')
+validate_yaml = load_script('validate-yaml')
+
+PROVISIONING_DIRS = [ROOT / 'grafana-alerts', ROOT / 'helm' / 'grafana-alerts']
+
+def converted_rule(**changes):
+    rule = convert_alerts.convert_rule({'alert': 'QueueBacklog', 'expr': 'queue_messages > 100', 'for': '5m'},
+                                       'queues').to_dict()
+    rule.update(changes)
+    return rule
+
+def group(*rules, **changes):
+    return dict({'orgId': 1, 'name': 'queues', 'folder': 'Applications', 'interval': '1m', 'rules': list(rules)},
+                **changes)
+
+def test_converted_rule_is_valid():
+    assert alert_schema.rule_problems(converted_rule()) == []
+
+@pytest.mark.parametrize('changes, problem', [
+    ({'uid': 'x' * 41}, 'longer than 40 characters'),
+    ({'uid': 'queue backlog'}, 'may only contain'),
+    ({'condition': 'D'}, "condition 'D' is not one of the refIds"),
+    ({'for': 'soon'}, 'is not a duration'),
+    ({'noDataState': 'Maybe'}, 'noDataState'),
+    ({'labels': {'severity': 1}}, 'label severity is a int'),
+])
+def test_rule_problems(changes, problem):
+    problems = alert_schema.rule_problems(converted_rule(**changes))
+    assert any(problem in p for p in problems), problems
+
+def test_group_problems():
+    rule = converted_rule()
+    problems = alert_schema.group_problems(group(rule, rule, interval='15s', folder='Elsewhere'), {'Applications'})
+    assert any("not a multiple of 10s" in p for p in problems)
+    assert any("'Elsewhere' is not provisioned" in p for p in problems)
+    assert any("used twice" in p for p in problems)
+
+def test_duplicate_uids_across_files():
+    problems = alert_schema.duplicate_uids([('a.yaml', ['x', 'y']), ('b.yaml', ['y'])])
+    assert problems == ["uid 'y' of b.yaml is also used in a.yaml"]
+
+def test_configmaps_are_checked_through_their_data():
+    inner = yaml_io.dump({'apiVersion': 1, 'groups': [group(converted_rule())]})
+    configmap = {'apiVersion': 'v1', 'kind': 'ConfigMap', 'data': {'queues.yaml': inner}}
+    documents = alert_schema.provisioning_documents(configmap)
+    assert len(documents) == 1
+    assert alert_schema.document_problems(documents[0], {'Applications'}) == []
+
+def test_prometheus_rules_are_skipped():
+    assert alert_schema.provisioning_documents({'kind': 'PrometheusRule', 'spec': {}}) == []
+
+@pytest.mark.parametrize('directory', PROVISIONING_DIRS, ids=lambda path: path.relative_to(ROOT).as_posix())
+def test_committed_provisioning_files_are_valid(directory):
+    folders = alert_schema.load_folders(directory / alert_schema.FOLDERS_FILE)
+    results = [(path.name, validate_yaml.validate_file(path, folders)) for path in sorted(directory.glob('*.yaml'))]
+    problems = [f"{name}: {problem}" for name, (file_problems, _, _) in results for problem in file_problems]
+    problems += alert_schema.duplicate_uids((name, uids) for name, (_, uids, _) in results)
+    assert problems == []
@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import backtest
+from conftest import load_script
+
+convert_alerts = load_script('convert-alerts')
+
+QUEUE = (('__name__', 'queue_depth'), ('queue', 'a'))
+
+@pytest.fixture
+def fixture(tmp_path):
+    """An hour at 15s resolution: a counter growing 2/s, a queue deep from 20m to 40m."""
+    lines = []
+    for t in range(0, 3600, 15):
+        lines.append(f'jobs_total{{queue="a"}} {t * 2} {t}')
+        lines.append(f'queue_depth{{queue="a"}} {500 if 1200 <= t < 2400 else 10} {t}')
+    path = tmp_path / 'fixture.txt'
+    path.write_text('\n'.join(lines) + '\n# EOF\n')
+    return backtest.load_text(path)
+
+def test_rate_of_a_counter(fixture):
+    result = backtest.Evaluator(fixture).query('rate(jobs_total[5m])', np.array([600.0, 1200.0]))
+    assert list(result) == [(('queue', 'a'),)]
+    assert result[(('queue', 'a'),)] == pytest.approx([2.0, 2.0])
+
+def test_comparison_filters_samples(fixture):
+    result = backtest.Evaluator(fixture).query('sum(queue_depth) > 100', np.array([600.0, 1500.0]))
+    values = result[()]
+    assert np.isnan(values[0]) and values[1] == 500
+
+def test_converted_rule_fires_after_its_for_duration(fixture):
+    rule = convert_alerts.convert_rule({'alert': 'QueueDeep', 'expr': 'queue_depth > 100', 'for': '5m'},
+                                       'queues', '1m').to_dict()
+    result = backtest.RuleBacktest(fixture).run(rule, 60)
+    assert result.error is None
+    assert list(result.episodes()) == [(QUEUE, 1500.0, 2400.0)]
+
+def test_pending_to_firing():
+    active = np.array([True, True, True, False, True, True])
+    firing = backtest.pending_to_firing(active, np.arange(6) * 60.0, 120)
+    assert firing.tolist() == [False, False, True, False, False, False]
+
+def test_columnar_round_trip(fixture, tmp_path):
+    backtest.save_columnar(fixture, tmp_path / 'fixture.npz')
+    loaded = backtest.load_columnar(tmp_path / 'fixture.npz')
+    assert [s.labels for s in loaded.series] == [s.labels for s in fixture.series]
+    for original, copy in zip(fixture.series, loaded.series):
+        assert copy.timestamps.tolist() == original.timestamps.tolist()
+        assert copy.values.tolist() == original.values.tolist()
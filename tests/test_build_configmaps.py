@@ -0,0 +1,40 @@
+import sys
+
+import pytest
+
+import yaml_io
+from conftest import ROOT, load_script
+
+build_configmaps = load_script('build-configmaps')
+
+def test_minify_yaml_keeps_the_data():
+    text = '# comment\napiVersion: 1\ngroups:\n  - name: queues\n    interval: 1m\n---\nfolders: []\n'
+    minified = build_configmaps.minify_yaml(text)
+    assert minified == '{"apiVersion":1,"groups":[{"name":"queues","interval":"1m"}]}\n---\n{"folders":[]}'
+    assert list(yaml_io.load_all(minified)) == list(yaml_io.load_all(text))
+
+def test_minify_yaml_writes_dates_as_iso_strings():
+    minified = build_configmaps.minify_yaml('since: 2026-10-01\nat: 2026-10-01T12:30:00Z\n')
+    assert minified == '{"since":"2026-10-01","at":"2026-10-01T12:30:00+00:00"}'
+
+def test_minify_yaml_rejects_other_values():
+    with pytest.raises(TypeError, match='bytes'):
+        build_configmaps.minify_yaml('data: !!binary aGVsbG8=\n')
+
+@pytest.mark.parametrize('sizes, budget, shards', [
+    ([100, 100, 100], 10_000, [['f0', 'f1', 'f2']]),
+    ([3000, 3000, 3000], 7000, [['f0', 'f1'], ['f2']]),
+    ([9000, 100], 5000, [['f0'], ['f1']]),
+])
+def test_shard_packs_files_in_order(sizes, budget, shards):
+    files = [(f"f{i}", 'x' * size) for i, size in enumerate(sizes)]
+    assert build_configmaps.shard(files, budget) == shards
+
+def test_committed_build_is_up_to_date(monkeypatch, capsys):
+    """Argo CD renders the chart from git, so helm/build/ must match its sources."""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(sys, 'argv', ['build-configmaps.py', '--check'])
+    try:
+        build_configmaps.main()
+    except SystemExit:
+        pytest.fail(capsys.readouterr().out.strip().splitlines()[-1])
@@ -0,0 +1,79 @@
+import shutil
+import sys
+
+import pytest
+
+from conftest import ROOT, load_script
+
+convert_alerts = load_script('convert-alerts')
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A checkout with one PrometheusRule and the folders it needs."""
+    (tmp_path / 'alerts').mkdir()
+    (tmp_path / 'grafana-alerts').mkdir()
+    shutil.copy(ROOT / 'alerts' / 'rabbitmq.yaml', tmp_path / 'alerts')
+    shutil.copy(ROOT / 'grafana-alerts' / 'folders.yaml', tmp_path / 'grafana-alerts')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def run(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, 'argv', ['convert-alerts.py', *args])
+    convert_alerts.main()
+    return capsys.readouterr().out
+
+def test_cache_key_follows_content_version_and_salt(tmp_path, monkeypatch):
+    path = tmp_path / 'rules.yaml'
+    path.write_text('a: 1\n')
+    key = convert_alerts.cache_key(path)
+    assert convert_alerts.cache_key(path) == key
+    assert convert_alerts.cache_key(path, 'recording') != key
+
+    path.write_text('a: 2\n')
+    assert convert_alerts.cache_key(path) != key
+
+    path.write_text('a: 1\n')
+    monkeypatch.setattr(convert_alerts, 'CONVERTER_VERSION', 'next')
+    assert convert_alerts.cache_key(path) != key
+
+def test_cached_alert_count_needs_matching_key_and_output(tmp_path):
+    output = tmp_path / 'out.yaml'
+    output.write_text('groups: []\n')
+    entry = {'key': 'k', 'output_sha256': convert_alerts.file_sha256(output), 'alerts': 3}
+    assert convert_alerts.cached_alert_count(entry, 'k', output) == 3
+    assert convert_alerts.cached_alert_count(entry, 'other', output) is None
+    assert convert_alerts.cached_alert_count(None, 'k', output) is None
+
+    output.write_text('groups: [edited]\n')
+    assert convert_alerts.cached_alert_count(entry, 'k', output) is None
+    output.unlink()
+    assert convert_alerts.cached_alert_count(entry, 'k', output) is None
+
+def test_unchanged_inputs_are_served_from_the_cache(workdir, monkeypatch, capsys):
+    out = run(monkeypatch, capsys)
+    assert '✓ Converted rabbitmq.yaml' in out
+    written = (workdir / 'grafana-alerts' / 'rabbitmq.yaml').read_text()
+
+    out = run(monkeypatch, capsys)
+    assert '· Unchanged rabbitmq.yaml' in out
+    assert (workdir / 'grafana-alerts' / 'rabbitmq.yaml').read_text() == written
+
+def test_converter_version_invalidates_the_cache(workdir, monkeypatch, capsys):
+    run(monkeypatch, capsys)
+    monkeypatch.setattr(convert_alerts, 'CONVERTER_VERSION', convert_alerts.CONVERTER_VERSION + '-next')
+    assert '✓ Converted rabbitmq.yaml' in run(monkeypatch, capsys)
+
+def test_changed_input_or_output_is_reconverted(workdir, monkeypatch, capsys):
+    run(monkeypatch, capsys)
+    source = workdir / 'alerts' / 'rabbitmq.yaml'
+    source.write_text(source.read_text() + '\n# edited\n')
+    assert '✓ Converted rabbitmq.yaml' in run(monkeypatch, capsys)
+
+    (workdir / 'grafana-alerts' / 'rabbitmq.yaml').write_text('edited by hand\n')
+    assert '✓ Converted rabbitmq.yaml' in run(monkeypatch, capsys)
+
+def test_cached_count_matches_a_fresh_conversion(workdir, monkeypatch, capsys):
+    fresh = run(monkeypatch, capsys, '--no-cache').splitlines()[-2]
+    cached = run(monkeypatch, capsys).splitlines()[-2]
+    assert 'Successfully converted' in fresh
+    assert cached == fresh
@@ -0,0 +1,30 @@
+import dashboards
+
+def panel(title, expr, **extra):
+    return {'type': 'timeseries', 'title': title, 'targets': [{'refId': 'A', 'expr': expr}], **extra}
+
+def test_hand_made_panel_with_the_same_title_is_kept():
+    hand_made = panel('Jobs', 'sum(jobs_waiting)', id=1, description='edited in Grafana')
+    panels = [hand_made]
+    assert dashboards.patch_panels(panels, [panel('Jobs', 'jobs_waiting')], 'gen') == (1, 0, 0)
+    assert panels[0] is hand_made
+    assert panels[1][dashboards.OWNER_KEY] == 'gen'
+
+def test_owned_panel_is_updated_by_title():
+    panels = [panel('Jobs', 'jobs_waiting', id=7, **{dashboards.OWNER_KEY: 'gen'})]
+    assert dashboards.patch_panels(panels, [panel('Jobs', 'sum(jobs_waiting)')], 'gen') == (0, 1, 0)
+    assert panels == [panel('Jobs', 'sum(jobs_waiting)', id=7, **{dashboards.OWNER_KEY: 'gen'})]
+    assert dashboards.patch_panels(panels, [panel('Jobs', 'max(jobs_waiting)')], 'other') == (1, 0, 0)
+
+def test_same_title_and_queries_is_adopted_and_rerun_is_unchanged():
+    panels = [panel('Jobs', 'jobs_waiting', id=3)]
+    assert dashboards.patch_panels(panels, [panel('Jobs', 'jobs_waiting')], 'gen') == (0, 1, 0)
+    assert panels[0]['id'] == 3 and panels[0][dashboards.OWNER_KEY] == 'gen'
+    before = panels[0]
+    assert dashboards.patch_panels(panels, [panel('Jobs', 'jobs_waiting')], 'gen') == (0, 0, 1)
+    assert panels[0] is before
+
+def test_renamed_panel_is_found_by_its_queries():
+    panels = [panel('Jobs', 'jobs_waiting', id=3, **{dashboards.OWNER_KEY: 'gen'})]
+    assert dashboards.patch_panels(panels, [panel('Jobs waiting', 'jobs_waiting')], 'gen') == (0, 1, 0)
+    assert [p['title'] for p in panels] == ['Jobs waiting']
@@ -0,0 +1,68 @@
+import pytest
+
+import evaluation_plan
+from conftest import load_script
+from evaluation_plan import GroupLoad, PlanSettings
+
+convert_alerts = load_script('convert-alerts')
+
+def alert(name, expr, for_duration='0s'):
+    return {'alert': name, 'expr': expr, 'for': for_duration}
+
+@pytest.mark.parametrize('costs, ceiling, chunks', [
+    ([10, 10, 10], 100, [[0, 1, 2]]),
+    ([40, 40, 40, 40], 100, [[0, 1], [2, 3]]),
+    ([60, 50, 40], 100, [[0, 2], [1]]),
+    ([500, 10], 100, [[0], [1]]),
+    ([], 100, []),
+])
+def test_split_by_cost(costs, ceiling, chunks):
+    assert evaluation_plan.split_by_cost(costs, ceiling) == chunks
+
+@pytest.mark.parametrize('declared, for_duration, window, expected', [
+    (30, None, 0, 30),
+    (30, 600, 300, 60),
+    (30, 1800, 1800, 300),
+    (30, 3600, 3600, 300),
+    (120, 60, 0, 120),
+])
+def test_rule_interval(declared, for_duration, window, expected):
+    assert evaluation_plan.rule_interval(declared, for_duration, window) == expected
+
+def test_plan_groups_splits_by_interval():
+    rules = [
+        alert('Fast', 'x > 1'),
+        alert('Medium', 'rate(x[5m]) > 1', '10m'),
+        alert('Slow', 'rate(y[30m]) > 1', '30m'),
+    ]
+    groups = convert_alerts.plan_groups('queues', 'applications', '30s', rules, None, PlanSettings())
+    assert [(g.name, g.interval, [r.title for r in g.rules]) for g in groups] == [
+        ('queues', '30s', ['Fast']),
+        ('queues-1m', '1m', ['Medium']),
+        ('queues-5m', '5m', ['Slow']),
+    ]
+
+def test_plan_groups_splits_under_the_ceiling():
+    rules = [alert(f"Rule{i}", f"metric_{i} > 1") for i in range(5)]
+    cost = convert_alerts.rule_cost(convert_alerts.convert_rule(rules[0], 'queues', '30s'))
+    groups = convert_alerts.plan_groups('queues', 'applications', '30s', rules, None,
+                                        PlanSettings(ceiling=cost * 2))
+    assert [(g.name, [r.title for r in g.rules]) for g in groups] == [
+        ('queues', ['Rule0', 'Rule1']),
+        ('queues-2', ['Rule2', 'Rule3']),
+        ('queues-3', ['Rule4']),
+    ]
+    assert all(convert_alerts.group_load(g).cost <= cost * 2 for g in groups)
+
+def test_plan_groups_keeps_every_rule():
+    rules = [alert(f"Rule{i}", f"rate(metric_{i}[{i + 1}m]) > 1", f"{i * 5}m") for i in range(8)]
+    groups = convert_alerts.plan_groups('g', 'applications', '30s', rules, None, PlanSettings(ceiling=50))
+    assert sorted(r.title for g in groups for r in g.rules) == sorted(r['alert'] for r in rules)
+    assert len({g.name for g in groups}) == len(groups)
+
+def test_schedule_staggers_groups():
+    groups = [GroupLoad('a', 'f', 60, 100, 1), GroupLoad('b', 'f', 60, 100, 1)]
+    loads, lockstep = evaluation_plan.schedule(groups)
+    assert lockstep == 200
+    assert max(loads) == 100
+    assert groups[0].slot != groups[1].slot
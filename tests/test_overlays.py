@@ -0,0 +1,67 @@
+import pytest
+
+import overlays
+import yaml_io
+from conftest import ROOT, load_script
+
+expand_overlays = load_script('expand-overlays')
+
+ENVIRONMENTS = overlays.Environments([
+    {'name': 'dev', 'namespace': 'n8n-dev', 'threshold': 200},
+    {'name': 'prod', 'namespace': 'n8n-prod', 'threshold': 500},
+])
+
+def overlay_paths():
+    return [path.relative_to(ROOT) for path in expand_overlays.overlay_files(ROOT / expand_overlays.OVERLAY_DIR)]
+
+@pytest.mark.parametrize('overlay', overlay_paths(), ids=str)
+def test_committed_outputs_match_their_overlay(overlay, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    with open(expand_overlays.ENVIRONMENTS_FILE, encoding='utf-8') as f:
+        environments = overlays.Environments.load(yaml_io.load(f))
+    output = overlay.relative_to(expand_overlays.OVERLAY_DIR)
+    assert expand_overlays.render(overlay, environments) == output.read_text(encoding='utf-8'), (
+        f"{output} is out of date; run python expand-overlays.py")
+
+def test_marked_items_expand_per_environment():
+    overlay = {'rules': [
+        {'$environments': '*', 'alert': 'Backlog', 'expr': 'q{namespace="${namespace}"} > ${threshold}',
+         '$patch': {'prod': {'for': '5m', 'labels': {'severity': 'critical'}}}},
+        {'$environments': ['prod'], 'alert': 'Critical${name}', 'expr': 'q{namespace="${namespace}"} > 1000'},
+        {'alert': 'Stale', 'expr': 'age{namespace=~"${all:namespace}"} > 600'},
+    ]}
+    assert overlays.expand(overlay, ENVIRONMENTS) == {'rules': [
+        {'alert': 'Backlog', 'expr': 'q{namespace="n8n-dev"} > 200'},
+        {'alert': 'Backlog', 'expr': 'q{namespace="n8n-prod"} > 500', 'for': '5m',
+         'labels': {'severity': 'critical'}},
+        {'alert': 'Criticalprod', 'expr': 'q{namespace="n8n-prod"} > 1000'},
+        {'alert': 'Stale', 'expr': 'age{namespace=~"n8n-(dev|prod)"} > 600'},
+    ]}
+
+def test_unmarked_subtrees_are_shared():
+    overlay = {'spec': {'endpoints': [{'port': 'metrics'}]}, 'items': [{'$environments': '*', 'name': '${name}'}]}
+    expanded = overlays.expand(overlay, ENVIRONMENTS)
+    assert expanded['spec'] is overlay['spec']
+    assert expanded['items'] == [{'name': 'dev'}, {'name': 'prod'}]
+
+@pytest.mark.parametrize('values, regex', [
+    (['n8n-dev', 'n8n-prod'], 'n8n-(dev|prod)'),
+    (['a', 'a'], 'a'),
+    ([], ''),
+])
+def test_regex_union(values, regex):
+    assert overlays.regex_union(values) == regex
+
+def test_merge_patch():
+    target = {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': [1]}
+    assert overlays.merge_patch(target, {'b': {'c': None, 'x': 4}, 'e': [2]}) == {'a': 1, 'b': {'d': 3, 'x': 4}, 'e': [2]}
+    assert target == {'a': 1, 'b': {'c': 2, 'd': 3}, 'e': [1]}
+
+@pytest.mark.parametrize('overlay, message', [
+    ({'rules': [{'$environments': ['staging'], 'alert': 'X'}]}, 'unknown environments staging'),
+    ({'rules': [{'alert': 'X', 'expr': 'q{namespace="${namespace}"}'}]}, 'outside an item'),
+    ({'$environments': '*'}, 'only marks items of a list'),
+])
+def test_invalid_overlays(overlay, message):
+    with pytest.raises(overlays.OverlayError, match=message):
+        overlays.expand(overlay, ENVIRONMENTS)
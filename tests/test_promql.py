@@ -0,0 +1,68 @@
+import pytest
+
+import promql
+import yaml_io
+from conftest import ROOT
+
+EXPRESSIONS = [
+    'up',
+    'sum by (queue) (rate(x{a="b", c!~"d.*"}[5m] offset 1h)) > 5',
+    'max_over_time(up[1h:5m]) == 0',
+    '-x * 2 ^ 3',
+    'histogram_quantile(0.95, sum(rate(h_bucket[5m])) by (le))',
+    'a and on (x) group_left (y) b',
+    'x @ 100',
+    'count(changes(certmanager_certificate_ready_status{condition="True", namespace="$namespace"}[7d]) > 0)',
+]
+
+def alert_expressions():
+    exprs = []
+    for path in sorted((ROOT / 'alerts').glob('*.yaml')):
+        with open(path, encoding='utf-8') as f:
+            for document in yaml_io.load_all(f):
+                for group in ((document or {}).get('spec') or {}).get('groups') or []:
+                    exprs.extend(rule['expr'] for rule in group.get('rules') or [] if rule.get('expr'))
+    return exprs
+
+@pytest.mark.parametrize('expr', EXPRESSIONS)
+def test_round_trip(expr):
+    tree = promql.parse(expr)
+    assert promql.parse(str(tree)) == tree
+    assert str(promql.parse(str(tree))) == str(tree)
+
+def test_round_trip_of_every_alert():
+    exprs = alert_expressions()
+    assert exprs
+    for expr in exprs:
+        tree = promql.parse(expr)
+        assert promql.parse(str(tree)) == tree, expr
+
+def test_spans_cover_the_source():
+    expr = 'rate(x{namespace="n8n-dev"}[5m])'
+    selector = next(node for node in promql.walk(promql.parse(expr)) if isinstance(node, promql.VectorSelector))
+    matcher = selector.matchers[0]
+    assert expr[matcher.start:matcher.end] == 'namespace="n8n-dev"'
+
+@pytest.mark.parametrize('expr', ['x{a="b"', 'sum(', 'x > > 1', 'rate(x[5q])'])
+def test_syntax_errors(expr):
+    with pytest.raises(promql.PromQLSyntaxError):
+        promql.parse(expr)
+
+@pytest.mark.parametrize('expr, expected', [
+    ('x > 5', ('x', '>', '5')),
+    ('5 < x', ('x', '>', '5')),
+    ('1 >= rate(x[5m])', ('rate(x[5m])', '<=', '1')),
+    ('(x > bool 0.90)', ('x', '>', '0.90')),
+    ('sum(x) by (q) != 0', ('sum by (q) (x)', '!=', '0')),
+])
+def test_threshold_comparison(expr, expected):
+    vector, op, literal = promql.threshold_comparison(promql.parse(expr))
+    assert (str(vector), op, str(literal)) == expected
+
+@pytest.mark.parametrize('expr', ['x > y', 'x + 5', '1 > 2', 'x > 5 and y', 'x'])
+def test_threshold_comparison_none(expr):
+    assert promql.threshold_comparison(promql.parse(expr)) is None
+
+def test_scalar_text_keeps_plain_decimals():
+    assert promql.scalar_text(promql.parse('0.90')) == '0.90'
+    assert promql.scalar_text(promql.parse('1e3')) == '1000'
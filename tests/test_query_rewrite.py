@@ -0,0 +1,55 @@
+import pytest
+
+from query_rewrite import OrVector, RenameMetric, ReplaceQuery, Rewriter, RuleError, SetLabel, load_rules
+
+def rewrite(rules, expr):
+    return Rewriter(rules).rewrite_expr(expr)
+
+@pytest.mark.parametrize('expr, expected', [
+    ('x{namespace="n8n-dev"}', 'x{namespace=~"$namespace"}'),
+    ('x{namespace!="n8n-dev"}', 'x{namespace!="n8n-dev"}'),
+    ('x{namespace!~"kube-.*"}', 'x{namespace!~"kube-.*"}'),
+    ('x{namespace="a", namespace!="b"}', 'x{namespace=~"$namespace", namespace!="b"}'),
+    ('x{namespace!="b", namespace="a"}', 'x{namespace!="b", namespace=~"$namespace"}'),
+    ('x{job="j"}', 'x{job="j"}'),
+])
+def test_replace_only_positive_equality(expr, expected):
+    rule = SetLabel('namespace', '$namespace', op='=~', mode='replace', replace_ops=['='])
+    assert rewrite([rule], expr) == expected
+
+def test_replace_defaults_to_every_operator():
+    rule = SetLabel('namespace', '$namespace', op='=~', mode='replace')
+    assert rewrite([rule], 'x{namespace!="a"}') == 'x{namespace=~"$namespace"}'
+
+@pytest.mark.parametrize('mode, expr, expected', [
+    ('set', 'x', 'x{pod=~"ws-.*"}'),
+    ('set', 'x{pod="a"}', 'x{pod=~"ws-.*"}'),
+    ('add', 'x{pod="a"}', 'x{pod="a"}'),
+    ('add', 'x{job="j"}', 'x{job="j", pod=~"ws-.*"}'),
+    ('replace', 'x', 'x'),
+])
+def test_set_label_modes(mode, expr, expected):
+    assert rewrite([SetLabel('pod', 'ws-.*', op='=~', mode=mode)], expr) == expected
+
+def test_rules_compose_in_one_pass():
+    rules = [
+        RenameMetric('redis_pubsub_num_messages_total', 'redis_commands_total', {'cmd': 'publish'}),
+        SetLabel('namespace', '$namespace', op='=~', mode='add'),
+        OrVector(functions=['rate']),
+    ]
+    assert rewrite(rules, 'sum(rate(redis_pubsub_num_messages_total[5m]))') == (
+        'sum(rate(redis_commands_total{cmd="publish", namespace=~"$namespace"}[5m])) or vector(0)')
+
+def test_replace_query_ignores_formatting():
+    rule = ReplaceQuery('sum(x{a="b"})', 'sum(y)')
+    assert rewrite([rule], "sum( x{a='b'} )") == 'sum(y)'
+
+@pytest.mark.parametrize('entry, message', [
+    ({'set_label': {'label': 'a', 'value': 'b', 'op': '=='}}, 'invalid matcher operator'),
+    ({'set_label': {'label': 'a', 'value': 'b', 'mode': 'replace', 'replace_ops': ['~']}}, 'replace_ops'),
+    ({'set_label': {'label': 'a', 'value': 'b', 'mode': 'upsert'}}, 'invalid set_label mode'),
+    ({'or_vector': {}, 'set_label': {'label': 'a', 'value': 'b'}}, 'exactly one'),
+])
+def test_invalid_rules(entry, message):
+    with pytest.raises(RuleError, match=message):
+        load_rules({'rules': [entry]})
@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import load_script
+
+convert_alerts = load_script('convert-alerts')
+
+@pytest.mark.parametrize('expr, interval, annotations, reducer, timing', [
+    # `last` only needs the final point: one step, however long the range selectors
+    ('rate(x[5m]) > 1', '1m', {}, 'last', (60, 60)),
+    ('x > 1', '30s', {}, 'last', (30, 30)),
+    # Reducers over the whole result cover the longest range selector
+    ('rate(x[5m]) > 1', '1m', {}, 'mean', (300, 60)),
+    ('max_over_time(x[1h:5m]) > 1', '1m', {}, 'max', (3600, 60)),
+    ('x > 1', '1m', {}, 'mean', (60, 60)),
+    # Annotations override either value; the window is never shorter than the step
+    ('x > 1', '1m', {'grafana_query_window': '10m'}, 'last', (600, 60)),
+    ('x > 1', '1m', {'grafana_query_step': '5m'}, 'last', (300, 300)),
+    ('x > 1', '1m', {'grafana_query_window': '30s', 'grafana_query_step': '2m'}, 'last', (120, 120)),
+])
+def test_query_timing(expr, interval, annotations, reducer, timing):
+    assert convert_alerts.query_timing(expr, interval, annotations, reducer) == timing
+
+def test_invalid_timing_annotation():
+    with pytest.raises(ValueError):
+        convert_alerts.query_timing('x > 1', '1m', {'grafana_query_window': 'soon'})
+
+def test_rule_query_uses_window_and_step():
+    rule = convert_alerts.convert_rule({
+        'alert': 'Backlog', 'expr': 'rate(x[5m]) > 5', 'for': '5m',
+        'annotations': {'summary': 'backlog', 'grafana_query_window': '10m'},
+    }, 'queues', '1m').to_dict()
+    query = rule['data'][0]
+    assert query['relativeTimeRange'] == {'from': 600, 'to': 0}
+    assert query['model']['intervalMs'] == 60000
+    assert query['model']['maxDataPoints'] == 11
+    assert rule['annotations'] == {'summary': 'backlog'}
@@ -0,0 +1,20 @@
+import recording_rules
+
+RATIO = 'rate(jobs_failed_total{namespace="%(ns)s"}[5m]) / rate(%(total)s{namespace="%(ns)s"}[5m])'
+
+def plan(*totals):
+    expressions = [RATIO % {'ns': ns, 'total': total} for total in totals for ns in ('dev', 'prod')]
+    return recording_rules.build_plan(expressions)
+
+def test_shared_subexpression_is_recorded_and_rewritten():
+    built = plan('jobs_total')
+    assert built.rules == [('namespace:jobs_failed_total:ratio', 'rate(jobs_failed_total[5m]) / rate(jobs_total[5m])')]
+    assert built.rewrite(RATIO % {'ns': 'dev', 'total': 'jobs_total'}) == \
+        'namespace:jobs_failed_total:ratio{namespace="dev"}'
+
+def test_colliding_names_do_not_depend_on_the_other_rules():
+    two = dict((expr, name) for name, expr in plan('jobs_total', 'jobs_started_total').rules)
+    three = dict((expr, name) for name, expr in plan('jobs_total', 'jobs_started_total', 'a_total').rules)
+    assert len(set(two.values())) == 2
+    assert all(name.startswith('namespace:jobs_failed_total:ratio_') for name in three.values())
+    assert {expr: three[expr] for expr in two} == two
@@ -0,0 +1,87 @@
+import pytest
+
+import variants
+from conftest import load_script
+
+convert_alerts = load_script('convert-alerts')
+
+TEMPLATE = {
+    'apiVersion': 'monitoring.coreos.com/v1',
+    'kind': 'PrometheusRule',
+    'metadata': {'name': 'queue-alerts'},
+    'spec': {'groups': [{'name': 'queues', 'rules': [
+        {'alert': 'QueueBacklog', 'expr': 'queue_messages{namespace="n8n-dev"} > ${threshold}'},
+        {'record': 'queue:messages:sum', 'expr': 'sum(queue_messages{namespace="n8n-dev"})'},
+    ]}]},
+}
+
+MATRIX = variants.Matrix.load({'label': 'namespace', 'variants': [
+    {'name': 'acme', 'namespace': 'n8n-acme', 'threshold': 200, 'labels': {'tenant': 'acme'}},
+    {'name': 'beta-2', 'namespace': 'n8n-beta', 'threshold': 500},
+]})
+
+def render_all(document):
+    template = variants.Template(document, MATRIX)
+    return [template.render(variant) for variant in MATRIX.variants]
+
+def test_variants_get_their_own_names():
+    acme, beta = render_all(TEMPLATE)
+    assert acme['metadata']['name'] == 'queue-alerts-acme'
+    assert acme['spec']['groups'][0]['name'] == 'queues-acme'
+    assert beta['spec']['groups'][0]['name'] == 'queues-beta-2'
+    assert [r.get('alert') for r in acme['spec']['groups'][0]['rules']] == ['QueueBacklog_acme', None]
+    assert beta['spec']['groups'][0]['rules'][0]['alert'] == 'QueueBacklog_beta_2'
+
+def test_converted_variants_have_unique_uids():
+    uids = [convert_alerts.convert_rule(rule, group['name']).uid
+            for document in render_all(TEMPLATE) for group in document['spec']['groups']
+            for rule in group['rules'] if 'alert' in rule]
+    assert uids == ['queuebacklog_acme', 'queuebacklog_beta_2']
+
+def test_expressions_are_pinned_and_substituted():
+    acme, beta = render_all(TEMPLATE)
+    assert acme['spec']['groups'][0]['rules'][0]['expr'] == 'queue_messages{namespace="n8n-acme"} > 200'
+    assert beta['spec']['groups'][0]['rules'][1]['expr'] == 'sum(queue_messages{namespace="n8n-beta"})'
+
+def test_negative_matchers_are_left_alone():
+    document = dict(TEMPLATE, spec={'groups': [{'name': 'queues', 'rules': [
+        {'alert': 'Backlog', 'expr': 'queue_messages{namespace=~"n8n-.*", namespace!="n8n-dev"} > 1'},
+        {'alert': 'Other', 'expr': 'queue_messages{namespace!~"n8n-(dev|prod)"} > 1'}]}]})
+    acme, _ = render_all(document)
+    assert [r['expr'] for r in acme['spec']['groups'][0]['rules']] == [
+        'queue_messages{namespace="n8n-acme", namespace!="n8n-dev"} > 1',
+        'queue_messages{namespace!~"n8n-(dev|prod)"} > 1',
+    ]
+
+def test_unparsable_expression_is_an_error():
+    document = dict(TEMPLATE, spec={'groups': [{'name': 'queues', 'rules': [
+        {'alert': 'Broken', 'expr': 'rate(queue_messages{namespace="n8n-dev"}_total[5m])'}]}]})
+    with pytest.raises(variants.MatrixError, match='cannot pin namespace'):
+        variants.Template(document, MATRIX)
+
+def test_variant_labels_go_on_every_rule():
+    acme, beta = render_all(TEMPLATE)
+    assert all(rule['labels'] == {'tenant': 'acme'} for rule in acme['spec']['groups'][0]['rules'])
+    assert 'labels' not in beta['spec']['groups'][0]['rules'][0]
+    assert 'labels' not in TEMPLATE['spec']['groups'][0]['rules'][0]
+
+def test_placeholder_names_are_kept():
+    document = dict(TEMPLATE, spec={'groups': [{'name': 'queues-${name}', 'rules': [
+        {'alert': 'QueueBacklog${name}', 'expr': 'up'}]}]})
+    acme, _ = render_all(document)
+    assert acme['spec']['groups'][0]['name'] == 'queues-acme'
+    assert acme['spec']['groups'][0]['rules'][0]['alert'] == 'QueueBacklogacme'
+
+def test_dashboard_uid_and_title():
+    acme, _ = render_all({'uid': 'x' * 40, 'title': 'Queues', 'panels': []})
+    assert acme['uid'] == 'x' * 35 + '-acme'
+    assert acme['title'] == 'Queues (acme)'
+
+@pytest.mark.parametrize('document, message', [
+    ({'variants': [{'namespace': 'a'}]}, 'needs a name'),
+    ({'variants': [{'name': 'a'}, {'name': 'a'}]}, 'duplicate variant name'),
+    ({'label': 'namespace', 'variants': [{'name': 'a'}]}, 'no value for'),
+])
+def test_invalid_matrix(document, message):
+    with pytest.raises(variants.MatrixError, match=message):
+        variants.Matrix.load(document)
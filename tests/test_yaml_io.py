@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+import yaml_io
+
+STRINGS = [
+    'plain',
+    'line one\nline two\n',
+    '**Impact**: \n- queue backlog',
+    'trailing tab\t\nend',
+    'blank line with spaces\n  \nafter',
+    'emoji 🚨\nsecond line',
+    'üñíçødé\n',
+]
+
+def dumpers():
+    yield yaml_io.PurePythonDumper
+    if yaml_io.LIBYAML:
+        yield yaml_io.LibyamlDumper
+
+@pytest.mark.parametrize('text', STRINGS)
+def test_strings_round_trip_identically_on_both_backends(text):
+    data = {'annotations': {'description': text}, 'items': [text]}
+    outputs = {yaml_io.dump(data, dumper=dumper) for dumper in dumpers()}
+    assert len(outputs) == 1
+    assert yaml_io.load(outputs.pop()) == data
+
+def test_multi_line_strings_are_literal_blocks():
+    assert yaml_io.dump({'expr': 'sum(x)\n> 5\n'}) == 'expr: |\n  sum(x)\n  > 5\n'
+
+def test_trailing_whitespace_is_kept():
+    text = yaml_io.dump({'description': 'hard break  \nnext'})
+    assert yaml_io.load(text) == {'description': 'hard break  \nnext'}
+
+def test_shared_objects_are_not_anchored():
+    shared = {'uid': 'prometheus'}
+    assert '&' not in yaml_io.dump({'a': shared, 'b': shared})
+
+def test_iter_items_streams_list_items():
+    stream = io.StringIO('kind: List\nitems:\n- {a: 1}\n- {a: 2}\n---\nkind: PrometheusRule\n')
+    assert list(yaml_io.iter_items(stream)) == [{'a': 1}, {'a': 2}, {'kind': 'PrometheusRule'}]
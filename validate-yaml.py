@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Validate the Grafana alert provisioning files in grafana-alerts/.
+
+Replaces validate-yaml.mjs, which only checked apiVersion and a few top-level
+keys, with the checks of alert_schema.py: uids, condition and expression
+refIds, queries, durations, states, group intervals and folders against
+folders.yaml, plus uids unique across all files. ConfigMaps wrapping
+provisioning files are checked through their data; PrometheusRules in the
+directory are listed as skipped. convert-alerts.py runs the
+same checks on every group it builds, so this is for hand-written files and
+for checking a directory before deployment.
+
+Each file is parsed and checked once, in N worker processes with --jobs;
+duplicate uids are then checked over the uids the workers report. Exits with
+status 1 when any file has problems.
+
+Usage:
+    python validate-yaml.py [--jobs N] [DIR_OR_FILE ...]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+import alert_schema
+import yaml_io
+
+DEFAULT_DIR = Path('grafana-alerts')
+
+def validate_file(path: Path, folders: Optional[Set[str]]) -> Tuple[List[str], List[str], bool]:
+    """(problems, rule uids, skipped) of one provisioning file."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            documents = alert_schema.provisioning_documents(yaml_io.load(f))
+    except Exception as e:
+        return [str(e).splitlines()[0]], [], False
+    problems, uids = [], []
+    for document in documents:
+        problems.extend(alert_schema.document_problems(document, folders))
+        uids.extend(alert_schema.document_uids(document))
+    return problems, uids, not documents
+
+def provisioning_files(paths: List[Path]) -> List[Path]:
+    files = []
+    for path in paths:
+        files.extend(sorted(path.glob('*.yaml')) if path.is_dir() else [path])
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate Grafana alert provisioning files.')
+    parser.add_argument('paths', nargs='*', type=Path, default=[DEFAULT_DIR], metavar='DIR_OR_FILE',
+                        help=f'files, or directories of *.yaml files (default {DEFAULT_DIR})')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='validate files in N worker processes (0 = one per CPU)')
+    args = parser.parse_args()
+
+    files = provisioning_files(args.paths)
+    print(f"\nValidating {len(files)} YAML files...\n")
+
+    # Folders come from the folders.yaml next to the files; without one the folder check is skipped
+    folders = None
+    for folders_file in {path.parent / alert_schema.FOLDERS_FILE for path in files}:
+        if folders_file.exists():
+            folders = (folders or set()) | alert_schema.load_folders(folders_file)
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+            results = list(executor.map(validate_file, files, [folders] * len(files)))
+    else:
+        results = [validate_file(path, folders) for path in files]
+
+    valid = 0
+    for path, (problems, _, skipped) in zip(files, results):
+        if skipped:
+            print(f"- {path.name} (PrometheusRule, skipped)")
+            valid += 1
+        elif problems:
+            print(f"✗ {path.name}")
+            for problem in problems:
+                print(f"    {problem}")
+        else:
+            print(f"✓ {path.name}")
+            valid += 1
+    duplicates = alert_schema.duplicate_uids((path.name, uids) for path, (_, uids, _) in zip(files, results))
+    for problem in duplicates:
+        print(f"✗ {problem}")
+
+    print(f"\n{valid}/{len(files)} files valid")
+    if valid < len(files) or duplicates:
+        print("\n✗ Some files have errors. Please fix them before deployment.\n")
+        sys.exit(1)
+    print("\n✓ All YAML files are valid!\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Per-namespace / per-tenant variants of alert rules and dashboards.
+
+One template (a PrometheusRule or a dashboard) is expanded for every entry of
+a matrix:
+
+    label: namespace            # matcher pinned in every expression
+    variants:
+      - name: acme              # suffix for uids and resource names
+        namespace: n8n-acme
+        backlog_threshold: 200
+        labels:                 # added to every alert rule
+          tenant: acme
+
+Rendering a variant:
+
+- `${key}` in any string is replaced by the variant's value for key. Only the
+  matrix's own keys are placeholders; Grafana variables and Prometheus
+  templates ($namespace, {{ $labels.queue }}) are left alone.
+- In PromQL expressions every = and =~ matcher on the matrix label is pinned
+  to the variant's value, so a template written against namespace="n8n-dev"
+  or namespace=~"$namespace" queries the variant's namespace. != and !~
+  matchers and selectors without such a matcher are not changed, and an
+  expression that does not parse is a MatrixError.
+- A PrometheusRule gets `-<name>` appended to metadata.name and to each group
+  name, `_<name>` to each alert name (Grafana derives rule uids and titles
+  from it, so variants must not share one) and the variant's labels on each
+  rule; a dashboard gets `-<name>` on its uid and ` (<name>)` on its title.
+  Names that already use a placeholder are left as rendered.
+
+compile() walks and parses a template once. Rendering only rebuilds the
+containers on the path to a string that differs between variants and shares
+everything else with the template, so outputs must be treated as read-only.
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import promql
+from promql import VectorSelector
+
+# Grafana's limit for dashboard and alert rule uids
+MAX_UID_LENGTH = 40
+
+# Alert names must be valid metric names
+ALERT_NAME_INVALID = re.compile(r'[^a-zA-Z0-9_]')
+
+Variant = Dict[str, Any]
+Renderer = Callable[[Variant], Any]
+
+class MatrixError(ValueError):
+    """Raised for an invalid variant matrix or a template it cannot be applied to."""
+
+class Matrix:
+    """Variants to render and the label pinned in their expressions."""
+    __slots__ = ('label', 'variants', 'keys')
+
+    def __init__(self, variants: List[Variant], label: Optional[str] = None):
+        self.label = label
+        self.variants = variants
+        self.keys = sorted({key for variant in variants for key, value in variant.items()
+                            if not isinstance(value, (dict, list))})
+
+    @classmethod
+    def load(cls, document: Dict[str, Any]) -> 'Matrix':
+        if not isinstance(document, dict) or not isinstance(document.get('variants'), list):
+            raise MatrixError("matrix needs a 'variants' list")
+        label = document.get('label')
+        names = set()
+        for index, variant in enumerate(document['variants']):
+            if not isinstance(variant, dict) or not variant.get('name'):
+                raise MatrixError(f"variant {index} needs a name")
+            if variant['name'] in names:
+                raise MatrixError(f"duplicate variant name {variant['name']!r}")
+            names.add(variant['name'])
+            if label and label not in variant:
+                raise MatrixError(f"variant {variant['name']!r} has no value for {label!r}")
+            if not isinstance(variant.get('labels', {}), dict):
+                raise MatrixError(f"labels of variant {variant['name']!r} must be a mapping")
+        return cls(document['variants'], label)
+
+# --- Compilation ------------------------------------------------------------
+
+def placeholder_pattern(keys: Iterable[str]) -> Optional['re.Pattern']:
+    keys = sorted(keys, key=len, reverse=True)
+    if not keys:
+        return None
+    return re.compile(r'\$\{(' + '|'.join(re.escape(k) for k in keys) + r')\}')
+
+def compile_text(text: str, pattern: Optional['re.Pattern']) -> Optional[Renderer]:
+    """A renderer substituting placeholders in text, or None if it has none."""
+    if pattern is None or not pattern.search(text):
+        return None
+    pieces = pattern.split(text)
+    # split() alternates literal text and placeholder names
+    literals, names = pieces[0::2], pieces[1::2]
+
+    def render(variant: Variant) -> str:
+        out = [literals[0]]
+        for name, literal in zip(names, literals[1:]):
+            out.append(str(variant[name]))
+            out.append(literal)
+        return ''.join(out)
+    return render
+
+def compile_expr(expr: str, label: Optional[str], pattern: Optional['re.Pattern']) -> Optional[Renderer]:
+    """A renderer pinning `label` matchers in a PromQL expression and substituting placeholders."""
+    spans = []
+    if label:
+        try:
+            tree = promql.parse(expr)
+        except promql.PromQLSyntaxError as e:
+            # Rendered as is, every variant would query the template's own label value
+            raise MatrixError(f"cannot pin {label} in {expr!r}: {e}") from e
+        # Negative matchers exclude values and are left as written
+        spans = [(m.start, m.end) for node in promql.walk(tree) if isinstance(node, VectorSelector)
+                 for m in node.matchers if m.name == label and m.op in ('=', '=~')]
+    if not spans:
+        return compile_text(expr, pattern)
+
+    def render(variant: Variant) -> str:
+        pinned = f'{label}={promql.quote(str(variant[label]))}'
+        text = promql.replace_spans(expr, [(start, end, pinned) for start, end in spans])
+        return pattern.sub(lambda m: str(variant[m.group(1)]), text) if pattern else text
+    return render
+
+def compile_value(value: Any, matrix: Matrix, pattern: Optional['re.Pattern'],
+                  key: Optional[str] = None) -> Optional[Renderer]:
+    """A renderer for value, or None when it is the same in every variant."""
+    if isinstance(value, str):
+        if key == 'expr':
+            return compile_expr(value, matrix.label, pattern)
+        return compile_text(value, pattern)
+    if isinstance(value, dict):
+        items = [(k, v, compile_value(v, matrix, pattern, k)) for k, v in value.items()]
+        if all(fn is None for _, _, fn in items):
+            return None
+        return lambda variant: {k: fn(variant) if fn else v for k, v, fn in items}
+    if isinstance(value, list):
+        items = [(v, compile_value(v, matrix, pattern)) for v in value]
+        if all(fn is None for _, fn in items):
+            return None
+        return lambda variant: [fn(variant) if fn else v for v, fn in items]
+    return None
+
+class Template:
+    """A parsed template, compiled once and rendered for every variant."""
+    __slots__ = ('document', 'kind', 'renderer', 'pattern')
+
+    def __init__(self, document: Dict[str, Any], matrix: Matrix):
+        self.document = document
+        self.kind = 'PrometheusRule' if document.get('kind') == 'PrometheusRule' else 'dashboard'
+        self.pattern = placeholder_pattern(matrix.keys)
+        self.renderer = compile_value(document, matrix, self.pattern)
+
+    def uses_placeholder(self, text: Any) -> bool:
+        return isinstance(text, str) and self.pattern is not None and bool(self.pattern.search(text))
+
+    def render(self, variant: Variant) -> Dict[str, Any]:
+        document = self.renderer(variant) if self.renderer else self.document
+        if self.kind == 'PrometheusRule':
+            return self.finish_prometheus_rule(document, variant)
+        return self.finish_dashboard(document, variant)
+
+    def finish_prometheus_rule(self, document: Dict[str, Any], variant: Variant) -> Dict[str, Any]:
+        metadata = dict(document.get('metadata') or {})
+        if not self.uses_placeholder((self.document.get('metadata') or {}).get('name')):
+            metadata['name'] = f"{metadata.get('name', 'rules')}-{variant['name']}"
+        labels = variant.get('labels') or {}
+        alert_suffix = '_' + ALERT_NAME_INVALID.sub('_', str(variant['name']))
+        template_groups = (self.document.get('spec') or {}).get('groups') or []
+        spec = document.get('spec') or {}
+        groups = []
+        for group, template_group in zip(spec.get('groups') or [], template_groups):
+            group = dict(group)
+            if group.get('name') and not self.uses_placeholder(template_group.get('name')):
+                group['name'] = f"{group['name']}-{variant['name']}"
+            rules = []
+            for rule, template_rule in zip(group.get('rules') or [], template_group.get('rules') or []):
+                rule = dict(rule)
+                if rule.get('alert') and not self.uses_placeholder(template_rule.get('alert')):
+                    rule['alert'] = rule['alert'] + alert_suffix
+                if labels:
+                    rule['labels'] = {**(rule.get('labels') or {}), **labels}
+                rules.append(rule)
+            group['rules'] = rules
+            groups.append(group)
+        return dict(document, metadata=metadata, spec=dict(spec, groups=groups))
+
+    def finish_dashboard(self, document: Dict[str, Any], variant: Variant) -> Dict[str, Any]:
+        document = dict(document)
+        if document.get('uid') and not self.uses_placeholder(self.document.get('uid')):
+            suffix = f"-{variant['name']}"
+            document['uid'] = document['uid'][:MAX_UID_LENGTH - len(suffix)] + suffix
+        if document.get('title') and not self.uses_placeholder(self.document.get('title')):
+            document['title'] = f"{document['title']} ({variant['name']})"
+        return document
@@ -0,0 +1,172 @@
+"""
+YAML loading and dumping shared by the alert conversion tooling.
+
+Uses PyYAML's libyaml bindings (CSafeLoader/CSafeDumper) when they are
+available and falls back to the pure-Python SafeLoader/SafeDumper otherwise.
+Both dumpers are configured so they emit identical bytes:
+
+- Multi-line strings (annotations, long expressions) are written as literal
+  blocks (`|`). Neither emitter can write a line with trailing whitespace in
+  block style, so such strings are double-quoted instead, always by the
+  pure-Python dumper because libyaml folds double-quoted lines differently.
+- Non-ASCII characters are written as-is (allow_unicode), since escaping
+  forces double-quoted style for the same reason.
+- libyaml treats characters outside the Basic Multilingual Plane (emoji) and
+  control characters as unprintable. Documents containing them are emitted
+  with the pure-Python dumper so the result does not depend on the backend.
+
+Run benchmark-yaml.py to check both paths agree and compare their speed.
+"""
+
+import re
+from typing import Any, Iterator
+
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import (
+    MappingEndEvent, MappingStartEvent, SequenceEndEvent, SequenceStartEvent, StreamEndEvent,
+)
+from yaml.resolver import Resolver
+
+try:
+    from yaml import CSafeLoader, CSafeDumper
+    from yaml._yaml import CParser
+    LIBYAML = True
+except ImportError:
+    LIBYAML = False
+
+STR_TAG = 'tag:yaml.org,2002:str'
+
+# Anything outside the characters both emitters print verbatim
+LIBYAML_UNPRINTABLE = re.compile('[^\n\x20-\x7e\x85\xa0-\ud7ff\ue000-\ufefe\uff00-\ufffd]')
+# Whitespace ending a line of a multi-line string rules out block style
+TRAILING_WHITESPACE = re.compile(r'[ \t]\n')
+
+DUMP_OPTIONS = {
+    'default_flow_style': False,
+    'sort_keys': False,
+    'width': 120,
+    'allow_unicode': True,
+}
+
+def represent_str(dumper, data: str):
+    """
+    Represent multi-line strings as literal blocks, everything else as usual.
+    The emitter double-quotes multi-line strings that cannot be a block.
+    """
+    if '\n' in data:
+        return dumper.represent_scalar(STR_TAG, data, style='|')
+    return dumper.represent_str(data)
+
+class PurePythonDumper(yaml.SafeDumper):
+    """SafeDumper with literal block style for multi-line strings."""
+
+    def ignore_aliases(self, data):
+        # Shared objects (see grafana_model) are written out in full, never as anchors
+        return True
+
+PurePythonDumper.add_representer(str, represent_str)
+
+PurePythonLoader = yaml.SafeLoader
+
+class NeedsPurePythonDumper(Exception):
+    """Raised by LibyamlDumper for strings libyaml would emit differently."""
+
+def represent_str_libyaml(dumper, data: str):
+    """represent_str, refusing strings that libyaml cannot print verbatim or would fold differently."""
+    if LIBYAML_UNPRINTABLE.search(data) or ('\n' in data and TRAILING_WHITESPACE.search(data + '\n')):
+        raise NeedsPurePythonDumper(data)
+    return represent_str(dumper, data)
+
+if LIBYAML:
+    class LibyamlDumper(CSafeDumper):
+        """CSafeDumper with literal block style for multi-line strings."""
+
+        def ignore_aliases(self, data):
+            return True
+
+    LibyamlDumper.add_representer(str, represent_str_libyaml)
+
+    class EventLoader(CParser, Composer, SafeConstructor, Resolver):
+        """libyaml events composed and constructed in Python, one node at a time."""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+    Loader = CSafeLoader
+    Dumper = LibyamlDumper
+else:
+    EventLoader = PurePythonLoader
+
+    Loader = PurePythonLoader
+    Dumper = PurePythonDumper
+
+def add_representer(cls, representer):
+    """Register a representer for cls on both dumpers."""
+    PurePythonDumper.add_representer(cls, representer)
+    if LIBYAML:
+        LibyamlDumper.add_representer(cls, representer)
+
+def load(stream, loader=None):
+    """Parse a single YAML document."""
+    return yaml.load(stream, Loader=loader or Loader)
+
+def load_all(stream, loader=None):
+    """Lazily parse every document in a multi-document YAML stream."""
+    return yaml.load_all(stream, Loader=loader or Loader)
+
+def iter_items(stream, loader=None) -> Iterator[Any]:
+    """
+    Lazily parse a YAML stream, yielding each document, except that the
+    `items` of a list document (`kubectl get ... -o yaml`, kind: List) are
+    yielded one at a time in its place. Only one item is in memory at a time,
+    however long the list.
+    """
+    parser = (loader or EventLoader)(stream)
+    try:
+        parser.get_event()  # StreamStart
+        while not parser.check_event(StreamEndEvent):
+            parser.get_event()  # DocumentStart
+            if not parser.check_event(MappingStartEvent):
+                document = parser.construct_document(parser.compose_node(None, None))
+            else:
+                parser.get_event()
+                document, streamed = {}, False
+                while not parser.check_event(MappingEndEvent):
+                    key = parser.construct_document(parser.compose_node(None, None))
+                    if key == 'items' and parser.check_event(SequenceStartEvent):
+                        parser.get_event()
+                        while not parser.check_event(SequenceEndEvent):
+                            yield parser.construct_document(parser.compose_node(None, None))
+                        parser.get_event()
+                        streamed = True
+                        continue
+                    document[key] = parser.construct_document(parser.compose_node(None, None))
+                parser.get_event()
+                if streamed:
+                    document = None
+            parser.get_event()  # DocumentEnd
+            parser.anchors = {}
+            if document is not None:
+                yield document
+    finally:
+        parser.dispose()
+
+def dump(data, stream=None, dumper=None):
+    """
+    Serialize data with the repository's output conventions.
+
+    Returns the YAML text when stream is None, otherwise writes it to stream.
+    """
+    dumper = dumper or Dumper
+    try:
+        text = yaml.dump(data, Dumper=dumper, **DUMP_OPTIONS)
+    except NeedsPurePythonDumper:
+        text = yaml.dump(data, Dumper=PurePythonDumper, **DUMP_OPTIONS)
+    if stream is None:
+        return text
+    stream.write(text)